@@ -107,7 +107,11 @@ class AstroImage(BaseImage):
         self.wcs.load_header(hdu.header, fobj=fobj)
 
     def load_file(self, filepath, numhdu=None, naxispath=None,
-                  allow_numhdu_override=True):
+                  allow_numhdu_override=True, lazy=False):
+        """Load an image from a FITS file.  If `lazy` is True, the data
+        is memory-mapped (if the FITS module supports it) and is only
+        read from disk as it is accessed.
+        """
         self.logger.debug("Loading file '%s' ..." % (filepath))
         self.clear_metadata()
 
@@ -120,7 +124,8 @@ class AstroImage(BaseImage):
         _data, numhdu_, naxispath = self.io.load_file(info.filepath, ahdr,
                                                       numhdu=numhdu,
                                                       naxispath=naxispath,
-                                                      phdr=self._primary_hdr)
+                                                      phdr=self._primary_hdr,
+                                                      lazy=lazy)
         # this is a handle to the full data array
         self._md_data = _data
 
@@ -159,15 +164,36 @@ class AstroImage(BaseImage):
 
     def load_buffer(self, data, dims, dtype, byteswap=False,
                     metadata=None):
-        data = numpy.fromstring(data, dtype=dtype)
+        data = numpy.frombuffer(data, dtype=dtype)
+        if not data.flags.writeable:
+            data = data.copy()
         if byteswap:
             data.byteswap(True)
         data = data.reshape(dims)
         self.set_data(data, metadata=metadata)
 
     def get_mddata(self):
+        if self._md_data is None:
+            # image was not loaded from multidimensional data
+            return self._get_data()
         return self._md_data
 
+    def sample_mddata(self, xs, ys, method='nearest'):
+        """Like `sample_points`, but samples all of the planes of the
+        multidimensional data at once: the result has the shape of
+        get_mddata().shape[:-2] + xs.shape.
+        """
+        return trcalc.sample_image(self.get_mddata(), xs, ys, method=method)
+
+    def get_nbytes(self):
+        nbytes = super(AstroImage, self).get_nbytes()
+        if ((self._md_data is not None) and
+            (self._md_data.shape != self._get_data().shape)):
+            # count the full data array, the slice is a view of it
+            nbytes += self._md_data.nbytes - self._get_data().nbytes
+        nbytes += 80 * len(self.get_header())
+        return nbytes
+
     def set_naxispath(self, naxispath):
         """Choose a slice out of multidimensional data.
         """
@@ -175,7 +201,7 @@ class AstroImage(BaseImage):
         revnaxis.reverse()
 
         # construct slice view and extract it
-        view = revnaxis + [slice(None), slice(None)]
+        view = tuple(revnaxis + [slice(None), slice(None)])
         data = self.get_mddata()[view]
 
         assert len(data.shape) == 2, \
@@ -321,6 +347,34 @@ class AstroImage(BaseImage):
         return self.wcs.radectopix(ra_deg, dec_deg, coords=coords,
                                    naxispath=self.revnaxis)
 
+    def pixtoradec_arr(self, x_arr, y_arr, coords='data'):
+        """Vectorized form of `pixtoradec`.  Converts arrays of data
+        coordinates with a single call into the WCS and returns a tuple
+        of arrays (ra_deg, dec_deg), shaped like the (broadcast) inputs.
+        """
+        x_arr, y_arr = numpy.broadcast_arrays(numpy.asarray(x_arr, dtype=float),
+                                              numpy.asarray(y_arr, dtype=float))
+        shape = x_arr.shape
+        idxs = numpy.empty((x_arr.size, 2 + len(self.revnaxis)), dtype=float)
+        idxs[:, 0] = x_arr.ravel()
+        idxs[:, 1] = y_arr.ravel()
+        idxs[:, 2:] = self.revnaxis
+        res = self.wcs.pixtoradec_arr(idxs, coords=coords)
+        return res[:, 0].reshape(shape), res[:, 1].reshape(shape)
+
+    def radectopix_arr(self, ra_arr, dec_arr, coords='data'):
+        """Vectorized form of `radectopix`.  Converts arrays of sky
+        coordinates (in degrees) with a single call into the WCS and
+        returns a tuple of arrays (x, y), shaped like the (broadcast)
+        inputs.
+        """
+        ra_arr, dec_arr = numpy.broadcast_arrays(numpy.asarray(ra_arr, dtype=float),
+                                                 numpy.asarray(dec_arr, dtype=float))
+        shape = ra_arr.shape
+        res = self.wcs.radectopix_arr(ra_arr.ravel(), dec_arr.ravel(),
+                                      coords=coords, naxispath=self.revnaxis)
+        return res[:, 0].reshape(shape), res[:, 1].reshape(shape)
+
     #-----> TODO: merge into wcs.py ?
     #
     def get_starsep_XY(self, x1, y1, x2, y2):
@@ -376,21 +430,33 @@ class AstroImage(BaseImage):
                                    delta_deg)
 
 
+    def _add_offsets_ne(self, ra_deg, dec_deg, len_deg_e, len_deg_n):
+        # north and east offsets from (ra_deg, dec_deg), converted back
+        # to pixel coordinates with one call into the WCS
+        ra_n, dec_n = wcs.add_offset_radec(ra_deg, dec_deg, 0.0, len_deg_n)
+        ra_e, dec_e = wcs.add_offset_radec(ra_deg, dec_deg, len_deg_e, 0.0)
+        x_arr, y_arr = self.radectopix_arr([ra_n, ra_e], [dec_n, dec_e])
+        return (x_arr[0], y_arr[0], x_arr[1], y_arr[1])
+
     def calc_compass(self, x, y, len_deg_e, len_deg_n):
+        ra_deg, dec_deg = self.pixtoradec(x, y)
+        return self._calc_compass(x, y, ra_deg, dec_deg,
+                                  len_deg_e, len_deg_n)
 
+    def _calc_compass(self, x, y, ra_deg, dec_deg, len_deg_e, len_deg_n):
         # Get east and north coordinates
-        xe, ye = self.add_offset_xy(x, y, len_deg_e, 0.0)
+        xn, yn, xe, ye = self._add_offsets_ne(ra_deg, dec_deg,
+                                              len_deg_e, len_deg_n)
         xe = int(round(xe))
         ye = int(round(ye))
-        xn, yn = self.add_offset_xy(x, y, 0.0, len_deg_n)
         xn = int(round(xn))
         yn = int(round(yn))
 
         return (x, y, xn, yn, xe, ye)
 
     def calc_compass_radius(self, x, y, radius_px):
-        xe, ye = self.add_offset_xy(x, y, 1.0, 0.0)
-        xn, yn = self.add_offset_xy(x, y, 0.0, 1.0)
+        ra_deg, dec_deg = self.pixtoradec(x, y)
+        xn, yn, xe, ye = self._add_offsets_ne(ra_deg, dec_deg, 1.0, 1.0)
 
         # now calculate the length in pixels of those arcs
         # (planar geometry is good enough here)
@@ -402,7 +468,8 @@ class AstroImage(BaseImage):
         len_deg_e = radius_px / px_per_deg_e
         len_deg_n = radius_px / px_per_deg_n
 
-        return self.calc_compass(x, y, len_deg_e, len_deg_n)
+        return self._calc_compass(x, y, ra_deg, dec_deg,
+                                  len_deg_e, len_deg_n)
 
     def calc_compass_center(self):
         # calculate center of data
@@ -436,6 +503,10 @@ class AstroImage(BaseImage):
                       update_minmax=True, suppress_callback=False):
         """Drops new images into the current image (if there is room),
         relocating them according the WCS between the two images.
+
+        The min/max values and other statistics are recalculated lazily,
+        and only for the regions that were modified; `update_minmax` is
+        accepted for compatibility and ignored.
         """
         # Get our own (mosaic) rotation and scale
         header = self.get_header()
@@ -476,13 +547,6 @@ class AstroImage(BaseImage):
                 #print "bg=%f inc=%f" % (bg, bg_inc)
                 data_np = data_np + bg_inc
 
-            # Determine max/min to update our values
-            if update_minmax:
-                maxval = numpy.nanmax(data_np)
-                minval = numpy.nanmin(data_np)
-                self.maxval = max(self.maxval, maxval)
-                self.minval = min(self.minval, minval)
-
             # Get rotation and scale of piece
             header = image.get_header()
             ((xrot, yrot),
@@ -631,10 +695,9 @@ class AstroImage(BaseImage):
                 self.logger.error("Error fitting tile: %s" % (str(e)))
                 raise
 
-        # TODO: recalculate min and max values
-        # Can't use usual techniques because it adds too much time to the
-        # mosacing
-        #self._set_minmax()
+            # only the statistics (min/max, histogram) of the region that
+            # changed need to be recalculated
+            self.region_modified(xlo, ylo, xhi, yhi)
 
         # Notify watchers that our data has changed
         if not suppress_callback:
@@ -13,7 +13,7 @@ import threading
 
 from ginga.misc import Bunch
 #from ginga.misc.ParamSet import Param
-from ginga.util import zscale
+from ginga.util import zscale, imstats
 
 have_scipy = True
 autocut_methods = ('minmax', 'median', 'histogram', 'stddev', 'zscale')
@@ -25,9 +25,36 @@ except ImportError:
     have_scipy = False
     autocut_methods = ('minmax', 'histogram', 'stddev', 'zscale')
 
+have_numexpr = False
+try:
+    # optional numexpr package fuses the cut level operations
+    import numexpr as ne
+    have_numexpr = True
+
+except ImportError:
+    pass
+
 # Lock to work around a non-threadsafe bug in scipy
 _lock = threading.RLock()
 
+
+def get_buffer(buf, shape, dtype):
+    """Return `buf` if it is an array of the given shape and dtype (so
+    that it can be reused as an output buffer), else a new array.
+    """
+    if (buf is None) or (buf.shape != shape) or (buf.dtype != dtype):
+        buf = numpy.empty(shape, dtype=dtype)
+    return buf
+
+
+def get_work_dtype(data):
+    """The floating point type used for calculating cut levels on
+    `data`.
+    """
+    if data.dtype.kind == 'f':
+        return data.dtype
+    return numpy.dtype(numpy.float64)
+
 class Param(Bunch.Bunch):
     pass
 
@@ -87,6 +114,48 @@ class AutoCutsBase(object):
         numpy.multiply(f, vmax, out=f)
         return f
 
+    def cut_levels_idx(self, data, loval, hival, vmin=0, vmax=255,
+                       out=None, scratch=None):
+        """Like `cut_levels`, but returns the result as an unsigned
+        integer index array (e.g. for an RGB mapper).  The calculation
+        is done in place in `scratch` (a floating point array of the
+        type returned by `get_work_dtype(data)`) and the result is
+        written to `out` (an array of dtype uint); either one is
+        allocated if not given, or not of the right shape and type.
+        Passing in the buffers from a previous call avoids any
+        allocation.  Subclasses that override `cut_levels` should
+        override this method too.
+        """
+        out = get_buffer(out, data.shape, numpy.dtype(numpy.uint))
+        scratch = get_buffer(scratch, data.shape, get_work_dtype(data))
+
+        loval, hival = float(loval), float(hival)
+        delta = hival - loval
+        if delta == 0.0:
+            # threshold
+            numpy.less_equal(data, loval, out=scratch)
+            numpy.subtract(1.0, scratch, out=scratch)
+            numpy.multiply(scratch, vmax, out=scratch)
+
+        elif have_numexpr and (delta > 0.0):
+            # NOTE: inverted cut levels (loval > hival) are left to the
+            # numpy steps below, which handle them like cut_levels
+            ne.evaluate("where(data < loval, 0.0, "
+                        "where(data > hival, 1.0, "
+                        "(data - loval) / delta)) * vmax",
+                        out=scratch, casting='unsafe')
+        else:
+            # See NOTE in cut_levels: same steps as there, but all
+            # in place
+            numpy.clip(data, loval, hival, out=scratch)
+            numpy.subtract(scratch, loval, out=scratch)
+            numpy.divide(scratch, delta, out=scratch)
+            scratch.clip(0.0, 1.0, out=scratch)
+            numpy.multiply(scratch, vmax, out=scratch)
+
+        numpy.copyto(out, scratch, casting='unsafe')
+        return out
+
     def __str__(self):
         return self.kind
 
@@ -105,6 +174,14 @@ class Clip(AutoCutsBase):
     def cut_levels(self, data, loval, hival, vmin=0.0, vmax=255.0):
         return data.clip(vmin, vmax)
 
+    def cut_levels_idx(self, data, loval, hival, vmin=0, vmax=255,
+                       out=None, scratch=None):
+        out = get_buffer(out, data.shape, numpy.dtype(numpy.uint))
+        scratch = get_buffer(scratch, data.shape, get_work_dtype(data))
+        data.clip(vmin, vmax, out=scratch)
+        numpy.copyto(out, scratch, casting='unsafe')
+        return out
+
 
 class Minmax(AutoCutsBase):
 
@@ -146,13 +223,28 @@ class Histogram(AutoCutsBase):
         
     def calc_cut_levels(self, image):
         if self.usecrop:
-            data = self.get_crop(image)
+            wd, ht = image.get_size()
+            (data, x1, y1, x2, y2) = image.cutout_radius(wd//2, ht//2,
+                                                         self.crop_radius)
         else:
-            data = image.get_data()
-        bnch = self.calc_histogram(data, pct=self.pct, numbins=self.numbins)
+            x1 = y1 = x2 = y2 = None
+        bnch = self.calc_histogram_image(image, x1, y1, x2, y2,
+                                         pct=self.pct, numbins=self.numbins)
         loval, hival = bnch.loval, bnch.hival
 
-        return loval, hival    
+        return loval, hival
+
+    def calc_histogram_image(self, image, x1=None, y1=None, x2=None, y2=None,
+                             pct=1.0, numbins=2048):
+        """Like calc_histogram(), but for the region (x1, y1)-(x2, y2)
+        (x2, y2 exclusive) of `image`, or all of it.  The histogram is
+        made from the cached statistics of the image, so repeating this
+        for the same image (and bins) is cheap.
+        """
+        self.logger.debug("Computing image histogram, pct=%.4f numbins=%d" % (
+            pct, numbins))
+        res = image.get_stats().get_histogram(numbins, x1, y1, x2, y2)
+        return self._calc_cutoffs(res.dist, res.bins, res.npix, pct)
 
     def calc_histogram(self, data, pct=1.0, numbins=2048):
 
@@ -162,32 +254,11 @@ class Histogram(AutoCutsBase):
         self.logger.debug("Median analysis array is %dx%d" % (
             width, height))
 
-        total_px = width * height
-        dsum = numpy.sum(data)
-        if numpy.isnan(dsum) or numpy.isinf(dsum):
-            # Oh crap, the array has a NaN or Inf value.
-            # We have to workaround this by making a copy of the array
-            # and substituting for the problem values, otherwise numpy's
-            # histogram() cannot handle it
-            self.logger.warn("NaN's found in data, using workaround for histogram")
-            data = data.copy()
-            # TODO: calculate a reasonable replacement value
-            data[numpy.isinf(data)] = 0.0
-            minval = numpy.nanmin(data)
-            maxval = numpy.nanmax(data)
-            substval = (minval + maxval)/2.0
-            data[numpy.isnan(data)] = substval
-            data[numpy.isinf(data)] = substval
-            ## dsum = numpy.sum(data)
-            ## if numpy.isnan(dsum) or numpy.isinf(dsum):
-            ##     print "NaNs STILL PRESENT"
-
-            dist, bins = numpy.histogram(data, bins=numbins,
-                                         density=False)
-        else:
-            dist, bins = numpy.histogram(data, bins=numbins,
-                                         density=False)
+        # NOTE: NaN and Inf values are left out of the histogram
+        res = imstats.ImageStats(data).get_histogram(numbins)
+        return self._calc_cutoffs(res.dist, res.bins, res.npix, pct)
 
+    def _calc_cutoffs(self, dist, bins, total_px, pct):
         cutoff = int((float(total_px)*(1.0-pct))/2.0)
         top = len(dist)-1
         self.logger.debug("top=%d cutoff=%d" % (top, cutoff))
@@ -10,6 +10,7 @@ import logging
 
 from ginga.misc import Bunch, Callback
 from ginga import trcalc, AutoCuts
+from ginga.util import pyramid, imstats, shapemask, regionstats
 from ginga.util.six.moves import map, zip
 
 class ImageError(Exception):
@@ -39,7 +40,16 @@ class BaseImage(Callback.Callbacks):
         # None
         self.metadata.setdefault('name', None)
 
-        self._set_minmax()
+        # min/max values are calculated when first needed
+        self._minmax = None
+        # multi-resolution pyramid, built on demand for tiled rendering
+        self._pyramid = None
+        # cached statistics of the data
+        self._stats = None
+        # masks of shapes, keyed on their geometry
+        self._mask_cache = shapemask.MaskCache(max_size=1024)
+        # statistics of regions, keyed on the geometry of their shapes
+        self._region_stats = shapemask.LRUCache(max_size=1024)
 
         self.autocuts = AutoCuts.Histogram(self.logger)
 
@@ -103,6 +113,17 @@ class BaseImage(Callback.Callbacks):
         data = self._get_data()
         return data.copy()
 
+    def get_nbytes(self):
+        """Return an estimate of the memory used by this image in bytes.
+        """
+        data = self._get_data()
+        nbytes = 0
+        if data is not None:
+            nbytes += data.nbytes
+        # assume ~80 bytes per metadata item (i.e. a FITS card)
+        nbytes += 80 * len(self.metadata)
+        return nbytes
+
     def get_data_xy(self, x, y):
         assert (x >= 0) and (y >= 0), \
             ImageError("Indexes out of range: (x=%d, y=%d)" % (
@@ -152,7 +173,12 @@ class BaseImage(Callback.Callbacks):
         if metadata:
             self.update_metadata(metadata)
 
-        self._set_minmax()
+        # NOTE: don't scan the data now--it may be memory-mapped and
+        # not need to be read in full
+        self._minmax = None
+        self._pyramid = None
+        self._stats = None
+        self._region_stats.clear()
 
         self.make_callback('modified')
 
@@ -187,31 +213,55 @@ class BaseImage(Callback.Callbacks):
     def has_valid_wcs(self):
         return hasattr(self, 'wcs') and self.wcs.has_valid_wcs()
 
+    def _get_minmax_val(self, name):
+        if (self._minmax is None) or (name not in self._minmax):
+            self._minmax = Bunch.Bunch()
+            self._set_minmax()
+        return self._minmax[name]
+
+    def _set_minmax_val(self, name, val):
+        if self._minmax is None:
+            self._minmax = Bunch.Bunch()
+        self._minmax[name] = val
+
+    minval = property(lambda self: self._get_minmax_val('minval'),
+                      lambda self, val: self._set_minmax_val('minval', val))
+    maxval = property(lambda self: self._get_minmax_val('maxval'),
+                      lambda self, val: self._set_minmax_val('maxval', val))
+    minval_noinf = property(
+        lambda self: self._get_minmax_val('minval_noinf'),
+        lambda self, val: self._set_minmax_val('minval_noinf', val))
+    maxval_noinf = property(
+        lambda self: self._get_minmax_val('maxval_noinf'),
+        lambda self, val: self._set_minmax_val('maxval_noinf', val))
+
     def _set_minmax(self):
+        stats = self.get_stats()
+        self.minval, self.maxval = stats.get_minmax()
+        self.minval_noinf, self.maxval_noinf = stats.get_minmax(noinf=True)
+
+    def get_stats(self):
+        """Return the cached statistics (min/max, NaN and finite value
+        counts, histograms) of this image's data; see
+        `ginga.util.imstats.ImageStats`.
+        """
         data = self._get_fast_data()
-        try:
-            self.maxval = numpy.nanmax(data)
-            self.minval = numpy.nanmin(data)
-        except Exception:
-            self.maxval = 0
-            self.minval = 0
-
-        # TODO: see if there is a faster way to ignore infinity
-        try:
-            if numpy.isfinite(self.maxval):
-                self.maxval_noinf = self.maxval
-            else:
-                self.maxval_noinf = numpy.nanmax(data[numpy.isfinite(data)])
-        except:
-            self.maxval_noinf = self.maxval
-
-        try:
-            if numpy.isfinite(self.minval):
-                self.minval_noinf = self.minval
-            else:
-                self.minval_noinf = numpy.nanmin(data[numpy.isfinite(data)])
-        except:
-            self.minval_noinf = self.minval
+        stats = self._stats
+        if (stats is None) or (stats.data is not data):
+            stats = imstats.ImageStats(data)
+            self._stats = stats
+        return stats
+
+    def region_modified(self, x1, y1, x2, y2):
+        """Call this after modifying the data array in place in the
+        region (x1, y1)-(x2, y2) (x2, y2 exclusive), so that only the
+        cached statistics for that region are recalculated.
+        """
+        if self._stats is not None:
+            self._stats.invalidate(x1, y1, x2, y2)
+        self._minmax = None
+        self._region_stats.clear()
+        self.reset_pyramid()
 
     def get_minmax(self, noinf=False):
         if not noinf:
@@ -288,15 +338,23 @@ class BaseImage(Callback.Callbacks):
 
         return (x0, y0, xarr, yarr)
 
+    def get_shape_rle(self, shape_obj):
+        """
+        Return a `ShapeMask` (run-length encoded mask) of the pixels
+        within the given shape.  Only the bounding box of the shape is
+        tested, and masks are cached by the geometry of the shape.
+        """
+        wd, ht = self.get_size()
+        return self._mask_cache.get_mask(shape_obj, wd, ht)
+
     def get_shape_mask(self, shape_obj):
         """
         Return full mask where True marks pixels within the given shape.
         """
         wd, ht = self.get_size()
-        yi = numpy.mgrid[:ht].reshape(-1, 1)
-        xi = numpy.mgrid[:wd].reshape(1, -1)
-        contains = shape_obj.contains_arr(xi, yi)
-        return contains
+        mask = numpy.zeros((ht, wd), dtype=bool)
+        self.get_shape_rle(shape_obj).fill(mask)
+        return mask
 
     def get_shape_view(self, shape_obj, avoid_oob=True):
         """
@@ -307,13 +365,11 @@ class BaseImage(Callback.Callbacks):
         If `avoid_oob` is True (default) then the bounding box is clipped
         to avoid coordinates outside of the actual data.
         """
-        x1, y1, x2, y2 = map(int, shape_obj.get_llur())
-
         if avoid_oob:
-            # avoid out of bounds indexes
-            wd, ht = self.get_size()
-            x1, x2 = max(0, x1), min(x2, wd-1)
-            y1, y2 = max(0, y1), min(y2, ht-1)
+            rle = self.get_shape_rle(shape_obj)
+            return (rle.get_view(), rle.to_dense())
+
+        x1, y1, x2, y2 = map(int, shape_obj.get_llur())
 
         # calculate pixel containment mask in bbox
         yi = numpy.mgrid[y1:y2+1].reshape(-1, 1)
@@ -323,6 +379,48 @@ class BaseImage(Callback.Callbacks):
         view = numpy.s_[y1:y2+1, x1:x2+1]
         return (view, contains)
 
+    def get_shape_values(self, shape_obj):
+        """
+        Return a 1D array of the values of the pixels enclosed in
+        `shape_obj` (2D for color images).  Unlike `cutout_shape`, no
+        masked array is made, so this is the cheaper way to calculate
+        statistics of a region.
+        """
+        return self.get_shape_rle(shape_obj).get_values(self._get_data())
+
+    def get_region_stats(self, shape_objs):
+        """
+        Return the statistics of the pixels enclosed in each of the
+        shapes in `shape_objs` (a list of canvas objects), as a record
+        array with one record per shape; see
+        `ginga.util.regionstats.calc_region_stats`.
+
+        The statistics of all the shapes are calculated together, and
+        are cached until the data or the geometry of the shape changes.
+        """
+        wd, ht = self.get_size()
+        keys = [shapemask.get_shape_key(obj) for obj in shape_objs]
+        res = numpy.recarray(len(keys), dtype=regionstats.stats_dtype)
+
+        todo = []
+        for i, key in enumerate(keys):
+            rec = None
+            if key is not None:
+                rec = self._region_stats.get((key, wd, ht))
+            if rec is None:
+                todo.append(i)
+            else:
+                res[i] = rec
+
+        if len(todo) > 0:
+            masks = [self.get_shape_rle(shape_objs[i]) for i in todo]
+            stats = regionstats.calc_region_stats(self._get_data(), masks)
+            for i, rec in zip(todo, stats):
+                res[i] = rec
+                if keys[i] is not None:
+                    self._region_stats.put((keys[i], wd, ht), rec.item())
+        return res
+
     def cutout_shape(self, shape_obj):
         """
         Cut out and return a portion of the data corresponding to `shape_obj`.
@@ -381,51 +479,68 @@ class BaseImage(Callback.Callbacks):
         res = Bunch.Bunch(data=newdata, scale_x=scale_x, scale_y=scale_y)
         return res
 
+    def get_pyramid(self, tile_size=512):
+        """Return the multi-resolution pyramid for this image's data,
+        creating it if necessary.  Tiles of the pyramid are only computed
+        as they are needed.
+        """
+        pyr = self._pyramid
+        if (pyr is None) or (pyr.tile_size != tile_size):
+            pyr = pyramid.ImagePyramid(self._get_data(), tile_size=tile_size)
+            self._pyramid = pyr
+        return pyr
+
+    def reset_pyramid(self):
+        """Discard any cached pyramid tiles.  Call this if the data
+        array is modified in place.
+        """
+        self._pyramid = None
+
+    def get_scaled_cutout_tiled(self, x1, y1, x2, y2, scale_x, scale_y,
+                                method='basic', tile_size=512):
+        """Like get_scaled_cutout(), but when zoomed out the cutout is
+        made from the nearest level of a tiled, multi-resolution pyramid,
+        so that the cost follows the size of the result rather than the
+        size of the image.
+        """
+        pyr = self.get_pyramid(tile_size=tile_size)
+        if pyr.choose_level(scale_x, scale_y) == 0:
+            return self.get_scaled_cutout(x1, y1, x2, y2, scale_x, scale_y,
+                                          method=method)
+
+        return pyr.get_scaled_cutout(x1, y1, x2, y2, scale_x, scale_y,
+                                     method=method)
+
     def get_pixels_on_line(self, x1, y1, x2, y2, getvalues=True):
         """Uses Bresenham's line algorithm to enumerate the pixels along
         a line.
         (see http://en.wikipedia.org/wiki/Bresenham%27s_line_algorithm)
 
         If `getvalues`==False then it will return tuples of (x, y) coordinates
-        instead of pixel values.
+        instead of pixel values.  Values outside the data are NaN.
         """
-        # NOTE: seems to be necessary or we get a non-terminating result
-        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-        
-        dx = abs(x2 - x1)
-        dy = abs(y2 - y1)
-        if x1 < x2:
-            sx = 1
-        else:
-            sx = -1
-        if y1 < y2:
-            sy = 1
-        else:
-            sy = -1
-        err = dx - dy
-
-        res = []
-        x, y = x1, y1
-        while True:
-            if getvalues:
-                try:
-                    val = self.get_data_xy(x, y)
-                except Exception:
-                    val = numpy.NaN
-                res.append(val)
-            else:
-                res.append((x, y))
-            if (x == x2) and (y == y2):
-                break
-            e2 = 2 * err
-            if e2 > -dy:
-                err = err - dy
-                x += sx
-            if e2 <  dx:
-                err = err + dx
-                y += sy
-
-        return res
+        xs, ys = trcalc.get_line_points(x1, y1, x2, y2)
+        if not getvalues:
+            return list(zip(xs.tolist(), ys.tolist()))
+        return list(self.sample_points(xs, ys))
+
+    def sample_points(self, xs, ys, method='nearest'):
+        """Return the values of the data at the data coordinates in
+        arrays `xs`, `ys`, by nearest neighbor ('nearest') or bilinear
+        ('bilinear') interpolation (see `trcalc.sample_image`).  Points
+        outside the data are NaN.  For color data, the result has an
+        extra last axis for the color planes.
+
+        For example, the values along a path are
+        sample_points(*trcalc.get_polyline_points(points)).
+        """
+        data = self._get_data()
+        if len(data.shape) > 2:
+            # sample each color plane
+            res = trcalc.sample_image(numpy.moveaxis(data, -1, 0), xs, ys,
+                                      method=method)
+            return numpy.moveaxis(res, 0, -1)
+        return trcalc.sample_image(data, xs, ys, method=method)
 
 
     def info_xy(self, data_x, data_y, settings):
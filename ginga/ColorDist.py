@@ -21,6 +21,10 @@ class ColorDistError(Exception):
 
 class ColorDistBase(object):
 
+    # True if the hash depends on the data passed to hash_array(), so
+    # that it cannot be precomputed (e.g. into a lookup table)
+    data_dependent = False
+
     def __init__(self, hashsize, colorlen=None):
         super(ColorDistBase, self).__init__()
 
@@ -268,7 +272,8 @@ class HistogramEqualizationDist(ColorDistBase):
     The histogram equalization distribution function distributes colors
     based on the frequency of each data value.
     """
-    
+    data_dependent = True
+
     def __init__(self, hashsize, colorlen=None):
         super(HistogramEqualizationDist, self).__init__(hashsize,
                                                          colorlen=colorlen)
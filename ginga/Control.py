@@ -22,7 +22,6 @@ else:
 import threading
 import logging
 import mimetypes
-from collections import deque
 import atexit, shutil
 from datetime import datetime
 
@@ -43,7 +42,7 @@ except (ImportError, Exception):
 
 # Local application imports
 from ginga import cmap, imap, AstroImage, RGBImage, ImageView
-from ginga.misc import Bunch, Datasrc, Callback, Timer, Task, Future
+from ginga.misc import Bunch, Datasrc, Callback, Timer, Task, Future, Prefetch
 from ginga.util import catalog, iohelper
 from ginga.canvas.CanvasObject import drawCatalog
 
@@ -99,8 +98,6 @@ class GingaControl(Callback.Callbacks):
         self.cur_channel = None
         self.wscount = 0
         self.statustask = None
-        self.preload_lock = threading.RLock()
-        self.preload_list = deque([], 4)
 
         # Create general preferences
         self.settings = self.prefs.createCategory('general')
@@ -114,14 +111,34 @@ class GingaControl(Callback.Callbacks):
                                   channel_follows_focus=False,
                                   share_readout=True,
                                   numImages=10,
+                                  # if > 0, bound the memory used by all
+                                  # channel caches (in MB) instead
+                                  cache_max_mb=0,
+                                  # 'lru' or 'lfu'
+                                  cache_policy='lru',
+                                  # write evicted images to disk
+                                  cache_spill=False,
+                                  cache_spill_dir=None,
                                   # Offset to add to numpy-based coords
                                   pixel_coords_offset=1.0,
                                   # inherit from primary header
-                                  inherit_primary_header=False)
+                                  inherit_primary_header=False,
+                                  # memory-map FITS data, read on demand
+                                  lazy_load=False,
+                                  # images to preload in the direction
+                                  # of travel and behind it
+                                  preload_ahead=3,
+                                  preload_behind=1,
+                                  preload_max_workers=2)
 
         # Should channel change as mouse moves between windows
         self.channel_follows_focus = self.settings['channel_follows_focus']
 
+        # background loading of the images adjacent to the current one
+        self.prefetcher = Prefetch.PrefetchScheduler(
+            self.nongui_do, self.logger,
+            max_workers=self.settings['preload_max_workers'])
+
         self.global_plugins = {}
         self.local_plugins = {}
 
@@ -139,6 +156,15 @@ class GingaControl(Callback.Callbacks):
 
         self.operations = []
 
+        # Optional memory budget shared by the data caches of all channels
+        self.cache_budget = None
+        max_mb = self.settings.get('cache_max_mb', 0)
+        if (max_mb is not None) and (max_mb > 0):
+            self.cache_budget = Datasrc.MemoryBudget(
+                int(max_mb * 1024 * 1024),
+                policy=self.settings.get('cache_policy', 'lru'),
+                logger=self.logger)
+
     def get_ServerBank(self):
         return self.imgsrv
 
@@ -328,8 +354,9 @@ class GingaControl(Callback.Callbacks):
             name = spec.setdefault('name', spec.get('klass', spec.module))
             self.local_plugins[name] = spec
 
+            # module is imported when the plugin is first started
             pfx = spec.get('pfx', pluginconfpfx)
-            self.mm.loadModule(spec.module, pfx=pfx)
+            self.mm.registerModule(spec.module, pfx=pfx)
 
             hidden = spec.get('hidden', False)
             if not hidden:
@@ -351,15 +378,21 @@ class GingaControl(Callback.Callbacks):
             name = spec.setdefault('name', spec.get('klass', spec.module))
             self.global_plugins[name] = spec
 
+            # module is imported when the plugin is loaded, unless the
+            # plugin is deferred
             pfx = spec.get('pfx', pluginconfpfx)
-            self.mm.loadModule(spec.module, pfx=pfx)
+            self.mm.registerModule(spec.module, pfx=pfx)
 
             self.gpmon.loadPlugin(name, spec)
             self.add_plugin_menu(name)
 
             start = spec.get('start', True)
             if start:
-                self.start_global_plugin(name, raise_tab=False)
+                if spec.get('defer', False):
+                    # start when its tab is first shown
+                    self.gpmon.defer_plugin(name)
+                else:
+                    self.start_global_plugin(name, raise_tab=False)
 
         except Exception as e:
             self.logger.error("Unable to load global plugin '%s': %s" % (
@@ -469,7 +502,8 @@ class GingaControl(Callback.Callbacks):
             inherit_prihdr = self.settings.get('inherit_primary_header', False)
             image = AstroImage.AstroImage(logger=self.logger,
                                           inherit_primary_header=inherit_prihdr)
-            kwdargs.update(dict(numhdu=idx))
+            kwdargs.update(dict(numhdu=idx,
+                                lazy=self.settings.get('lazy_load', False)))
 
         try:
             self.logger.info("Loading image from %s kwdargs=%s" % (
@@ -624,20 +658,17 @@ class GingaControl(Callback.Callbacks):
         return image
 
     def add_preload(self, chname, image_info):
-        bnch = Bunch.Bunch(chname=chname, info=image_info)
-        with self.preload_lock:
-            self.preload_list.append(bnch)
-        self.nongui_do(self.preload_scan)
-
-    def preload_scan(self):
-        # preload any pending files
-        # TODO: do we need any throttling of loading here?
-        with self.preload_lock:
-            while len(self.preload_list) > 0:
-                bnch = self.preload_list.pop()
-                self.nongui_do(self.preload_file, bnch.chname,
-                               bnch.info.name, bnch.info.path,
-                               image_future=bnch.info.image_future)
+        self.prefetcher.add(chname, image_info.name, self.preload_file,
+                            chname, image_info.name, image_info.path,
+                            image_info.image_future)
+
+    def get_preload_counters(self, chname):
+        """Returns a Bunch with the preload statistics of a channel:
+        `hits` and `misses` (whether images were already in memory when
+        the user navigated to them), and the numbers of preloads
+        `loaded`, `cancelled` and failed (`errors`).
+        """
+        return self.prefetcher.get_counters(chname)
 
     def preload_file(self, chname, imname, path, image_future=None):
         # sanity check to see if the file is already in memory
@@ -655,6 +686,11 @@ class GingaControl(Callback.Callbacks):
             else:
                 image = image_future.thaw()
 
+            if not self.prefetcher.is_wanted(chname, imname):
+                # user moved on while we were loading
+                self.logger.debug("preload: %s no longer wanted" % (imname))
+                return
+
             self.gui_do(self.add_image, imname, image,
                            chname=chname, silent=True)
         self.logger.debug("end preload")
@@ -1052,6 +1088,8 @@ class GingaControl(Callback.Callbacks):
 
             self.ds.remove_tab(chname)
             del self.channel[name]
+            self.prefetcher.cancel(chname)
+            channel.release_cache()
             self.prefs.remove_settings('channel_'+chname)
 
             # pick new channel
@@ -1248,8 +1286,7 @@ class Channel(Callback.Callbacks):
         # this is the viewer we are connected to
         self.fitsimage = None
         if datasrc is None:
-            num_images = self.settings.get('numImages', 1)
-            datasrc = Datasrc.Datasrc(num_images)
+            datasrc = self._make_datasrc()
         self.datasrc = datasrc
         self.cursor = -1
         self.history = []
@@ -1261,6 +1298,28 @@ class Channel(Callback.Callbacks):
         self.settings.getSetting('sort_order').add_callback(
             'set', self._sort_changed_ext_cb)
 
+    def _make_datasrc(self):
+        budget = getattr(self.fv, 'cache_budget', None)
+        if budget is None:
+            num_images = self.settings.get('numImages', 1)
+            return Datasrc.Datasrc(num_images)
+
+        # number of images is limited by the memory budget
+        spill = None
+        if self.fv.settings.get('cache_spill', False):
+            spill_dir = self.fv.settings.get('cache_spill_dir', None)
+            if spill_dir is None:
+                spill_dir = os.path.join(self.fv.tmpdir, 'spill')
+            spill = Datasrc.SpillStore(os.path.join(spill_dir, self.name),
+                                       logger=self.logger)
+        return Datasrc.Datasrc(0, budget=budget, spill=spill)
+
+    def release_cache(self):
+        """Release the data cache resources held by this channel."""
+        self.datasrc.set_budget(None)
+        if self.datasrc.spill is not None:
+            self.datasrc.spill.clear()
+
     def connect_viewer(self, viewer):
         self.viewer = viewer
 
@@ -1411,10 +1470,12 @@ class Channel(Callback.Callbacks):
         info = self.history[self.cursor]
         if self.datasrc.has_key(info.name):
             # image still in memory
+            self.fv.prefetcher.record_access(self.name, True)
             image = self.datasrc[info.name]
             self.switch_image(image)
 
         else:
+            self.fv.prefetcher.record_access(self.name, False)
             self.switch_name(info.name)
 
     def prev_image(self, loop=True):
@@ -1512,21 +1573,44 @@ class Channel(Callback.Callbacks):
                 if not preload:
                     return
 
-                # queue next and previous files for preloading
-                index = self.cursor
-                if index < len(self.history)-1:
-                    info = self.history[index+1]
-                    if info.path is not None:
-                        self.fv.add_preload(self.name, info)
-
-                if index > 0:
-                    info = self.history[index-1]
-                    if info.path is not None:
-                        self.fv.add_preload(self.name, info)
+                self._schedule_preload(image)
 
             else:
                 self.logger.debug("Apparently no need to set image.")
 
+    def _schedule_preload(self, image):
+        """Queue the images around the cursor for preloading, favoring
+        the direction the user is moving through the history.  Pending
+        preloads that are no longer wanted are cancelled.
+        """
+        prefetcher = self.fv.prefetcher
+        num_hist = len(self.history)
+        direction = prefetcher.update_position(self.name, self.cursor,
+                                               num_hist)
+        indexes = Prefetch.get_prefetch_order(
+            self.cursor, num_hist, direction=direction,
+            num_ahead=self.fv.settings.get('preload_ahead', 3),
+            num_behind=self.fv.settings.get('preload_behind', 1))
+
+        # with a memory budget, don't preload more images than will fit
+        # alongside the current one, or they will evict each other
+        budget = self.datasrc.budget
+        if (budget is not None) and budget.max_bytes:
+            nbytes = image.get_nbytes()
+            if nbytes > 0:
+                max_count = max(0, int(budget.max_bytes // nbytes) - 1)
+                indexes = indexes[:max_count]
+
+        jobs = []
+        for index in indexes:
+            info = self.history[index]
+            if (info.path is None) or self.datasrc.has_key(info.name):
+                continue
+            jobs.append((info.name, self.fv.preload_file,
+                         (self.name, info.name, info.path,
+                          info.image_future)))
+        prefetcher.schedule(self.name, jobs)
+
     def switch_name(self, imname):
 
         if self.datasrc.has_key(imname):
@@ -1535,6 +1619,15 @@ class Channel(Callback.Callbacks):
             self.switch_image(image)
             return
 
+        if self.datasrc.has_spilled(imname):
+            # Image was evicted to disk; restoring it is cheap
+            self.logger.debug("Image '%s' is no longer in memory; restoring "
+                              "from spill file" % (imname))
+            image = self.datasrc.get_spilled(imname)
+            self.add_image(image, silent=True)
+            self.switch_image(image)
+            return
+
         if not (imname in self.image_index):
             errmsg = "No image by the name '%s' found" % (imname)
             self.logger.error("Can't switch to image '%s': %s" % (
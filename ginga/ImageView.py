@@ -21,7 +21,7 @@ from ginga import RGBMap, AstroImage, AutoCuts, ColorDist
 from ginga import cmap, imap, trcalc, version
 from ginga.canvas import coordmap
 from ginga.canvas.types.layer import DrawingCanvas
-from ginga.util import io_rgb
+from ginga.util import io_rgb, profiling
 
 
 class ImageViewError(Exception):
@@ -142,6 +142,24 @@ class ImageViewBase(Callback.Callbacks):
         self.t_.getSetting('interpolation').add_callback(
             'set', self.interpolation_change_cb)
 
+        # tiled, multi-resolution rendering of large images
+        self.t_.addDefaults(tiled_rendering=False, tile_size=512)
+        for name in ('tiled_rendering', 'tile_size'):
+            self.t_.getSetting(name).add_callback('set',
+                                                  self.tiled_rendering_cb)
+
+        # per-stage timing of the rendering pipeline
+        self.profile = profiling.RenderProfile()
+        self.t_.addDefaults(profile_render=False, profile_frames=200)
+        for name in ('profile_render', 'profile_frames'):
+            self.t_.getSetting(name).add_callback('set', self.profile_cb)
+        self.profile_cb(None, None)
+
+        # interpolation for rotation ('nearest' or 'bilinear')
+        self.t_.addDefaults(rot_interpolation='nearest')
+        self.t_.getSetting('rot_interpolation').add_callback(
+            'set', self.rot_interpolation_cb)
+
         # max/min scaling
         self.t_.addDefaults(scale_max=10000.0, scale_min=0.00001)
 
@@ -243,6 +261,9 @@ class ImageViewBase(Callback.Callbacks):
         self._rgbarr = None
         self._rgbarr2 = None
         self._rgbobj = None
+        # coordinate map for rotating the RGB image, reused as long as
+        # the size of the image and the angle don't change
+        self._rotmap = None
 
         # optimization of redrawing
         self.defer_redraw = self.t_.get('defer_redraw', True)
@@ -980,10 +1001,17 @@ class ImageViewBase(Callback.Callbacks):
         """
         try:
             time_start = time.time()
+            t0 = self.profile.start_frame(whence)
             self.redraw_data(whence=whence)
 
             # finally update the window drawable from the offscreen surface
+            t1 = self.profile.start()
             self.update_image()
+            if t1 is not None:
+                rgbobj = self._rgbobj
+                nbytes = 0 if rgbobj is None else rgbobj.rgbarr.nbytes
+                self.profile.stop('blit', t1, nbytes)
+            self.profile.end_frame(t0)
             time_done = time.time()
             time_delta = time_start - self.time_last_redraw
             time_elapsed = time_done - time_start
@@ -1123,9 +1151,11 @@ class ImageViewBase(Callback.Callbacks):
 
         if (whence <= 0.0) or (self._rgbarr is None):
             # calculate dimensions of window RGB backing image
+            t1 = self.profile.start()
             wd, ht = self._calc_bg_dimensions(self._scale_x, self._scale_y,
                                               self._pan_x, self._pan_y,
                                               win_wd, win_ht)
+            self.profile.stop('bg_dims', t1)
 
             # create backing image
             depth = len(order)
@@ -1142,17 +1172,21 @@ class ImageViewBase(Callback.Callbacks):
 
             # Apply any viewing transformations or rotations
             # if not applied earlier
+            t1 = self.profile.start()
             rotimg = self.apply_transforms(rotimg,
                                            self.t_['rot_deg'])
             rotimg = numpy.ascontiguousarray(rotimg)
+            self.profile.stop('transforms', t1, rotimg.nbytes)
 
             self._rgbobj = RGBMap.RGBPlanes(rotimg, order)
 
             # convert to output ICC profile, if one is specified
             output_profile = self.t_.get('icc_output_profile', None)
             if not (output_profile is None):
+                t1 = self.profile.start()
                 self.convert_via_profile(self._rgbobj, 'working',
                                          output_profile)
+                self.profile.stop('icc', t1, rotimg.nbytes)
 
         time_end = time.time()
         self.logger.debug("times: total=%.4f" % (
@@ -1272,9 +1306,11 @@ class ImageViewBase(Callback.Callbacks):
 
         # Rotate the image as necessary
         if rot_deg != 0:
-            # TODO: this is the slowest part of the rendering
-            # need to find a way to speed it up!
-            data = trcalc.rotate_clip(data, -rot_deg, out=data)
+            if trcalc.have_opencv:
+                data = trcalc.rotate_clip(data, -rot_deg, out=data)
+            else:
+                data = trcalc.remap(data, self._get_rotation_map(ht, wd,
+                                                                 -rot_deg))
 
         split2_time = time.time()
 
@@ -1934,6 +1970,66 @@ class ImageViewBase(Callback.Callbacks):
         canvas_img.reset_optimize()
         self.redraw(whence=0)
 
+    def enable_profiling(self, tf):
+        """Turn per-stage timing of the rendering pipeline on or off.
+
+        The timings of recent frames are kept in the ``profile``
+        attribute of the viewer (a `~ginga.util.profiling.RenderProfile`);
+        register a ``'frame'`` callback on it to be notified of each
+        frame, or call its ``get_stats()`` method for percentiles.
+
+        Parameters
+        ----------
+        tf : bool
+            Enable or disable profiling.
+
+        """
+        self.t_.set(profile_render=tf)
+
+    def profile_cb(self, setting, value):
+        """Handle callback related to changes in render profiling."""
+        self.profile.set_num_frames(self.t_.get('profile_frames', 200))
+        self.profile.enable(self.t_.get('profile_render', False))
+
+    def _get_rotation_map(self, ht, wd, theta_deg):
+        # the map only depends on the size of the (flipped/swapped) RGB
+        # image, the angle and the interpolation, so redraws that only
+        # change colors or overlays can reuse it
+        method = self.t_.get('rot_interpolation', 'nearest')
+        rmap = self._rotmap
+        if ((rmap is None) or
+            (rmap.key != (ht, wd, theta_deg, wd // 2, ht // 2, method))):
+            rmap = trcalc.calc_rotation_map(ht, wd, theta_deg,
+                                            interpolation=method)
+            self._rotmap = rmap
+        return rmap
+
+    def rot_interpolation_cb(self, setting, value):
+        """Handle callback related to changes in rotation interpolation."""
+        self._rotmap = None
+        self.redraw(whence=2.5)
+
+    def enable_tiled_rendering(self, tf):
+        """Turn tiled, multi-resolution rendering on or off.
+
+        When enabled, zoomed-out views are rendered from a lazily built
+        pyramid of downsampled tiles of the image, so the rendering cost
+        follows the window size rather than the image size.
+
+        Parameters
+        ----------
+        tf : bool
+            Enable or disable tiled rendering.
+
+        """
+        self.t_.set(tiled_rendering=tf)
+
+    def tiled_rendering_cb(self, setting, value):
+        """Handle callback related to changes in tiled rendering."""
+        canvas_img = self.get_canvas_image()
+        canvas_img.reset_optimize()
+        self.redraw(whence=0)
+
     def set_name(self, name):
         """Set viewer name."""
         self.name = name
@@ -10,8 +10,12 @@
 import math
 import numpy
 
-from ginga.misc import Callback
-from ginga import ColorDist
+from ginga.misc import Callback, Bunch
+from ginga import ColorDist, trcalc
+
+have_futures = trcalc.have_futures
+if have_futures:
+    import multiprocessing
 
 
 class RGBMapError(Exception):
@@ -85,6 +89,15 @@ class RGBMapper(Callback.Callbacks):
         self.carr = None
         self.sarr = None
         self.scale_pct = 1.0
+        # combined lookup table: hash index -> output pixel
+        self._lut = None
+
+        # For parallel color mapping (see get_rgbarray)
+        self.num_threads = 1
+        if have_futures:
+            self.num_threads = min(4, multiprocessing.cpu_count())
+        # number of pixels below which we don't bother with threads
+        self.min_pixels_per_thread = 256 * 1024
 
         # For scaling algorithms
         hashsize = 65536
@@ -254,6 +267,65 @@ class RGBMapper(Callback.Callbacks):
             out[..., gi] = self.arr[1][idx[..., gj]]
             out[..., bi] = self.arr[2][idx[..., bj]]
 
+    def set_num_threads(self, num_threads):
+        """Set the maximum number of threads used to color map an array.
+        """
+        if not have_futures:
+            num_threads = 1
+        self.num_threads = max(1, num_threads)
+
+    def get_lut(self, order):
+        """Returns a combined lookup table that maps an index in the
+        range of the hash size directly to an output pixel in `order`
+        (i.e. the hash, shift and color maps are all applied).  The table
+        is cached until one of those maps changes.  It cannot be used with
+        a color distribution whose hash depends on the data (histeq).
+        """
+        hash_arr = self.dist.hash
+        lut = self._lut
+        if ((lut is None) or (lut.hash is not hash_arr) or
+            (lut.sarr is not self.sarr) or (lut.arr is not self.arr) or
+            (lut.order != order)):
+            idx = hash_arr.clip(0, 255)
+            idx = self.sarr[idx].clip(0, 255)
+
+            table = numpy.empty((len(idx), len(order)), dtype=numpy.uint8)
+            for i, ch in enumerate(order):
+                if ch == 'A':
+                    table[:, i] = 255
+                else:
+                    table[:, i] = self.arr['RGB'.index(ch)][idx]
+
+            lut = Bunch.Bunch(hash=hash_arr, sarr=self.sarr, arr=self.arr,
+                              order=order, table=table)
+            self._lut = lut
+        return lut.table
+
+    def _map_band(self, table, idx, out, y1, y2):
+        # NOTE: take() with mode='clip' clamps the indexes to the table
+        # size and writes straight into the output rows
+        numpy.take(table, idx[y1:y2], axis=0, out=out[y1:y2], mode='clip')
+
+    def _get_rgbarray_lut(self, idx, out, order):
+        table = self.get_lut(order)
+
+        ht = idx.shape[0]
+        num_threads = min(self.num_threads,
+                          idx.size // self.min_pixels_per_thread)
+        if num_threads <= 1:
+            self._map_band(table, idx, out, 0, ht)
+            return
+
+        # split into bands of rows and map them in parallel
+        # (numpy releases the GIL for take())
+        pool = trcalc.get_thread_pool()
+        step = -(-ht // num_threads)
+        futures = [pool.submit(self._map_band, table, idx, out,
+                               y1, min(y1 + step, ht))
+                   for y1 in range(0, ht, step)]
+        for future in futures:
+            future.result()
+
     def get_rgbarray(self, idx, out=None, order='RGB', image_order='RGB'):
         # prepare output array
         shape = idx.shape
@@ -269,6 +341,12 @@ class RGBMapper(Callback.Callbacks):
 
         res = RGBPlanes(out, order)
 
+        if ((len(shape) == 2) and (idx.dtype.kind in 'iu') and
+            not self.dist.data_dependent):
+            # fast path: a single lookup, alpha included
+            self._get_rgbarray_lut(idx, out, res.get_order())
+            return res
+
         # set alpha channel
         if res.hasAlpha:
             aa = res.get_slice('A')
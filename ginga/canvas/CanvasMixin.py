@@ -7,7 +7,11 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import numpy
+
 from ginga.canvas.CompoundMixin import CompoundMixin
+from ginga.canvas.coordmap import DataMapper
+from ginga.canvas.gridindex import GridIndex
 from ginga.util.six.moves import map, filter
 
 class CanvasError(Exception):
@@ -17,14 +21,37 @@ class CanvasMixin(object):
     """A CanvasMixin is combined with the CompoundMixin to make a
     tag-addressible canvas-like interface.  This mixin should precede the
     CompoundMixin in the inheritance (and so, method resolution) order.
+
+    Once a canvas holds `spatial_index_min` objects, their bounding boxes
+    are kept in a spatial index (see `ginga.canvas.gridindex`), which is
+    used to draw only the objects in view and to find the objects at a
+    point without testing all of them.
     """
 
+    # number of objects at which a canvas starts using a spatial index
+    spatial_index_min = 200
+    # size of the index cells, in data pixels
+    spatial_index_cell = 64
+    # margin around the view, in canvas pixels, for objects (e.g. text
+    # or caps) drawn outside of their bounding boxes
+    cull_margin = 50
+    # minimum margin around a point for selecting objects, in canvas pixels
+    select_margin = 10
+
     def __init__(self):
         assert isinstance(self, CompoundMixin), "Missing CompoundMixin class"
         # holds the list of tags
         self.tags = {}
         self.count = 0
 
+        # spatial index, built when there are enough objects
+        self._spindex = None
+        self._sp_objects = None
+        self._sp_synced = False
+        self._sp_dirty = set()
+        self._sp_order = {}
+        self._sp_cap_radius = 0
+
         for name in ('modified', ):
             self.enable_callback(name)
 
@@ -107,6 +134,139 @@ class CanvasMixin(object):
     def get_objects_by_tag_pfx(self, tagpfx):
         return list(map(lambda k: self.tags[k], self.getTagsByTagpfx(tagpfx)))
 
+    def geometry_changed(self):
+        # objects were added, deleted or reordered
+        self._sp_synced = False
+        # a canvas that is not a canvas object (e.g. a viewer) has no
+        # geometry_changed() of its own
+        fn = getattr(super(CanvasMixin, self), 'geometry_changed', None)
+        if fn is not None:
+            fn()
+
+    def _get_index_bbox(self, obj):
+        """Returns the bounding box of `obj` in data coordinates, or None
+        if the object cannot be indexed by position.
+        """
+        if (obj.coord != 'data' or getattr(obj, 'ref_obj', None) is not None
+                or isinstance(obj, CanvasMixin)
+                or type(obj.crdmap) not in (DataMapper, type(None))):
+            return None
+        try:
+            bbox = tuple(map(float, obj.get_llur()))
+        except Exception:
+            return None
+        if not numpy.all(numpy.isfinite(bbox)):
+            return None
+        return bbox
+
+    def _sp_watch(self, obj, top_obj, add):
+        # watch (or stop watching) changes to the geometry of `obj` and
+        # any objects it is composed of
+        if hasattr(obj, 'add_geometry_watcher'):
+            if add:
+                obj.add_geometry_watcher(
+                    id(self), lambda o: self._sp_dirty.add(top_obj))
+            else:
+                obj.remove_geometry_watcher(id(self))
+        if obj.is_compound() and not isinstance(obj, CanvasMixin):
+            for child in obj.objects:
+                self._sp_watch(child, top_obj, add)
+
+    def _sp_insert(self, obj):
+        self._spindex.insert(obj, self._get_index_bbox(obj))
+        self._sp_cap_radius = max(self._sp_cap_radius,
+                                  getattr(obj, 'cap_radius', 0))
+        self._sp_watch(obj, obj, True)
+
+    def _sp_remove(self, obj):
+        self._spindex.remove(obj)
+        self._sp_watch(obj, obj, False)
+
+    def _sp_drop_index(self):
+        for obj in list(self._spindex):
+            self._sp_watch(obj, obj, False)
+        self._spindex = None
+        self._sp_objects = None
+        self._sp_dirty = set()
+
+    def _update_index(self):
+        """Brings the spatial index up to date with the objects and their
+        geometry.  Returns False if the canvas does not use an index.
+        """
+        objects = self.objects
+        if len(objects) < self.spatial_index_min:
+            if self._spindex is not None:
+                self._sp_drop_index()
+            return False
+
+        if self._spindex is None:
+            self._spindex = GridIndex(cell_size=self.spatial_index_cell)
+            self._sp_synced = False
+
+        if (not self._sp_synced or self._sp_objects is not objects or
+                len(self._spindex) != len(objects)):
+            # objects were added, deleted or reordered
+            cur = set(objects)
+            for obj in list(self._spindex):
+                if obj not in cur:
+                    self._sp_remove(obj)
+            for obj in objects:
+                if obj not in self._spindex:
+                    self._sp_insert(obj)
+            self._sp_order = dict(zip(objects, range(len(objects))))
+            self._sp_objects = objects
+            self._sp_synced = True
+
+        if len(self._sp_dirty) > 0:
+            dirty, self._sp_dirty = self._sp_dirty, set()
+            for obj in dirty:
+                if obj in self._spindex:
+                    self._sp_remove(obj)
+                    self._sp_insert(obj)
+        return True
+
+    def get_objects_in_rect(self, x1, y1, x2, y2):
+        """Returns the objects whose bounding boxes (in data coordinates)
+        may overlap the rectangle (x1, y1)-(x2, y2), in drawing order.
+        Objects without a bounding box in data coordinates are always
+        included.
+        """
+        if not self._update_index():
+            return self.objects
+        res = list(self._spindex.query(x1, y1, x2, y2))
+        res.sort(key=self._sp_order.__getitem__)
+        return res
+
+    def _get_objects_at(self, viewer, x, y):
+        if len(self.objects) < self.spatial_index_min:
+            return self.objects
+        # objects test containment within a few data pixels of their
+        # outlines, and selection within their cap radius in canvas pixels
+        margin = 2.0
+        if viewer is not None:
+            scale = min(viewer.get_scale_xy())
+            if scale > 0:
+                margin = max(margin,
+                             max(self.select_margin,
+                                 self._sp_cap_radius) / float(scale))
+        return self.get_objects_in_rect(x - margin, y - margin,
+                                        x + margin, y + margin)
+
+    def _get_objects_in_view(self, viewer):
+        if len(self.objects) < self.spatial_index_min:
+            return self.objects
+        try:
+            points = viewer.get_pan_rect()
+            scale = min(viewer.get_scale_xy())
+        except Exception:
+            # viewer has no image or window yet
+            return self.objects
+        xs = [pt[0] for pt in points]
+        ys = [pt[1] for pt in points]
+        margin = self.cull_margin / float(scale) if scale > 0 else 0.0
+        return self.get_objects_in_rect(min(xs) - margin, min(ys) - margin,
+                                        max(xs) + margin, max(ys) + margin)
+
     def delete_all_objects(self, redraw=True):
         self.tags = {}
         CompoundMixin.delete_all_objects(self)
@@ -115,7 +275,7 @@ class CanvasMixin(object):
             self.update_canvas(whence=3)
 
     def delete_objects(self, objects, redraw=True):
-        for tag, obj in self.tags.items():
+        for tag, obj in list(self.tags.items()):
             if obj in objects:
                 self.delete_object_by_tag(tag, redraw=False)
 
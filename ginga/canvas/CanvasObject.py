@@ -28,6 +28,14 @@ class CanvasObjectBase(Callback.Callbacks):
     This class defines common methods used by all such objects.
     """
 
+    # attributes that determine where an object is drawn; setting one
+    # of these calls geometry_changed()
+    geometry_attrs = frozenset(['x', 'y', 'x1', 'y1', 'x2', 'y2', 'radius',
+                                'xradius', 'yradius', 'width', 'height',
+                                'points', 'rot_deg', 'objects', 'coord',
+                                'crdmap', 'ref_obj', 'image',
+                                'scale_x', 'scale_y'])
+
     def __init__(self, **kwdargs):
         if not hasattr(self, 'cb'):
             Callback.Callbacks.__init__(self)
@@ -57,6 +65,32 @@ class CanvasObjectBase(Callback.Callbacks):
             else:
                 self.crdmap = viewer.get_coordmap(self.coord)
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.geometry_attrs:
+            self.geometry_changed()
+
+    def geometry_changed(self):
+        """This method is called when the position or extent of the object
+        changes.  It notifies the watchers (the canvases that index this
+        object spatially) added with add_geometry_watcher().
+        """
+        watchers = self.__dict__.get('_geometry_watchers', None)
+        if watchers:
+            for cb_fn in list(watchers.values()):
+                cb_fn(self)
+
+    def add_geometry_watcher(self, key, cb_fn):
+        watchers = self.__dict__.get('_geometry_watchers', None)
+        if watchers is None:
+            watchers = self.__dict__['_geometry_watchers'] = {}
+        watchers[key] = cb_fn
+
+    def remove_geometry_watcher(self, key):
+        watchers = self.__dict__.get('_geometry_watchers', None)
+        if watchers is not None:
+            watchers.pop(key, None)
+
     def sync_state(self):
         """This method called when changes are made to the parameters.
         subclasses should override if they need any special state handling.
@@ -220,6 +254,7 @@ class CanvasObjectBase(Callback.Callbacks):
         elif hasattr(self, 'points'):
             for i in range(len(self.points)):
                 self.points[i] = self.crdmap.offset_pt(self.points[i], xoff, yoff)
+            self.geometry_changed()
 
     def move_to(self, xdst, ydst):
         x, y = self.get_reference_pt()
@@ -238,6 +273,7 @@ class CanvasObjectBase(Callback.Callbacks):
     def set_point_by_index(self, i, pt):
         if hasattr(self, 'points'):
             self.points[i] = pt
+            self.geometry_changed()
         elif i == 0:
             if hasattr(self, 'x'):
                 self.x, self.y = pt
@@ -438,8 +474,19 @@ class CanvasObjectBase(Callback.Callbacks):
                                 points))
         else:
             rpoints = points
-        cpoints = tuple(map(lambda p: self.canvascoords(viewer, p[0], p[1]),
-                            rpoints))
+        if len(rpoints) == 0:
+            return ()
+
+        crdmap = self.crdmap
+        if crdmap is None:
+            crdmap = viewer.get_coordmap('data')
+
+        # convert all of the points to data coordinates at once
+        # (e.g. a single WCS call for objects in WCS coordinates)
+        arr = numpy.asarray(rpoints, dtype=float)
+        data_x, data_y = crdmap.to_data_arr(arr[:, 0], arr[:, 1])
+        cpoints = tuple(map(lambda x, y: viewer.get_canvas_xy(x, y),
+                            data_x, data_y))
         return cpoints
 
     def get_bbox(self):
@@ -41,8 +41,8 @@ class CompoundMixin(object):
         points = numpy.array(list(map(lambda obj: obj.get_llur(),
                                       self.objects)))
         t_ = points.T
-        x1, y1 = min(t_[0].min(), t_[0].min()), min(t_[1].min(), t_[3].min())
-        x2, y2 = max(t_[0].max(), t_[0].max()), min(t_[1].max(), t_[3].max())
+        x1, y1 = min(t_[0].min(), t_[2].min()), min(t_[1].min(), t_[3].min())
+        x2, y2 = max(t_[0].max(), t_[2].max()), max(t_[1].max(), t_[3].max())
         return (x1, y1, x2, y2)
 
     def get_edit_points(self):
@@ -55,29 +55,34 @@ class CompoundMixin(object):
                           self.objects))
 
     def contains(self, x, y):
-        for obj in self.objects:
+        for obj in self._get_objects_at(None, x, y):
             if obj.contains(x, y):
                 return True
         return False
 
     def get_items_at(self, x, y):
         res = []
-        for obj in self.objects:
+        for obj in self._get_objects_at(None, x, y):
             if obj.contains(x, y):
                 #res.insert(0, obj)
                 res.append(obj)
         return res
 
     def select_contains(self, viewer, x, y):
-        for obj in self.objects:
+        for obj in self._get_objects_at(viewer, x, y):
             if obj.select_contains(viewer, x, y):
                 return True
         return False
 
     def select_items_at(self, viewer, x, y, test=None):
+        """Returns the objects that can be selected at (x, y).  If `test`
+        is given, it is called as test(obj, x, y, is_inside) to decide
+        whether each object is selected.  Note that canvases with a
+        spatial index only test the objects near (x, y).
+        """
         res = []
         try:
-            for obj in self.objects:
+            for obj in self._get_objects_at(viewer, x, y):
                 if obj.is_compound() and not obj.opaque:
                     # compound object, list up compatible members
                     res.extend(obj.select_items_at(viewer, x, y, test=test))
@@ -134,9 +139,21 @@ class CompoundMixin(object):
             obj.use_coordmap(mapobj)
 
     def draw(self, viewer):
-        for obj in self.objects:
+        for obj in self._get_objects_in_view(viewer):
             obj.draw(viewer)
 
+    def _get_objects_at(self, viewer, x, y):
+        """Returns the objects that may be at (x, y), in drawing order.
+        Subclasses that index their objects spatially override this.
+        """
+        return self.objects
+
+    def _get_objects_in_view(self, viewer):
+        """Returns the objects that may be visible in `viewer`, in
+        drawing order.
+        """
+        return self.objects
+
     def get_objects(self):
         return self.objects
 
@@ -145,6 +162,7 @@ class CompoundMixin(object):
 
     def delete_object(self, obj):
         self.objects.remove(obj)
+        self.geometry_changed()
 
     def delete_objects(self, objects):
         for obj in objects:
@@ -181,6 +199,7 @@ class CompoundMixin(object):
         else:
             index = self.objects.index(belowThis)
             self.objects.insert(index, obj)
+        self.geometry_changed()
 
     def raise_object(self, obj, aboveThis=None):
         if aboveThis is None:
@@ -193,6 +212,7 @@ class CompoundMixin(object):
             self.objects.remove(obj)
             index = self.objects.index(aboveThis)
             self.objects.insert(index+1, obj)
+        self.geometry_changed()
 
     def lower_object(self, obj, belowThis=None):
         if belowThis is None:
@@ -205,6 +225,7 @@ class CompoundMixin(object):
             self.objects.remove(obj)
             index = self.objects.index(belowThis)
             self.objects.insert(index, obj)
+        self.geometry_changed()
 
     def rotate(self, theta, xoff=0, yoff=0):
         for obj in self.objects:
@@ -241,6 +262,7 @@ class CompoundMixin(object):
         for obj in self.objects:
             if obj.is_compound():
                 obj.reorder_layers()
+        self.geometry_changed()
 
     def get_points(self):
         res = []
@@ -7,6 +7,8 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import numpy
+
 from ginga import trcalc
 from ginga.util import wcs
 from ginga.util.six.moves import map
@@ -25,6 +27,10 @@ class CanvasMapper(object):
     def to_data(self, canvas_x, canvas_y):
         return self.viewer.get_data_xy(canvas_x, canvas_y)
 
+    def to_data_arr(self, canvas_x, canvas_y):
+        return self.viewer.get_data_xy(numpy.asarray(canvas_x, dtype=float),
+                                       numpy.asarray(canvas_y, dtype=float))
+
     def offset_pt(self, pt, xoff, yoff):
         x, y = pt
         return x + xoff, y + yoff
@@ -47,9 +53,17 @@ class DataMapper(object):
     def to_data(self, data_x, data_y):
         return data_x, data_y
 
+    def to_data_arr(self, data_x, data_y):
+        return (numpy.asarray(data_x, dtype=float),
+                numpy.asarray(data_y, dtype=float))
+
     def data_to(self, data_x, data_y):
         return data_x, data_y
 
+    def data_to_arr(self, data_x, data_y):
+        return (numpy.asarray(data_x, dtype=float),
+                numpy.asarray(data_y, dtype=float))
+
     def offset_pt(self, pt, xoff, yoff):
         x, y = pt
         return x + xoff, y + yoff
@@ -84,6 +98,10 @@ class OffsetMapper(object):
         data_x, data_y = self.refobj.crdmap.to_data(ref_x, ref_y)
         return data_x + delta_x, data_y + delta_y
 
+    def to_data_arr(self, delta_x, delta_y):
+        return self.to_data(numpy.asarray(delta_x, dtype=float),
+                            numpy.asarray(delta_y, dtype=float))
+
     ## def data_to(self, data_x, data_y):
     ##     ref_x, ref_y = self.refobj.get_reference_pt()
     ##     return data_x - ref_data_x, data_y - ref_data_y
@@ -116,6 +134,15 @@ class WCSMapper(DataMapper):
         lon, lat = image.pixtoradec(data_x, data_y)
         return lon, lat
 
+    def to_data_arr(self, lon, lat):
+        # one call into the WCS for all of the points
+        image = self.viewer.get_image()
+        return image.radectopix_arr(lon, lat)
+
+    def data_to_arr(self, data_x, data_y):
+        image = self.viewer.get_image()
+        return image.pixtoradec_arr(data_x, data_y)
+
     def offset_pt(self, pt, xoff, yoff):
         x, y = pt
         return wcs.add_offset_radec(x, y, xoff, yoff)
@@ -0,0 +1,120 @@
+#
+# gridindex.py -- spatial index of canvas objects
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+A spatial index of the bounding boxes of canvas objects, used by
+canvases with many objects to find the objects that are visible (for
+drawing) or near a point (for hit testing) without looking at all of
+them.
+
+The index is a uniform grid of square cells (in data coordinates), each
+holding the set of objects whose bounding box overlaps it.  Objects
+without a bounding box in data coordinates (e.g. text, or objects
+placed in window coordinates) and very large objects are kept in a
+separate set that every query returns.
+"""
+import math
+
+
+class GridIndex(object):
+    """An index of objects by bounding box, on a grid of cells of
+    `cell_size` data units.  Objects covering more than `max_cells`
+    cells are not entered in the cells, but tested on every query.
+    """
+
+    def __init__(self, cell_size=64.0, max_cells=256):
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+
+        # (i, j) -> set of objects
+        self._cells = {}
+        # object -> (bbox, list of cells)
+        self._entries = {}
+        # objects tested on every query
+        self._unbinned = set()
+
+    def _get_cell_range(self, x1, y1, x2, y2):
+        cs = self.cell_size
+        return (int(math.floor(x1 / cs)), int(math.floor(y1 / cs)),
+                int(math.floor(x2 / cs)), int(math.floor(y2 / cs)))
+
+    def insert(self, obj, bbox):
+        """Enter (or update) `obj` with bounding box `bbox` (x1, y1, x2,
+        y2), or None if it should be returned by every query.
+        """
+        self.remove(obj)
+        cells = []
+        if bbox is None:
+            self._unbinned.add(obj)
+        else:
+            i1, j1, i2, j2 = self._get_cell_range(*bbox)
+            if (i2 - i1 + 1) * (j2 - j1 + 1) > self.max_cells:
+                self._unbinned.add(obj)
+            else:
+                for j in range(j1, j2 + 1):
+                    for i in range(i1, i2 + 1):
+                        cell = (i, j)
+                        cells.append(cell)
+                        objs = self._cells.get(cell, None)
+                        if objs is None:
+                            objs = self._cells[cell] = set()
+                        objs.add(obj)
+        self._entries[obj] = (bbox, cells)
+
+    def remove(self, obj):
+        """Remove `obj` from the index, if it is there."""
+        entry = self._entries.pop(obj, None)
+        if entry is None:
+            return
+        self._unbinned.discard(obj)
+        for cell in entry[1]:
+            objs = self._cells[cell]
+            objs.discard(obj)
+            if len(objs) == 0:
+                del self._cells[cell]
+
+    def get_bbox(self, obj):
+        return self._entries[obj][0]
+
+    def query(self, x1, y1, x2, y2):
+        """Returns the set of objects whose bounding boxes overlap the
+        rectangle (x1, y1)-(x2, y2), and those without a bounding box.
+        """
+        i1, j1, i2, j2 = self._get_cell_range(x1, y1, x2, y2)
+        if (i2 - i1 + 1) * (j2 - j1 + 1) > len(self._cells):
+            # more cells in the rectangle than in the index
+            candidates = self._entries.keys()
+        else:
+            candidates = set(self._unbinned)
+            for j in range(j1, j2 + 1):
+                for i in range(i1, i2 + 1):
+                    objs = self._cells.get((i, j), None)
+                    if objs is not None:
+                        candidates.update(objs)
+
+        res = set()
+        for obj in candidates:
+            bbox = self._entries[obj][0]
+            if (bbox is None) or ((bbox[0] <= x2) and (bbox[2] >= x1) and
+                                  (bbox[1] <= y2) and (bbox[3] >= y1)):
+                res.add(obj)
+        return res
+
+    def clear(self):
+        self._cells = {}
+        self._entries = {}
+        self._unbinned = set()
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __contains__(self, obj):
+        return obj in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+#END
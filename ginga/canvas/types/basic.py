@@ -11,7 +11,6 @@ import math
 import warnings
 import numpy
 # for BezierCurve
-from collections import OrderedDict
 
 from ginga.canvas.CanvasObject import (CanvasObjectBase, _bool, _color,
                                        register_canvas_types,
@@ -168,7 +167,7 @@ class PolygonMixin(object):
             ya = ya.reshape(-1, 1)
             promoted = True
 
-        result = numpy.empty((ya.size, xa.size), dtype=numpy.bool)
+        result = numpy.empty((ya.size, xa.size), dtype=bool)
         result.fill(False)
 
         xj, yj = self.crdmap.to_data(*self.points[-1])
@@ -183,7 +182,7 @@ class PolygonMixin(object):
             # Till then we use the warnings module to suppress the warning.
             with warnings.catch_warnings():
                 warnings.simplefilter('ignore', RuntimeWarning)
-                cross = ((xi + (ya - yi).astype(numpy.float) /
+                cross = ((xi + (ya - yi).astype(float) /
                           (yj - yi) * (xj - xi)) < xa)
 
             result[tf == True] ^= cross[tf == True]
@@ -191,7 +190,7 @@ class PolygonMixin(object):
 
         if promoted:
             # de-promote result
-            result = result[numpy.eye(len(y_arr), len(x_arr), dtype=numpy.bool)]
+            result = result[numpy.eye(len(y_arr), len(x_arr), dtype=bool)]
             
         return result
 
@@ -539,37 +538,12 @@ class BezierCurve(Path):
         PolygonMixin.__init__(self)
 
     def calc_bezier_curve_range(self, steps, points):
-        """Hacky method to get an ordered set of points that are on the
-        Bezier curve.  This is used by some backends (which don't support
-        drawing cubic Bezier curves) to render the curve using paths.
+        """Get an ordered set of points that are on the Bezier curve.
+        This is used by some backends (which don't support drawing cubic
+        Bezier curves) to render the curve using paths.
         """
-        n = len(points) - 1
-        fact_n = math.factorial(n)
-
-        # press OrderedDict into use as an OrderedSet of points
-        d = OrderedDict()
-
-        m = float(steps - 1)
-
-        # TODO: optomize this code as much as possible
-        for i in range(steps):
-            #t = i / float(steps - 1)
-            t = i / m
-
-            # optomize a call to calculate the bezier point
-            #x, y = bezier(t, points)
-            x = y = 0
-            for j, pos in enumerate(points):
-                #bern = bernstein(t, j, n)
-                bin = fact_n / float(math.factorial(j) * math.factorial(n - j))
-                bern = bin * (t ** j) * ((1 - t) ** (n - j))
-                x += pos[0] * bern
-                y += pos[1] * bern
-
-            # convert to integer data coordinates and remove duplicates
-            d[int(round(x)), int(round(y))] = None
-
-        return list(d.keys())
+        xs, ys = trcalc.get_bezier_points(points, steps)
+        return list(zip(xs.tolist(), ys.tolist()))
 
     def get_points_on_curve(self, image):
         points = list(map(lambda pt: self.crdmap.to_data(pt[0], pt[1]),
@@ -586,15 +560,15 @@ class BezierCurve(Path):
 
     # TODO: this probably belongs somewhere else
     def get_pixels_on_curve(self, image, getvalues=True):
-        data = image.get_data()
-        wd, ht = image.get_size()
+        points = numpy.array(self.get_points_on_curve(image)).reshape(-1, 2)
         if getvalues:
-            res = [ data[y, x] if 0 <= x < wd and 0 <= y < ht else numpy.NaN
-                    for x, y in self.get_points_on_curve(image) ]
-        else:
-            res = [ [x, y] if 0 <= x < wd and 0 <= y < ht else numpy.NaN
-                    for x, y in self.get_points_on_curve(image) ]
-        return res
+            return list(image.sample_points(points[:, 0], points[:, 1]))
+
+        wd, ht = image.get_size()
+        inside = ((0 <= points[:, 0]) & (points[:, 0] < wd) &
+                  (0 <= points[:, 1]) & (points[:, 1] < ht))
+        return [ [x, y] if ok else numpy.nan
+                 for (x, y), ok in zip(points.tolist(), inside) ]
 
     def draw(self, viewer):
         cpoints = self.get_cpoints(viewer, points=self.points)
@@ -950,8 +924,8 @@ class Ellipse(OnePointTwoRadiusMixin, CanvasObjectBase):
 
     def contains_arr(self, x_arr, y_arr):
         # coerce args to floats
-        x_arr = x_arr.astype(numpy.float)
-        y_arr = y_arr.astype(numpy.float)
+        x_arr = x_arr.astype(float)
+        y_arr = y_arr.astype(float)
 
         # rotate point back to cartesian alignment for test
         xd, yd = self.crdmap.to_data(self.x, self.y)
@@ -1117,8 +1091,8 @@ class Triangle(OnePointTwoRadiusMixin, CanvasObjectBase):
         x3, y3 = self.crdmap.to_data(x3, y3)
 
         # coerce args to floats
-        x_arr = x_arr.astype(numpy.float)
-        y_arr = y_arr.astype(numpy.float)
+        x_arr = x_arr.astype(float)
+        y_arr = y_arr.astype(float)
 
         # barycentric coordinate test
         denominator = float((y2 - y3)*(x1 - x3) + (x3 - x2)*(y1 - y3))
@@ -1224,8 +1198,8 @@ class Circle(OnePointOneRadiusMixin, CanvasObjectBase):
         yradius = max(y3, yd) - min(y3, yd)
 
         # need to make sure to coerce these to floats or it won't work
-        x_arr = x_arr.astype(numpy.float)
-        y_arr = y_arr.astype(numpy.float)
+        x_arr = x_arr.astype(float)
+        y_arr = y_arr.astype(float)
 
         # See http://math.stackexchange.com/questions/76457/check-if-a-point-is-within-an-ellipse
         res = (((x_arr - xd) ** 2) / xradius ** 2 +
@@ -1680,8 +1654,8 @@ class RightTriangle(TwoPointMixin, CanvasObjectBase):
         x3, y3 = self.crdmap.to_data(x3, y3)
 
         # coerce args to floats
-        x_arr = x_arr.astype(numpy.float)
-        y_arr = y_arr.astype(numpy.float)
+        x_arr = x_arr.astype(float)
+        y_arr = y_arr.astype(float)
 
         # barycentric coordinate test
         denominator = float((y2 - y3)*(x1 - x3) + (x3 - x2)*(y1 - y3))
@@ -14,7 +14,7 @@ from ginga.canvas.CanvasObject import (CanvasObjectBase, _bool, _color,
                                        colors_plus_none)
 from ginga.misc.ParamSet import Param
 from ginga.misc import Bunch
-from ginga import trcalc
+from ginga import trcalc, AutoCuts
 
 class Image(CanvasObjectBase):
     """Draws an image on a ImageViewCanvas.
@@ -171,10 +171,10 @@ class Image(CanvasObjectBase):
             # scale additionally by our scale
             _scale_x, _scale_y = scale_x * self.scale_x, scale_y * self.scale_y
 
-            res = self.image.get_scaled_cutout(a1, b1, a2, b2,
-                                               _scale_x, _scale_y,
-                                               #flipy=self.flipy,
-                                               method=self.interpolation)
+            t1 = viewer.profile.start()
+            res = self._get_scaled_cutout(viewer, a1, b1, a2, b2,
+                                          _scale_x, _scale_y)
+            viewer.profile.stop('cutout', t1, res.data.nbytes)
 
             # don't ask for an alpha channel from overlaid image if it
             # doesn't have one
@@ -208,12 +208,46 @@ class Image(CanvasObjectBase):
 
         # composite the image into the destination array at the
         # calculated position
-        trcalc.overlay_image(dstarr, cache.cvs_x, cache.cvs_y, cache.cutout,
-                             dst_order=dst_order, src_order=image_order,
-                             alpha=self.alpha, flipy=False)
+        t1 = viewer.profile.start()
+        self.overlay_cached(cache, dstarr, cache.cutout, dst_order,
+                            image_order)
+        viewer.profile.stop('compose', t1, cache.cutout.nbytes)
+
+    def overlay_cached(self, cache, dstarr, srcarr, dst_order, src_order):
+        """Composite `srcarr` into `dstarr` at the cached position.  The
+        premultiplied-alpha form of the overlay is cached, and reused
+        until the overlay, our alpha or the destination order changes.
+        """
+        pm = cache.premult
+        if ((pm is None) or (pm.src is not srcarr) or
+            (pm.alpha != self.alpha) or (pm.dst_order != dst_order) or
+            (pm.src_order != src_order) or (pm.dtype != dstarr.dtype)):
+            pm = trcalc.premultiply_image(srcarr, dst_order=dst_order,
+                                          src_order=src_order,
+                                          alpha=self.alpha,
+                                          dtype=dstarr.dtype)
+            cache.premult = pm
+
+        trcalc.overlay_premultiplied(dstarr, cache.cvs_x, cache.cvs_y, pm,
+                                     flipy=False)
+
+    def _get_scaled_cutout(self, viewer, x1, y1, x2, y2, scale_x, scale_y):
+        if viewer.t_.get('tiled_rendering', False):
+            # cut from the nearest level of the image's tiled pyramid,
+            # so that cost follows window size rather than image size
+            tile_size = viewer.t_.get('tile_size', 512)
+            return self.image.get_scaled_cutout_tiled(x1, y1, x2, y2,
+                                                      scale_x, scale_y,
+                                                      method=self.interpolation,
+                                                      tile_size=tile_size)
+
+        return self.image.get_scaled_cutout(x1, y1, x2, y2,
+                                            scale_x, scale_y,
+                                            method=self.interpolation)
 
     def _reset_cache(self, cache):
-        cache.setvals(cutout=None, drawn=False, cvs_x=0, cvs_y=0)
+        cache.setvals(cutout=None, premult=None, drawn=False,
+                      cvs_x=0, cvs_y=0)
         return cache
 
     def reset_optimize(self):
@@ -405,10 +439,12 @@ class NormImage(Image):
             # scale additionally by our scale
             _scale_x, _scale_y = scale_x * self.scale_x, scale_y * self.scale_y
 
-            res = self.image.get_scaled_cutout(a1, b1, a2, b2,
-                                               _scale_x, _scale_y,
-                                               method=self.interpolation)
+            t1 = viewer.profile.start()
+            res = self._get_scaled_cutout(viewer, a1, b1, a2, b2,
+                                          _scale_x, _scale_y)
+            viewer.profile.stop('cutout', t1, res.data.nbytes)
             cache.cutout = res.data
+            cache.geometry = (a1, b1, a2, b2, _scale_x, _scale_y)
 
             # calculate our offset from the pan position
             pan_x, pan_y = viewer.get_pan()
@@ -434,13 +470,11 @@ class NormImage(Image):
 
         if (whence <= 1.0) or (cache.prergb is None) or (not self.optimize):
             # apply visual changes prior to color mapping (cut levels, etc)
-            vmax = rgbmap.get_hash_size() - 1
-            newdata = self.apply_visuals(viewer, cache.cutout, 0, vmax)
-
             # result becomes an index array fed to the RGB mapper
-            if not numpy.issubdtype(newdata.dtype, numpy.dtype('uint')):
-                newdata = newdata.astype(numpy.uint)
-            idx = newdata
+            vmax = rgbmap.get_hash_size() - 1
+            t1 = viewer.profile.start()
+            idx = self.apply_visuals_idx(viewer, cache, 0, vmax)
+            viewer.profile.stop('cuts', t1, idx.nbytes)
 
             self.logger.debug("shape of index is %s" % (str(idx.shape)))
             cache.prergb = idx
@@ -453,15 +487,18 @@ class NormImage(Image):
 
         if (whence <= 2.5) or (cache.rgbarr is None) or (not self.optimize):
             # get RGB mapped array
+            t1 = viewer.profile.start()
             rgbobj = rgbmap.get_rgbarray(cache.prergb, order=dst_order,
                                          image_order=image_order)
             cache.rgbarr = rgbobj.get_array(get_order)
+            viewer.profile.stop('cmap', t1, cache.rgbarr.nbytes)
 
         # composite the image into the destination array at the
         # calculated position
-        trcalc.overlay_image(dstarr, cache.cvs_x, cache.cvs_y, cache.rgbarr,
-                             dst_order=dst_order, src_order=get_order,
-                             alpha=self.alpha, flipy=False)
+        t1 = viewer.profile.start()
+        self.overlay_cached(cache, dstarr, cache.rgbarr, dst_order,
+                            get_order)
+        viewer.profile.stop('compose', t1, cache.rgbarr.nbytes)
 
     def apply_visuals(self, viewer, data, vmin, vmax):
         if self.autocuts is not None:
@@ -475,9 +512,55 @@ class NormImage(Image):
                                       vmin=vmin, vmax=vmax)
         return newdata
 
+    def apply_visuals_idx(self, viewer, cache, vmin, vmax):
+        """Like `apply_visuals`, but for the cached cutout, producing an
+        index array directly.  The index array and intermediate buffer
+        from the last redraw are reused where possible.
+        """
+        if self.autocuts is not None:
+            autocuts = self.autocuts
+        else:
+            autocuts = viewer.autocuts
+
+        data = cache.cutout
+        cache.scratch = AutoCuts.get_buffer(cache.scratch, data.shape,
+                                            AutoCuts.get_work_dtype(data))
+
+        # Apply cut levels
+        loval, hival = viewer.t_['cuts']
+        idx = autocuts.cut_levels_idx(data, loval, hival,
+                                      vmin=vmin, vmax=vmax,
+                                      out=cache.prergb,
+                                      scratch=cache.scratch)
+        return idx
+
+    def get_cutout_geometry(self, viewer):
+        """Returns the cutout (x1, y1, x2, y2) and scale (scale_x,
+        scale_y) used for this image in the last full redraw of `viewer`,
+        as a tuple, or None if there was none (e.g. the image is off the
+        window).
+        """
+        cache = self.get_cache(viewer)
+        if cache.cutout is None:
+            return None
+        return cache.geometry
+
+    def set_prergb(self, viewer, idx):
+        """Show the index array `idx` (the result of the cut levels
+        step) in `viewer` in place of the one calculated from the data,
+        and redraw from the color mapping on.  `idx` must match the
+        cutout geometry (see `get_cutout_geometry`); it is typically
+        pre-rendered from another slice of the same data cube.  The next
+        full redraw or change of cut levels replaces it.
+        """
+        cache = self.get_cache(viewer)
+        cache.prergb = idx
+        viewer.redraw(whence=2)
+
     def _reset_cache(self, cache):
-        cache.setvals(cutout=None, prergb=None, rgbarr=None,
-                      drawn=False, cvs_x=0, cvs_y=0)
+        cache.setvals(cutout=None, prergb=None, rgbarr=None, scratch=None,
+                      geometry=None, premult=None, drawn=False,
+                      cvs_x=0, cvs_y=0)
         return cache
 
     def set_image(self, image):
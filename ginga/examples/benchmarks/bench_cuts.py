@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+#
+# bench_cuts.py -- benchmark interactive cut level changes
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Simulates dragging the cut levels on a large window and reports the
+time taken per redraw (cut levels + color mapping), compared with the
+budget for a given frame rate.  No GUI toolkit is needed.
+
+Usage:
+   bench_cuts.py [options]
+"""
+from __future__ import print_function
+import sys
+import time
+from optparse import OptionParser
+
+import numpy
+
+from ginga import AstroImage
+from ginga.mockw.ImageViewCanvasMock import ImageViewCanvas
+from ginga.misc import log
+
+
+def main(options, args):
+
+    logger = log.get_logger("bench_cuts", options=options)
+
+    wd, ht = [int(n) for n in options.geometry.split('x')]
+    viewer = ImageViewCanvas(logger)
+    viewer.configure(wd, ht)
+    viewer.enable_autocuts('off')
+
+    data = numpy.random.normal(1000.0, 200.0, size=(ht, wd))
+    image = AstroImage.AstroImage(data.astype(options.dtype), logger=logger)
+    viewer.set_image(image)
+    viewer.redraw_now(whence=0)
+
+    # the cut levels kernel alone
+    canvas_img = viewer.get_canvas_image()
+    cache = canvas_img.get_cache(viewer)
+    vmax = viewer.get_rgbmap().get_hash_size() - 1
+
+    def old_cuts(lo, hi):
+        newdata = canvas_img.apply_visuals(viewer, cache.cutout, 0, vmax)
+        return newdata.astype(numpy.uint)
+
+    def new_cuts(lo, hi):
+        return canvas_img.apply_visuals_idx(viewer, cache, 0, vmax)
+
+    def redraw(lo, hi):
+        viewer.redraw_now(whence=1)
+
+    budget = 1.0 / options.fps
+    print("window %dx%d, dtype %s, budget %.1f ms/frame (%d Hz)" % (
+        wd, ht, options.dtype, budget * 1000, options.fps))
+
+    for name, fn in (("cut levels (separate steps)", old_cuts),
+                     ("cut levels (fused)", new_cuts),
+                     ("full redraw (whence=1)", redraw)):
+        times = []
+        for i in range(options.count):
+            lo = 600.0 + i
+            hi = 1400.0 - i
+            # NOTE: set the cuts without triggering a redraw
+            viewer.t_.set(cuts=(lo, hi), callback=False)
+            t1 = time.time()
+            fn(lo, hi)
+            times.append(time.time() - t1)
+        avg = numpy.mean(times)
+        print("%-30s %8.2f ms  %s" % (name, avg * 1000,
+                                       "OK" if avg <= budget else "SLOW"))
+
+
+if __name__ == "__main__":
+
+    usage = "usage: %prog [options]"
+    optprs = OptionParser(usage=usage)
+
+    optprs.add_option("-g", "--geometry", dest="geometry",
+                      default="3840x2160", metavar="WDxHT",
+                      help="Window size to simulate")
+    optprs.add_option("-n", "--count", dest="count", type="int",
+                      default=30, help="Number of redraws to time")
+    optprs.add_option("--dtype", dest="dtype", default="float32",
+                      help="Data type of the image")
+    optprs.add_option("--fps", dest="fps", type="int", default=60,
+                      help="Target frame rate")
+    log.addlogopts(optprs)
+
+    (options, args) = optprs.parse_args(sys.argv[1:])
+
+    main(options, args)
+
+#END
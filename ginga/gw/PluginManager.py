@@ -8,6 +8,7 @@
 # Please see the file LICENSE.txt for details.
 #
 import sys
+import time
 import threading
 import traceback
 
@@ -36,42 +37,99 @@ class PluginManager(Callback.Callbacks):
         self.active = {}
         self.focus  = set([])
         self.exclusive = set([])
+        # plugins waiting for their tab to be shown: tabname -> name
+        self.deferred = Bunch.caselessDict()
 
         for name in ('activate-plugin', 'deactivate-plugin',
                      'focus-plugin', 'unfocus-plugin'):
             self.enable_callback(name)
 
     def loadPlugin(self, name, spec, chinfo=None):
+        """Register plugin `name`.  Local plugins and global plugins
+        with `defer=True` in their spec are not imported, nor their
+        plugin objects created, until the plugin is first used (see
+        `get_plugin_obj`).  Other global plugins are created right away,
+        because they may register for callbacks (e.g. 'add-channel') in
+        their constructor that they must not miss.
+        """
+        # Prepare configuration for module.  This becomes the pInfo
+        # object referred to in later code.
+        opname = name.lower()
+        fitsimage = None
+        if chinfo is not None:
+            fitsimage = chinfo.fitsimage
+        self.plugin[opname] = Bunch.Bunch(klass=None, obj=None,
+                                          widget=None, name=name,
+                                          is_toplevel=False,
+                                          spec=spec,
+                                          fitsimage=fitsimage,
+                                          chinfo=chinfo)
+
+        if (chinfo is None) and not spec.get('defer', False):
+            try:
+                self.get_plugin_obj(self.plugin[opname])
+
+            except PluginManagerError:
+                del self.plugin[opname]
+                raise
+            return
+
+        self.logger.info("Plugin '%s' registered." % name)
+
+    def get_plugin_obj(self, pInfo):
+        """Return the plugin object for `pInfo`, importing the plugin
+        module and creating the object if this is its first use.
+        """
+        if pInfo.obj is not None:
+            return pInfo.obj
+
+        spec = pInfo.spec
         try:
             module = self.mm.getModule(spec.module)
             className = spec.get('klass', spec.module)
             klass = getattr(module, className)
 
-            if chinfo is None:
+            start_time = time.time()
+            if pInfo.chinfo is None:
                 # global plug in
                 obj = klass(self.fv)
-                fitsimage = None
             else:
                 # local plugin
-                fitsimage = chinfo.fitsimage
-                obj = klass(self.fv, fitsimage)
+                obj = klass(self.fv, pInfo.fitsimage)
+            self.mm.add_timing(spec.module, 'init',
+                               time.time() - start_time)
 
-            # Prepare configuration for module.  This becomes the pInfo
-            # object referred to in later code.
-            opname = name.lower()
-            self.plugin[opname] = Bunch.Bunch(klass=klass, obj=obj,
-                                              widget=None, name=name,
-                                              is_toplevel=False,
-                                              spec=spec,
-                                              fitsimage=fitsimage,
-                                              chinfo=chinfo)
-
-            self.logger.info("Plugin '%s' loaded." % name)
+            pInfo.klass = klass
+            pInfo.obj = obj
+            self.logger.info("Plugin '%s' loaded." % pInfo.name)
+            return obj
 
         except Exception as e:
             self.logger.error("Failed to load plugin '%s': %s" % (
-                name, str(e)))
-            #raise PluginManagerError(e)
+                pInfo.name, str(e)))
+            raise PluginManagerError(e)
+
+    def defer_plugin(self, name):
+        """Add an empty tab for global plugin `name` and start the plugin
+        (importing it and building its GUI) only when that tab is first
+        shown.
+        """
+        pInfo = self.getPluginInfo(name)
+        pInfo.tabname = pInfo.spec.get('tab', pInfo.name)
+        in_ws = pInfo.spec.ws
+
+        vbox = Widgets.VBox()
+        self.ds.add_tab(in_ws, vbox, 2, pInfo.tabname, pInfo.tabname)
+        pInfo.widget = vbox
+        pInfo.is_toplevel = False
+
+        ws_w = self.ds.get_nb(in_ws)
+        ws_w.add_callback('page-switch', self.tab_switched_cb)
+        if ws_w.index_of(vbox) == ws_w.get_index():
+            # the tab is already showing
+            self.start_plugin_future(None, name, None)
+        else:
+            self.deferred[pInfo.tabname] = name
 
     def reloadPlugin(self, plname, chinfo=None):
         pInfo = self.getPluginInfo(plname)
@@ -88,7 +146,7 @@ class PluginManager(Callback.Callbacks):
 
     def getPlugin(self, name):
         pInfo = self.getPluginInfo(name)
-        return pInfo.obj
+        return self.get_plugin_obj(pInfo)
 
     def getNames(self):
         return self.plugin.keys()
@@ -237,13 +295,29 @@ class PluginManager(Callback.Callbacks):
             raise PluginManagerError("Plugin %s is already active." % (
                 plname))
 
+        try:
+            obj = self.get_plugin_obj(pInfo)
+
+        except PluginManagerError as e:
+            self.fv.show_error("Plugin '%s' failed to load: %s" % (
+                plname, str(e)))
+            return
+
+        # the tab was created already if the plugin start was deferred
+        self.deferred.pop(pInfo.spec.get('tab', plname), None)
+        deferred = (pInfo.widget is not None)
+
         # Raise tab with GUI
         pInfo.tabname = pInfo.spec.get('tab', plname)
         vbox = None
         had_error = False
+        start_time = time.time()
         try:
-            if hasattr(pInfo.obj, 'build_gui'):
-                vbox = Widgets.VBox()
+            if hasattr(obj, 'build_gui'):
+                if deferred:
+                    vbox = pInfo.widget
+                else:
+                    vbox = Widgets.VBox()
 
                 in_ws = pInfo.spec.ws
                 if in_ws.startswith('in:'):
@@ -258,9 +332,9 @@ class PluginManager(Callback.Callbacks):
                     vbox.size = (wd, ht)
 
                 if future:
-                    pInfo.obj.build_gui(vbox, future=future)
+                    obj.build_gui(vbox, future=future)
                 else:
-                    pInfo.obj.build_gui(vbox)
+                    obj.build_gui(vbox)
 
         except Exception as e:
             errstr = "Plugin UI failed to initialize: %s" % (
@@ -281,9 +355,9 @@ class PluginManager(Callback.Callbacks):
         if not had_error:
             try:
                 if future:
-                    pInfo.obj.start(future=future)
+                    obj.start(future=future)
                 else:
-                    pInfo.obj.start()
+                    obj.start()
 
             except Exception as e:
                 had_error = True
@@ -302,8 +376,12 @@ class PluginManager(Callback.Callbacks):
                 self.plugin_build_error(vbox, errstr + '\n' + tb_str)
                 #raise PluginManagerError(e)
 
+        self.mm.add_timing(pInfo.spec.module, 'gui',
+                           time.time() - start_time)
+
         if vbox is not None:
-            self.finish_gui(pInfo, vbox)
+            if not deferred:
+                self.finish_gui(pInfo, vbox)
 
             self.activate(pInfo)
             self.set_focus(pInfo.name)
@@ -392,6 +470,11 @@ class PluginManager(Callback.Callbacks):
         # A tab in a workspace in which we started a plugin has been
         # raised.  Check for this widget and focus the plugin
         title = widget.extdata.get('tab_title', None)
+        if (title is not None) and (title in self.deferred):
+            # first time this tab is shown: start the plugin
+            self.start_plugin_future(None, self.deferred[title], None)
+            return
+
         if title is not None:
             # is this a local plugin tab?
             if ':' in title:
@@ -42,6 +42,7 @@ import sys
 import os
 import logging, logging.handlers
 import threading
+import time
 import traceback
 
 # Local application imports
@@ -99,8 +100,8 @@ global_plugins = [
     Bunch(module='Toolbar', tab='Toolbar', ws='toolbar'),
     Bunch(module='Pan', tab='_pan', ws='uleft', raisekey=None),
     Bunch(module='Info', tab='Synopsis', ws='lleft', raisekey=None),
-    Bunch(module='Header', tab='Header', ws='left', raisekey='H'),
-    Bunch(module='Zoom', tab='Zoom', ws='left', raisekey='Z'),
+    Bunch(module='Header', tab='Header', ws='left', raisekey='H', defer=True),
+    Bunch(module='Zoom', tab='Zoom', ws='left', raisekey='Z', defer=True),
     Bunch(module='Thumbs', tab='Thumbs', ws='right', raisekey='T'),
     Bunch(module='Contents', tab='Contents', ws='right', raisekey='c'),
     Bunch(module='Colorbar', tab='_cbar', ws='cbar', start=True),
@@ -155,13 +156,19 @@ class ReferenceViewer(object):
             Bunch(module=module_name, ws=ws_name, pfx=pfx))
 
     def add_global_plugin(self, module_name, ws_name,
-                          tab_name=None, start_plugin=True, pfx=None):
+                          tab_name=None, start_plugin=True, pfx=None,
+                          defer=False):
+        """
+        Add a global plugin to the reference viewer.  If `defer` is
+        True, the plugin is started (imported and its GUI built) only
+        when its tab is first shown.
+        """
         if tab_name is None:
             tab_name = module_name
 
         self.global_plugins.append(
             Bunch(module=module_name, ws=ws_name, tab=tab_name,
-                  start=start_plugin, pfx=pfx))
+                  start=start_plugin, pfx=pfx, defer=defer))
 
     def clear_default_plugins(self):
         self.local_plugins = []
@@ -176,8 +183,10 @@ class ReferenceViewer(object):
         for bnch in global_plugins:
             start = bnch.get('start', True)
             pfx = bnch.get('pfx', None)
+            defer = bnch.get('defer', False)
             self.add_global_plugin(bnch.module, bnch.ws,
-                          tab_name=bnch.tab, start_plugin=start, pfx=pfx)
+                          tab_name=bnch.tab, start_plugin=start, pfx=pfx,
+                          defer=defer)
 
         # add default local plugins
         for bnch in local_plugins:
@@ -223,6 +232,9 @@ class ReferenceViewer(object):
         optprs.add_option("--profile", dest="profile", action="store_true",
                           default=False,
                           help="Run the profiler on main()")
+        optprs.add_option("--startup-profile", dest="startup_profile",
+                          action="store_true", default=False,
+                          help="Report import and construction time per plugin module at startup")
         optprs.add_option("-t", "--toolkit", dest="toolkit", metavar="NAME",
                           default=None,
                           help="Prefer GUI toolkit (gtk|qt)")
@@ -243,6 +255,8 @@ class ReferenceViewer(object):
         options.  It should contain a list of files or URLs to load.
         """
 
+        start_time = time.time()
+
         # Create a logger
         logger = log.get_logger(name='ginga', options=options)
 
@@ -496,6 +510,10 @@ class ReferenceViewer(object):
         if (not options.nosplash) and (len(args) == 0) and showBanner:
             ginga_shell.banner(raiseTab=True)
 
+        if options.startup_profile:
+            print("Startup time: %.4f sec" % (time.time() - start_time))
+            print(mm.get_profile_report())
+
         # Assume remaining arguments are fits files and load them.
         for imgfile in args:
             ginga_shell.nongui_do(ginga_shell.load_file, imgfile)
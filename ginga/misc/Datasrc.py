@@ -5,16 +5,45 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import os
+import itertools
 import threading
+import weakref
+
+import numpy
+
+from ginga.misc import Bunch
 
 
 class TimeoutError(Exception):
     pass
 
 
+# global "clock" used to order accesses across all caches sharing a budget
+_access_clock = itertools.count()
+
+
+def get_nbytes(value):
+    """Estimate the memory footprint of a cached item in bytes.
+
+    Objects can report their own size via a `get_nbytes()` method
+    (e.g. images); otherwise the size of a numpy array is used.
+    """
+    if hasattr(value, 'get_nbytes'):
+        return value.get_nbytes()
+    return getattr(value, 'nbytes', 0)
+
+
 class Datasrc(object):
-    """Class to handle internal data cache."""
-    def __init__(self, length=0):
+    """Class to handle internal data cache.
+
+    By default the cache holds at most `length` items (no limit if
+    `length` is 0 or None).  If a `MemoryBudget` is given, items are also
+    evicted when the total size of all caches sharing that budget
+    exceeds it.  If a `SpillStore` is given, items evicted by the budget
+    are written to it so that they can be restored quickly later.
+    """
+    def __init__(self, length=0, budget=None, spill=None):
         self.length = length
         self.cursor = -1
         self.datums = {}
@@ -23,9 +52,22 @@ class Datasrc(object):
         self.cond = threading.Condition()
         self.newdata = threading.Event()
 
+        # for byte accounting and LRU/LFU eviction
+        self.nbytes = {}
+        self.atime = {}
+        self.hits = {}
+        self.total_bytes = 0
+        self.spill = spill
+        self.budget = None
+        if budget is not None:
+            budget.add_datasrc(self)
+
     def __getitem__(self, key):
         with self.cond:
-            return self.datums[key]
+            value = self.datums[key]
+            self.atime[key] = next(_access_clock)
+            self.hits[key] += 1
+            return value
 
     def __setitem__(self, key, value):
         self.push(key, value)
@@ -53,11 +95,20 @@ class Datasrc(object):
             self.history.append(key)
 
             self.datums[key] = value
+            self._account(key, value)
             self._eject_old()
 
+            self.sortedkeys = list(self.datums.keys())
+            self.sortedkeys.sort()
+
             self.newdata.set()
             self.cond.notify()
 
+        # NOTE: done outside of our lock, the budget may need to evict
+        # items from other caches
+        if self.budget is not None:
+            self.budget.enforce(exclude=(self, key))
+
     def pop_one(self):
         return self.remove(self.history[0])
 
@@ -74,10 +125,71 @@ class Datasrc(object):
             val = self.datums[key]
             self.history.remove(key)
             del self.datums[key]
+            self._unaccount(key)
+
+            self.sortedkeys = list(self.datums.keys())
+            self.sortedkeys.sort()
+
+        if (self.spill is not None) and self.spill.has_key(key):
+            self.spill.remove(key)
+        return val
+
+    def evict(self, key):
+        """Remove `key` from memory, writing it to the spill store
+        (if there is one) so that it can be restored with `get_spilled()`.
+        """
+        with self.cond:
+            val = self.datums.pop(key)
+            self.history.remove(key)
+            self._unaccount(key)
 
             self.sortedkeys = list(self.datums.keys())
             self.sortedkeys.sort()
-            return val
+
+        if self.spill is not None:
+            self.spill.put(key, val)
+        return val
+
+    def has_spilled(self, key):
+        return (self.spill is not None) and self.spill.has_key(key)
+
+    def get_spilled(self, key):
+        """Reconstitute an item previously evicted to the spill store.
+        The item is not added back to the cache.
+        """
+        if self.spill is None:
+            raise KeyError(key)
+        return self.spill.get(key)
+
+    def _account(self, key, value):
+        nbytes = get_nbytes(value)
+        self.total_bytes += nbytes - self.nbytes.get(key, 0)
+        self.nbytes[key] = nbytes
+        self.atime[key] = next(_access_clock)
+        self.hits.setdefault(key, 0)
+
+    def _unaccount(self, key):
+        self.total_bytes -= self.nbytes.pop(key, 0)
+        self.atime.pop(key, None)
+        self.hits.pop(key, None)
+
+    def get_total_bytes(self):
+        with self.cond:
+            return self.total_bytes
+
+    def get_usage(self):
+        """Returns a list of (key, nbytes, atime, hits) tuples for all
+        items in memory.
+        """
+        with self.cond:
+            return [(key, self.nbytes[key], self.atime[key], self.hits[key])
+                    for key in self.history]
+
+    def set_budget(self, budget):
+        if self.budget is not None:
+            self.budget.remove_datasrc(self)
+        if budget is not None:
+            budget.add_datasrc(self)
 
     def _eject_old(self):
         # Eject oldest cache unless there is no cache limit
@@ -85,6 +197,7 @@ class Datasrc(object):
             while len(self.history) > self.length:
                 oldest = self.history.pop(0)
                 del self.datums[oldest]
+                self._unaccount(oldest)
 
         # Update sorted keys regardless
         self.sortedkeys = list(self.datums.keys())
@@ -142,4 +255,156 @@ class Datasrc(object):
             self.length = length
             self._eject_old()
 
+
+class MemoryBudget(object):
+    """A byte budget shared by a number of `Datasrc` caches.
+
+    When the total size of the items held in all the caches exceeds
+    `max_bytes`, items are evicted from whichever cache holds them,
+    according to `policy`: 'lru' evicts the least recently used items
+    first, 'lfu' the least frequently used ones.
+    """
+    def __init__(self, max_bytes, policy='lru', logger=None):
+        assert policy in ('lru', 'lfu'), \
+               ValueError("policy must be one of: lru, lfu")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.logger = logger
+        self.lock = threading.RLock()
+        self.sources = weakref.WeakSet()
+
+    def add_datasrc(self, datasrc):
+        with self.lock:
+            self.sources.add(datasrc)
+            datasrc.budget = self
+
+    def remove_datasrc(self, datasrc):
+        with self.lock:
+            self.sources.discard(datasrc)
+            datasrc.budget = None
+
+    def get_total_bytes(self):
+        with self.lock:
+            return sum([ds.get_total_bytes() for ds in self.sources])
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.enforce()
+
+    def enforce(self, exclude=None):
+        """Evict items until the caches fit in the budget.  `exclude`
+        can specify a (datasrc, key) item that should not be evicted
+        (e.g. the one that was just added).
+        """
+        with self.lock:
+            total = self.get_total_bytes()
+            if (self.max_bytes is None) or (total <= self.max_bytes):
+                return
+
+            candidates = []
+            for ds in list(self.sources):
+                for key, nbytes, atime, hits in ds.get_usage():
+                    if (ds, key) == exclude:
+                        continue
+                    if self.policy == 'lfu':
+                        rank = (hits, atime)
+                    else:
+                        rank = (atime, )
+                    candidates.append((rank, ds, key, nbytes))
+            candidates.sort(key=lambda tup: tup[0])
+
+            for rank, ds, key, nbytes in candidates:
+                if total <= self.max_bytes:
+                    break
+                if self.logger is not None:
+                    self.logger.debug("evicting '%s' (%d bytes) from cache" % (
+                        key, nbytes))
+                try:
+                    ds.evict(key)
+                except KeyError:
+                    # removed by another thread in the meantime
+                    continue
+                total -= nbytes
+
+
+class SpillStore(object):
+    """On-disk store for images evicted from a `Datasrc`.
+
+    The data of each image is written to a .npy file in `dirpath`; the
+    (small) metadata is kept in memory.  Restored images get their data
+    as a copy-on-write memory map of that file, so restoring is fast and
+    memory is only used for the parts that are actually accessed.
+    Images whose data is a slice of a larger (multidimensional) array
+    are not spilled.
+    """
+    def __init__(self, dirpath, logger=None):
+        self.dirpath = dirpath
+        self.logger = logger
+        self.lock = threading.RLock()
+        self.items = {}
+        self._count = itertools.count()
+
+    def has_key(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __contains__(self, key):
+        return self.has_key(key)
+
+    def put(self, key, image):
+        data = image.get_data()
+        mddata = getattr(image, 'get_mddata', lambda: None)()
+        if (mddata is not None) and (mddata.shape != data.shape):
+            return False
+
+        with self.lock:
+            # NOTE: always write a new file--a restored image may have
+            # been modified in place since it was read back
+            if not os.path.isdir(self.dirpath):
+                os.makedirs(self.dirpath)
+            path = os.path.join(self.dirpath,
+                                'spill%d.npy' % (next(self._count)))
+            numpy.save(path, numpy.asarray(data))
+
+            rec = self.items.get(key, None)
+            if rec is not None:
+                self._remove_file(rec.path)
+
+            self.items[key] = Bunch.Bunch(path=path, klass=image.__class__,
+                                          metadata=image.get_metadata(),
+                                          order=image.get_order())
+        if self.logger is not None:
+            self.logger.debug("spilled '%s' to %s" % (key, path))
+        return True
+
+    def get(self, key):
+        with self.lock:
+            rec = self.items[key]
+            # copy-on-write, so that in-place modifications are allowed
+            data = numpy.load(rec.path, mmap_mode='c')
+
+        image = rec.klass(data_np=data, metadata=rec.metadata,
+                          logger=self.logger)
+        if rec.order:
+            image.set_order(rec.order)
+        return image
+
+    def remove(self, key):
+        with self.lock:
+            rec = self.items.pop(key)
+            self._remove_file(rec.path)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.items.keys()):
+                self.remove(key)
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            if self.logger is not None:
+                self.logger.warn("error removing spill file '%s': %s" % (
+                    path, str(e)))
+
 #END
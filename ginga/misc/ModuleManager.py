@@ -7,6 +7,11 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import time
+
+from ginga.util.six.moves import reload_module
+
+
 def my_import(name):
     mod = __import__(name)
     components = name.split('.')
@@ -19,28 +24,52 @@ class ModuleManagerError(Exception):
     pass
 
 class ModuleManager(object):
+    """
+    Keeps track of dynamically imported (plugin) modules.  Modules can
+    be registered with `registerModule`, in which case they are only
+    imported the first time they are requested with `getModule`.
+
+    The time spent importing each module (and any other time that is
+    recorded with `add_timing`, e.g. plugin construction) is kept for a
+    startup profile; see `get_profile_report`.
+    """
 
     def __init__(self, logger):
         self.logger = logger
-        
+
         self.module = {}
+        # registered, but not yet imported, modules: name -> prefix
+        self.pending = {}
+        # module name -> { kind: seconds }
+        self.timings = {}
+
+    def registerModule(self, moduleName, pfx=None):
+        """Register a module, to be imported on first use."""
+        if moduleName not in self.module:
+            self.pending[moduleName] = pfx
 
     def loadModule(self, moduleName, pfx=None):
         try:
             if moduleName in self.module:
                 self.logger.info("Reloading module '%s'..." % moduleName)
-                module = reload(self.module[moduleName])
+                module = reload_module(self.module[moduleName])
 
             else:
+                if pfx is None:
+                    pfx = self.pending.get(moduleName, None)
                 if pfx:
                     name = pfx + '.' + moduleName
                 else:
                     name = moduleName
 
                 self.logger.info("Loading module '%s'..." % moduleName)
+                start_time = time.time()
                 module = my_import(name)
-                
+                self.add_timing(moduleName, 'import',
+                                time.time() - start_time)
+
             self.module[moduleName] = module
+            self.pending.pop(moduleName, None)
 
         except Exception as e:
             self.logger.error("Failed to load module '%s': %s" % (
@@ -48,8 +77,42 @@ class ModuleManager(object):
             raise ModuleManagerError(e)
 
     def getModule(self, moduleName):
+        if (moduleName not in self.module) and (moduleName in self.pending):
+            self.loadModule(moduleName)
         return self.module[moduleName]
 
-    
-            
+    def isLoaded(self, moduleName):
+        return moduleName in self.module
+
+    def add_timing(self, moduleName, kind, secs):
+        """Add `secs` seconds to the time spent on `kind` (e.g. 'import',
+        'init' or 'gui') for module `moduleName`.
+        """
+        d = self.timings.setdefault(moduleName, {})
+        d[kind] = d.get(kind, 0.0) + secs
+
+    def get_profile_report(self, kinds=('import', 'init', 'gui')):
+        """Return a text table of the time spent per module, most
+        expensive first.
+        """
+        rows = []
+        for name, d in self.timings.items():
+            times = [d.get(kind, 0.0) for kind in kinds]
+            rows.append((sum(times), name, times))
+        rows.sort(key=lambda row: row[0], reverse=True)
+
+        fmt = "%-20s" + " %9s" * (len(kinds) + 1)
+        lines = [fmt % (('module',) + tuple(kinds) + ('total',))]
+        fmt = "%-20s" + " %9.4f" * (len(kinds) + 1)
+        totals = [0.0] * (len(kinds) + 1)
+        for total, name, times in rows:
+            lines.append(fmt % (tuple([name] + times + [total])))
+            totals = [a + b for a, b in zip(totals, times + [total])]
+        lines.append(fmt % (tuple(['(all)'] + totals)))
+        if len(self.pending) > 0:
+            lines.append("not imported: %s" % (
+                ', '.join(sorted(self.pending.keys()))))
+        return '\n'.join(lines)
+
+
 #END
@@ -0,0 +1,221 @@
+#
+# Prefetch.py -- background prefetching of images
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Scheduling of background image loads ahead of the user's navigation.
+
+`get_prefetch_order` decides which images around the current one are
+wanted, nearest first and favoring the direction of travel.  A
+`PrefetchScheduler` runs the loads with bounded concurrency; each new
+request for a channel replaces the loads still waiting to run for it,
+so that stale requests are cancelled when the user jumps ahead.
+"""
+import threading
+from collections import deque
+
+from ginga.misc import Bunch
+
+
+def get_prefetch_order(cursor, length, direction=1, num_ahead=3,
+                       num_behind=1, loop=True):
+    """Returns the list of indexes of the images to prefetch around
+    index `cursor` in a list of `length` images, nearest first.
+    `direction` (1 or -1) is the direction of travel: `num_ahead`
+    images are wanted that way and `num_behind` the other way; at the
+    same distance, images ahead come first.  If `loop` is True the
+    indexes wrap around at the ends of the list.
+    """
+    items = []
+    for dist in range(1, max(num_ahead, num_behind) + 1):
+        if dist <= num_ahead:
+            items.append(cursor + dist * direction)
+        if dist <= num_behind:
+            items.append(cursor - dist * direction)
+
+    res = []
+    for idx in items:
+        if loop and (length > 0):
+            idx %= length
+        if (0 <= idx < length) and (idx != cursor) and (idx not in res):
+            res.append(idx)
+    return res
+
+
+class PrefetchScheduler(object):
+    """Runs prefetch jobs, at most `max_workers` at a time.
+
+    Jobs are grouped by a key (e.g. a channel name).  Calling
+    `schedule` for a key replaces the jobs for that key that have not
+    started yet; jobs already running are allowed to finish, and
+    `is_wanted` can be used to decide whether to keep their result.
+    `submit_fn(fn, *args)` is used to run each job in the background
+    (e.g. the `nongui_do` method of the viewer).
+    """
+    def __init__(self, submit_fn, logger, max_workers=2):
+        self.submit_fn = submit_fn
+        self.logger = logger
+        self.max_workers = max_workers
+
+        self.lock = threading.RLock()
+        # jobs waiting to run, highest priority first
+        self.pending = deque()
+        # (key, name) of jobs running now
+        self.active = set()
+        # key -> names of the items currently wanted
+        self.wanted = {}
+        # key -> (last cursor, direction of travel)
+        self.positions = {}
+        # key -> counters
+        self.counters = {}
+
+    def _get_counters(self, key):
+        bnch = self.counters.get(key, None)
+        if bnch is None:
+            bnch = Bunch.Bunch(hits=0, misses=0, loaded=0, cancelled=0,
+                               errors=0)
+            self.counters[key] = bnch
+        return bnch
+
+    def set_max_workers(self, max_workers):
+        with self.lock:
+            self.max_workers = max_workers
+        self._start_jobs()
+
+    def update_position(self, key, cursor, length):
+        """Record that the cursor for `key` is now at index `cursor` of
+        a list of `length` items, and return the direction of travel
+        (1 or -1).
+        """
+        with self.lock:
+            last, direction = self.positions.get(key, (None, 1))
+            if (last is not None) and (cursor != last) and (length > 1):
+                delta = cursor - last
+                # a big jump is a wrap around the ends of the list
+                if abs(delta) > length // 2:
+                    delta = -delta
+                direction = 1 if delta > 0 else -1
+            self.positions[key] = (cursor, direction)
+            return direction
+
+    def schedule(self, key, jobs):
+        """Schedule `jobs`, a list of (name, fn, args) tuples in order
+        of priority, for `key`.  Jobs for `key` that have not started
+        yet and are not in `jobs` are cancelled.
+        """
+        with self.lock:
+            names = [job[0] for job in jobs]
+            counters = self._get_counters(key)
+            others = []
+            for bnch in self.pending:
+                if bnch.key != key:
+                    others.append(bnch)
+                elif bnch.name not in names:
+                    counters.cancelled += 1
+
+            # the latest request is the most urgent one
+            new = [Bunch.Bunch(key=key, name=name, fn=fn, args=args)
+                   for name, fn, args in jobs
+                   if (key, name) not in self.active]
+            self.pending = deque(new + others)
+            self.wanted[key] = set(names)
+
+        self._start_jobs()
+
+    def add(self, key, name, fn, *args):
+        """Add one job for `key`, after any that are already waiting,
+        without cancelling anything.
+        """
+        with self.lock:
+            if (key, name) in self.active:
+                return
+            for bnch in self.pending:
+                if (bnch.key == key) and (bnch.name == name):
+                    return
+            self.pending.append(Bunch.Bunch(key=key, name=name, fn=fn,
+                                            args=args))
+            self.wanted.setdefault(key, set()).add(name)
+
+        self._start_jobs()
+
+    def cancel(self, key):
+        """Cancel all the jobs for `key` that have not started yet."""
+        with self.lock:
+            counters = self._get_counters(key)
+            others = deque()
+            for bnch in self.pending:
+                if bnch.key == key:
+                    counters.cancelled += 1
+                else:
+                    others.append(bnch)
+            self.pending = others
+            self.wanted.pop(key, None)
+            self.positions.pop(key, None)
+
+    def is_wanted(self, key, name):
+        with self.lock:
+            return name in self.wanted.get(key, ())
+
+    def is_busy(self):
+        with self.lock:
+            return len(self.active) + len(self.pending) > 0
+
+    def record_access(self, key, hit):
+        """Count an access to an item for `key`: a hit if it was
+        already in memory, otherwise a miss.
+        """
+        with self.lock:
+            counters = self._get_counters(key)
+            if hit:
+                counters.hits += 1
+            else:
+                counters.misses += 1
+
+    def get_counters(self, key):
+        """Returns a Bunch with the counts of `hits`, `misses`, `loaded`
+        (jobs completed), `cancelled` and `errors` for `key`.
+        """
+        with self.lock:
+            return Bunch.Bunch(self._get_counters(key))
+
+    def _start_jobs(self):
+        with self.lock:
+            jobs = []
+            while ((len(self.active) < self.max_workers) and
+                   (len(self.pending) > 0)):
+                bnch = self.pending.popleft()
+                self.active.add((bnch.key, bnch.name))
+                jobs.append(bnch)
+
+        for bnch in jobs:
+            try:
+                self.submit_fn(self._run_job, bnch)
+            except Exception as e:
+                self.logger.error("Error starting prefetch of '%s': %s" % (
+                    bnch.name, str(e)))
+                self._job_done(bnch, False)
+
+    def _run_job(self, bnch):
+        ok = False
+        try:
+            bnch.fn(*bnch.args)
+            ok = True
+        except Exception as e:
+            self.logger.error("Error prefetching '%s': %s" % (
+                bnch.name, str(e)))
+        finally:
+            self._job_done(bnch, ok)
+
+    def _job_done(self, bnch, ok):
+        with self.lock:
+            self.active.discard((bnch.key, bnch.name))
+            counters = self._get_counters(bnch.key)
+            if ok:
+                counters.loaded += 1
+            else:
+                counters.errors += 1
+        self._start_jobs()
+
+#END
@@ -12,7 +12,7 @@ from collections import OrderedDict
 from ginga.misc import Bunch
 from ginga import GingaPlugin
 from ginga import cmap, imap
-from ginga.util import wcs
+from ginga.util import wcs, querycache
 from ginga.util.six.moves import map, zip
 from ginga.gw import ColorBar, Widgets
 
@@ -42,8 +42,13 @@ class Catalogs(GingaPlugin.LocalPlugin):
 
         prefs = self.fv.get_preferences()
         self.settings = prefs.createCategory('plugin_Catalogs')
+        self.settings.setDefaults(cache_queries=True, cache_max_age=None,
+                                  num_workers=4)
         self.settings.load(onError='silent')
 
+        # runs the queries in the background, built when first needed
+        self.qmgr = None
+
         self.image_server_options = []
         self.image_server_params = None
 
@@ -287,6 +292,10 @@ class Catalogs(GingaPlugin.LocalPlugin):
             self.table.close()
         except:
             pass
+        # results of queries in progress are no longer wanted
+        if self.qmgr is not None:
+            self.qmgr.cancel('image')
+            self.qmgr.cancel('catalog')
         self.gui_up = False
         self.fv.showStatus("")
 
@@ -472,12 +481,51 @@ class Catalogs(GingaPlugin.LocalPlugin):
         self.fitsimage.onscreen_message("Querying image db...",
                                         delay=1.0)
 
-        # Offload this network task to a non-gui thread
-        self.fv.nongui_do(self.getimage, server, params, chname)
+        # Query in the background; this replaces any earlier image query
+        try:
+            srvbank = self.fv.get_ServerBank()
+            srvobj = srvbank.getImageServer(server)
+            qmgr = self.get_query_manager()
+            future = qmgr.get_image(srvobj, self.get_sky_image_path(),
+                                    params, tag='image')
+
+        except Exception as e:
+            errmsg = "Query exception: %s" % (str(e))
+            self.logger.error(errmsg)
+            self.fv.show_error(errmsg)
+            return
+
+        future.add_done_callback(lambda f: self.getimage_done(f, chname))
 
-    def get_sky_image(self, servername, params):
+    def get_query_manager(self):
+        """Returns the manager that runs the queries of this plugin, with
+        a cache of the results in the Ginga folder (if enabled).
+        """
+        if self.qmgr is not None:
+            return self.qmgr
 
-        srvbank = self.fv.get_ServerBank()
+        cache = None
+        if self.settings.get('cache_queries', True):
+            prefs = self.fv.get_preferences()
+            cachedir = os.path.join(prefs.get_baseFolder(), 'catalogs')
+            try:
+                if not os.path.exists(cachedir):
+                    os.makedirs(cachedir)
+                cache = querycache.QueryCache(
+                    os.path.join(cachedir, 'queries.db'), self.logger,
+                    max_age=self.settings.get('cache_max_age', None))
+
+            except (OSError, querycache.QueryCacheError) as e:
+                self.logger.error("Could not open query cache: %s" % (
+                    str(e)))
+
+        self.qmgr = querycache.QueryManager(
+            self.logger, cache=cache,
+            num_workers=self.settings.get('num_workers', 4))
+        return self.qmgr
+
+    def get_sky_image_path(self):
+        """Returns the path of a temporary file for a sky image."""
         #filename = 'sky-' + str(time.time()).replace('.', '-') + '.fits'
         filename = 'sky-' + str(self.dsscnt) + '.fits'
         self.dsscnt = (self.dsscnt + 1) % 5
@@ -487,20 +535,18 @@ class Catalogs(GingaPlugin.LocalPlugin):
         except Exception as e:
             self.logger.error("failed to remove tmp file '%s': %s" % (
                 filepath, str(e)))
-        try:
-            dstpath = srvbank.getImage(servername, filepath, **params)
-            return dstpath
-
-        except Exception as e:
-            errmsg = "Failed to load sky image: %s" % (str(e))
-            raise Exception(errmsg)
+        return filepath
 
-    def getimage(self, server, params, chname):
+    def getimage_done(self, future, chname):
+        # called in a worker thread when an image query is done
+        if future.cancelled():
+            return
         try:
-            fitspath = self.get_sky_image(server, params)
+            fitspath = future.result()
 
         except Exception as e:
-            errmsg = "Query exception: %s" % (str(e))
+            errmsg = "Query exception: Failed to load sky image: %s" % (
+                str(e))
             self.logger.error(errmsg)
             # pop up the error in the GUI under "Errors" tab
             self.fv.gui_do(self.fv.show_error, errmsg)
@@ -534,22 +580,27 @@ class Catalogs(GingaPlugin.LocalPlugin):
         self.reset()
         self.fitsimage.onscreen_message("Querying catalog db...",
                                         delay=1.0)
-        # Offload this network task to a non-gui thread
-        self.fv.nongui_do(self.getcatalog, server, params, obj)
-
-    def _get_catalog(self, srvbank, key, params):
+        # Query in the background; this replaces any earlier catalog query
         try:
-            starlist, info = srvbank.getCatalog(key, None, **params)
-            return starlist, info
+            srvbank = self.fv.get_ServerBank()
+            srvobj = srvbank.getCatalogServer(server)
+            qmgr = self.get_query_manager()
+            future = qmgr.search_catalog(srvobj, params, tag='catalog')
 
         except Exception as e:
-            errmsg ="Failed to load catalog: %s" % (str(e))
-            raise Exception(errmsg)
+            errmsg = "Query exception: %s" % (str(e))
+            self.logger.error(errmsg)
+            self.fv.show_error(errmsg)
+            return
+
+        future.add_done_callback(lambda f: self.getcatalog_done(f, obj))
 
-    def getcatalog(self, server, params, obj):
+    def getcatalog_done(self, future, obj):
+        # called in a worker thread when a catalog query is done
+        if future.cancelled():
+            return
         try:
-            srvbank = self.fv.get_ServerBank()
-            starlist, info = self._get_catalog(srvbank, server, params)
+            starlist, info = future.result()
             self.logger.debug("starlist=%s" % str(starlist))
 
             starlist = self.filter_results(starlist, obj)
@@ -558,7 +609,8 @@ class Catalogs(GingaPlugin.LocalPlugin):
             self.fv.gui_do(self.update_catalog, starlist, info)
 
         except Exception as e:
-            errmsg = "Query exception: %s" % (str(e))
+            errmsg = "Query exception: Failed to load catalog: %s" % (
+                str(e))
             self.logger.error(errmsg)
             # pop up the error in the GUI under "Errors" tab
             self.fv.gui_do(self.fv.show_error, errmsg)
@@ -579,14 +631,11 @@ class Catalogs(GingaPlugin.LocalPlugin):
         if filter_obj:
             num_cat = len(starlist)
             self.logger.debug("number of incoming stars=%d" % (num_cat))
-            # TODO: vectorize wcs lookup
-            coords = [ image.radectopix(star['ra_deg'], star['dec_deg'])
-                       for star in starlist ]
-            arr = numpy.array(coords)
-            self.logger.debug("arr.shape = %s" % str(arr.shape))
+            x_arr, y_arr = self.get_star_positions(starlist, image)
+            self.logger.debug("arr.shape = %s" % str(x_arr.shape))
 
             # vectorized test for inclusion in shape
-            res = filter_obj.contains_arr(arr.T[0], arr.T[1])
+            res = filter_obj.contains_arr(x_arr, y_arr)
             self.logger.debug("res.shape = %s" % str(res.shape))
 
             stars = [ starlist[i] for i in range(num_cat) if res[i] ]
@@ -608,11 +657,24 @@ class Catalogs(GingaPlugin.LocalPlugin):
         #self.clearAll()
         self.table.clear()
 
-    def plot_star(self, obj, image=None):
+    def get_star_positions(self, starlist, image):
+        """Returns arrays of the data coordinates of the stars in
+        `starlist`, converted with a single call into the WCS.
+        """
+        ra_arr = numpy.array([star['ra_deg'] for star in starlist],
+                             dtype=numpy.float64)
+        dec_arr = numpy.array([star['dec_deg'] for star in starlist],
+                              dtype=numpy.float64)
+        return image.radectopix_arr(ra_arr, dec_arr)
+
+    def plot_star(self, obj, image=None, pos=None):
 
         if not image:
             image = self.fitsimage.get_image()
-        x, y = image.radectopix(obj['ra_deg'], obj['dec_deg'])
+        if pos is None:
+            x, y = image.radectopix(obj['ra_deg'], obj['dec_deg'])
+        else:
+            x, y = pos
         # TODO: auto-pick a decent radius
         radius = 10
         color = self.table.get_color(obj)
@@ -674,8 +736,9 @@ class Catalogs(GingaPlugin.LocalPlugin):
         subset = self.table.get_subset_from_starlist(i, i+length)
 
         with self.fitsimage.suppress_redraw:
-            for obj in subset:
-                self.plot_star(obj, image=image)
+            x_arr, y_arr = self.get_star_positions(subset, image)
+            for obj, x, y in zip(subset, x_arr, y_arr):
+                self.plot_star(obj, image=image, pos=(x, y))
 
             self.update_selected(redraw=False)
 
@@ -7,7 +7,7 @@
 import numpy
 
 from ginga.gw import Widgets, Plot
-from ginga import GingaPlugin, colors
+from ginga import GingaPlugin, colors, trcalc
 from ginga.util.six.moves import map, zip
 from ginga.canvas.coordmap import OffsetMapper
 from ginga.util import plots
@@ -527,11 +527,18 @@ Keyboard shortcuts: press 'h' for a full horizontal cut and 'j' for a full verti
         else:
             return self._get_perpendicular_points(obj, x, y, r)
 
-    def get_orthogonal_array(self, image, obj, x, y, r):
-        x1, y1, x2, y2 = self.get_orthogonal_points(obj, x, y, r)
-        values = image.get_pixels_on_line(int(x1), int(y1),
-                                          int(x2), int(y2))
-        return numpy.array(values)
+    def get_orthogonal_vector(self, obj):
+        # unit vector in the direction across the width of the cut
+        if self.widthtype == 'x':
+            return (1.0, 0.0)
+        elif self.widthtype == 'y':
+            return (0.0, 1.0)
+        dx = float(obj.x1 - obj.x2)
+        dy = float(obj.y1 - obj.y2)
+        dist = numpy.sqrt(dx*dx + dy*dy)
+        if dist == 0.0:
+            return (1.0, 0.0)
+        return (dy / dist, -dx / dist)
 
     def _plotpoints(self, obj, color):
 
@@ -539,30 +546,19 @@ Keyboard shortcuts: press 'h' for a full horizontal cut and 'j' for a full verti
 
         # Get points on the line
         if obj.kind == 'line':
+            xs, ys = trcalc.get_line_points(obj.x1, obj.y1, obj.x2, obj.y2)
             if self.widthtype == 'none':
-                points = image.get_pixels_on_line(int(obj.x1), int(obj.y1),
-                                                  int(obj.x2), int(obj.y2))
+                points = image.sample_points(xs, ys)
             else:
-                coords = image.get_pixels_on_line(int(obj.x1), int(obj.y1),
-                                                  int(obj.x2), int(obj.y2),
-                                                  getvalues=False)
-
-                points = []
-                for x, y in coords:
-                    arr = self.get_orthogonal_array(image, obj, x, y,
-                                                    self.width_radius)
-                    val = numpy.nansum(arr)
-                    points.append(val)
+                # sum the parallel lines across the width of the cut
+                ux, uy = self.get_orthogonal_vector(obj)
+                pxs, pys = trcalc.get_parallel_points(xs, ys, ux, uy,
+                                                      self.width_radius)
+                points = numpy.nansum(image.sample_points(pxs, pys), axis=0)
 
         elif obj.kind in ('path', 'freepath'):
-            points = []
-            x1, y1 = obj.points[0]
-            for x2, y2 in obj.points[1:]:
-                pts = image.get_pixels_on_line(int(x1), int(y1),
-                                               int(x2), int(y2))
-                # don't repeat last point when adding next segment
-                points.extend(pts[:-1])
-                x1, y1 = x2, y2
+            xs, ys = trcalc.get_polyline_points(obj.points)
+            points = image.sample_points(xs, ys)
 
         elif obj.kind == 'beziercurve':
             points = obj.get_pixels_on_curve(image)
@@ -592,33 +588,20 @@ Keyboard shortcuts: press 'h' for a full horizontal cut and 'j' for a full verti
 
         # Get points on the line
         if obj.kind == 'line':
-            coords = image.get_pixels_on_line(int(obj.x1), int(obj.y1),
-                                              int(obj.x2), int(obj.y2),
-                                              getvalues=False)
+            xs, ys = trcalc.get_line_points(obj.x1, obj.y1, obj.x2, obj.y2)
         elif obj.kind in ('path', 'freepath'):
-            coords = []
-            x1, y1 = obj.points[0]
-            for x2, y2 in obj.points[1:]:
-                pts = image.get_pixels_on_line(int(x1), int(y1),
-                                               int(x2), int(y2),
-                                               getvalues=False)
-                # don't repeat last point when adding next segment
-                coords.extend(pts[:-1])
-                x1, y1 = x2, y2
+            xs, ys = trcalc.get_polyline_points(obj.points)
         elif obj.kind == 'beziercurve':
-            coords = obj.get_pixels_on_curve(image, getvalues=False)
-            # Exclude NaNs
-            coords = [c for c in coords if not numpy.any(numpy.isnan(c))]
+            xs, ys = numpy.array(obj.get_points_on_curve(image)).reshape(-1, 2).T
 
         shape = image.shape
         # Exclude points outside boundaries
-        coords = [(coord[0], coord[1]) for coord in coords
-                  if (0 <= coord[0] < shape[1] and 0 <= coord[1] < shape[0])]
-        if not coords:
+        inside = (0 <= xs) & (xs < shape[1]) & (0 <= ys) & (ys < shape[0])
+        if not numpy.any(inside):
             self.redraw_slit('clear')
             return
 
-        return numpy.array(coords)
+        return numpy.array((xs[inside], ys[inside])).T
 
     def get_slit_data(self, coords):
         image = self.fitsimage.get_image()
@@ -638,7 +621,7 @@ Keyboard shortcuts: press 'h' for a full horizontal cut and 'j' for a full verti
             axes_slice[sa] = coords[:, i]
         axes_slice[selected_axis] = slice(None, None, None)
 
-        self.slit_data = data[axes_slice]
+        self.slit_data = data[tuple(axes_slice)]
 
     def _plot_slit(self):
         if not self.selected_axis:
@@ -748,6 +731,7 @@ Keyboard shortcuts: press 'h' for a full horizontal cut and 'j' for a full verti
             aline.crdmap = crdmap
             aline.editable = False
             obj.objects.append(aline)
+        obj.geometry_changed()
 
     def _create_cut_obj(self, count, cuts_obj, color='cyan'):
         text = "cuts%d" % (count)
@@ -53,6 +53,29 @@ class Debug(GingaPlugin.GlobalPlugin):
         vbox.add_widget(self.entry, stretch=0)
         self.entry.add_callback('activated', self.command_cb)
 
+        # rendering profile of the viewer with the focus
+        fr = Widgets.Frame("Render profile")
+        vbox2 = Widgets.VBox()
+        tw = Widgets.TextArea(wrap=False, editable=False)
+        tw.set_font(self.msgFont)
+        self.w.profile_text = tw
+        vbox2.add_widget(tw, stretch=1)
+
+        captions = (('Profile rendering', 'checkbutton',
+                     'Refresh', 'button', 'Clear', 'button'),
+                    )
+        w, b = Widgets.build_info(captions)
+        self.w.update(b)
+        b.profile_rendering.set_tooltip("Time the stages of rendering in "
+                                        "the focused viewer")
+        b.profile_rendering.add_callback('activated', self.set_profile_cb)
+        b.refresh.set_tooltip("Show the timings of recent redraws (msec)")
+        b.refresh.add_callback('activated', lambda w: self.show_profile())
+        b.clear.add_callback('activated', self.clear_profile_cb)
+        vbox2.add_widget(w, stretch=0)
+        fr.set_widget(vbox2)
+        vbox.add_widget(fr, stretch=1)
+
         btns = Widgets.HBox()
         btns.set_spacing(4)
         btns.set_border_width(4)
@@ -91,6 +114,25 @@ class Debug(GingaPlugin.GlobalPlugin):
         plname = self.w.global_plugin.get_text().strip()
         self.reloadLocalPlugin(plname)
 
+    def set_profile_cb(self, w, tf):
+        fitsimage = self.fv.getfocus_fitsimage()
+        fitsimage.enable_profiling(tf)
+        self.show_profile()
+
+    def clear_profile_cb(self, w):
+        fitsimage = self.fv.getfocus_fitsimage()
+        fitsimage.profile.clear()
+        self.show_profile()
+
+    def show_profile(self):
+        fitsimage = self.fv.getfocus_fitsimage()
+        if not fitsimage.profile.enabled:
+            self.w.profile_text.set_text("Profiling is off for '%s'" % (
+                fitsimage.name))
+            return
+        self.w.profile_text.set_text("%s\n\n%s" % (
+            fitsimage.name, fitsimage.profile.get_report()))
+
     def command(self, cmdstr):
         # Evaluate command
         try:
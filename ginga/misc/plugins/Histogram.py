@@ -242,11 +242,13 @@ class Histogram(GingaPlugin.LocalPlugin):
         if z is not None:
             data = image.get_data()
             data = data[y1:y2, x1:x2, z]
-        else:
-            tup = image.cutout_adjust(x1, y1, x2, y2)
-            data = tup[0]
+            return self.autocuts.calc_histogram(data, pct=pct,
+                                                numbins=numbins)
 
-        return self.autocuts.calc_histogram(data, pct=pct, numbins=numbins)
+        # use the cached statistics of the image
+        data, x1, y1, x2, y2 = image.cutout_adjust(x1, y1, x2, y2)
+        return self.autocuts.calc_histogram_image(image, x1, y1, x2, y2,
+                                                  pct=pct, numbins=numbins)
 
     def redo(self):
         if self.histtag is None:
@@ -18,9 +18,9 @@ import threading
 import logging
 import time
 import struct
-import array
 import re
 import string
+import numpy
 
 from ginga.misc import Bunch
 import ginga.util.six as six
@@ -589,10 +589,9 @@ Where   nbytes | NB  = number of bytes expected or written
             if len(data) != pkt.nbytes:
                 self.logger.warn("buffer length/packet size mismatch: %d != %d" % (
                         len(data), pkt.nbytes))
-            #data.reverse()
             #self.logger.debug("DATA=%s" % str(data))
-            buf = data.tostring()
-            pkt.dataout.write(buf)
+            # write straight from the framebuffer memory
+            pkt.dataout.write(memoryview(numpy.ascontiguousarray(data)))
             pkt.dataout.flush()
             self.logger.debug("end memory read")
 
@@ -603,27 +602,23 @@ Where   nbytes | NB  = number of bytes expected or written
             self.logger.debug("data bytes=%d needs_update=%s" % (
                 pkt.nbytes, self.needs_update))
             if (fb.width is not None) and (fb.height is not None):
-                if not self.needs_update:
-                    #del fb.buffer
-                    #fb.buffer = array.array('B', ' ' * fb.width * fb.height)
-                    if len(fb.buffer) != fb.width * fb.height:
-                        fb.buffer = array.array('B', '\000' * fb.width * fb.height)
-                        #self.needs_update = True
+                # (re)allocates only if the frame size changed
+                fb.alloc(fb.width, fb.height)
                 start = self.x + self.y * fb.width
-                end = start + pkt.nbytes
-                fb.buffer[start:end] = array.array('B', pkt.datain.read(pkt.nbytes))
+                end = min(start + pkt.nbytes, len(fb.buffer))
+                # read the packet straight into the framebuffer
+                t_bytes = read_into(pkt.datain, fb.buffer[start:end])
+                fb.mark_dirty(start, start + t_bytes)
+                if t_bytes < pkt.nbytes:
+                    self.logger.warn("buffer length/packet size mismatch: %d != %d" % (
+                        t_bytes, pkt.nbytes))
+                    pkt.datain.read(pkt.nbytes - t_bytes)
             else:
                 self.logger.warn("uninitialized framebuffer frame=%d" % (
                         self.frame))
-                if not self.needs_update:
-                    # init the framebuffer
-                    fb.buffer.fromstring(pkt.datain.read(pkt.nbytes))
-                    fb.buffer.reverse()
-                    #self.needs_update = True
-                else:
-                    data = array.array('B', pkt.datain.read(pkt.nbytes))
-                    data.reverse()
-                    fb.buffer += data
+                data = numpy.empty(pkt.nbytes, dtype=numpy.uint8)
+                t_bytes = read_into(pkt.datain, data)
+                fb.append(data[:t_bytes][::-1])
 
             self.needs_update = True
             self.logger.debug("end memory write")
@@ -964,10 +959,61 @@ class framebuffer(object):
         self.image = None           # the image data itself
         self.bitmap = None          # the image bitmap
         self.buffer = None          # used for screen updates
+        self.dirty = None           # (y1, y2) rows written since last
+                                    # display, or None if unknown
         self.zoom = 1.0             # zoom level
         self.ct = coord_tran()
         self.chname = None
 
+    def alloc(self, width, height):
+        """Make sure the buffer is a (flat) uint8 array of width*height
+        pixels, allocating a new (zeroed) one only if the size changed.
+        """
+        size = width * height
+        if (self.buffer is None) or (len(self.buffer) != size):
+            self.buffer = numpy.zeros(size, dtype=numpy.uint8)
+            # the whole frame needs to be redisplayed
+            self.image = None
+            self.dirty = None
+        elif not self.buffer.flags.c_contiguous:
+            # packets are read straight into the buffer memory
+            self.buffer = numpy.ascontiguousarray(self.buffer)
+
+    def append(self, data):
+        """Append `data` to a buffer of unknown size."""
+        if self.buffer is None:
+            self.buffer = numpy.zeros(0, dtype=numpy.uint8)
+        self.buffer = numpy.concatenate((self.buffer, data))
+        self.image = None
+        self.dirty = None
+
+    def mark_dirty(self, start, end):
+        """Record that the buffer was written between offsets `start`
+        and `end` (exclusive).
+        """
+        if end <= start:
+            return
+        y1, y2 = start // self.width, (end - 1) // self.width
+        if self.dirty is not None:
+            y1, y2 = min(y1, self.dirty[0]), max(y2, self.dirty[1])
+        self.dirty = (y1, y2)
+
+
+def read_into(f, buf):
+    """Read from file-like object `f` straight into the (writable,
+    contiguous) array `buf` until it is full or the stream ends.
+    Returns the number of bytes read.
+    """
+    view = memoryview(buf).cast('B')
+    nbytes = len(view)
+    t_bytes = 0
+    while t_bytes < nbytes:
+        n = f.readinto(view[t_bytes:])
+        if not n:
+            break
+        t_bytes += n
+    return t_bytes
+
 
 # utility routines
 def wcs_pix_transform (ct, i, format=0):
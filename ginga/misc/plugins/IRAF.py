@@ -35,7 +35,6 @@ if six.PY2:
     import Queue
 else:
     import queue as Queue
-import array
 import numpy
 import time
 
@@ -304,7 +303,7 @@ class IRAF(GingaPlugin.GlobalPlugin):
 
         # this is just a placeholder so that IIS_RequestHandler will
         # report something in this buffer
-        fb.buffer = array.array('B', ' ')
+        fb.buffer = numpy.zeros(1, dtype=numpy.uint8)
 
         # Update IRAF "wcs" info so that IRAF can load this image
 
@@ -378,7 +377,8 @@ class IRAF(GingaPlugin.GlobalPlugin):
         fb.image = None
         fb.bitmap = None
         fb.zoom = 1.0
-        fb.buffer = array.array('B')
+        fb.buffer = numpy.zeros(0, dtype=numpy.uint8)
+        fb.dirty = None
         fb.ct = iis.coord_tran()
         #fb.chname = None
         return fb
@@ -405,7 +405,9 @@ class IRAF(GingaPlugin.GlobalPlugin):
         self.current_frame = frame
 
         if reverse:
-            fb.buffer.reverse()
+            # keep the buffer contiguous, so that packets can still be
+            # read straight into it
+            fb.buffer = numpy.ascontiguousarray(fb.buffer[::-1])
 
         # frames are indexed from 1 in IRAF
         chname = fb.chname
@@ -413,22 +415,44 @@ class IRAF(GingaPlugin.GlobalPlugin):
             chname = 'Frame%d' % (frame+1)
             fb.chname = chname
 
+        dirty, fb.dirty = fb.dirty, None
+        try:
+            # framebuffer as a 2D array (no copy)
+            dims = (height, width)
+            fb_data = fb.buffer[:width*height].reshape(dims)
+
+        except Exception as e:
+            errmsg = "Error creating image data for '%s': %s" % (
+                chname, str(e))
+            self.logger.error(errmsg)
+            raise GingaPlugin.PluginError(errmsg)
+
+        # extract path from ref
+        host, path = self.parse_ref(fb.ct.ref)
+
+        image = fb.image
+        if ((image is not None) and (dirty is not None) and
+            (image.get_data().shape == dims) and
+            self.is_current_image(chname, image)):
+            # only the rows that IRAF wrote since the last update need
+            # to be copied into the displayed image
+            self.logger.debug("update rows %d-%d of %s" % (
+                dirty[0], dirty[1], chname))
+            y1, y2 = dirty
+            # Image comes in from IRAF flipped for screen display
+            rows = numpy.flipud(fb_data[y1:y2+1]).copy()
+            self.fv.gui_do(self._gui_update_rows, image, rows,
+                           height-1-y2, fb.ct, path, host)
+            return
+
         self.logger.debug("display to %s" %(chname))
 
         try:
-            data = fb.buffer
-            byteswap = False
-            dims = (fb.height, fb.width)
-            dtype = numpy.uint8
             metadata = {}
 
             image = IRAF_AstroImage(logger=self.logger)
-            #image.load_buffer(fb.buffer, dims, dtype, byteswap=byteswap,
-            #                  metadata=metadata)
-            data = numpy.fromstring(fb.buffer, dtype=dtype)
-            data = data.reshape(dims)
             # Image comes in from IRAF flipped for screen display
-            data = numpy.flipud(data)
+            data = numpy.flipud(fb_data).copy()
             image.set_data(data, metadata=metadata)
             # Save coordinate transform info
             image.set(ct=fb.ct)
@@ -436,12 +460,6 @@ class IRAF(GingaPlugin.GlobalPlugin):
             # make up a name (is there a protocol slot for the name?)
             fitsname = str(time.time())
 
-            # extract path from ref
-            oldref = fb.ct.ref
-            items = oldref.split('!')
-            host = items[0]
-            path = '!'.join(items[1:])
-
             image.set(name=fitsname, path=path, host=host)
             #image.update_keywords(header)
 
@@ -452,9 +470,34 @@ class IRAF(GingaPlugin.GlobalPlugin):
             self.logger.error(errmsg)
             raise GingaPlugin.PluginError(errmsg)
 
+        fb.image = image
+
         # Do the GUI bits as the GUI thread
         self.fv.gui_do(self._gui_display_image, fitsname, image, chname)
 
+    def parse_ref(self, ref):
+        """Split an IRAF image reference into (host, path)."""
+        items = ref.split('!')
+        host = items[0]
+        path = '!'.join(items[1:])
+        return (host, path)
+
+    def is_current_image(self, chname, image):
+        """Return True if `image` is the image shown in channel `chname`."""
+        if not self.fv.has_channel(chname):
+            return False
+        chinfo = self.fv.get_channelInfo(chname)
+        return chinfo.fitsimage.get_image() is image
+
+    def _gui_update_rows(self, image, rows, y1, ct, path, host):
+        # copy rows from the framebuffer into the displayed image
+        data = image.get_data()
+        ht, wd = rows.shape
+        data[y1:y1+ht] = rows
+        image.region_modified(0, y1, wd, y1+ht)
+        image.set(ct=ct, path=path, host=host)
+        image.make_callback('modified')
+
     def _gui_display_image(self, fitsname, image, chname):
 
         if not self.fv.has_channel(chname):
@@ -14,7 +14,7 @@ from ginga.gw import Widgets
 from ginga.misc import Future, Bunch
 from ginga import GingaPlugin
 from ginga.util.videosink import VideoSink
-from ginga.util import iohelper
+from ginga.util import iohelper, playback
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -57,11 +57,18 @@ class MultiDim(GingaPlugin.LocalPlugin):
         self.play_min_sec = 0.1
         self.timer = fv.get_timer()
         self.timer.set_callback('expired', self.play_next)
+        self._isplaying = False
+        # pre-renders slices for playback (see play_start)
+        self.player = None
+        self.player_key = None
+        self._frame_pending = False
+        self._showing_frame = False
 
         # Load plugin preferences
         prefs = self.fv.get_preferences()
         self.settings = prefs.createCategory('plugin_MultiDim')
-        self.settings.setDefaults(auto_start_naxis=False)
+        self.settings.setDefaults(auto_start_naxis=False,
+                                  play_buffer_size=16, play_num_workers=2)
         self.settings.load(onError='silent')
 
         # register for new image notification in this channel
@@ -207,6 +214,9 @@ class MultiDim(GingaPlugin.LocalPlugin):
 
     def set_naxis_cb(self, w, idx, n):
         #idx = int(w.get_value()) - 1
+        if self._showing_frame:
+            # slider moved by playback
+            return
         self.set_naxis(idx, n)
 
     def build_naxis(self, dims):
@@ -465,14 +475,7 @@ class MultiDim(GingaPlugin.LocalPlugin):
             image.set_naxispath(self.naxispath)
             self.logger.debug("NAXIS%d slice %d loaded." % (n+1, idx+1))
 
-
-
-            if self.play_indices:
-                text = self.play_indices
-                text[m]= idx
-            else:
-                text = idx
-            self.w.slice.set_text(str(text))
+            self.set_slice_text(idx, m)
 
         except Exception as e:
             errmsg = "Error loading NAXIS%d slice %d: %s" % (
@@ -480,21 +483,139 @@ class MultiDim(GingaPlugin.LocalPlugin):
             self.logger.error(errmsg)
             self.fv.error(errmsg)
 
+    def set_slice_text(self, idx, m):
+        if self.play_indices:
+            text = self.play_indices
+            text[m]= idx
+        else:
+            text = idx
+        self.w.slice.set_text(str(text))
+
+    def get_player_key(self):
+        # The geometry and cut levels that slices are pre-rendered with;
+        # if they change, the pre-rendered slices are no good.
+        canvas_img = self.fitsimage.get_canvas_image()
+        geometry = canvas_img.get_cutout_geometry(self.fitsimage)
+        if geometry is None:
+            return None
+        return (geometry, self.fitsimage.get_cut_levels())
+
+    def make_player(self, idx):
+        """Make and start a player that pre-renders the slices along the
+        play axis with the cutout, scale and cut levels currently on
+        display, starting at slice `idx` (0-based).  Returns None if
+        that is not possible, e.g. if the image is not on display.
+        """
+        image = self.fitsimage.get_image()
+        key = self.get_player_key()
+        if (image is None) or (key is None):
+            return None
+
+        (x1, y1, x2, y2, scale_x, scale_y), (loval, hival) = key
+        vmax = self.fitsimage.get_rgbmap().get_hash_size() - 1
+        renderer = playback.SliceRenderer(image.get_mddata(),
+                                          self.naxispath, self.play_axis,
+                                          self.fitsimage.autocuts,
+                                          loval, hival, vmax=vmax,
+                                          bbox=(x1, y1, x2, y2),
+                                          scale=(scale_x, scale_y))
+        player = playback.SlicePlayer(
+            self.logger, renderer.render, renderer.num_slices,
+            interval=self.play_int_sec,
+            buffer_size=self.settings.get('play_buffer_size', 16),
+            num_workers=self.settings.get('play_num_workers', 2))
+        player.start(idx)
+        self.player_key = key
+        return player
+
+    def close_player(self):
+        if self.player is not None:
+            self.player.close()
+            self.logger.debug("playback: %d frames shown, %d dropped" % (
+                self.player.num_shown, self.player.num_dropped))
+            self.player = None
+
     def play_start(self):
+        if self._isplaying:
+            return
         self._isplaying = True
+        self._frame_pending = False
+        try:
+            self.player = self.make_player(self.play_idx - 1)
+
+        except Exception as e:
+            self.logger.warn("Can't pre-render slices: %s" % (str(e)))
+            self.player = None
         self.play_next(self.timer)
 
     def play_next(self, timer):
-        if self._isplaying:
-            time_start = time.time()
+        if not self._isplaying:
+            return
+
+        time_start = time.time()
+        player = self.player
+        if player is None:
+            # step through the slices
             deadline = time_start + self.play_int_sec
             self.next_slice()
             #self.fv.update_pending(0.001)
             delta = max(deadline - time.time(), 0.001)
             self.timer.set(delta)
+            return
+
+        # Don't queue up frames faster than the GUI shows them; the
+        # player drops frames that are not taken in time.
+        if not self._frame_pending:
+            try:
+                res = player.get_due_frame(time_start)
+
+            except Exception as e:
+                self.logger.error("Error rendering slice: %s" % (str(e)))
+                self.fv.gui_do(self.play_stop)
+                return
+
+            if res is not None:
+                self._frame_pending = True
+                idx, frame = res
+                self.fv.gui_do(self.show_frame, player, idx, frame)
+
+        self.timer.set(player.get_wait())
+
+    def show_frame(self, player, idx, frame):
+        """Show slice `idx`, pre-rendered by `player`, in the viewer.
+        Called in the GUI thread.
+        """
+        self._frame_pending = False
+        if (not self._isplaying) or (player is not self.player):
+            return
+
+        key = self.get_player_key()
+        if key != self.player_key:
+            # view or cut levels changed: start over with new ones,
+            # from this slice
+            self.close_player()
+            self.player = self.make_player(idx)
+            return
+
+        self.play_idx = idx + 1
+        canvas_img = self.fitsimage.get_canvas_image()
+        canvas_img.set_prergb(self.fitsimage, frame)
+
+        n = self.play_axis
+        self._showing_frame = True
+        try:
+            self.w['choose_naxis%d' % (n+1)].set_value(idx + 1)
+        finally:
+            self._showing_frame = False
+        self.set_slice_text(idx, n - 2)
 
     def play_stop(self):
         self._isplaying = False
+        if self.player is not None:
+            self.close_player()
+            if self.gui_up:
+                # make the image data match the slice on display
+                self.set_naxis(self.play_idx, self.play_axis)
 
     def first_slice(self):
         play_idx = 1
@@ -519,6 +640,8 @@ class MultiDim(GingaPlugin.LocalPlugin):
     def play_int_cb(self, w, val):
         # force at least play_min_sec, otherwise playback is untenable
         self.play_int_sec = max(self.play_min_sec, val)
+        if self.player is not None:
+            self.player.set_interval(self.play_int_sec)
 
     def prep_hdu_menu(self, w, info):
         # clear old TOC
@@ -628,17 +751,29 @@ class MultiDim(GingaPlugin.LocalPlugin):
             self.save_movie(start, end, target)
 
     def save_movie(self, start, end, target_file):
+        """Write slices `start`..`end`-1 along the play axis to a movie,
+        scaled to 8 bits between the current cut levels.  The slices are
+        rendered ahead on worker threads, as for playback, but without a
+        clock, so this runs as fast as the slices can be rendered.
+        """
         image = self.fitsimage.get_image()
         loval, hival = self.fitsimage.get_cut_levels()
-        data = np.array(image.get_mddata()).clip(loval, hival)
-
-        # http://stackoverflow.com/questions/7042190/plotting-directly-to-movie-with-numpy-and-mencoder
-        data_rescaled = ((data - loval) * 255 / (hival - loval)).astype(np.uint8, copy=False)
+        renderer = playback.SliceRenderer(image.get_mddata(),
+                                          self.naxispath, self.play_axis,
+                                          self.fitsimage.autocuts,
+                                          loval, hival, vmax=255)
+        player = playback.SlicePlayer(
+            self.logger, renderer.render, renderer.num_slices,
+            buffer_size=self.settings.get('play_buffer_size', 16),
+            num_workers=self.settings.get('play_num_workers', 2))
 
         W, H = image.get_data_size()
-        with self.video_writer(VideoSink((H, W), target_file)) as video:
-            for i in xrange(start, end):
-                video.write(np.flipud(data_rescaled[i]))
+        try:
+            with self.video_writer(VideoSink((H, W), target_file)) as video:
+                for i, frame in player.iter_frames(start, end):
+                    video.write(np.flipud(frame).astype(np.uint8))
+        finally:
+            player.close()
 
         self.fv.showStatus("Successfully saved movie")
 
@@ -838,18 +838,13 @@ class Pick(GingaPlugin.LocalPlugin):
                 if num_peaks == 0:
                     raise Exception("Cannot find bright peaks")
 
-                def cb_fn(obj):
-                    self.pgs_cnt += 1
-                    pct = float(self.pgs_cnt) / num_peaks
-                    self.fv.gui_do(self.update_progress, pct)
-
-                # Evaluate those peaks
+                # Evaluate those peaks (all at once)
                 self.update_status("Evaluating %d bright peaks..." % (
                     num_peaks))
                 objlist = self.iqcalc.evaluate_peaks(peaks, data,
                                                      fwhm_radius=self.radius,
-                                                     cb_fn=cb_fn,
                                                      ev_intr=self.ev_intr)
+                self.fv.gui_do(self.update_progress, 1.0)
 
                 num_candidates = len(objlist)
                 if num_candidates == 0:
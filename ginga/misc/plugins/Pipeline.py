@@ -25,7 +25,8 @@ class Pipeline(GingaPlugin.LocalPlugin):
         # Load preferences
         prefs = self.fv.get_preferences()
         self.settings = prefs.createCategory('plugin_Pipeline')
-        self.settings.setDefaults(num_threads=4)
+        self.settings.setDefaults(num_threads=4, stack_method='median',
+                                  num_workers=4, max_band_mb=256)
         self.settings.load(onError='silent')
 
         # For building up an image stack
@@ -234,10 +235,20 @@ class Pipeline(GingaPlugin.LocalPlugin):
         self.update_stack_gui()
         self.fv.add_image(name, image, chname=chname)
 
+    def update_progress(self, frac):
+        self.fv.gui_do(self.w.eval_pgs.set_value, frac)
+
+    def get_stack_params(self):
+        # parameters for combining the image stack (see ginga.util.stack)
+        return dict(method=self.settings.get('stack_method', 'median'),
+                    num_workers=self.settings.get('num_workers', 4),
+                    max_band_mb=self.settings.get('max_band_mb', 256),
+                    logger=self.logger, progress_cb=self.update_progress)
+
     # BIAS
 
     def _make_bias(self):
-        image = dp.make_bias(self.imglist)
+        image = dp.make_bias(self.imglist, **self.get_stack_params())
         self.imglist = []
         self.fv.gui_do(self.show_result, image)
         self.update_status("Made bias image.")
@@ -264,9 +275,9 @@ class Pipeline(GingaPlugin.LocalPlugin):
     # FLAT FIELDING
 
     def _make_flat_field(self):
-        result = dp.make_flat(self.imglist)
+        result = dp.make_flat(self.imglist, **self.get_stack_params())
         self.imglist = []
-        self.show_result(result)
+        self.fv.gui_do(self.show_result, result)
         self.update_status("Made flat field.")
 
     def make_flat_cb(self, w):
@@ -72,6 +72,19 @@ Examples:
  Change intensity map:
  $ grc channel FOO set_intensity_map neg
 
+Images can also be sent over a binary socket protocol on the stream
+port (by default the RC port + 1), which avoids the base64 encoding of
+load_buffer and load_fits_buffer.  From the command line:
+
+ $ grc stream_fits FOO_1 FOO /home/eric/testdata/SPCAM/SUPA01118797.fits
+
+and from Python (see ginga.util.grc):
+
+ client = grc.RemoteClient('localhost', 9000)
+ client.stream_image('frame1', 'FOO', data, compress='zlib')
+
+The rate at which images are ingested is shown in the plugin GUI.
+
 """
 import sys
 import numpy
@@ -98,8 +111,12 @@ class RC(GingaPlugin.GlobalPlugin):
         self.port = 9000
         # If blank, listens on all interfaces
         self.host = 'localhost'
+        # What port to listen for streamed images
+        self.stream_port = self.port + 1
+        self.stream_server = None
 
         self.ev_quit = fv.ev_quit
+        self.gui_up = False
 
     def build_gui(self, container):
         vbox = Widgets.VBox()
@@ -109,6 +126,8 @@ class RC(GingaPlugin.GlobalPlugin):
         captions = [
             ("Addr:", 'label', "Addr", 'llabel', 'Restart', 'button'),
             ("Set Addr:", 'label', "Set Addr", 'entry'),
+            ("Stream Port:", 'label', "Stream Port", 'llabel'),
+            ("Last Ingest:", 'label', "Last Ingest", 'llabel'),
             ]
         w, b = Widgets.build_info(captions)
         self.w.update(b)
@@ -123,6 +142,9 @@ class RC(GingaPlugin.GlobalPlugin):
         b.set_addr.set_tooltip("Set address to run remote control server")
         b.set_addr.add_callback('activated', self.set_addr_cb)
 
+        b.stream_port.set_text(str(self.stream_port))
+        b.last_ingest.set_text('')
+
         fr.set_widget(w)
         vbox.add_widget(fr, stretch=0)
 
@@ -140,7 +162,7 @@ class RC(GingaPlugin.GlobalPlugin):
         vbox.add_widget(btns)
 
         container.add_widget(vbox, stretch=1)
-
+        self.gui_up = True
 
     def start(self):
         self.robj = GingaWrapper(self.fv, self.logger)
@@ -149,12 +171,37 @@ class RC(GingaPlugin.GlobalPlugin):
                                        ev_quit=self.fv.ev_quit)
         self.server.start(thread_pool=self.fv.get_threadPool())
 
+        self.stream_server = grc.ImageStreamServer(self.ingest_cb,
+                                                   host=self.host,
+                                                   port=self.stream_port,
+                                                   ev_quit=self.fv.ev_quit,
+                                                   logger=self.logger,
+                                                   stats_fn=self.stats_cb)
+        self.stream_server.start(thread_pool=self.fv.get_threadPool())
+
     def stop(self):
         self.server.stop()
+        if self.stream_server is not None:
+            self.stream_server.stop()
+            self.stream_server = None
+
+    def ingest_cb(self, hdr, data):
+        self.robj.ingest(hdr, data)
+
+    def stats_cb(self, hdr, stats):
+        # called in a non-gui thread after each ingest
+        self.fv.gui_do(self.update_ingest_rate, hdr, stats)
+
+    def update_ingest_rate(self, hdr, stats):
+        if not self.gui_up:
+            return
+        self.w.last_ingest.set_text("%s: %.1f MB in %.3f s (%.1f MB/s)" % (
+            hdr.get('imname', ''), stats['nbytes'] / 1.0e6,
+            stats['time_sec'], stats['rate_mbps']))
 
     def restart_cb(self, w):
-        # restart server
-        self.server.stop()
+        # restart servers
+        self.stop()
         self.start()
 
     def set_addr_cb(self, w):
@@ -163,10 +210,13 @@ class RC(GingaPlugin.GlobalPlugin):
         host, port = addr.split(':')
         self.host = host
         self.port = int(port)
+        self.stream_port = self.port + 1
         self.w.addr.set_text(addr)
+        self.w.stream_port.set_text(str(self.stream_port))
 
     def close(self):
         self.fv.stop_global_plugin(str(self))
+        self.gui_up = False
         return True
 
     def __str__(self):
@@ -292,8 +342,6 @@ class GingaWrapper(object):
 
     def load_fits_buffer(self, imname, chname, file_buf, num_hdu,
                          metadata):
-        from astropy.io import fits
-
         # Unpack the data
         try:
             # Decode binary data
@@ -304,6 +352,20 @@ class GingaWrapper(object):
             if decompress == 'bz2':
                 file_buf = bz2.decompress(file_buf)
 
+        except Exception as e:
+            # Some kind of error unpacking the data
+            errmsg = "Error creating image data for '%s': %s" % (
+                imname, str(e))
+            self.logger.error(errmsg)
+            raise GingaPlugin.PluginError(errmsg)
+
+        return self._load_fits_data(imname, chname, file_buf, num_hdu,
+                                    metadata)
+
+    def _load_fits_data(self, imname, chname, file_buf, num_hdu, metadata):
+        from astropy.io import fits
+
+        try:
             self.logger.info("received data: len=%d num_hdu=%d" % (
                 len(file_buf), num_hdu))
 
@@ -328,6 +390,27 @@ class GingaWrapper(object):
                             chname=chname)
         return 0
 
+    def ingest(self, hdr, data):
+        """Display an image received by the image stream server (see
+        ginga.util.grc.ImageStreamServer).
+        """
+        imname, chname = hdr['imname'], hdr['chname']
+        metadata = hdr.get('metadata', {})
+        if hdr.get('kind', 'array') == 'fits':
+            return self._load_fits_data(imname, chname, data,
+                                        hdr.get('num_hdu', 0), metadata)
+
+        # data was received straight into the array: no decoding needed
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(data, metadata=metadata)
+        image.set(name=imname)
+        image.update_keywords(hdr.get('header', {}))
+
+        # Enqueue image to display datasrc
+        self.fv.gui_do(self.fv.add_image, imname, image,
+                            chname=chname)
+        return 0
+
     def channel(self, chname, method_name, *args, **kwdargs):
         chinfo = self.fv.get_channelInfo(chname)
         _method = getattr(chinfo.fitsimage, method_name)
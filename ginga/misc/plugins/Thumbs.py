@@ -8,15 +8,19 @@
 # Please see the file LICENSE.txt for details.
 #
 import os
-import hashlib
 import threading
 
-from ginga import GingaPlugin
-from ginga.misc import Bunch
-from ginga.util import iohelper
+from ginga import GingaPlugin, AutoCuts, RGBMap, RGBImage
 from ginga.misc import Bunch
+from ginga.util import iohelper, thumbdb
 from ginga.gw import GwHelp, Widgets, Viewers
 
+try:
+    import multiprocessing
+    have_multiprocessing = True
+except ImportError:
+    have_multiprocessing = False
+
 
 class Thumbs(GingaPlugin.GlobalPlugin):
 
@@ -50,7 +54,9 @@ class Thumbs(GingaPlugin.GlobalPlugin):
                                   label_cutoff='right',
                                   highlight_tracks_keyboard_focus=True,
                                   label_font_color='black',
-                                  label_bg_color='lightgreen')
+                                  label_bg_color='lightgreen',
+                                  num_workers=2,
+                                  lookup_wait=0.1)
         self.settings.load(onError='silent')
         # max length of thumb on the long side
         self.thumbWidth = self.settings.get('thumb_length', 150)
@@ -60,6 +66,17 @@ class Thumbs(GingaPlugin.GlobalPlugin):
         self.lagtime = self.settings.get('rebuild_wait', 4.0)
         self.thmblock = threading.RLock()
 
+        # cut levels method for thumbnails
+        self.autocut_method = 'zscale'
+        # open thumbnail indexes, by database path
+        self.thumb_indexes = {}
+        # worker processes that make thumbnails
+        self.pool = None
+        # thumbnails waiting for a batch lookup in the index
+        self.pending = []
+        self.pendtask = fv.get_timer()
+        self.pendtask.set_callback('expired', self.lookup_pending_cb)
+
         # TODO: these maybe should be configurable by channel
         # different instruments have different keywords of interest
         self.keywords = self.settings.get('tt_keywords', tt_keywords)
@@ -82,15 +99,17 @@ class Thumbs(GingaPlugin.GlobalPlugin):
         width, height = 300, 300
         cm, im = self.fv.cm, self.fv.im
 
-        tg = Viewers.ImageViewCanvas(logger=self.logger)
-        tg.configure_window(200, 200)
-        tg.enable_autozoom('on')
-        tg.set_autocut_params('zscale')
-        tg.enable_autocuts('override')
-        tg.enable_auto_orient(True)
-        tg.defer_redraw = False
-        tg.set_bg(0.7, 0.7, 0.7)
-        self.thumb_generator = tg
+        # displays thumbnails, which are already colored
+        tl = Viewers.ImageViewCanvas(logger=self.logger)
+        tl.configure_window(200, 200)
+        tl.enable_autozoom('on')
+        tl.set_rgbmap(RGBMap.PassThruRGBMapper(self.logger))
+        tl.set_autocuts(AutoCuts.Clip(logger=self.logger))
+        tl.enable_autocuts('off')
+        tl.cut_levels(0, 255)
+        tl.defer_redraw = False
+        tl.set_bg(0.7, 0.7, 0.7)
+        self.thumb_loader = tl
 
         sw = Widgets.ScrollArea()
         sw.add_callback('configure', self.thumbpane_resized_cb)
@@ -150,8 +169,6 @@ class Thumbs(GingaPlugin.GlobalPlugin):
         thumbname = name
         self.logger.info("making thumb for %s" % (thumbname))
 
-        future = image_info.image_future
-
         # Is there a preference set to avoid making thumbnails?
         chinfo = self.fv.get_channelInfo(chname)
         prefs = chinfo.settings
@@ -173,23 +190,37 @@ class Thumbs(GingaPlugin.GlobalPlugin):
             metadata[kwd] = header.get(kwd, 'N/A')
         metadata[self.settings.get('mouseover_name_key','NAME')] = name
 
-        thumbpath = self.get_thumbpath(path)
+        thumbid = self.get_thumbid(chinfo, path)
 
-        with self.thmblock:
-            self.copy_attrs(chinfo.fitsimage)
-            self.thumb_generator.set_image(image)
-            imgwin = self.thumb_generator.get_image_as_widget()
+        # render from decimated data in a non-gui thread
+        fitsimage = chinfo.fitsimage
+        bnch = Bunch.Bunch(
+            chname=chname, info=image_info, thumbkey=thumbkey,
+            thumbid=thumbid, render=self.get_render_settings(fitsimage),
+            transforms=fitsimage.get_transforms())
+        self.fv.nongui_do(self._make_image_thumb, bnch, image,
+                          fitsimage.get_cut_levels(), metadata)
+
+    def render_image(self, image, render, cuts):
+        """Render a thumbnail of `image` from its decimated data with the
+        settings in dict `render` and cut levels `cuts`.  Returns an RGB
+        array.
+        """
+        data = thumbdb.decimate(image.get_data(), render['thumb_length'])
+        return thumbdb.render_thumb(data, render=render, cuts=cuts,
+                                    logger=self.logger)
 
-        label_length = self.settings.get('label_length', None)
-        label_cutoff = self.settings.get('label_cutoff', 'right')
+    def _make_image_thumb(self, bnch, image, cuts, metadata):
+        # called in a non-gui thread
+        try:
+            rgb = self.render_image(image, bnch.render, cuts)
 
-        # Shorten thumbnail label, if requested
-        if label_length is not None:
-            thumbname = iohelper.shorten_name(thumbname, label_length,
-                                              side=label_cutoff)
+        except Exception as e:
+            self.logger.error("Error generating thumbnail for '%s': %s" % (
+                bnch.info.name, str(e)))
+            return
 
-        self.insert_thumbnail(imgwin, thumbkey, thumbname, chname, name, path,
-                              thumbpath, metadata, future)
+        self.fv.gui_do(self.insert_thumbs, [(bnch, rgb, metadata)])
 
     def _add_image(self, viewer, chname, image):
         chinfo = self.fv.get_channelInfo(chname)
@@ -336,12 +367,6 @@ class Thumbs(GingaPlugin.GlobalPlugin):
     def redo_delay_timer(self, timer):
         self.fv.gui_do(self.redo_thumbnail, timer.data.fitsimage)
 
-    def copy_attrs(self, fitsimage):
-        # Reflect transforms, colormap, etc.
-        fitsimage.copy_attributes(self.thumb_generator,
-                                  ['transforms', 'cutlevels',
-                                   'rgbmap'])
-
     def update_highlights(self, old_highlight_set, new_highlight_set):
         """Unhighlight the thumbnails represented by `old_highlight_set`
         and highlight the ones represented by new_highlight_set.
@@ -461,23 +486,62 @@ class Thumbs(GingaPlugin.GlobalPlugin):
                 self._add_image(self.fv, chname, image)
                 return
 
-            # Generate new thumbnail
-            fitsimage.copy_attributes(self.thumb_generator,
-                                      ['transforms', 'cutlevels',
-                                       'rgbmap'])
-            self.thumb_generator.set_image(image)
+        # Generate new thumbnail from decimated data in a non-gui thread
+        self.fv.nongui_do(self._redo_image_thumb, thumbkey, image,
+                          self.get_render_settings(fitsimage),
+                          fitsimage.get_cut_levels(),
+                          fitsimage.get_transforms(), name, metadata)
 
-            # Save a thumbnail for future browsing
-            if save_thumb:
-                thumbpath = self.get_thumbpath(path)
-                if thumbpath is not None:
-                    self.thumb_generator.save_image_as_file(thumbpath,
-                                                            format='jpeg')
+        # Save a thumbnail for future browsing
+        if save_thumb and (path is not None):
+            channel = self.fv.get_channelInfo(chname)
+            self.fv.nongui_do(self.save_thumb, channel, image, path,
+                              metadata)
+
+    def _redo_image_thumb(self, thumbkey, image, render, cuts, transforms,
+                          name, metadata):
+        # called in a non-gui thread
+        try:
+            rgb = self.render_image(image, render, cuts)
+
+        except Exception as e:
+            self.logger.error("Error generating thumbnail for '%s': %s" % (
+                name, str(e)))
+            return
+
+        self.fv.gui_do(self._update_image_thumb, thumbkey, rgb, transforms,
+                       name, metadata)
 
-            imgwin = self.thumb_generator.get_image_as_widget()
+    def _update_image_thumb(self, thumbkey, rgb, transforms, name, metadata):
+        with self.thmblock:
+            image = RGBImage.RGBImage(rgb, logger=self.logger)
+            self.thumb_loader.transform(*transforms)
+            self.thumb_loader.set_image(image)
+            imgwin = self.thumb_loader.get_image_as_widget()
 
         self.update_thumbnail(thumbkey, imgwin, name, metadata)
 
+    def save_thumb(self, channel, image, path, metadata):
+        """Store a thumbnail of `image`, loaded from `path`, in the
+        thumbnail index, unless it is already there.
+        """
+        index = self.get_thumb_index(path)
+        thumbid = self.get_thumbid(channel, path)
+        if (index is None) or (thumbid is None):
+            return
+        if index.get(thumbid) is not None:
+            return
+        render = self.get_render_settings(channel.fitsimage)
+        try:
+            data = thumbdb.decimate(image.get_data(), render['thumb_length'])
+            rgb = thumbdb.render_thumb(data, render=render,
+                                       logger=self.logger)
+            index.put(thumbid, iohelper.get_fileinfo(path).filepath, rgb,
+                      metadata)
+        except Exception as e:
+            self.logger.error("Error saving thumbnail for '%s': %s" % (
+                path, str(e)))
+
     def delete_channel_cb(self, viewer, chinfo):
         """Called when a channel is deleted from the main interface.
         Parameter is chinfo (a bunch)."""
@@ -500,86 +564,226 @@ class Thumbs(GingaPlugin.GlobalPlugin):
 
         self.reorder_thumbs()
 
-    def _make_thumb(self, chname, image, name, path, thumbkey,
-                    image_future, save_thumb=False, thumbpath=None):
-        # This is called by the make_thumbs() as a gui thread
-        with self.thmblock:
-            self.thumb_generator.set_image(image)
-            # Save a thumbnail for future browsing
-            if save_thumb and (thumbpath is not None):
-                self.thumb_generator.save_image_as_file(thumbpath,
-                                                        format='jpeg')
-
-            imgwin = self.thumb_generator.get_image_as_widget()
-
-            image = self.thumb_generator.get_image()
-
-        # Get metadata for mouse-over tooltip
-        header = image.get_header()
-        metadata = {}
-        for kwd in self.keywords:
-            metadata[kwd] = header.get(kwd, 'N/A')
-
-        thumbname = name
-        self.insert_thumbnail(imgwin, thumbkey, thumbname,
-                              chname, name, path, thumbpath, metadata,
-                              image_future)
-        self.fv.update_pending(timeout=0.001)
-
-    def _gethex(self, s):
-        return hashlib.sha1(s.encode()).hexdigest()
-
-    def get_thumbpath(self, path, makedir=True):
+    def get_render_settings(self, fitsimage):
+        """Returns the settings for rendering thumbnails of images in the
+        viewer `fitsimage` (see `thumbdb.get_render_settings`).
+        """
+        rgbmap = fitsimage.get_rgbmap()
+        return thumbdb.get_render_settings(
+            thumb_length=self.thumbWidth,
+            autocut_method=self.autocut_method,
+            cmap=rgbmap.get_cmap().name, imap=rgbmap.get_imap().name)
+
+    def get_thumbid(self, channel, path):
+        """Returns the key of the thumbnail of the file at `path` in the
+        thumbnail index, for the render settings of `channel`, or None if
+        there is no such file.
+        """
         if path is None:
             return None
+        info = iohelper.get_fileinfo(path)
+        render = self.get_render_settings(channel.fitsimage)
+        try:
+            return thumbdb.get_thumb_key(info.filepath, idx=info.numhdu,
+                                         render=render)
+        except OSError:
+            return None
 
-        path = os.path.abspath(path)
-        dirpath, filename = os.path.split(path)
+    def get_thumb_index(self, path):
+        """Returns the thumbnail index for the file at `path`, or None if
+        thumbnails are not cached.
+        """
+        if not self.settings.get('cache_thumbs', False):
+            return None
+
+        path = os.path.abspath(iohelper.get_fileinfo(path).filepath)
         # Get thumb directory
         cache_location = self.settings.get('cache_location', 'local')
         if cache_location == 'ginga':
             # thumbs in .ginga cache
             prefs = self.fv.get_preferences()
-            thumbDir = os.path.join(prefs.get_baseFolder(), 'thumbs')
-            thumbdir = os.path.join(thumbDir, self._gethex(dirpath))
+            thumbdir = os.path.join(prefs.get_baseFolder(), 'thumbs')
         else:
             # thumbs in .thumbs subdirectory of image folder
-            thumbdir = os.path.join(dirpath, '.thumbs')
+            thumbdir = os.path.join(os.path.dirname(path), '.thumbs')
+        dbpath = os.path.join(thumbdir, 'thumbs.db')
 
-        if not os.path.exists(thumbdir):
-            if not makedir:
-                self.logger.error("Thumb directory does not exist: %s" % (
-                    thumbdir))
-                return None
+        with self.thmblock:
+            if dbpath in self.thumb_indexes:
+                return self.thumb_indexes[dbpath]
 
+            index = None
             try:
-                os.makedirs(thumbdir)
-                # Write meta file
-                metafile = os.path.join(thumbdir, "meta")
-                with open(metafile, 'w') as out_f:
-                    out_f.write("srcdir: %s\n" % (dirpath))
-
-            except OSError as e:
-                self.logger.error("Could not make thumb directory '%s': %s" % (
-                    thumbdir, str(e)))
-                return None
-
-        # Get location of thumb
-        modtime = os.stat(path).st_mtime
-        thumb_fname = self._gethex("%s.%s" % (filename, modtime))
-        thumbpath = os.path.join(thumbdir, thumb_fname + ".jpg")
-        self.logger.debug("thumb path is '%s'" % (thumbpath))
-        return thumbpath
+                if not os.path.exists(thumbdir):
+                    os.makedirs(thumbdir)
+                index = thumbdb.ThumbIndex(dbpath, self.logger)
+
+            except (OSError, thumbdb.ThumbDBError) as e:
+                self.logger.error("Could not open thumb index '%s': %s" % (
+                    dbpath, str(e)))
+            # remember failures too, so we don't keep trying
+            self.thumb_indexes[dbpath] = index
+            return index
+
+    def get_pool(self):
+        """Returns the pool of worker processes that make thumbnails, or
+        None if thumbnails should be made in the calling thread.
+        """
+        num_workers = self.settings.get('num_workers', 2)
+        if (not have_multiprocessing) or (num_workers < 1):
+            return None
+        with self.thmblock:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(num_workers)
+            return self.pool
+
+    def lookup_pending_cb(self, timer):
+        """Look up the pending thumbnails in the index, in one batch per
+        index.  Thumbnails that are found are shown right away, the rest
+        are made in the background.
+        """
+        with self.thmblock:
+            pending, self.pending = self.pending, []
+
+        by_index = {}
+        for bnch in pending:
+            index = None
+            if bnch.thumbid is not None:
+                index = self.get_thumb_index(bnch.info.path)
+            by_index.setdefault(index, []).append(bnch)
+
+        found = []
+        for index, bnchs in by_index.items():
+            if index is None:
+                thumbs = {}
+            else:
+                thumbs = index.get_many([bnch.thumbid for bnch in bnchs])
+            for bnch in bnchs:
+                if bnch.thumbid in thumbs:
+                    rgb, metadata = thumbs[bnch.thumbid]
+                    found.append((bnch, rgb, metadata))
+                else:
+                    self.make_thumb(bnch, index)
+
+        if len(found) > 0:
+            self.logger.debug("%d thumbs found in index" % (len(found)))
+            self.fv.gui_do(self.insert_thumbs, found)
+
+    def make_thumb(self, bnch, index):
+        """Make a thumbnail for `bnch` from a decimated read of the file
+        in a worker process (or a non-gui thread, if there are no worker
+        processes).
+        """
+        info = iohelper.get_fileinfo(bnch.info.path)
+        args = (info.filepath, info.numhdu, bnch.render, self.keywords)
+
+        pool = self.get_pool()
+        if pool is None:
+            # NOTE: we are called from a gui timer callback, so don't
+            # read the file here
+            self.fv.nongui_do(self._make_thumb_local, bnch, index, args)
+            return
+
+        def _made(res):
+            self.thumb_made(bnch, index, res)
+
+        pool.apply_async(thumbdb._make_thumb_job, (args,), callback=_made)
+
+    def _make_thumb_local(self, bnch, index, args):
+        # make a thumbnail in this (non-gui) thread
+        self.thumb_made(bnch, index, thumbdb._make_thumb_job(args))
+
+    def thumb_made(self, bnch, index, res):
+        # called in a non-gui thread with the result of make_thumb
+        ok, res = res
+        if not ok:
+            # not something we can read directly (e.g. not a FITS file)
+            self.logger.debug("Can't make thumb directly for '%s': %s" % (
+                bnch.info.path, res))
+            self.fv.nongui_do(self.load_thumb, bnch, index)
+            return
+
+        rgb, metadata = res
+        self.store_thumb(bnch, index, rgb, metadata)
+
+    def load_thumb(self, bnch, index):
+        """Make a thumbnail for `bnch` by loading the image with the
+        channel's loader.
+        """
+        info = bnch.info
+        try:
+            image = info.image_loader(info.path)
+            data = thumbdb.decimate(image.get_data(),
+                                    bnch.render['thumb_length'])
+            rgb = thumbdb.render_thumb(data, render=bnch.render,
+                                       logger=self.logger)
+            header = image.get_header()
+            metadata = {}
+            for kwd in self.keywords:
+                metadata[kwd] = header.get(kwd, 'N/A')
+
+        except Exception as e:
+            self.logger.error("Error generating thumbnail for '%s': %s" % (
+                info.path, str(e)))
+            # TODO: generate "broken thumb"?
+            return
+
+        self.store_thumb(bnch, index, rgb, metadata)
+
+    def store_thumb(self, bnch, index, rgb, metadata):
+        if index is not None:
+            try:
+                filepath = iohelper.get_fileinfo(bnch.info.path).filepath
+                index.put(bnch.thumbid, filepath, rgb, metadata)
+            except Exception as e:
+                self.logger.error("Error saving thumbnail for '%s': %s" % (
+                    bnch.info.path, str(e)))
+
+        self.fv.gui_do(self.insert_thumbs, [(bnch, rgb, metadata)])
+
+    def insert_thumbs(self, thumbs):
+        """Add thumbnails to the pane.  `thumbs` is a list of
+        (bnch, rgb, metadata) tuples.
+        """
+        for bnch, rgb, metadata in thumbs:
+            info = bnch.info
+            with self.thmblock:
+                # may have been added meanwhile
+                old_bnch = self.thumbDict.get(bnch.thumbkey, None)
+                if old_bnch is not None:
+                    if old_bnch.thumbid == bnch.thumbid:
+                        continue
+                    self.remove_thumb(bnch.thumbkey)
+
+                image = RGBImage.RGBImage(rgb, logger=self.logger)
+                self.thumb_loader.transform(*bnch.transforms)
+                self.thumb_loader.set_image(image)
+                imgwin = self.thumb_loader.get_image_as_widget()
+
+            metadata[self.settings.get('mouseover_name_key', 'NAME')] = \
+                info.name
+
+            thumbname = info.name
+            label_length = self.settings.get('label_length', None)
+            if label_length is not None:
+                thumbname = iohelper.shorten_name(
+                    thumbname, label_length,
+                    side=self.settings.get('label_cutoff', 'right'))
+
+            self.insert_thumbnail(imgwin, bnch.thumbkey, thumbname,
+                                  bnch.chname, info.name, info.path,
+                                  bnch.thumbid, metadata, info.image_future)
+        self.fv.update_pending(timeout=0.001)
 
     def insert_thumbnail(self, imgwin, thumbkey, thumbname, chname, name, path,
-                         thumbpath, metadata, image_future):
+                         thumbid, metadata, image_future):
 
         # make a context menu
         menu = self._mk_context_menu(thumbkey, chname, name, path, image_future)
 
         thumbw = Widgets.Image(native_image=imgwin, menu=menu,
                                style='clickable')
-        wd, ht = self.thumb_generator.get_window_size()
+        wd, ht = self.thumb_loader.get_window_size()
         thumbw.resize(wd, ht)
 
         # set the load callback
@@ -602,7 +806,7 @@ class Thumbs(GingaPlugin.GlobalPlugin):
 
         bnch = Bunch.Bunch(widget=vbox, image=thumbw,
                            name=name, imname=name, namelbl=namelbl,
-                           chname=chname, path=path, thumbpath=thumbpath,
+                           chname=chname, path=path, thumbid=thumbid,
                            image_future=image_future)
 
         with self.thmblock:
@@ -700,51 +904,44 @@ class Thumbs(GingaPlugin.GlobalPlugin):
             self.logger.debug("update finished.")
 
     def add_image_info_cb(self, viewer, channel, info):
-
-        save_thumb = self.settings.get('cache_thumbs', False)
+        if info.path is None:
+            # nothing to make a thumbnail from
+            return
 
         # Do we already have this thumb loaded?
         chname = channel.name
         thumbkey = self.get_thumb_key(chname, info.name, info.path)
-        thumbpath = self.get_thumbpath(info.path)
+        thumbid = self.get_thumbid(channel, info.path)
 
         with self.thmblock:
             try:
                 bnch = self.thumbDict[thumbkey]
                 # if these are not equal then the mtime must have
                 # changed on the file, better reload and regenerate
-                if bnch.thumbpath == thumbpath:
+                if bnch.thumbid == thumbid:
                     return
             except KeyError:
                 pass
 
-        # Is there a cached thumbnail image on disk we can use?
-        image = None
-        if (thumbpath is not None) and os.path.exists(thumbpath):
-            save_thumb = False
-            try:
-                # try to load the thumbnail image
-                image = self.fv.load_image(thumbpath)
-            except Exception as e:
-                pass
-
-        try:
-            if image is None:
-                # no luck loading thumbnail, try to load the full image
-                image = info.image_loader(info.path)
-
-            # make sure name is consistent
-            image.set(name=info.name)
+            # collect requests that arrive together (e.g. a directory
+            # being opened) for a batch lookup in the thumbnail index
+            fitsimage = channel.fitsimage
+            self.pending.append(Bunch.Bunch(
+                chname=chname, info=info, thumbkey=thumbkey, thumbid=thumbid,
+                render=self.get_render_settings(fitsimage),
+                transforms=fitsimage.get_transforms()))
 
-            self.fv.gui_do(self._make_thumb, chname, image, info.name,
-                           info.path, thumbkey, info.image_future,
-                           save_thumb=save_thumb,
-                           thumbpath=thumbpath)
+        self.pendtask.set(self.settings.get('lookup_wait', 0.1))
 
-        except Exception as e:
-            self.logger.error("Error generating thumbnail for '%s': %s" % (
-                info.path, str(e)))
-            # TODO: generate "broken thumb"?
+    def stop(self):
+        with self.thmblock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool = None
+            for index in self.thumb_indexes.values():
+                if index is not None:
+                    index.close()
+            self.thumb_indexes = {}
 
     def __str__(self):
         return 'thumbs'
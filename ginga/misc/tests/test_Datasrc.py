@@ -0,0 +1,109 @@
+#
+# Unit Tests for the Datasrc class
+#
+import unittest
+import logging
+import tempfile
+import shutil
+import numpy as np
+
+from ginga.misc import Datasrc
+from ginga import AstroImage
+
+
+class TestError(Exception):
+    pass
+
+
+class TestDatasrc(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestDatasrc")
+        self.tmpdir = tempfile.mkdtemp()
+
+    def make_image(self, name, size=100):
+        data = np.random.rand(size, size)
+        image = AstroImage.AstroImage(data_np=data, logger=self.logger)
+        image.set(name=name)
+        return image
+
+    def test_count_limit(self):
+        ds = Datasrc.Datasrc(2)
+        for i in range(3):
+            ds[str(i)] = np.zeros(10)
+
+        expected = ['1', '2']
+        actual = ds.keys(sort='alpha')
+        assert expected == actual
+
+        expected = 160
+        actual = ds.get_total_bytes()
+        assert expected == actual
+
+    def test_budget_lru(self):
+        budget = Datasrc.MemoryBudget(2000, policy='lru')
+        ds1 = Datasrc.Datasrc(0, budget=budget)
+        ds2 = Datasrc.Datasrc(0, budget=budget)
+
+        ds1['a'] = np.zeros(100)
+        ds2['b'] = np.zeros(100)
+        # touch 'a' so that 'b' is the least recently used
+        ds1['a']
+        ds1['c'] = np.zeros(100)
+
+        assert ds1.has_key('a')
+        assert ds1.has_key('c')
+        assert not ds2.has_key('b')
+
+        expected = 1600
+        actual = budget.get_total_bytes()
+        assert expected == actual
+
+    def test_budget_lfu(self):
+        budget = Datasrc.MemoryBudget(2000, policy='lfu')
+        ds = Datasrc.Datasrc(0, budget=budget)
+
+        ds['a'] = np.zeros(100)
+        ds['b'] = np.zeros(100)
+        for i in range(3):
+            ds['a']
+        ds['b']
+        ds['c'] = np.zeros(100)
+
+        expected = ['a', 'c']
+        actual = ds.keys(sort='alpha')
+        assert expected == actual
+
+    def test_spill_restore(self):
+        budget = Datasrc.MemoryBudget(100000)
+        spill = Datasrc.SpillStore(self.tmpdir, logger=self.logger)
+        ds = Datasrc.Datasrc(0, budget=budget, spill=spill)
+
+        image1 = self.make_image('image1')
+        ds['image1'] = image1
+        ds['image2'] = self.make_image('image2')
+
+        assert not ds.has_key('image1')
+        assert ds.has_spilled('image1')
+
+        image = ds.get_spilled('image1')
+        assert isinstance(image, AstroImage.AstroImage)
+        assert np.all(image.get_data() == image1.get_data())
+
+        expected = 'image1'
+        actual = image.get('name')
+        assert expected == actual
+
+        ds.remove('image2')
+        ds['image1'] = image
+        ds.remove('image1')
+        assert not ds.has_spilled('image1')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,126 @@
+#
+# Unit Tests for the Prefetch module
+#
+import unittest
+import logging
+
+from ginga.misc import Prefetch
+
+
+class TestError(Exception):
+    pass
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestPrefetch")
+        # submitted jobs are run by the test, one at a time
+        self.submitted = []
+        self.loaded = []
+        self.prefetcher = Prefetch.PrefetchScheduler(self.submit,
+                                                     self.logger,
+                                                     max_workers=2)
+
+    def submit(self, fn, *args):
+        self.submitted.append((fn, args))
+
+    def run_one(self):
+        fn, args = self.submitted.pop(0)
+        fn(*args)
+
+    def load(self, name):
+        self.loaded.append(name)
+
+    def make_jobs(self, names):
+        return [(name, self.load, (name,)) for name in names]
+
+    def test_prefetch_order(self):
+        expected = [6, 4, 7, 8]
+        actual = Prefetch.get_prefetch_order(5, 20, direction=1,
+                                             num_ahead=3, num_behind=1)
+        assert expected == actual
+
+        expected = [4, 6, 3, 2]
+        actual = Prefetch.get_prefetch_order(5, 20, direction=-1,
+                                             num_ahead=3, num_behind=1)
+        assert expected == actual
+
+        # wrap around at the ends
+        expected = [0, 8, 1]
+        actual = Prefetch.get_prefetch_order(9, 10, num_ahead=2,
+                                             num_behind=1)
+        assert expected == actual
+
+        expected = [8]
+        actual = Prefetch.get_prefetch_order(9, 10, num_ahead=2,
+                                             num_behind=1, loop=False)
+        assert expected == actual
+
+    def test_direction(self):
+        assert self.prefetcher.update_position('ch', 5, 100) == 1
+        assert self.prefetcher.update_position('ch', 4, 100) == -1
+        # no move: keep direction
+        assert self.prefetcher.update_position('ch', 4, 100) == -1
+        assert self.prefetcher.update_position('ch', 5, 100) == 1
+        # wrap around from the end to the start is going forward
+        self.prefetcher.update_position('ch', 99, 100)
+        assert self.prefetcher.update_position('ch', 0, 100) == 1
+
+    def test_bounded_concurrency(self):
+        self.prefetcher.schedule('ch', self.make_jobs(['a', 'b', 'c', 'd']))
+        assert len(self.submitted) == 2
+
+        self.run_one()
+        assert self.loaded == ['a']
+        # finishing a job starts the next one
+        assert len(self.submitted) == 2
+
+        while len(self.submitted) > 0:
+            self.run_one()
+        expected = ['a', 'b', 'c', 'd']
+        actual = self.loaded
+        assert expected == actual
+        assert self.prefetcher.get_counters('ch').loaded == 4
+        assert not self.prefetcher.is_busy()
+
+    def test_cancel_stale(self):
+        self.prefetcher.schedule('ch', self.make_jobs(['a', 'b', 'c', 'd']))
+        # user jumps: c and d are no longer wanted
+        self.prefetcher.schedule('ch', self.make_jobs(['x', 'b']))
+        assert not self.prefetcher.is_wanted('ch', 'a')
+        assert self.prefetcher.is_wanted('ch', 'x')
+
+        while len(self.submitted) > 0:
+            self.run_one()
+        # a and b were already running
+        expected = ['a', 'b', 'x']
+        actual = self.loaded
+        assert expected == actual
+
+        counters = self.prefetcher.get_counters('ch')
+        assert counters.cancelled == 2
+
+    def test_errors_and_counters(self):
+        def fail(name):
+            raise TestError("no such file")
+
+        self.prefetcher.schedule('ch', [('a', fail, ('a',))])
+        self.run_one()
+        self.prefetcher.record_access('ch', True)
+        self.prefetcher.record_access('ch', False)
+
+        counters = self.prefetcher.get_counters('ch')
+        expected = (1, 1, 0, 1)
+        actual = (counters.hits, counters.misses, counters.loaded,
+                  counters.errors)
+        assert expected == actual
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
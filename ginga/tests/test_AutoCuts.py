@@ -0,0 +1,82 @@
+#
+# Unit Tests for the AutoCuts.py classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga import AutoCuts
+
+
+class TestError(Exception):
+    pass
+
+
+class TestCutLevels(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestCutLevels")
+        self.data = np.random.normal(100.0, 30.0, size=(120, 130))
+
+    def test_cut_levels_idx_matches(self):
+        autocuts = AutoCuts.Minmax(self.logger)
+        for data in (self.data, self.data.astype(np.float32),
+                     self.data.astype(np.int16)):
+            expected = autocuts.cut_levels(data, 80.0, 130.0, vmax=65535)
+            expected = expected.astype(np.uint)
+            actual = autocuts.cut_levels_idx(data, 80.0, 130.0, vmax=65535)
+            assert actual.dtype == np.uint
+            assert np.array_equal(expected, actual)
+
+    def test_cut_levels_idx_threshold(self):
+        autocuts = AutoCuts.Minmax(self.logger)
+        expected = (self.data > 100.0) * 255
+        actual = autocuts.cut_levels_idx(self.data, 100.0, 100.0, vmax=255)
+        assert np.array_equal(expected, actual)
+
+    def test_cut_levels_idx_inverted(self):
+        # cut levels dragged backwards (loval > hival)
+        autocuts = AutoCuts.Minmax(self.logger)
+        expected = autocuts.cut_levels(self.data, 130.0, 80.0, vmax=255)
+        expected = expected.astype(np.uint)
+        branches = [False]
+        if hasattr(AutoCuts, 'ne'):
+            branches.append(True)
+        have_numexpr = AutoCuts.have_numexpr
+        try:
+            for flag in branches:
+                AutoCuts.have_numexpr = flag
+                actual = autocuts.cut_levels_idx(self.data, 130.0, 80.0,
+                                                 vmax=255)
+                assert np.array_equal(expected, actual)
+        finally:
+            AutoCuts.have_numexpr = have_numexpr
+
+    def test_cut_levels_idx_reuses_buffers(self):
+        autocuts = AutoCuts.Minmax(self.logger)
+        out = np.empty(self.data.shape, dtype=np.uint)
+        scratch = np.empty(self.data.shape, dtype=np.float64)
+        res = autocuts.cut_levels_idx(self.data, 80.0, 130.0, vmax=255,
+                                      out=out, scratch=scratch)
+        assert res is out
+
+        # wrong shape: a new buffer is allocated
+        res = autocuts.cut_levels_idx(self.data[:10], 80.0, 130.0, vmax=255,
+                                      out=out, scratch=scratch)
+        assert res is not out
+
+    def test_clip_cut_levels_idx(self):
+        autocuts = AutoCuts.Clip(self.logger)
+        expected = autocuts.cut_levels(self.data, 0, 0, vmax=255)
+        expected = expected.astype(np.uint)
+        actual = autocuts.cut_levels_idx(self.data, 0, 0, vmax=255)
+        assert np.array_equal(expected, actual)
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,59 @@
+#
+# Unit Tests for the ModuleManager class
+#
+import unittest
+import logging
+
+from ginga.misc import ModuleManager
+
+
+class TestError(Exception):
+    pass
+
+
+class TestModuleManager(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestModuleManager")
+        self.mm = ModuleManager.ModuleManager(self.logger)
+
+    def test_lazy_import(self):
+        mm = self.mm
+        mm.registerModule('zscale', pfx='ginga.util')
+        assert not mm.isLoaded('zscale')
+
+        # imported on first use
+        module = mm.getModule('zscale')
+        assert module.__name__ == 'ginga.util.zscale'
+        assert mm.isLoaded('zscale')
+        assert mm.getModule('zscale') is module
+        assert 'import' in mm.timings['zscale']
+
+        self.assertRaises(KeyError, mm.getModule, 'NoSuchModule')
+        mm.registerModule('NoSuchModule')
+        self.assertRaises(ModuleManager.ModuleManagerError, mm.getModule,
+                          'NoSuchModule')
+
+    def test_profile_report(self):
+        mm = self.mm
+        mm.add_timing('Pan', 'import', 0.25)
+        mm.add_timing('Pan', 'gui', 0.5)
+        mm.add_timing('Zoom', 'init', 1.0)
+        mm.add_timing('Zoom', 'init', 1.0)
+        mm.registerModule('Header')
+
+        lines = mm.get_profile_report().split('\n')
+        assert lines[0].split() == ['module', 'import', 'init', 'gui',
+                                    'total']
+        # most expensive first
+        assert lines[1].split()[0] == 'Zoom'
+        assert float(lines[1].split()[-1]) == 2.0
+        assert lines[2].split()[0] == 'Pan'
+        assert float(lines[3].split()[-1]) == 2.75
+        assert lines[4] == 'not imported: Header'
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
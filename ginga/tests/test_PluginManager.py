@@ -0,0 +1,87 @@
+#
+# Unit Tests for the PluginManager class
+#
+import unittest
+import logging
+
+from ginga.misc import Bunch, Callback, ModuleManager
+from ginga.gw import PluginManager
+
+
+class TestError(Exception):
+    pass
+
+
+class ChannelWatcher(object):
+    """A global plugin that tracks channels from its constructor, like
+    IRAF or WCSMatch.
+    """
+
+    def __init__(self, fv):
+        self.fv = fv
+        self.channels = []
+        fv.add_callback('add-channel', self.add_channel)
+
+    def add_channel(self, viewer, chinfo):
+        self.channels.append(chinfo.name)
+
+    def start(self):
+        pass
+
+
+class Viewer(Callback.Callbacks):
+    """Stands in for the reference viewer."""
+
+    def __init__(self):
+        super(Viewer, self).__init__()
+        self.enable_callback('add-channel')
+
+    def add_channel(self, chname):
+        self.make_callback('add-channel', Bunch.Bunch(name=chname))
+
+
+class TestPluginManager(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestPluginManager")
+        self.fv = Viewer()
+        self.mm = ModuleManager.ModuleManager(self.logger)
+        self.mm.registerModule('test_PluginManager', pfx='ginga.tests')
+        self.pm = PluginManager.PluginManager(self.logger, self.fv, None,
+                                              self.mm)
+
+    def make_spec(self, **kwdargs):
+        return Bunch.Bunch(module='test_PluginManager',
+                           klass='ChannelWatcher', ws='right', **kwdargs)
+
+    def test_global_eager(self):
+        # global plugins are created when loaded, so that channels made
+        # before the plugin is started are not missed
+        self.pm.loadPlugin('Watcher', self.make_spec(start=False))
+        assert self.pm.getPluginInfo('Watcher').obj is not None
+        self.fv.add_channel('Image')
+        obj = self.pm.getPlugin('Watcher')
+        assert obj.channels == ['Image']
+
+    def test_lazy(self):
+        # deferred global and local plugins are created on first use
+        self.pm.loadPlugin('Watcher', self.make_spec(defer=True))
+        assert self.pm.getPluginInfo('Watcher').obj is None
+        assert isinstance(self.pm.getPlugin('Watcher'), ChannelWatcher)
+
+        chinfo = Bunch.Bunch(name='Image', fitsimage=None)
+        self.pm.loadPlugin('Local', self.make_spec(), chinfo=chinfo)
+        assert self.pm.getPluginInfo('Local').obj is None
+
+    def test_load_error(self):
+        spec = self.make_spec()
+        spec.klass = 'NoSuchPlugin'
+        self.assertRaises(PluginManager.PluginManagerError,
+                          self.pm.loadPlugin, 'Bad', spec)
+        assert 'bad' not in self.pm.plugin
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
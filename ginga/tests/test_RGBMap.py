@@ -0,0 +1,81 @@
+#
+# Unit Tests for the RGBMap.py classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga import RGBMap, cmap, imap
+
+
+class TestError(Exception):
+    pass
+
+
+class TestRGBMapper(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestRGBMapper")
+        self.rgbmap = RGBMap.RGBMapper(self.logger)
+        self.rgbmap.set_cmap(cmap.get_cmap('rainbow3'))
+        self.rgbmap.set_imap(imap.get_imap('log'))
+        self.rgbmap.scale_and_shift(0.7, 0.1)
+
+        self.idx = np.random.randint(-10, 70000, size=(101, 57))
+
+    def get_reference(self, idx, order):
+        # step by step mapping, without the combined lookup table
+        out = np.empty(idx.shape + (len(order),), dtype=np.uint8)
+        res = RGBMap.RGBPlanes(out, order)
+        if res.hasAlpha:
+            res.get_slice('A').fill(255)
+        hashed = self.rgbmap.get_hasharray(idx)
+        self.rgbmap._get_rgbarray(hashed, res, 'RGB')
+        return out
+
+    def test_rgbarray_matches_reference(self):
+        for order in ('RGB', 'BGRA', 'ARGB'):
+            expected = self.get_reference(self.idx, order)
+            actual = self.rgbmap.get_rgbarray(self.idx, order=order).rgbarr
+            assert np.array_equal(expected, actual)
+
+    def test_rgbarray_threaded(self):
+        self.rgbmap.set_num_threads(3)
+        self.rgbmap.min_pixels_per_thread = 100
+
+        expected = self.get_reference(self.idx, 'RGBA')
+        out = np.zeros(self.idx.shape + (4,), dtype=np.uint8)
+        res = self.rgbmap.get_rgbarray(self.idx, out=out, order='RGBA')
+        assert res.rgbarr is out
+        assert np.array_equal(expected, out)
+
+    def test_lut_recalculated(self):
+        lut1 = self.rgbmap.get_lut('RGB')
+        assert self.rgbmap.get_lut('RGB') is lut1
+
+        self.rgbmap.shift(0.2)
+        lut2 = self.rgbmap.get_lut('RGB')
+        assert lut2 is not lut1
+
+        self.rgbmap.set_hash_size(256)
+        expected = (256, 3)
+        actual = self.rgbmap.get_lut('RGB').shape
+        assert expected == actual
+
+    def test_histeq(self):
+        # hash depends on the data, so the lookup table can't be used
+        self.rgbmap.set_hash_algorithm('histeq')
+        idx = self.idx.clip(0, 65535).astype(np.uint32)
+        for order in ('RGB', 'RGBA'):
+            expected = self.get_reference(idx, order)
+            actual = self.rgbmap.get_rgbarray(idx, order=order).rgbarr
+            assert np.array_equal(expected, actual)
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,156 @@
+#
+# Unit Tests for the grc.py image stream functions and classes
+#
+import unittest
+import logging
+import threading
+import io
+import socket
+import zlib
+import numpy as np
+
+from ginga.util import grc
+
+try:
+    from astropy.io import fits
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+
+class TestError(Exception):
+    pass
+
+
+class TestImageStream(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestImageStream")
+        self.received = []
+        self.lock = threading.Lock()
+        self.stats = []
+        self.server = grc.ImageStreamServer(self.ingest, host='127.0.0.1',
+                                            port=0, logger=self.logger,
+                                            stats_fn=self.stats_cb)
+        self.server.start()
+        host, port = self.server.get_address()
+        self.client = grc.RemoteClient(host, port - 1, stream_port=port)
+
+        rng = np.random.RandomState(5)
+        self.data = rng.normal(100.0, 10.0, (300, 200)).astype(np.float32)
+
+    def ingest(self, hdr, data):
+        if hdr['imname'] == 'bad':
+            raise ValueError("bad image")
+        with self.lock:
+            self.received.append((hdr, data))
+
+    def stats_cb(self, hdr, stats):
+        with self.lock:
+            self.stats.append((hdr['imname'], stats))
+
+    def check(self, res, imname):
+        hdr, data = self.received[-1]
+        assert hdr['imname'] == imname
+        assert hdr['chname'] == 'Image'
+        assert res['status'] == 0
+        assert res['nbytes'] == self.data.nbytes
+        assert res['rate_mbps'] > 0
+        # the stats callback gets the stats of this image
+        assert self.stats[-1] == (imname, res)
+        assert self.server.last_stats == res
+        return data
+
+    def test_stream_image(self):
+        res = self.client.stream_image('im1', 'Image', self.data,
+                                       header=dict(OBJECT='M31',
+                                                   EXPTIME=np.float64(30)))
+        data = self.check(res, 'im1')
+        assert data.dtype == self.data.dtype
+        assert np.array_equal(data, self.data)
+        # received straight into a writable array
+        assert data.flags.writeable
+        assert self.received[-1][0]['header']['EXPTIME'] == 30.0
+
+        # several images on one connection, big-endian data
+        be_data = self.data.astype('>f8')
+        res = self.client.stream_image('im2', 'Image', be_data)
+        data = self.received[-1][1]
+        assert np.array_equal(data, be_data)
+        assert len(self.received) == 2
+
+    def test_compress(self):
+        for compress in ('zlib', 'lz4', 'zstd'):
+            res = self.client.stream_image('im_' + compress, 'Image',
+                                           self.data, compress=compress)
+            data = self.check(res, 'im_' + compress)
+            assert np.array_equal(data, self.data)
+            assert data.flags.writeable
+
+    def test_compress_mismatch(self):
+        # stands in for lz4 on a host that has it installed
+        fake_lz4 = (lambda buf: zlib.compress(buf)[::-1],
+                    lambda buf: zlib.decompress(bytes(buf)[::-1]))
+        saved = grc.compressors.pop('lz4', None)
+        try:
+            # sender without lz4: the header names the method really used
+            res = self.client.stream_image('im_lz4', 'Image', self.data,
+                                           compress='lz4')
+            assert np.array_equal(self.check(res, 'im_lz4'), self.data)
+            assert self.received[-1][0]['compress'] == 'zlib'
+
+            # receiver without lz4: an error, rather than a wrong decode
+            grc.compressors['lz4'] = fake_lz4
+            sock1, sock2 = socket.socketpair()
+            try:
+                name, compress_fn, _ = grc.get_compressor('lz4')
+                assert name == 'lz4'
+                hdr = dict(kind='fits', compress=name)
+                grc.send_msg(sock1, hdr, compress_fn(b'some data'))
+                del grc.compressors['lz4']
+                self.assertRaises(grc.StreamError, grc.recv_payload,
+                                  sock2, hdr)
+            finally:
+                sock1.close()
+                sock2.close()
+
+        finally:
+            grc.compressors.pop('lz4', None)
+            if saved is not None:
+                grc.compressors['lz4'] = saved
+
+    @unittest.skipUnless(grc.have_shm, "requires shared memory")
+    def test_shm(self):
+        res = self.client.stream_image('im_shm', 'Image', self.data,
+                                       use_shm=True)
+        data = self.check(res, 'im_shm')
+        assert np.array_equal(data, self.data)
+
+    def test_errors(self):
+        self.assertRaises(grc.StreamError, self.client.stream_image,
+                          'bad', 'Image', self.data)
+        assert len(self.stats) == 0
+        # the client reconnects after an error
+        res = self.client.stream_image('im3', 'Image', self.data)
+        assert np.array_equal(self.check(res, 'im3'), self.data)
+
+    @unittest.skipUnless(have_astropy, "requires astropy")
+    def test_stream_fits(self):
+        out_f = io.BytesIO()
+        fits.PrimaryHDU(self.data).writeto(out_f)
+        res = self.client.stream_fits('im_fits', 'Image', out_f.getvalue(),
+                                      compress='zlib')
+        hdr, buf = self.received[-1]
+        assert hdr['kind'] == 'fits'
+        assert bytes(buf) == out_f.getvalue()
+        assert res['nbytes'] == len(out_f.getvalue())
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
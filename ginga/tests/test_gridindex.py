@@ -0,0 +1,123 @@
+#
+# Unit Tests for the gridindex.py classes and canvas spatial indexing
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga.canvas.gridindex import GridIndex
+from ginga.canvas.coordmap import DataMapper
+from ginga.canvas.types.all import (Canvas, Circle, Box, Polygon, Text,
+                                    Annulus)
+
+
+class TestError(Exception):
+    pass
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestGridIndex")
+
+    def test_query(self):
+        idx = GridIndex(cell_size=10, max_cells=16)
+        idx.insert('a', (0, 0, 5, 5))
+        idx.insert('b', (100, 100, 120, 130))
+        # too big for the cells
+        idx.insert('c', (-1000, -1000, 1000, 1000))
+        idx.insert('d', None)
+        assert len(idx) == 4
+
+        assert idx.query(1, 1, 2, 2) == set(['a', 'c', 'd'])
+        assert idx.query(110, 125, 111, 126) == set(['b', 'c', 'd'])
+        assert idx.query(2000, 2000, 2001, 2001) == set(['d'])
+        assert idx.query(-5000, -5000, 5000, 5000) == set(['a', 'b', 'c',
+                                                           'd'])
+        # moving and removing
+        idx.insert('a', (200, 200, 201, 201))
+        assert 'a' not in idx.query(1, 1, 2, 2)
+        assert 'a' in idx.query(195, 195, 200, 200)
+        idx.remove('b')
+        assert 'b' not in idx
+        assert idx.query(110, 125, 111, 126) == set(['c', 'd'])
+
+    def make_canvas(self, num):
+        canvas = Canvas()
+        canvas.initialize(None, None, self.logger)
+        rng = np.random.RandomState(42)
+        for i, (x, y) in enumerate(rng.uniform(0, 2000, (num, 2))):
+            if i % 3 == 0:
+                obj = Box(x, y, 8, 4, rot_deg=30.0)
+            elif i % 3 == 1:
+                obj = Circle(x, y, 6)
+            else:
+                obj = Polygon([(x, y), (x + 15, y), (x, y + 10)])
+            obj.use_coordmap(DataMapper(None))
+            canvas.add(obj, redraw=False)
+        return canvas
+
+    def linear_items_at(self, canvas, x, y):
+        return [obj for obj in canvas.objects if obj.contains(x, y)]
+
+    def test_canvas(self):
+        canvas = self.make_canvas(1000)
+        rng = np.random.RandomState(7)
+        pts = [canvas.objects[0].get_center_pt()]
+        pts.extend(rng.uniform(0, 2000, (50, 2)))
+        for x, y in pts:
+            assert (canvas.get_items_at(x, y) ==
+                    self.linear_items_at(canvas, x, y))
+
+        objs = canvas.get_objects_in_rect(100, 100, 300, 300)
+        assert 0 < len(objs) < len(canvas.objects)
+        # in drawing order
+        order = [canvas.objects.index(obj) for obj in objs]
+        assert order == sorted(order)
+
+    def test_update(self):
+        canvas = self.make_canvas(300)
+        obj = canvas.objects[10]
+        x, y = obj.get_center_pt()
+        assert obj in canvas.get_items_at(x, y)
+
+        # moved objects are found at their new location
+        obj.move_to(3000.0, 3000.0)
+        assert obj not in canvas.get_items_at(x, y)
+        assert obj in canvas.get_items_at(3000.0, 3000.0)
+        obj.x, obj.y = 4000.0, 4000.0
+        assert canvas.get_items_at(4000.0, 4000.0)[-1] is obj
+
+        # raised and deleted objects
+        obj2 = canvas.objects[20]
+        obj2.move_to(4000.0, 4000.0)
+        assert canvas.get_items_at(4000.0, 4000.0) == [obj, obj2]
+        canvas.raise_object(obj)
+        assert canvas.get_items_at(4000.0, 4000.0) == [obj2, obj]
+        canvas.delete_object(obj2)
+        assert canvas.get_items_at(4000.0, 4000.0) == [obj]
+
+        # objects without a bounding box are always candidates
+        text = Text(4000.0, 4000.0, 'hello')
+        text.use_coordmap(DataMapper(None))
+        canvas.add(text, redraw=False)
+        assert text in canvas.get_objects_in_rect(0, 0, 1, 1)
+
+        # changes to the parts of compound objects
+        ann = Annulus(500.0, 500.0, 10.0, width=5.0)
+        ann.use_coordmap(DataMapper(None))
+        canvas.add(ann, redraw=False)
+        assert ann in canvas.get_items_at(512.0, 500.0)
+        ann.objects[1].radius = 50.0
+        assert ann in canvas.get_objects_in_rect(540.0, 500.0, 541.0, 501.0)
+
+        # few objects: no index
+        canvas.delete_all_objects(redraw=False)
+        canvas.add(obj, redraw=False)
+        assert canvas.get_objects_in_rect(0, 0, 1, 1) == [obj]
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,150 @@
+#
+# Unit Tests for the IIS_DataListener framebuffer functions and classes
+#
+import unittest
+import io
+import logging
+import numpy as np
+
+from ginga.misc import Bunch
+from ginga.misc.plugins import IIS_DataListener as iis
+
+
+class TestError(Exception):
+    pass
+
+
+class ChunkedReader(io.RawIOBase):
+    """Returns at most `chunk` bytes per read, like a socket."""
+
+    def __init__(self, data, chunk):
+        self.f = io.BytesIO(data)
+        self.chunk = chunk
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        data = self.f.read(min(len(buf), self.chunk))
+        buf[:len(data)] = data
+        return len(data)
+
+
+class TestFramebuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.fb = iis.framebuffer()
+        self.fb.width, self.fb.height = 16, 10
+
+    def test_read_into(self):
+        data = bytes(bytearray(range(100)))
+        buf = np.zeros(120, dtype=np.uint8)
+        n = iis.read_into(ChunkedReader(data, 7), buf[10:90])
+        assert n == 80
+        assert buf[10:90].tobytes() == data[:80]
+        assert not buf[:10].any()
+
+        # short read at the end of the stream
+        n = iis.read_into(ChunkedReader(data, 7), buf)
+        assert n == 100
+
+    def test_alloc(self):
+        fb = self.fb
+        fb.alloc(16, 10)
+        buf = fb.buffer
+        assert buf.dtype == np.uint8
+        assert len(buf) == 160
+        fb.image = 'image'
+        # same size: no reallocation
+        fb.alloc(16, 10)
+        assert fb.buffer is buf
+        assert fb.image == 'image'
+        # new size: reallocation and full redisplay
+        fb.alloc(8, 8)
+        assert len(fb.buffer) == 64
+        assert fb.image is None
+
+    def test_dirty(self):
+        fb = self.fb
+        fb.alloc(16, 10)
+        assert fb.dirty is None
+        fb.mark_dirty(16 * 3 + 2, 16 * 4)
+        assert fb.dirty == (3, 3)
+        fb.mark_dirty(16 * 6, 16 * 8 + 1)
+        assert fb.dirty == (3, 8)
+        fb.mark_dirty(5, 5)
+        assert fb.dirty == (3, 8)
+
+    def test_append(self):
+        fb = self.fb
+        fb.append(np.arange(3, dtype=np.uint8))
+        fb.append(np.arange(2, dtype=np.uint8))
+        assert list(fb.buffer) == [0, 1, 2, 0, 1]
+        assert fb.dirty is None
+
+
+class Controller(object):
+    """Stands in for the IRAF plugin."""
+
+    def __init__(self):
+        self.fb = {}
+
+    def init_frame(self, n):
+        fb = iis.framebuffer()
+        fb.buffer = np.zeros(0, dtype=np.uint8)
+        self.fb[n] = fb
+        return fb
+
+    def get_frame(self, n):
+        return self.fb[n]
+
+
+class TestMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = Controller()
+        self.handler = iis.IIS_RequestHandler.__new__(iis.IIS_RequestHandler)
+        self.handler.logger = logging.getLogger("TestMemory")
+        self.handler.server = Bunch.Bunch(controller=self.controller)
+        self.fb = self.controller.init_frame(0)
+        self.fb.width, self.fb.height = 16, 10
+
+    def packet(self, x, y, data=b'', nbytes=None, read=False):
+        pkt = iis.iis()
+        pkt.tid = iis.PACKED
+        if read:
+            pkt.tid |= iis.IIS_READ
+        pkt.x, pkt.y, pkt.z = x, y, 1
+        pkt.nbytes = len(data) if nbytes is None else nbytes
+        pkt.datain = io.BufferedReader(ChunkedReader(data, 5))
+        pkt.dataout = io.BytesIO()
+        self.handler.handle_memory(pkt)
+        return pkt.dataout.getvalue()
+
+    def test_write_read(self):
+        data = bytes(bytearray(range(20)))
+        self.packet(2, 3, data)
+        assert self.fb.buffer[16*3+2:16*3+22].tobytes() == data
+        assert self.fb.dirty == (3, 4)
+        assert self.packet(2, 3, nbytes=20, read=True) == data
+
+    def test_write_after_reverse(self):
+        self.fb.alloc(16, 10)
+        self.fb.buffer[:] = np.arange(160) % 256
+        # displaying an uninitialized frame leaves a reversed buffer
+        self.fb.buffer = self.fb.buffer[::-1]
+        expected = self.fb.buffer.copy()
+
+        assert self.packet(0, 0, nbytes=16, read=True) == \
+            expected[:16].tobytes()
+
+        data = bytes(bytearray(range(100, 116)))
+        self.packet(0, 2, data)
+        expected[32:48] = np.frombuffer(data, dtype=np.uint8)
+        assert np.array_equal(self.fb.buffer, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,108 @@
+#
+# Unit Tests for the imstats.py classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga import AstroImage, AutoCuts
+from ginga.util import imstats
+
+
+class TestError(Exception):
+    pass
+
+
+class TestImageStats(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestImageStats")
+        self.data = np.random.normal(100.0, 30.0, size=(150, 170))
+        self.data[5, 7] = np.nan
+        self.data[140, 160] = np.inf
+        self.finite = self.data[np.isfinite(self.data)]
+
+    def test_minmax(self):
+        stats = imstats.ImageStats(self.data, block_size=32)
+
+        expected = (np.nanmin(self.data), np.inf)
+        actual = stats.get_minmax()
+        assert expected == actual
+
+        expected = (self.finite.min(), self.finite.max())
+        actual = stats.get_minmax(noinf=True)
+        assert expected == actual
+
+    def test_minmax_special(self):
+        stats = imstats.ImageStats(np.zeros((0, 0)))
+        assert stats.get_minmax() == (0, 0)
+
+        stats = imstats.ImageStats(np.full((10, 10), np.nan))
+        assert np.isnan(stats.get_minmax(noinf=True)).all()
+
+    def test_histogram_matches_numpy(self):
+        stats = imstats.ImageStats(self.data, block_size=32)
+        res = stats.get_histogram(100)
+
+        dist, bins = np.histogram(self.finite, bins=100)
+        assert np.array_equal(dist, res.dist)
+        assert np.allclose(bins, res.bins)
+        assert res.npix == self.finite.size
+
+        # region not aligned with the blocks
+        res = stats.get_histogram(50, 10, 20, 90, 110)
+        region = self.data[20:110, 10:90]
+        region = region[np.isfinite(region)]
+        dist, bins = np.histogram(region, bins=50)
+        assert np.array_equal(dist, res.dist)
+
+    def test_invalidate(self):
+        stats = imstats.ImageStats(self.data, block_size=32)
+        stats.get_histogram(100)
+
+        self.data[40:50, 40:50] = 1000.0
+        stats.invalidate(40, 40, 50, 50)
+
+        expected = 1000.0
+        actual = stats.get_minmax(noinf=True)[1]
+        assert expected == actual
+
+        finite = self.data[np.isfinite(self.data)]
+        dist, bins = np.histogram(finite, bins=100)
+        assert np.array_equal(dist, stats.get_histogram(100).dist)
+
+    def test_image_region_modified(self):
+        image = AstroImage.AstroImage(self.data.copy(), logger=self.logger)
+        stats = image.get_stats()
+        assert image.get_minmax()[0] == np.nanmin(self.data)
+
+        image.get_data()[0:4, 0:4] = -1000.0
+        image.region_modified(0, 0, 4, 4)
+        assert image.get_stats() is stats
+
+        expected = (-1000.0, self.finite.max())
+        actual = image.get_minmax(noinf=True)
+        assert expected == actual
+
+        # new data array: new statistics
+        image.set_data(self.data.copy())
+        assert image.get_stats() is not stats
+
+    def test_autocuts_histogram(self):
+        image = AstroImage.AstroImage(self.data, logger=self.logger)
+        autocuts = AutoCuts.Histogram(self.logger, usecrop=False)
+
+        expected = autocuts.calc_histogram(self.data, pct=0.99)
+        actual = autocuts.calc_histogram_image(image, pct=0.99)
+        assert np.isclose(expected.loval, actual.loval)
+        assert np.isclose(expected.hival, actual.hival)
+        assert actual.loval < 100.0 < actual.hival
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
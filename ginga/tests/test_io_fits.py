@@ -0,0 +1,66 @@
+#
+# Unit Tests for lazy loading of FITS files
+#
+import unittest
+import logging
+import os
+import tempfile
+import shutil
+import numpy as np
+
+from ginga import AstroImage
+from ginga.util import io_fits
+
+
+class TestError(Exception):
+    pass
+
+
+@unittest.skipUnless(io_fits.have_pyfits, "astropy is not installed")
+class TestLazyLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestLazyLoad")
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'mef.fits')
+
+        fits = io_fits.pyfits
+        hdus = [fits.PrimaryHDU()]
+        for i in range(5):
+            data = np.arange(100 * 120, dtype=np.float32).reshape(100, 120)
+            hdus.append(fits.ImageHDU(data=data + i, name='SCI', ver=i + 1))
+        fits.HDUList(hdus).writeto(self.path)
+
+    def test_lazy_matches_eager(self):
+        image1 = AstroImage.AstroImage(logger=self.logger)
+        image1.load_file(self.path)
+        image2 = AstroImage.AstroImage(logger=self.logger)
+        image2.load_file(self.path, lazy=True)
+
+        expected = image1.get('idx')
+        actual = image2.get('idx')
+        assert expected == actual
+
+        assert np.all(image1.get_data() == image2.get_data())
+        assert image1.get_minmax() == image2.get_minmax()
+
+    def test_lazy_select_hdu(self):
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.load_file(self.path, numhdu=('SCI', 3), lazy=True)
+
+        expected = 2.0
+        actual = image.get_data()[0, 0]
+        assert expected == actual
+
+        expected = 'mef[SCI,3]'
+        actual = image.get('name')
+        assert expected == actual
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
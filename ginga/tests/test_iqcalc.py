@@ -0,0 +1,115 @@
+#
+# Unit Tests for the iqcalc.py functions and classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga.misc import Bunch
+from ginga.util import iqcalc
+
+
+class TestError(Exception):
+    pass
+
+
+@unittest.skipUnless(iqcalc.have_scipy, "requires scipy")
+class TestIQCalc(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestIQCalc")
+        self.iqcalc = iqcalc.IQCalc(logger=self.logger)
+
+        # a 200x150 field with a few gaussian stars of sdev 2 (FWHM 4.71)
+        # on a noisy background
+        rng = np.random.RandomState(42)
+        yi, xi = np.mgrid[0:150, 0:200]
+        self.data = rng.normal(100.0, 2.0, size=(150, 200))
+        self.stars = [(50.3, 40.6, 500.0), (120.0, 75.2, 900.0),
+                      (160.7, 110.1, 300.0), (30.2, 120.4, 700.0)]
+        for x, y, amp in self.stars:
+            self.data += amp * np.exp(-((xi - x)**2 + (yi - y)**2) /
+                                      (2 * 2.0**2))
+        self.fwhm = 2.0 * np.sqrt(2.0 * np.log(2.0)) * 2.0
+
+    def test_fit_gaussians(self):
+        medv = float(np.median(self.data))
+        xs = np.array([int(x) for x, y, amp in self.stars])
+        ys = np.array([int(y) for x, y, amp in self.stars])
+        x0s, y0s, xarrs, yarrs, xvalid, yvalid = self.iqcalc.cut_crosses(
+            xs, ys, 15, self.data)
+        fwhm, mu, sdev, maxv, ok = self.iqcalc.fit_gaussians(xarrs, xvalid,
+                                                             medv)
+        assert ok.all()
+
+        # same results as fitting one by one
+        for i in range(len(xs)):
+            x0, y0, xarr, yarr = self.iqcalc.cut_cross(xs[i], ys[i], 15,
+                                                       self.data)
+            assert x0 == x0s[i]
+            res = self.iqcalc.calc_fwhm(xarr, medv=medv)
+            assert np.isclose(abs(res[0]), fwhm[i], rtol=1e-4)
+            assert np.isclose(res[1], mu[i], atol=1e-4)
+
+    def test_cut_crosses_edge(self):
+        xs, ys = np.array([3]), np.array([140])
+        x0s, y0s, xarrs, yarrs, xvalid, yvalid = self.iqcalc.cut_crosses(
+            xs, ys, 15, self.data)
+        x0, y0, xarr, yarr = self.iqcalc.cut_cross(3, 140, 15, self.data)
+
+        assert (x0s[0], y0s[0]) == (x0, y0)
+        assert np.array_equal(xarrs[0][xvalid[0]], xarr)
+        assert np.array_equal(yarrs[0][yvalid[0]], yarr)
+
+    def test_evaluate_peaks(self):
+        peaks = self.iqcalc.find_bright_peaks(self.data, radius=5)
+        objlist = self.iqcalc.evaluate_peaks(peaks, self.data)
+
+        assert isinstance(objlist, np.ndarray)
+        assert objlist.dtype == iqcalc.obj_dtype
+        assert len(objlist) == len(self.stars)
+        for x, y, amp in self.stars:
+            obj = objlist[np.argmin(np.hypot(objlist.objx - x,
+                                             objlist.objy - y))]
+            assert abs(obj.objx - x) < 0.2
+            assert abs(obj.objy - y) < 0.2
+            assert abs(obj.fwhm - self.fwhm) < 0.2
+
+        # the brightest star is picked
+        results = self.iqcalc.objlist_select(objlist, 200, 150)
+        expected = (120, 75)
+        actual = (results[0].x, results[0].y)
+        assert expected == actual
+
+        qs = self.iqcalc.pick_field(self.data)
+        assert (qs.x, qs.y) == expected
+
+    def test_leftover_fits(self):
+        # fits that don't converge in the batch are redone one by one
+        peaks = self.iqcalc.find_bright_peaks(self.data, radius=5)
+        expected = self.iqcalc.evaluate_peaks(peaks, self.data)
+
+        fit_gaussians = self.iqcalc.fit_gaussians
+        self.iqcalc.fit_gaussians = lambda arrs, valid, medv: \
+            fit_gaussians(arrs, valid, medv, max_iter=0)
+        actual = self.iqcalc.evaluate_peaks(peaks, self.data, num_workers=1)
+
+        assert np.allclose(expected.fwhm, actual.fwhm, rtol=1e-4)
+
+    def test_select_list(self):
+        # a list of Bunch objects can still be selected from
+        objs = [Bunch.Bunch(objx=10.0, objy=10.0, pos=0.9, fwhm_x=4.0,
+                            fwhm_y=4.0, fwhm=4.0, fwhm_radius=15,
+                            brightness=100.0 * i, elipse=1.0, x=10, y=10,
+                            skylevel=145.0, background=100.0)
+                for i in range(1, 4)]
+        results = self.iqcalc.objlist_select(objs, 100, 100)
+        expected = [300.0, 200.0, 100.0]
+        actual = list(results.brightness)
+        assert expected == actual
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
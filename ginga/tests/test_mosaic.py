@@ -0,0 +1,89 @@
+#
+# Unit Tests for the mosaic.py functions
+#
+import unittest
+import logging
+import os
+import tempfile
+import shutil
+import numpy as np
+
+from ginga.util import wcs, mosaic
+
+try:
+    from astropy.io import fits
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+
+class TestError(Exception):
+    pass
+
+
+@unittest.skipUnless(have_astropy, "requires astropy")
+class TestMosaic(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestMosaic")
+        self.tmpdir = tempfile.mkdtemp()
+
+        # two 100x50 pieces, the second one 60 pixels to the right
+        self.files = []
+        for i, val in enumerate((5.0, 7.0)):
+            header = fits.Header()
+            kwds = wcs.simple_wcs(50, 25, 10.0 + i * 0.006, 20.0, 0.0001,
+                                  0.0)
+            for kwd, kval in kwds.items():
+                header[kwd] = kval
+            data = np.full((50, 100), val, dtype=np.float32)
+            path = os.path.join(self.tmpdir, 'piece%d.fits' % i)
+            fits.PrimaryHDU(data, header).writeto(path)
+            self.files.append(path)
+
+    def test_plan(self):
+        plan = mosaic.plan_mosaic(self.logger, self.files)
+        assert plan.height == 50
+        assert 155 <= plan.width <= 160
+
+        expected = (0, 0, 100, 50)
+        actual = plan.pieces[0].bbox
+        assert expected == actual
+
+    def test_mosaic_average(self):
+        outfile = os.path.join(self.tmpdir, 'mosaic.fits')
+        covfile = os.path.join(self.tmpdir, 'coverage.fits')
+        mosaic.mosaic_files(self.logger, self.files, outfile, num_workers=1,
+                            coverage_file=covfile)
+
+        data = fits.getdata(outfile)
+        coverage = fits.getdata(covfile)
+        assert data.shape == coverage.shape
+
+        expected = [5.0, 6.0, 7.0]
+        actual = list(np.unique(data[coverage > 0]))
+        assert expected == actual
+        assert np.all(data[coverage == 2] == 6.0)
+        # the output has the WCS of the mosaic
+        header = fits.getheader(outfile)
+        assert header['NAXIS1'] == data.shape[1]
+        assert 'CRPIX1' in header
+
+    def test_mosaic_first(self):
+        outfile = os.path.join(self.tmpdir, 'mosaic.fits')
+        mosaic.mosaic_files(self.logger, self.files, outfile, num_workers=1,
+                            merge='first')
+        data = fits.getdata(outfile)
+
+        # in the overlap, the first piece is kept
+        assert data[25, 70] == 5.0
+        assert data[25, 120] == 7.0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,165 @@
+#
+# Unit Tests for the playback.py functions and classes
+#
+import unittest
+import logging
+import threading
+import numpy as np
+
+from ginga import AstroImage, AutoCuts
+from ginga.util import playback
+from ginga.mockw.ImageViewCanvasMock import ImageViewCanvas
+
+try:
+    from astropy.io import fits
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+
+class TestError(Exception):
+    pass
+
+
+class TestPlayback(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestPlayback")
+        # a cube of 20 slices, each with the slice number plus a gradient
+        zi, yi, xi = np.mgrid[0:20, 0:60, 0:80]
+        self.cube = (zi * 100 + xi + yi).astype(np.float32)
+        self.autocuts = AutoCuts.Minmax(self.logger)
+
+    def make_image(self):
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.load_hdu(fits.PrimaryHDU(self.cube))
+        return image
+
+    @unittest.skipUnless(have_astropy, "requires astropy")
+    def test_render(self):
+        renderer = playback.SliceRenderer(self.cube, [0], 2, self.autocuts,
+                                          0.0, 2000.0, vmax=255,
+                                          bbox=(10, 5, 49, 34),
+                                          scale=(0.5, 0.5))
+        assert renderer.num_slices == 20
+
+        image = self.make_image()
+        image.set_naxispath([7])
+        res = image.get_scaled_cutout(10, 5, 49, 34, 0.5, 0.5)
+        expected = self.autocuts.cut_levels_idx(res.data, 0.0, 2000.0,
+                                                vmin=0, vmax=255)
+        actual = renderer.render(7)
+        assert expected.shape == (15, 20)
+        assert np.array_equal(expected, actual)
+
+        # frames are not overwritten by later renders
+        actual2 = renderer.render(8)
+        assert not np.array_equal(actual, actual2)
+        assert np.array_equal(expected, actual)
+
+    def test_render_4d(self):
+        cube4 = np.stack([self.cube, self.cube + 5000])
+        # slices along NAXIS3, with NAXIS4 at index 1
+        renderer = playback.SliceRenderer(cube4, [0, 1], 2, self.autocuts,
+                                          0.0, 10000.0)
+        assert np.array_equal(renderer.get_slice(3), cube4[1, 3])
+
+        # slices along NAXIS4, with NAXIS3 at index 3
+        renderer = playback.SliceRenderer(cube4, [3, 0], 3, self.autocuts,
+                                          0.0, 10000.0)
+        assert renderer.num_slices == 2
+        assert np.array_equal(renderer.get_slice(1), cube4[1, 3])
+
+    def test_due_frames(self):
+        player = playback.SlicePlayer(self.logger, lambda idx: idx * 10, 5,
+                                      interval=1.0, buffer_size=3)
+        player.start(1)
+        t0 = player._t0
+
+        expected = (1, 10)
+        actual = player.get_due_frame(t0)
+        assert expected == actual
+        # not returned twice
+        assert player.get_due_frame(t0 + 0.5) is None
+
+        # late: frames 2 and 3 are dropped, and playback wraps around
+        for future in list(player._frames.values()):
+            future.result()
+        expected = (4, 40)
+        actual = player.get_due_frame(t0 + 3.5)
+        assert expected == actual
+        player._frames[5].result()
+        expected = (0, 0)
+        actual = player.get_due_frame(t0 + 4.0)
+        assert expected == actual
+        assert player.num_shown == 3
+        assert player.num_dropped == 2
+
+        # the ring is bounded
+        assert len(player._frames) <= 3
+        player.close()
+
+    def test_slow_render(self):
+        # a frame that is not ready when due is skipped, not waited for
+        event = threading.Event()
+
+        def render(idx):
+            if idx == 1:
+                event.wait()
+            return idx
+
+        player = playback.SlicePlayer(self.logger, render, 10,
+                                      interval=1.0, buffer_size=4)
+        player.start(0)
+        t0 = player._t0
+        assert player.get_due_frame(t0) == (0, 0)
+        assert player.get_due_frame(t0 + 1.0) is None
+
+        event.set()
+        player._frames[2].result()
+        assert player.get_due_frame(t0 + 2.0) == (2, 2)
+        assert player.num_dropped == 1
+        player.close()
+
+    def test_iter_frames(self):
+        player = playback.SlicePlayer(self.logger, lambda idx: -idx, 20,
+                                      buffer_size=4, loop=False)
+        expected = [(i, -i) for i in range(3, 15)]
+        actual = list(player.iter_frames(3, 15))
+        assert expected == actual
+        player.close()
+
+    @unittest.skipUnless(have_astropy, "requires astropy")
+    def test_prergb(self):
+        viewer = ImageViewCanvas(logger=self.logger)
+        viewer.configure(100, 100)
+        viewer.enable_autocuts('off')
+        viewer.cut_levels(0.0, 2000.0)
+        image = self.make_image()
+        viewer.set_image(image)
+        viewer.scale_to(0.5, 0.5)
+
+        viewer.get_rgb_object(whence=0)
+        canvas_img = viewer.get_canvas_image()
+        geometry = canvas_img.get_cutout_geometry(viewer)
+        assert geometry is not None
+        x1, y1, x2, y2, scale_x, scale_y = geometry
+        vmax = viewer.get_rgbmap().get_hash_size() - 1
+        renderer = playback.SliceRenderer(self.cube, [0], 2,
+                                          viewer.autocuts, 0.0, 2000.0,
+                                          vmax=vmax, bbox=(x1, y1, x2, y2),
+                                          scale=(scale_x, scale_y))
+
+        # a pre-rendered slice looks the same as the slice itself
+        canvas_img.get_cache(viewer).prergb = renderer.render(9)
+        actual = np.copy(viewer.get_rgb_object(whence=2).get_array('RGB'))
+
+        image.set_naxispath([9])
+        expected = viewer.get_rgb_object(whence=0).get_array('RGB')
+        assert np.array_equal(expected, actual)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
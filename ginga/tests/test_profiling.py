@@ -0,0 +1,89 @@
+#
+# Unit Tests for the profiling.py classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga import AstroImage
+from ginga.mockw.ImageViewCanvasMock import ImageViewCanvas
+from ginga.util import profiling
+
+
+class TestError(Exception):
+    pass
+
+
+class TestRenderProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestRenderProfile")
+        self.profile = profiling.RenderProfile(num_frames=5)
+
+    def test_disabled(self):
+        t0 = self.profile.start_frame(0)
+        assert t0 is None
+        t1 = self.profile.start()
+        assert t1 is None
+        self.profile.stop('cuts', t1, 100)
+        self.profile.end_frame(t0)
+        assert self.profile.get_frames() == []
+
+    def test_ring_buffer(self):
+        frames = []
+        self.profile.add_callback('frame',
+                                  lambda profile, frame: frames.append(frame))
+        self.profile.enable(True)
+        for i in range(8):
+            t0 = self.profile.start_frame(1)
+            for j in range(2):
+                t1 = self.profile.start()
+                self.profile.stop('cuts', t1, 100)
+            self.profile.end_frame(t0)
+
+        assert len(frames) == 8
+        assert len(self.profile.get_frames()) == 5
+        # stages that run more than once in a frame add up
+        assert frames[-1].stages['cuts'][1] == 200
+
+        stats = self.profile.get_stats()
+        assert stats['cuts'].count == 5
+        assert stats['cuts'].nbytes == 200
+        assert set(stats['total'].percentiles.keys()) == set([50, 90, 99])
+
+    def test_viewer_stages(self):
+        viewer = ImageViewCanvas(self.logger)
+        viewer.configure(200, 150)
+        viewer.enable_autocuts('off')
+        image = AstroImage.AstroImage(np.random.rand(300, 300),
+                                      logger=self.logger)
+        viewer.set_image(image)
+        viewer.enable_profiling(True)
+
+        def render(whence):
+            t0 = viewer.profile.start_frame(whence)
+            viewer.get_rgb_object(whence=whence)
+            viewer.profile.end_frame(t0)
+            return viewer.profile.get_frames()[-1]
+
+        frame = render(0)
+        for stage in ('bg_dims', 'cutout', 'cuts', 'cmap', 'compose',
+                      'transforms'):
+            assert stage in frame.stages
+
+        # a color map change skips the earlier stages
+        frame = render(2)
+        assert 'cuts' not in frame.stages
+        assert 'cmap' in frame.stages
+
+        viewer.enable_profiling(False)
+        assert viewer.profile.start_frame(0) is None
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
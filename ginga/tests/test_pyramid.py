@@ -0,0 +1,107 @@
+#
+# Unit Tests for the pyramid.py functions
+#
+import unittest
+import numpy as np
+
+from ginga.util import pyramid
+from ginga import AstroImage
+
+
+class TestError(Exception):
+    pass
+
+
+class TestPyramid(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.random.rand(301, 250).astype(np.float32)
+
+    def test_downsample_shape(self):
+        res = pyramid.downsample(self.data)
+
+        expected = (151, 125)
+        actual = res.shape
+        assert expected == actual
+
+        expected = self.data.dtype
+        actual = res.dtype
+        assert expected == actual
+
+    def test_downsample_values(self):
+        data = np.arange(16, dtype=float).reshape(4, 4)
+        res = pyramid.downsample(data)
+
+        expected = np.array([[2.5, 4.5], [10.5, 12.5]])
+        assert np.allclose(expected, res)
+
+    def test_downsample_rgb(self):
+        data = np.zeros((10, 9, 3), dtype=np.uint8)
+        res = pyramid.downsample(data)
+
+        expected = (5, 5, 3)
+        actual = res.shape
+        assert expected == actual
+
+    def test_levels(self):
+        pyr = pyramid.ImagePyramid(self.data, tile_size=32, min_size=32)
+
+        expected = [(301, 250), (151, 125), (76, 63), (38, 32)]
+        actual = pyr.shapes
+        assert expected == actual
+
+    def test_choose_level(self):
+        pyr = pyramid.ImagePyramid(self.data, tile_size=32, min_size=32)
+
+        assert pyr.choose_level(1.0, 1.0) == 0
+        assert pyr.choose_level(2.0, 2.0) == 0
+        assert pyr.choose_level(0.6, 0.6) == 0
+        assert pyr.choose_level(0.5, 0.5) == 1
+        assert pyr.choose_level(0.3, 0.3) == 1
+        # clamped to the coarsest level available
+        assert pyr.choose_level(0.001, 0.001) == 3
+
+    def test_region_matches_full_downsample(self):
+        pyr = pyramid.ImagePyramid(self.data, tile_size=32, min_size=32)
+        full = pyramid.downsample(pyramid.downsample(self.data))
+
+        actual = pyr.get_region(2, 0, 0, 1000, 1000)
+        assert np.allclose(full, actual)
+
+        actual = pyr.get_region(2, 10, 5, 40, 70)
+        assert np.allclose(full[5:71, 10:41], actual)
+
+    def test_tiles_are_lazy(self):
+        pyr = pyramid.ImagePyramid(self.data, tile_size=32, min_size=32)
+        pyr.get_region(1, 0, 0, 10, 10)
+
+        # only the tile that was touched is built
+        expected = [(1, 0, 0)]
+        actual = list(pyr._tiles.keys())
+        assert expected == actual
+
+    def test_scaled_cutout_dims(self):
+        image = AstroImage.AstroImage(self.data)
+
+        res1 = image.get_scaled_cutout(0, 0, 250, 301, 0.2, 0.2)
+        res2 = image.get_scaled_cutout_tiled(0, 0, 250, 301, 0.2, 0.2,
+                                             tile_size=64)
+        assert res1.data.shape == res2.data.shape
+        assert res2.level == 2
+
+    def test_pyramid_reset_on_set_data(self):
+        image = AstroImage.AstroImage(self.data)
+        pyr = image.get_pyramid(tile_size=64)
+        assert image.get_pyramid(tile_size=64) is pyr
+
+        image.set_data(np.zeros((100, 100)))
+        assert image.get_pyramid(tile_size=64) is not pyr
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
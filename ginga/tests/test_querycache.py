@@ -0,0 +1,185 @@
+#
+# Unit Tests for the querycache.py functions and classes
+#
+import unittest
+import logging
+import os
+import time
+import tempfile
+import shutil
+import threading
+import numpy as np
+
+from ginga.util import catalog, querycache
+from ginga.util.six.moves import BaseHTTPServer, socketserver
+from ginga.util.six.moves.urllib.parse import urlparse, parse_qs
+
+
+class TestError(Exception):
+    pass
+
+
+class CatalogHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """A stand-in for a catalog server: returns the stars of the field
+    in the cone given by the query, in the format CatalogServer reads.
+    """
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        ra, dec = float(query['ra'][0]), float(query['dec'][0])
+        radius = float(query['r'][0]) / 60.0
+        with server.lock:
+            server.requests.append(self.path)
+        server.release.wait()
+
+        lines = ['name ra dec a b c d e f g mag', '-' * 40]
+        seps = querycache.calc_sep(ra, dec, server.ras, server.decs)
+        for i in np.nonzero(seps <= radius)[0]:
+            lines.append('star%d %.6f %.6f 0 0 0 0 0 0 0 %.2f' % (
+                i, server.ras[i], server.decs[i], 10.0 + i % 7))
+        body = '\n'.join(lines).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CatalogHTTPServer(socketserver.ThreadingMixIn,
+                        BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestQueryCache")
+        self.tmpdir = tempfile.mkdtemp()
+
+        httpd = CatalogHTTPServer(('127.0.0.1', 0), CatalogHandler)
+        rng = np.random.RandomState(3)
+        httpd.ras = rng.uniform(149.0, 151.0, 2000)
+        httpd.decs = rng.uniform(1.0, 3.0, 2000)
+        httpd.requests = []
+        httpd.lock = threading.Lock()
+        httpd.release = threading.Event()
+        httpd.release.set()
+        self.httpd = httpd
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        url = ('http://127.0.0.1:%d/cat?ra=%%(ra)s&dec=%%(dec)s&r=%%(r)s' %
+               (httpd.server_address[1]))
+        self.server = catalog.CatalogServer(self.logger, 'Test Catalog',
+                                            'test', url, 'stand-in server')
+        self.server.format = 'deg'
+        self.make_manager()
+
+    def make_manager(self):
+        self.cache = querycache.QueryCache(os.path.join(self.tmpdir,
+                                                        'queries.db'),
+                                           self.logger)
+        self.qmgr = querycache.QueryManager(self.logger, cache=self.cache)
+
+    def search(self, ra, dec, r, tag=None):
+        params = dict(ra=str(ra), dec=str(dec), r=str(r))
+        return self.qmgr.search_catalog(self.server, params, tag=tag)
+
+    def names(self, res):
+        return sorted([star['name'] for star in res[0]])
+
+    def test_cache(self):
+        res1 = self.search(150.0, 2.0, 20.0).result(timeout=10)
+        assert len(res1[0]) > 0
+        assert len(self.httpd.requests) == 1
+
+        # a repeated query, or one inside the first cone, is served from
+        # the cache
+        t1 = time.time()
+        res2 = self.search(150.0, 2.0, 20.0).result(timeout=10)
+        assert time.time() - t1 < 0.5
+        assert self.names(res1) == self.names(res2)
+        assert res2[1].columns == res1[1].columns
+
+        res3 = self.search(150.1, 2.05, 10.0).result(timeout=10)
+        assert len(self.httpd.requests) == 1
+        # the same stars that the server would return
+        self.cache.clear()
+        expected = self.search(150.1, 2.05, 10.0).result(timeout=10)
+        assert len(self.httpd.requests) == 2
+        assert 0 < len(res3[0]) < len(res1[0])
+        assert self.names(expected) == self.names(res3)
+
+        # a cone not inside is fetched
+        self.search(150.4, 2.0, 10.0).result(timeout=10)
+        assert len(self.httpd.requests) == 3
+
+    def test_persist(self):
+        res1 = self.search(150.0, 2.0, 20.0).result(timeout=10)
+        self.qmgr.close()
+        self.cache.close()
+        self.make_manager()
+
+        res2 = self.search(150.0, 2.0, 15.0).result(timeout=10)
+        assert len(self.httpd.requests) == 1
+        assert 0 < len(res2[0]) < len(res1[0])
+
+    def test_merge(self):
+        # requests made while a covering query is in flight share it
+        self.httpd.release.clear()
+        f1 = self.search(150.0, 2.0, 20.0)
+        f2 = self.search(150.0, 2.0, 20.0)
+        f3 = self.search(150.1, 2.0, 5.0)
+        assert f1 is not f2
+        self.httpd.release.set()
+
+        res1, res2, res3 = [f.result(timeout=10) for f in (f1, f2, f3)]
+        assert len(self.httpd.requests) == 1
+        assert self.names(res1) == self.names(res2)
+        assert set(self.names(res3)) < set(self.names(res1))
+        assert self.qmgr.num_fetched == 1
+
+    def test_cancel(self):
+        self.httpd.release.clear()
+        f1 = self.search(150.0, 2.0, 20.0, tag='pan')
+        # a new request with the same tag cancels the old one
+        f2 = self.search(150.5, 2.5, 20.0, tag='pan')
+        assert f1.cancelled()
+        assert not f2.cancelled()
+        self.httpd.release.set()
+        assert len(f2.result(timeout=10)[0]) > 0
+
+        self.qmgr.cancel('pan')
+        assert not f2.cancelled()
+
+    def test_cones(self):
+        assert querycache.cone_contains((150.0, 2.0, 0.5), (150.1, 2.1, 0.2))
+        assert not querycache.cone_contains((150.0, 2.0, 0.5),
+                                            (150.4, 2.0, 0.2))
+        # near the pole, RA offsets are small distances
+        assert querycache.cone_contains((0.0, 89.9, 0.5), (180.0, 89.9, 0.2))
+
+        cone = querycache.get_cone(dict(ra='10:00:00', dec='+02:00:00',
+                                        r='30'))
+        assert np.allclose(cone, (150.0, 2.0, 0.5))
+        assert querycache.get_cone(dict(ra='150.0', dec='2.0')) is None
+
+    def tearDown(self):
+        self.httpd.release.set()
+        self.qmgr.close()
+        self.cache.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
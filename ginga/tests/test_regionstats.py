@@ -0,0 +1,112 @@
+#
+# Unit Tests for the regionstats.py functions and classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga import BaseImage
+from ginga.util import regionstats
+from ginga.canvas.coordmap import DataMapper
+from ginga.canvas.types.all import Circle, Box, Polygon, Annulus
+
+
+class TestError(Exception):
+    pass
+
+
+class TestRegionStats(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestRegionStats")
+        rng = np.random.RandomState(7)
+        self.data = rng.normal(100.0, 10.0, size=(120, 150))
+        self.image = BaseImage.BaseImage(self.data, logger=self.logger)
+
+    def make_shapes(self):
+        shapes = [Circle(40.3, 50.7, 12.2),
+                  Box(100, 60, 20, 8, rot_deg=30.0),
+                  Polygon([(10, 10), (60, 15), (30, 70), (12, 40)]),
+                  # overlaps the circle
+                  Annulus(45, 55, 6, width=10),
+                  Circle(2, 3, 1.5)]
+        for shape in shapes:
+            shape.use_coordmap(DataMapper(None))
+        return shapes
+
+    def check_stats(self, shape, rec):
+        mask = self.image.get_shape_mask(shape)
+        vals = self.data[mask]
+        vals = vals[np.isfinite(vals)]
+        ys, xs = np.nonzero(mask)
+        assert rec.npix == len(vals)
+        assert np.isclose(rec.sumval, vals.sum())
+        assert np.isclose(rec.meanval, vals.mean())
+        assert np.isclose(rec.medianval, np.median(vals))
+        assert np.isclose(rec.stdval, vals.std())
+        assert rec.minval == vals.min()
+        assert rec.maxval == vals.max()
+        if np.isfinite(self.data[mask]).all():
+            assert np.isclose(rec.xcen, (vals * xs).sum() / vals.sum())
+            assert np.isclose(rec.ycen, (vals * ys).sum() / vals.sum())
+
+    def test_stats(self):
+        shapes = self.make_shapes()
+        res = self.image.get_region_stats(shapes)
+        assert isinstance(res, np.ndarray)
+        assert res.dtype == regionstats.stats_dtype
+        assert len(res) == len(shapes)
+        for shape, rec in zip(shapes, res):
+            self.check_stats(shape, rec)
+
+    def test_nan_and_empty(self):
+        self.data[50, 40] = np.nan
+        self.data[51, 40] = np.inf
+        shapes = self.make_shapes()
+        off = Circle(500, 500, 5)
+        off.use_coordmap(DataMapper(None))
+        res = self.image.get_region_stats(shapes + [off])
+        self.check_stats(shapes[0], res[0])
+
+        assert res[-1].npix == 0
+        assert np.isnan(res[-1].meanval)
+        assert np.isnan(res[-1].medianval)
+        assert np.isnan(res[-1].minval)
+
+    def test_cache(self):
+        shapes = self.make_shapes()
+        res1 = self.image.get_region_stats(shapes)
+
+        # only changed shapes are recalculated
+        calc_region_stats = regionstats.calc_region_stats
+        counts = []
+
+        def calc(data, masks):
+            counts.append(len(masks))
+            return calc_region_stats(data, masks)
+
+        regionstats.calc_region_stats = calc
+        try:
+            res2 = self.image.get_region_stats(shapes)
+            assert counts == []
+            assert np.array_equal(res1, res2)
+
+            shapes[1].move_to(90, 70)
+            res3 = self.image.get_region_stats(shapes)
+            assert counts == [1]
+            self.check_stats(shapes[1], res3[1])
+
+            # modified data invalidates the results
+            self.data[:10, :10] = 5.0
+            self.image.region_modified(0, 0, 10, 10)
+            res4 = self.image.get_region_stats(shapes)
+            assert counts == [1, len(shapes)]
+            self.check_stats(shapes[4], res4[4])
+        finally:
+            regionstats.calc_region_stats = calc_region_stats
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
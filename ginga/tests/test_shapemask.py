@@ -0,0 +1,135 @@
+#
+# Unit Tests for the shapemask.py functions and classes
+#
+import unittest
+import logging
+import numpy as np
+
+from ginga import BaseImage
+from ginga.util import shapemask
+from ginga.canvas.coordmap import DataMapper, CanvasMapper, WCSMapper
+from ginga.canvas.types.all import (Circle, Box, Ellipse, Polygon,
+                                    Annulus, CompoundObject)
+
+
+class TestError(Exception):
+    pass
+
+
+class TestShapeMask(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestShapeMask")
+        yi, xi = np.mgrid[0:120, 0:150]
+        self.data = (xi + 1000 * yi).astype(np.float64)
+        self.image = BaseImage.BaseImage(self.data, logger=self.logger)
+
+    def make_shapes(self):
+        shapes = [Circle(40.3, 50.7, 12.2),
+                  Box(100, 60, 20, 8, rot_deg=30.0),
+                  Ellipse(70, 30, 15, 6, rot_deg=-20.0),
+                  Polygon([(10, 10), (60, 15), (30, 70), (12, 40)]),
+                  Annulus(80, 80, 10, width=5),
+                  # partly off the image
+                  Circle(145, 115, 20),
+                  CompoundObject(Circle(20, 100, 5), Circle(50, 100, 5))]
+        for shape in shapes:
+            shape.use_coordmap(DataMapper(None))
+        return shapes
+
+    def full_mask(self, shape):
+        # the mask tested on every pixel of the image
+        yi = np.mgrid[:120].reshape(-1, 1)
+        xi = np.mgrid[:150].reshape(1, -1)
+        return np.broadcast_to(shape.contains_arr(xi, yi), (120, 150))
+
+    def test_masks(self):
+        for shape in self.make_shapes():
+            expected = self.full_mask(shape)
+            assert expected.any()
+
+            mask = self.image.get_shape_mask(shape)
+            assert np.array_equal(expected, mask)
+
+            rle = self.image.get_shape_rle(shape)
+            assert rle.get_count() == expected.sum()
+            assert np.array_equal(self.image.get_shape_values(shape),
+                                  self.data[expected])
+
+            view, mask = self.image.get_shape_view(shape)
+            assert np.array_equal(expected[view], mask)
+            assert mask.sum() == expected.sum()
+
+            mdata = self.image.cutout_shape(shape)
+            assert mdata.sum() == self.data[expected].sum()
+
+    def test_strips(self):
+        # masks made a strip of rows at a time are the same
+        shape = Circle(75, 60, 50)
+        shape.use_coordmap(DataMapper(None))
+        expected = self.full_mask(shape)
+        strip_rows = shapemask.strip_rows
+        try:
+            shapemask.strip_rows = 7
+            rle = shapemask.make_shape_mask(shape, 150, 120)
+        finally:
+            shapemask.strip_rows = strip_rows
+        actual = np.zeros((120, 150), dtype=bool)
+        rle.fill(actual)
+        assert np.array_equal(expected, actual)
+
+    def test_off_image(self):
+        shape = Circle(500, 500, 10)
+        shape.use_coordmap(DataMapper(None))
+        assert self.image.get_shape_rle(shape).get_count() == 0
+        assert len(self.image.get_shape_values(shape)) == 0
+        assert not self.image.get_shape_mask(shape).any()
+
+    def test_cache(self):
+        shape = Circle(40, 50, 12)
+        shape.use_coordmap(DataMapper(None))
+        rle = self.image.get_shape_rle(shape)
+        assert self.image.get_shape_rle(shape) is rle
+
+        # a change of color keeps the mask, moving the shape does not
+        shape.color = 'red'
+        shape.linewidth = 3
+        assert self.image.get_shape_rle(shape) is rle
+        shape.move_to(60, 50)
+        rle2 = self.image.get_shape_rle(shape)
+        assert rle2 is not rle
+        assert rle2.bbox[0] == rle.bbox[0] + 20
+
+        # shapes in other coordinates depend on the viewer: not cached
+        shape = Circle(40, 50, 12, coord='window')
+        shape.use_coordmap(CanvasMapper(None))
+        assert shapemask.get_shape_key(shape) is None
+        shape = Circle(40, 50, 12)
+        shape.use_coordmap(WCSMapper(None))
+        assert shapemask.get_shape_key(shape) is None
+        compound = CompoundObject(Circle(40, 50, 12), shape)
+        assert shapemask.get_shape_key(compound) is None
+
+        # the cache is bounded
+        cache = shapemask.MaskCache(max_size=3)
+        for i in range(5):
+            shape = Circle(10 * i, 10, 5)
+            shape.use_coordmap(DataMapper(None))
+            cache.get_mask(shape, 150, 120)
+        assert len(cache) == 3
+
+    def test_from_dense(self):
+        mask = np.random.RandomState(1).rand(30, 40) > 0.5
+        rle = shapemask.ShapeMask.from_dense(mask, x1=5, y1=7)
+        assert rle.bbox == (5, 7, 44, 36)
+        assert np.array_equal(rle.to_dense(), mask)
+        ys, xs = rle.get_coords()
+        ys0, xs0 = np.nonzero(mask)
+        assert np.array_equal(ys, ys0 + 7)
+        assert np.array_equal(xs, xs0 + 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
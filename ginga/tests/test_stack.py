@@ -0,0 +1,105 @@
+#
+# Unit Tests for the stack.py functions
+#
+import unittest
+import logging
+import os
+import tempfile
+import shutil
+import numpy as np
+
+from ginga import AstroImage
+from ginga.util import stack, dp
+
+try:
+    from astropy.io import fits
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+
+class TestError(Exception):
+    pass
+
+
+class TestStack(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestStack")
+        rng = np.random.RandomState(11)
+        self.frames = [rng.normal(100.0, 5.0, size=(37, 23)).astype(
+            np.float32) for i in range(7)]
+        # outliers
+        self.frames[2][5, 5] = 1.0e4
+        self.frames[4][10, 3] = -1.0e4
+        self.cube = np.array(self.frames)
+
+    def test_methods(self):
+        res = stack.stack_frames(self.frames, method='median', band_rows=5)
+        assert np.allclose(res, np.median(self.cube, axis=0))
+
+        res = stack.stack_frames(self.frames, method='mean', band_rows=4)
+        assert np.allclose(res, self.cube.mean(axis=0, dtype=np.float64))
+
+        res = stack.stack_frames(self.frames, method='minmax', band_rows=6,
+                                 nlow=1, nhigh=2)
+        expected = np.sort(self.cube, axis=0)[1:5].mean(axis=0)
+        assert np.allclose(res, expected)
+
+        # the outliers are rejected
+        res = stack.stack_frames(self.frames, method='sigclip',
+                                 sigma_lo=2.0, sigma_hi=2.0)
+        assert abs(res[5, 5] - 100.0) < 10.0
+        assert abs(res[10, 3] - 100.0) < 10.0
+        vals = np.delete(self.cube[:, 5, 5], 2)
+        assert vals.min() <= res[5, 5] <= vals.max()
+
+    def test_errors(self):
+        self.assertRaises(stack.StackError, stack.stack_frames,
+                          self.frames, method='mode')
+        self.assertRaises(stack.StackError, stack.stack_frames,
+                          self.frames + [np.zeros((10, 10))])
+        self.assertRaises(stack.StackError, stack.stack_frames,
+                          self.frames[:2], method='minmax')
+
+    def test_workers(self):
+        fracs = []
+        res = stack.stack_frames(self.frames, method='median', band_rows=3,
+                                 num_workers=2, progress_cb=fracs.append)
+        assert np.allclose(res, np.median(self.cube, axis=0))
+        assert len(fracs) == 13
+        assert fracs[-1] == 1.0
+
+    def test_dp(self):
+        images = [AstroImage.AstroImage(data, logger=self.logger)
+                  for data in self.frames]
+        bias = dp.make_bias(images, band_rows=8)
+        assert np.allclose(bias.get_data(), np.median(self.cube, axis=0))
+
+        flat = dp.make_flat(images, band_rows=8).get_data()
+        expected = np.median(self.cube, axis=0)
+        assert np.allclose(flat, expected / np.median(expected))
+
+    @unittest.skipUnless(have_astropy, "requires astropy")
+    def test_files(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i, data in enumerate(self.frames):
+                path = os.path.join(tmpdir, 'frame%d.fits' % (i))
+                fits.PrimaryHDU(data).writeto(path)
+                paths.append(path)
+
+            outfile = os.path.join(tmpdir, 'bias.fits')
+            stack.stack_files(self.logger, paths, outfile, method='median',
+                              max_band_mb=0.01, num_workers=2)
+            res = fits.getdata(outfile)
+            assert np.allclose(res, np.median(self.cube, axis=0))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,135 @@
+#
+# Unit Tests for the thumbdb.py functions and classes
+#
+import unittest
+import logging
+import os
+import tempfile
+import shutil
+import numpy as np
+
+from ginga.util import thumbdb
+
+
+class TestError(Exception):
+    pass
+
+
+class TestThumbDB(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestThumbDB")
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = thumbdb.ThumbIndex(os.path.join(self.tmpdir,
+                                                     'thumbs.db'),
+                                        self.logger)
+
+        # 1000x600 image with a gradient
+        yi, xi = np.mgrid[0:600, 0:1000]
+        self.data = (xi + yi).astype(np.float32)
+        self.path = os.path.join(self.tmpdir, 'image.fits')
+        if thumbdb.have_astropy:
+            from astropy.io import fits
+            header = fits.Header()
+            header['OBJECT'] = 'M27'
+            fits.PrimaryHDU(self.data, header).writeto(self.path)
+        else:
+            with open(self.path, 'w') as out_f:
+                out_f.write('dummy')
+
+    def test_key(self):
+        key1 = thumbdb.get_thumb_key(self.path)
+        assert key1 == thumbdb.get_thumb_key(self.path)
+
+        # different render settings or HDU give different keys
+        render = thumbdb.get_render_settings(cmap='heat')
+        assert key1 != thumbdb.get_thumb_key(self.path, render=render)
+        assert key1 != thumbdb.get_thumb_key(self.path, idx=1)
+
+        # so does a modified file
+        st = os.stat(self.path)
+        os.utime(self.path, (st.st_atime, st.st_mtime + 10))
+        assert key1 != thumbdb.get_thumb_key(self.path)
+
+    def test_index(self):
+        rgb = np.random.randint(0, 255, size=(90, 150, 3)).astype(np.uint8)
+        key1 = thumbdb.get_thumb_key(self.path)
+        self.index.put(key1, self.path, rgb, dict(OBJECT='M27'))
+
+        res = self.index.get_many([key1, 'nosuchkey'])
+        assert list(res.keys()) == [key1]
+        rgb2, metadata = res[key1]
+        assert np.array_equal(rgb, rgb2)
+        assert metadata == dict(OBJECT='M27')
+        assert self.index.get('nosuchkey') is None
+
+        # the index persists
+        self.index.close()
+        self.index = thumbdb.ThumbIndex(self.index.dbpath, self.logger)
+        assert self.index.get(key1) is not None
+
+        # a new version of the file replaces the old thumbnail
+        st = os.stat(self.path)
+        os.utime(self.path, (st.st_atime, st.st_mtime + 10))
+        key2 = thumbdb.get_thumb_key(self.path)
+        self.index.put(key2, self.path, rgb, {})
+        assert self.index.get(key1) is None
+        assert self.index.get_count() == 1
+
+    def test_batch_lookup(self):
+        rgb = np.zeros((10, 10, 3), dtype=np.uint8)
+        keys = []
+        for i in range(thumbdb.batch_size + 20):
+            key = thumbdb.get_thumb_key(self.path, idx=i)
+            self.index.put(key, self.path, rgb, dict(i=i))
+            keys.append(key)
+
+        res = self.index.get_many(keys)
+        assert len(res) == len(keys)
+        assert res[keys[-1]][1] == dict(i=len(keys) - 1)
+
+    def test_render(self):
+        data = thumbdb.decimate(self.data, 150)
+        assert max(data.shape) <= 150
+
+        rgb = thumbdb.render_thumb(data)
+        assert rgb.shape == data.shape + (3,)
+        assert rgb.dtype == np.uint8
+        # gray color map, increasing with the data
+        assert rgb[0, 0, 0] < rgb[-1, -1, 0]
+
+        # color data is used as is
+        rgb2 = thumbdb.render_thumb(rgb)
+        assert np.array_equal(rgb, rgb2)
+
+        # given cut levels (e.g. the channel's) are used as is
+        lo, hi = data.min(), data.max()
+        rgb3 = thumbdb.render_thumb(data, cuts=(hi, hi + 1))
+        assert not rgb3.any()
+        rgb3 = thumbdb.render_thumb(data, cuts=(lo - 2, lo - 1))
+        assert (rgb3 == rgb3[0, 0, 0]).all() and rgb3[0, 0, 0] > 250
+
+    @unittest.skipUnless(thumbdb.have_astropy, "requires astropy")
+    def test_make_thumb(self):
+        render = thumbdb.get_render_settings(thumb_length=100)
+        ok, res = thumbdb._make_thumb_job((self.path, None, render,
+                                           ['OBJECT', 'FRAMEID']))
+        assert ok
+        rgb, metadata = res
+        assert rgb.shape == (60, 100, 3)
+        assert metadata == dict(OBJECT='M27', FRAMEID='N/A')
+
+        # errors are returned
+        ok, res = thumbdb._make_thumb_job(('nosuchfile.fits', None, render,
+                                           []))
+        assert not ok
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -0,0 +1,91 @@
+#
+# Unit Tests for the tilediff.py functions
+#
+import unittest
+import numpy as np
+
+from ginga.util import tilediff
+
+
+class TestError(Exception):
+    pass
+
+
+def encode_raw(data_np, format, quality):
+    # stand-in for compression: just the raw bytes
+    return data_np.tobytes()
+
+
+class TestTileDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = np.zeros((100, 150, 3), dtype=np.uint8)
+
+    def test_dirty_tiles(self):
+        frame2 = self.frame.copy()
+        frame2[10, 10] = 255
+        frame2[99, 149, 2] = 1
+        dirty = tilediff.get_dirty_tiles(self.frame, frame2, 32)
+
+        expected = (4, 5)
+        actual = dirty.shape
+        assert expected == actual
+
+        expected = [(0, 0), (3, 4)]
+        actual = list(zip(*np.nonzero(dirty)))
+        assert expected == actual
+
+    def test_dirty_rects(self):
+        dirty = np.array([[True, True, False, True],
+                          [False, False, False, False],
+                          [False, True, True, True]])
+        rects = tilediff.get_dirty_rects(dirty, 32, 100, 70)
+
+        expected = [(0, 0, 64, 32), (96, 0, 4, 32), (32, 64, 68, 6)]
+        actual = rects
+        assert expected == actual
+
+    def test_encode_sequence(self):
+        encoder = tilediff.TileDiffEncoder(tile_size=32, encode_fn=encode_raw)
+
+        # first frame is a key frame
+        res = encoder.encode(self.frame)
+        assert res.key
+        assert res.seq == 1
+        assert len(res.tiles) == 1
+
+        # no change: nothing to send
+        res = encoder.encode(self.frame.copy())
+        assert len(res.tiles) == 0
+        assert res.seq == 1
+
+        # small change: one tile
+        frame2 = self.frame.copy()
+        frame2[40, 40] = 1
+        res = encoder.encode(frame2)
+        assert not res.key
+        assert res.seq == 2
+
+        expected = [(32, 32, 32, 32)]
+        actual = [(t.x, t.y, t.width, t.height) for t in res.tiles]
+        assert expected == actual
+
+        # large change: key frame
+        res = encoder.encode(frame2 + 1)
+        assert res.key
+
+    def test_quality_adapts(self):
+        encoder = tilediff.TileDiffEncoder(tile_size=32, encode_fn=encode_raw)
+        encoder.set_bandwidth_limit(1000)
+        encoder.encode(self.frame)
+
+        assert encoder.quality < encoder.max_quality
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
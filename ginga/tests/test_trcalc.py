@@ -0,0 +1,259 @@
+#
+# Unit Tests for the trcalc.py functions
+#
+import unittest
+import numpy as np
+
+from ginga import trcalc
+
+
+class TestError(Exception):
+    pass
+
+
+class TestRotation(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.random.randint(0, 255, size=(120, 90, 4)).astype(
+            np.uint8)
+
+    def reference(self, data, theta_deg):
+        # direct calculation of the nearest neighbor rotation
+        ht, wd = data.shape[:2]
+        yi, xi = np.mgrid[0:ht, 0:wd]
+        xi -= wd // 2
+        yi -= ht // 2
+        cos_t = np.cos(np.radians(theta_deg))
+        sin_t = np.sin(np.radians(theta_deg))
+        ap = np.rint((xi * cos_t) - (yi * sin_t) + wd // 2).astype(int)
+        bp = np.rint((xi * sin_t) + (yi * cos_t) + ht // 2).astype(int)
+        return data[bp.clip(0, ht-1), ap.clip(0, wd-1)]
+
+    def test_rotate_clip_nearest(self):
+        for data in (self.data, self.data[..., 0].astype(np.float64),
+                     self.data[..., :3]):
+            expected = self.reference(data, 33.0)
+            actual = trcalc.rotate_clip(data, 33.0)
+            assert np.array_equal(expected, actual)
+
+    def test_rotate_clip_in_place(self):
+        expected = self.reference(self.data, -71.0)
+        data = self.data.copy()
+        actual = trcalc.rotate_clip(data, -71.0, out=data)
+        assert actual is data
+        assert np.array_equal(expected, actual)
+
+    def test_remap_threaded(self):
+        rmap = trcalc.calc_rotation_map(120, 90, 20.0)
+        expected = trcalc.remap(self.data, rmap, num_threads=1)
+
+        min_pixels = trcalc.remap_min_pixels_per_thread
+        trcalc.remap_min_pixels_per_thread = 1000
+        try:
+            actual = trcalc.remap(self.data, rmap, num_threads=3)
+        finally:
+            trcalc.remap_min_pixels_per_thread = min_pixels
+        assert np.array_equal(expected, actual)
+
+    def test_bilinear(self):
+        # bilinear interpolation of a linear function is exact
+        yi, xi = np.mgrid[0:100, 0:80]
+        data = 2.0 * xi + 3.0 * yi
+        actual = trcalc.rotate_clip(data, 10.0, interpolation='bilinear')
+
+        theta = np.radians(10.0)
+        ap = (xi - 40) * np.cos(theta) - (yi - 50) * np.sin(theta) + 40
+        bp = (xi - 40) * np.sin(theta) + (yi - 50) * np.cos(theta) + 50
+        expected = 2.0 * ap + 3.0 * bp
+        inside = (ap >= 0) & (ap <= 79) & (bp >= 0) & (bp <= 99)
+        assert np.allclose(expected[inside], actual[inside], atol=1e-3)
+
+        # integer data stays integer
+        res = trcalc.rotate_clip(self.data, 10.0, interpolation='bilinear')
+        assert res.dtype == self.data.dtype
+
+    def tearDown(self):
+        pass
+
+
+class TestPathSampling(unittest.TestCase):
+
+    def setUp(self):
+        yi, xi = np.mgrid[0:50, 0:80]
+        self.data = (xi + 100 * yi).astype(np.float32)
+
+    def bresenham(self, x1, y1, x2, y2):
+        # reference: the Bresenham loop
+        dx, dy = abs(x2 - x1), abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx - dy
+        res = []
+        x, y = x1, y1
+        while True:
+            res.append((x, y))
+            if (x == x2) and (y == y2):
+                break
+            e2 = 2 * err
+            if e2 > -dy:
+                err -= dy
+                x += sx
+            if e2 < dx:
+                err += dx
+                y += sy
+        return res
+
+    def test_line_points(self):
+        rng = np.random.RandomState(0)
+        for i in range(500):
+            x1, y1, x2, y2 = rng.randint(-40, 40, 4).tolist()
+            expected = self.bresenham(x1, y1, x2, y2)
+            xs, ys = trcalc.get_line_points(x1, y1, x2, y2)
+            actual = list(zip(xs.tolist(), ys.tolist()))
+            assert expected == actual
+
+    def test_polyline_points(self):
+        xs, ys = trcalc.get_polyline_points([(0, 0), (3, 0), (3, 2)])
+        expected = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2)]
+        actual = list(zip(xs.tolist(), ys.tolist()))
+        assert expected == actual
+
+    def test_bezier_points(self):
+        # a straight "curve"
+        xs, ys = trcalc.get_bezier_points([(0, 0), (5, 0), (10, 0)], 50)
+        assert list(xs) == list(range(11))
+        assert not ys.any()
+
+    def test_sample_nearest(self):
+        xs = np.array([0, 10.4, 79, 80, -1])
+        ys = np.array([0, 20.6, 49, 0, 0])
+        expected = [0.0, 2110.0, 4979.0]
+        actual = trcalc.sample_image(self.data, xs, ys)
+        assert expected == list(actual[:3])
+        assert np.isnan(actual[3:]).all()
+
+    def test_sample_bilinear(self):
+        xs = np.array([[10.25, 0.0], [79.0, 3.5]])
+        ys = np.array([[20.5, 0.0], [49.0, 60.0]])
+        actual = trcalc.sample_image(self.data, xs, ys, method='bilinear')
+        assert actual.shape == (2, 2)
+        # the data is linear in x and y
+        assert np.allclose(actual[0], [2060.25, 0.0])
+        assert actual[1, 0] == 4979.0
+        assert np.isnan(actual[1, 1])
+
+    def test_sample_cube(self):
+        cube = np.array([self.data, -self.data])
+        xs, ys = trcalc.get_line_points(5, 5, 30, 12)
+        actual = trcalc.sample_image(cube, xs, ys)
+        assert actual.shape == (2, len(xs))
+        assert np.array_equal(actual[1], -self.data[ys, xs])
+
+    def test_parallel_points(self):
+        xs, ys = trcalc.get_line_points(10, 10, 20, 10)
+        pxs, pys = trcalc.get_parallel_points(xs, ys, 0.0, 1.0, 2)
+        assert pxs.shape == (5, 11)
+        actual = trcalc.sample_image(self.data, pxs, pys).sum(axis=0)
+        expected = self.data[8:13, 10:21].sum(axis=0)
+        assert np.array_equal(expected, actual)
+
+
+class TestOverlay(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.dst = rng.randint(0, 256, size=(60, 80, 4)).astype(np.uint8)
+        self.src = rng.randint(0, 256, size=(30, 40, 4)).astype(np.uint8)
+
+    def reference(self, dst, x, y, src, alpha):
+        # float calculation of Co = CaAa + Cb(1 - Aa)
+        ht, wd = src.shape[:2]
+        res = dst.astype(np.float64)
+        res[y:y+ht, x:x+wd, 0:3] = (alpha * src[..., 0:3] +
+                                    (1.0 - alpha) * res[y:y+ht, x:x+wd, 0:3])
+        res[y:y+ht, x:x+wd, 3] = 255
+        return np.rint(res)
+
+    def test_reorder(self):
+        data = self.src
+        res = trcalc.reorder_image('BGR', data, 'RGBA')
+        assert np.shares_memory(res, data)
+        assert np.array_equal(res, data[..., [2, 1, 0]])
+        res = trcalc.reorder_image('GBA', data, 'RGBA')
+        assert np.shares_memory(res, data)
+        res = trcalc.reorder_image('ARGB', data, 'RGBA')
+        assert np.array_equal(res, data[..., [3, 0, 1, 2]])
+
+    def test_blend(self):
+        # source alpha channel, source in a different order
+        src = self.src
+        res = trcalc.overlay_image(self.dst.copy(), 10, 20, src[..., ::-1],
+                                   src_order='ABGR')
+        alpha = src[..., 3:4] / 255.0
+        expected = self.reference(self.dst, 10, 20, src, alpha)
+        assert np.array_equal(res, expected)
+
+        # scalar alpha, no alpha channel in source
+        res = trcalc.overlay_image(self.dst.copy(), 10, 20, src[..., :3],
+                                   src_order='RGB', alpha=0.3)
+        alpha = round(0.3 * 255) / 255.0
+        expected = self.reference(self.dst, 10, 20, src, alpha)
+        assert np.array_equal(res, expected)
+
+        # opaque
+        res = trcalc.overlay_image(self.dst.copy(), 10, 20, src[..., :3],
+                                   src_order='RGB')
+        assert np.array_equal(res[20:50, 10:50, :3], src[..., :3])
+
+    def test_uint16(self):
+        dst = self.dst.astype(np.uint16) * 257
+        src = self.src.astype(np.uint16) * 257
+        res = trcalc.overlay_image(dst.copy(), 10, 20, src)
+        alpha = src[..., 3:4] / 65535.0
+        expected = self.reference(dst, 10, 20, src, alpha)
+        expected[20:50, 10:50, 3] = 65535
+        assert res.dtype == np.uint16
+        assert np.array_equal(res, expected)
+
+    def test_uint8_on_uint16(self):
+        # an 8-bit overlay is scaled to the range of the destination
+        dst = self.dst.astype(np.uint16) * 257
+        res = trcalc.overlay_image(dst.copy(), 10, 20, self.src)
+        expected = trcalc.overlay_image(dst.copy(), 10, 20,
+                                        self.src.astype(np.uint16) * 257)
+        assert np.array_equal(res, expected)
+
+        # opaque
+        src = np.full((30, 40, 3), 200, dtype=np.uint8)
+        res = trcalc.overlay_image(dst.copy(), 10, 20, src, src_order='RGB')
+        assert (res[20:50, 10:50, :3] == 200 * 257).all()
+        assert (res[20:50, 10:50, 3] == 65535).all()
+
+    def test_clip(self):
+        src = self.src.copy()
+        src[..., 3] = 255
+        res = trcalc.overlay_image(self.dst.copy(), -5, 45, src)
+        assert np.array_equal(res[45:, :35], src[:15, 5:])
+        assert np.array_equal(res[:45], self.dst[:45])
+        assert np.array_equal(res[45:, 35:], self.dst[45:, 35:])
+
+        res = trcalc.overlay_image(self.dst.copy(), 70, -10, src,
+                                   flipy=True)
+        assert np.array_equal(res[:20, 70:], np.flipud(src)[10:, :10])
+
+        res = trcalc.overlay_image(self.dst.copy(), 80, 0, src)
+        assert np.array_equal(res, self.dst)
+
+    def test_premultiplied(self):
+        pm = trcalc.premultiply_image(self.src, alpha=1.0)
+        res1 = trcalc.overlay_premultiplied(self.dst.copy(), 3, 4, pm)
+        res2 = trcalc.overlay_premultiplied(self.dst.copy(), 3, 4, pm)
+        expected = trcalc.overlay_image(self.dst.copy(), 3, 4, self.src)
+        assert np.array_equal(res1, expected)
+        assert np.array_equal(res2, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+#END
@@ -258,8 +258,83 @@ class TestImageView(unittest.TestCase):
         if not self.radectopix_scalar_runtest('astropy'):
             print("WCS '%s' not available--skipping test" % ('astropy'))
 
+    def batch_runtest(self, modname):
+        if not wcsmod.use(modname, raise_err=False):
+            return False
+        wcs = wcsmod.WCS(self.logger)
+        wcs.load_header(self.header)
+        img = AstroImage.AstroImage(logger=self.logger)
+        img.wcs = wcs
+        img.revnaxis = []
+
+        x_arr = numpy.array([[0.0, 120.0, 2047.0], [10.5, 4000.0, 17.25]])
+        y_arr = numpy.array([[0.0, 100.0, 4176.0], [3.5, 10.0, 2000.0]])
+
+        ra_arr, dec_arr = img.pixtoradec_arr(x_arr, y_arr)
+        assert ra_arr.shape == x_arr.shape
+        for x, y, ra_deg, dec_deg in zip(x_arr.flat, y_arr.flat,
+                                         ra_arr.flat, dec_arr.flat):
+            expected = img.pixtoradec(x, y)
+            assert numpy.allclose(expected, (ra_deg, dec_deg)), \
+                   ValueError("ra/dec does not match for (%f, %f)" % (x, y))
+
+        x2_arr, y2_arr = img.radectopix_arr(ra_arr, dec_arr)
+        assert numpy.allclose(x2_arr, x_arr, atol=1e-6)
+        assert numpy.allclose(y2_arr, y_arr, atol=1e-6)
+
+        # 1-based coordinates
+        ra_arr, dec_arr = img.pixtoradec_arr(x_arr + 1, y_arr + 1,
+                                             coords='fits')
+        x2_arr, y2_arr = img.radectopix_arr(ra_arr, dec_arr)
+        assert numpy.allclose(x2_arr, x_arr, atol=1e-6)
+        return True
+
+    def test_batch_kapteyn(self):
+        if not self.batch_runtest('kapteyn'):
+            print("WCS '%s' not available--skipping test" % ('kapteyn'))
+
+    def test_batch_starlink(self):
+        if not self.batch_runtest('starlink'):
+            print("WCS '%s' not available--skipping test" % ('starlink'))
+
+    def test_batch_astlib(self):
+        if not self.batch_runtest('astlib'):
+            print("WCS '%s' not available--skipping test" % ('astlib'))
+
+    def test_batch_astropy(self):
+        if not self.batch_runtest('astropy'):
+            print("WCS '%s' not available--skipping test" % ('astropy'))
+
+    def test_batch_barebones(self):
+        if not self.batch_runtest('barebones'):
+            print("WCS '%s' not available--skipping test" % ('barebones'))
+
+    def test_batch_fallback(self):
+        # a WCS without a vectorized implementation falls back to the
+        # scalar calls
+        class ScalarWCS(wcsmod.BaseWCS):
+            def pixtoradec(self, idxs, coords='data'):
+                return idxs[0] * 2.0, idxs[1] * 3.0
+
+            def radectopix(self, ra_deg, dec_deg, coords='data',
+                           naxispath=None):
+                return ra_deg / 2.0, dec_deg / 3.0
+
+        img = AstroImage.AstroImage(logger=self.logger)
+        img.wcs = ScalarWCS(self.logger)
+
+        ra_arr, dec_arr = img.pixtoradec_arr([1.0, 2.0, 3.0], 5.0)
+        expected = [2.0, 4.0, 6.0]
+        actual = list(ra_arr)
+        assert expected == actual
+        assert list(dec_arr) == [15.0, 15.0, 15.0]
+
+        x_arr, y_arr = img.radectopix_arr(ra_arr, dec_arr)
+        assert list(x_arr) == [1.0, 2.0, 3.0]
+
     def tearDown(self):
-        pass
+        # restore the default WCS choice for other tests
+        wcsmod.use('astropy', raise_err=False)
 
 
 if __name__ == '__main__':
@@ -10,6 +10,16 @@
 import math
 import numpy
 import time
+import threading
+
+from ginga.misc import Bunch
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    import multiprocessing
+    have_futures = True
+except ImportError:
+    have_futures = False
 
 interpolation_methods = ['basic']
 
@@ -56,6 +66,24 @@ except ImportError:
 #have_numexpr = False
 #have_opencv = False
 
+# thread pool shared by the array operations that are split into bands
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_thread_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=multiprocessing.cpu_count())
+        return _pool
+
+# default number of threads for remap()
+remap_num_threads = 1
+if have_futures:
+    remap_num_threads = min(4, multiprocessing.cpu_count())
+remap_min_pixels_per_thread = 128 * 1024
+
 def get_center(data_np):
     ht, wd = data_np.shape[:2]
 
@@ -80,8 +108,150 @@ def rotate_pt(x_arr, y_arr, theta_deg, xoff=0, yoff=0):
 
 rotate_arr = rotate_pt
 
+def calc_rotation_map(ht, wd, theta_deg, rotctr_x=None, rotctr_y=None,
+                      interpolation='nearest'):
+    """
+    Calculate the coordinate map used by `remap` to rotate an array of
+    `ht` x `wd` pixels by `theta_deg` around (rotctr_x, rotctr_y), as
+    rotate_clip() does.  `interpolation` can be 'nearest' or 'bilinear'.
+
+    The map depends only on these parameters, so it can be kept and
+    reused as long as they don't change.
+    """
+    assert interpolation in ('nearest', 'bilinear'), \
+           ValueError("interpolation must be 'nearest' or 'bilinear'")
+    if rotctr_x is None:
+        rotctr_x = wd // 2
+    if rotctr_y is None:
+        rotctr_y = ht // 2
+
+    cos_t = numpy.cos(numpy.radians(theta_deg))
+    sin_t = numpy.sin(numpy.radians(theta_deg))
+    xi = numpy.arange(wd, dtype=numpy.float64) - rotctr_x
+    yi = numpy.arange(ht, dtype=numpy.float64).reshape((ht, 1)) - rotctr_y
+
+    # source coordinates of each output pixel
+    ap = (xi * cos_t) - (yi * sin_t) + rotctr_x
+    bp = (xi * sin_t) + (yi * cos_t) + rotctr_y
+
+    idx_type = numpy.int32 if (ht * wd < 2**31) else numpy.intp
+    res = Bunch.Bunch(key=(ht, wd, theta_deg, rotctr_x, rotctr_y,
+                           interpolation),
+                      interpolation=interpolation, shape=(ht, wd))
+
+    if interpolation == 'nearest':
+        numpy.rint(ap, out=ap)
+        ap.clip(0, wd-1, out=ap)
+        numpy.rint(bp, out=bp)
+        bp.clip(0, ht-1, out=bp)
+        # flat index of the source pixel
+        bp *= wd
+        bp += ap
+        res.idx = bp.astype(idx_type).ravel()
+        return res
+
+    ap.clip(0, wd-1, out=ap)
+    bp.clip(0, ht-1, out=bp)
+    x0 = numpy.floor(ap).clip(0, max(wd-2, 0))
+    y0 = numpy.floor(bp).clip(0, max(ht-2, 0))
+    res.fx = (ap - x0).astype(numpy.float32).ravel()
+    res.fy = (bp - y0).astype(numpy.float32).ravel()
+    res.idx = (y0 * wd + x0).astype(idx_type).ravel()
+    # offsets of the neighboring pixels in the flat array
+    res.dx = 1 if wd > 1 else 0
+    res.dy = wd if ht > 1 else 0
+    return res
+
+def _get_pixel_view(data_np):
+    # Returns a view of `data_np` as a flat array with one element per
+    # pixel (so that a single take() fetches all the bands of a pixel),
+    # or with one row per pixel if that isn't possible
+    ht, wd = data_np.shape[:2]
+    data = data_np.reshape((ht * wd,) + data_np.shape[2:])
+    if data.ndim == 1:
+        return data
+    nbytes = data.dtype.itemsize * int(numpy.prod(data.shape[1:]))
+    if nbytes in (1, 2, 4, 8):
+        return data.reshape((ht * wd, -1)).view('u%d' % nbytes).reshape(-1)
+    return data.reshape((ht * wd, -1))
+
+def _remap_band(src, rmap, dst, i1, i2):
+    idx = rmap.idx[i1:i2]
+    if rmap.interpolation == 'nearest':
+        numpy.take(src, idx, axis=0, out=dst[i1:i2])
+        return
+
+    fx, fy = rmap.fx[i1:i2], rmap.fy[i1:i2]
+    if src.ndim > 1:
+        fx, fy = fx.reshape((-1, 1)), fy.reshape((-1, 1))
+    p00 = src.take(idx, axis=0).astype(numpy.float32)
+    p01 = src.take(idx + rmap.dx, axis=0).astype(numpy.float32)
+    p10 = src.take(idx + rmap.dy, axis=0).astype(numpy.float32)
+    p11 = src.take(idx + (rmap.dx + rmap.dy), axis=0).astype(numpy.float32)
+    # interpolate along x, then along y, reusing the intermediate arrays
+    p01 -= p00
+    p01 *= fx
+    p00 += p01
+    p11 -= p10
+    p11 *= fx
+    p10 += p11
+    p10 -= p00
+    p10 *= fy
+    p00 += p10
+    if dst.dtype.kind in ('u', 'i'):
+        numpy.rint(p00, out=p00)
+    dst[i1:i2] = p00
+
+def remap(data_np, rmap, out=None, num_threads=None):
+    """
+    Resample array `data_np` using a coordinate map made by
+    calc_rotation_map().  The work is split into bands of rows that are
+    processed in parallel by up to `num_threads` threads (numpy releases
+    the GIL for these operations).
+    """
+    ht, wd = data_np.shape[:2]
+    assert (ht, wd) == rmap.shape, \
+           ValueError("array is %dx%d, map is for %dx%d" % (
+        wd, ht, rmap.shape[1], rmap.shape[0]))
+
+    data_np = numpy.ascontiguousarray(data_np)
+    if ((out is None) or (not out.flags.c_contiguous) or
+        numpy.may_share_memory(out, data_np)):
+        newdata = numpy.empty_like(data_np)
+    else:
+        newdata = out
+
+    if rmap.interpolation == 'nearest':
+        src, dst = _get_pixel_view(data_np), _get_pixel_view(newdata)
+    else:
+        src = data_np.reshape((ht * wd,) + data_np.shape[2:])
+        dst = newdata.reshape((ht * wd,) + data_np.shape[2:])
+
+    if num_threads is None:
+        num_threads = remap_num_threads
+    if not have_futures:
+        num_threads = 1
+    num_threads = min(num_threads,
+                      (ht * wd) // remap_min_pixels_per_thread)
+
+    if num_threads <= 1:
+        _remap_band(src, rmap, dst, 0, ht * wd)
+    else:
+        pool = get_thread_pool()
+        step = -(-ht // num_threads) * wd
+        futures = [pool.submit(_remap_band, src, rmap, dst,
+                               i1, min(i1 + step, ht * wd))
+                   for i1 in range(0, ht * wd, step)]
+        for future in futures:
+            future.result()
+
+    if (out is not None) and (newdata is not out):
+        out[:, :, ...] = newdata
+        newdata = out
+    return newdata
+
 def rotate_clip(data_np, theta_deg, rotctr_x=None, rotctr_y=None,
-                out=None):
+                out=None, interpolation='nearest'):
     """
     Rotate numpy array `data_np` by `theta_deg` around rotation center
     (rotctr_x, rotctr_y).  If the rotation center is omitted it defaults
@@ -90,6 +260,10 @@ def rotate_clip(data_np, theta_deg, rotctr_x=None, rotctr_y=None,
     No adjustment is done to the data array beforehand, so the result will
     be clipped according to the size of the array (the output array will be
     the same size as the input array).
+
+    Without opencv, `interpolation` can be 'nearest' or 'bilinear'.  When
+    rotating many arrays of the same size by the same angle, it is faster
+    to use calc_rotation_map() once and remap() for each array.
     """
 
     # If there is no rotation, then we are done
@@ -118,41 +292,9 @@ def rotate_clip(data_np, theta_deg, rotctr_x=None, rotctr_y=None,
                 new_wd, new_ht, wd, ht))
 
     else:
-        yi, xi = numpy.mgrid[0:ht, 0:wd]
-        xi -= rotctr_x
-        yi -= rotctr_y
-        cos_t = numpy.cos(numpy.radians(theta_deg))
-        sin_t = numpy.sin(numpy.radians(theta_deg))
-
-        #t1 = time.time()
-        if have_numexpr:
-            ap = ne.evaluate("(xi * cos_t) - (yi * sin_t) + rotctr_x")
-            bp = ne.evaluate("(xi * sin_t) + (yi * cos_t) + rotctr_y")
-        else:
-            ap = (xi * cos_t) - (yi * sin_t) + rotctr_x
-            bp = (xi * sin_t) + (yi * cos_t) + rotctr_y
-        #print "rotation in %.5f sec" % (time.time() - t1)
-
-        #ap = numpy.rint(ap).astype('int').clip(0, wd-1)
-        #bp = numpy.rint(bp).astype('int').clip(0, ht-1)
-        # Optomizations to reuse existing intermediate arrays
-        numpy.rint(ap, out=ap)
-        ap = ap.astype('int')
-        ap.clip(0, wd-1, out=ap)
-        numpy.rint(bp, out=bp)
-        bp = bp.astype('int')
-        bp.clip(0, ht-1, out=bp)
-
-        if out is not None:
-            out[:, :, ...] = data_np[bp, ap]
-            newdata = out
-        else:
-            newdata = data_np[bp, ap]
-            new_ht, new_wd = newdata.shape[:2]
-
-            assert (wd == new_wd) and (ht == new_ht), \
-                   Exception("rotated cutout is %dx%d original=%dx%d" % (
-                new_wd, new_ht, wd, ht))
+        rmap = calc_rotation_map(ht, wd, theta_deg, rotctr_x, rotctr_y,
+                                 interpolation=interpolation)
+        newdata = remap(data_np, rmap, out=out)
 
     return newdata
 
@@ -365,56 +507,130 @@ def calc_image_merge_clip(x1, y1, x2, y2,
     return (dst_x, dst_y, a1, b1, a2, b2)
 
 
-def overlay_image(dstarr, dst_x, dst_y, srcarr, dst_order='RGBA',
-                  src_order='RGBA',
-                  alpha=1.0, copy=False, fill=True, flipy=False):
+# integer type used for the intermediate results of fixed-point alpha
+# blending, by destination type
+_blend_work_types = {numpy.dtype(numpy.uint8): numpy.uint16,
+                     numpy.dtype(numpy.uint16): numpy.uint32}
 
-    dst_ht, dst_wd, dst_dp = dstarr.shape
-    src_ht, src_wd, src_dp = srcarr.shape
 
-    if flipy:
-        srcarr = numpy.flipud(srcarr)
+def _get_max_value(dtype):
+    # full scale value of image data of type `dtype`; non-integer data
+    # is taken to be in the 8-bit range
+    dtype = numpy.dtype(dtype)
+    if dtype.kind in ('u', 'i'):
+        return numpy.iinfo(dtype).max
+    return 255
 
-    ## print "1. dst_x, dst_y, dst_wd, dst_ht", dst_x, dst_y, dst_wd, dst_ht
-    ## print "2. src_wd, src_ht, shape", src_wd, src_ht, srcarr.shape
-    # Trim off parts of srcarr that would be "hidden"
-    # to the left and above the dstarr edge.
-    if dst_y < 0:
-        dy = abs(dst_y)
-        srcarr = srcarr[dy:, :, :]
-        src_ht -= dy
-        dst_y = 0
-
-    if dst_x < 0:
-        dx = abs(dst_x)
-        srcarr = srcarr[:, dx:, :]
-        src_wd -= dx
-        dst_x = 0
-
-    if src_wd <= 0 or src_ht <=0:
-        return dstarr
 
-    # Trim off parts of srcarr that would be "hidden"
-    # to the right and below the dstarr edge.
-    ex = dst_y + src_ht - dst_ht
-    if ex > 0:
-        srcarr = srcarr[:dst_ht, :, :]
-        src_ht -= ex
+def _rescale(arr, from_max, to_max, dtype):
+    # rescale values of `arr` from the range 0..from_max to 0..to_max
+    if to_max % from_max == 0:
+        # e.g. 8 to 16 bits: exact
+        res = arr.astype(dtype)
+        res *= numpy.dtype(dtype).type(to_max // from_max)
+        return res
+    return numpy.rint(arr * (float(to_max) / from_max)).astype(dtype)
 
-    ex = dst_x + src_wd - dst_wd
-    if ex > 0:
-        srcarr = srcarr[:, :dst_wd, :]
-        src_wd -= ex
 
-    ## print "2. dst_x, dst_y", dst_x, dst_y
-    ## print "2. src_wd, src_ht, shape", src_wd, src_ht, srcarr.shape
+def premultiply_image(srcarr, dst_order='RGBA', src_order='RGBA',
+                      alpha=1.0, dtype=numpy.uint8):
+    """Prepare `srcarr` for compositing with `overlay_premultiplied`.
+
+    The color channels are reordered to match `dst_order` (with strided
+    views, where possible) and multiplied by the alpha channel of the
+    source (if it has one) or by the scalar `alpha`, in the integer
+    fixed-point arithmetic of destination type `dtype` (uint8 or uint16).
+    Integer source data is rescaled to the range of `dtype` (e.g. uint8
+    to uint16).  The result can be cached and reused for as long as the overlay and
+    `alpha` do not change.
+    """
+    rgb_order = dst_order.replace('A', '')
+    rgb = reorder_image(rgb_order, srcarr, src_order)
+    res = Bunch.Bunch(src=srcarr, alpha=alpha, dst_order=dst_order,
+                      src_order=src_order, dtype=numpy.dtype(dtype),
+                      rgb=rgb, inv_alpha=None, opaque=False)
+
+    work_type = _blend_work_types.get(res.dtype, None)
+    if work_type is None:
+        # not a type we can do fixed-point blending in: keep the alpha
+        # as a fraction, for blending in floating point
+        if 'A' in src_order:
+            a_idx = src_order.index('A')
+            alpha = srcarr[..., a_idx:a_idx+1] / 255.0
+        res.setvals(alpha_arr=alpha, opaque=(numpy.min(alpha) >= 1.0))
+        return res
+
+    maxv = numpy.iinfo(res.dtype).max
+    src_maxv = _get_max_value(srcarr.dtype)
+    if src_maxv != maxv:
+        rgb = _rescale(rgb, src_maxv, maxv, res.dtype)
+        res.rgb = rgb
+
+    if 'A' in src_order:
+        # if overlay source contains an alpha channel, use it, otherwise
+        # use scalar keyword parameter
+        a_arr = srcarr[..., src_order.index('A')]
+        if a_arr.min() >= src_maxv:
+            res.opaque = True
+            return res
+        a_arr = a_arr[..., numpy.newaxis]
+        if src_maxv != maxv:
+            a_arr = _rescale(a_arr, src_maxv, maxv, work_type)
+        else:
+            a_arr = a_arr.astype(work_type)
+
+    else:
+        a_val = int(round(min(max(alpha, 0.0), 1.0) * maxv))
+        if a_val >= maxv:
+            res.opaque = True
+            return res
+        a_arr = work_type(a_val)
+
+    # Co = CaAa + Cb(1 - Aa)
+    # premultiplied source (CaAa), and (1 - Aa) for the destination
+    premult = rgb.astype(work_type)
+    premult *= a_arr
+    res.setvals(rgb=premult, inv_alpha=maxv - a_arr)
+    return res
+
+
+def overlay_premultiplied(dstarr, dst_x, dst_y, pm, copy=False, fill=True,
+                          flipy=False):
+    """Composite an overlay prepared by `premultiply_image` into
+    `dstarr` at (`dst_x`, `dst_y`), in place (unless `copy` is True).
+    """
+    # per-pixel (or scalar) weight of the destination pixels, as an
+    # integer, or the source alpha as a fraction for floating point
+    fixed_point = (pm.dtype in _blend_work_types)
+    rgb, wt_arr = pm.rgb, pm.inv_alpha
+    if not fixed_point:
+        wt_arr = pm.alpha_arr
+    wt_is_arr = isinstance(wt_arr, numpy.ndarray) and (wt_arr.ndim > 0)
+
+    if flipy:
+        rgb = numpy.flipud(rgb)
+        if wt_is_arr:
+            wt_arr = numpy.flipud(wt_arr)
+
+    dst_ht, dst_wd, dst_dp = dstarr.shape
+    src_ht, src_wd = rgb.shape[:2]
+
+    # Trim off parts of the overlay that would be "hidden"
+    # beyond the dstarr edges
+    x1, y1 = max(0, -dst_x), max(0, -dst_y)
+    x2 = min(src_wd, dst_wd - dst_x)
+    y2 = min(src_ht, dst_ht - dst_y)
+    if (x2 <= x1) or (y2 <= y1):
+        return dstarr
+    dst_x, dst_y = max(dst_x, 0), max(dst_y, 0)
+    src_wd, src_ht = x2 - x1, y2 - y1
 
     if copy:
         dstarr = numpy.copy(dstarr, order='C')
 
     da_idx = -1
-    if 'A' in dst_order:
-        da_idx = dst_order.index('A')
+    if 'A' in pm.dst_order:
+        da_idx = pm.dst_order.index('A')
 
     # Currently we assume that alpha channel is in position 3 in dstarr
     assert da_idx == 3, \
@@ -423,39 +639,188 @@ def overlay_image(dstarr, dst_x, dst_y, srcarr, dst_order='RGBA',
     # fill alpha channel in destination in the area we will be dropping
     # the image
     if fill and (da_idx >= 0):
-        dstarr[dst_y:dst_y+src_ht, dst_x:dst_x+src_wd, da_idx] = 255
-
-    if src_dp > 3:
-        sa_idx = src_order.index('A')
-        # if overlay source contains an alpha channel, extract it
-        # and use it, otherwise use scalar keyword parameter
-        alpha = srcarr[0:src_ht, 0:src_wd, sa_idx] / 255.0
-        alpha = numpy.dstack((alpha, alpha, alpha))
-
-    # reorder srcarr if necessary to match dstarr for alpha merge
-    get_order = dst_order
-    if ('A' in dst_order) and not ('A' in src_order):
-        get_order = dst_order.replace('A', '')
-    if get_order != src_order:
-        srcarr = reorder_image(get_order, srcarr, src_order)
-
-    # calculate alpha blending
-    #   Co = CaAa + CbAb(1 - Aa)
-    a_arr = (alpha * srcarr[0:src_ht, 0:src_wd, 0:3]).astype(numpy.uint8)
-    b_arr = ((1.0 - alpha) * dstarr[dst_y:dst_y+src_ht,
-                                    dst_x:dst_x+src_wd,
-                                    0:3]).astype(numpy.uint8)
-
-    # Place our srcarr into this dstarr at dst offsets
-    #dstarr[dst_y:dst_y+src_ht, dst_x:dst_x+src_wd, 0:3] += addarr[0:src_ht, 0:src_wd, 0:3]
-    dstarr[dst_y:dst_y+src_ht, dst_x:dst_x+src_wd, 0:3] = \
-             a_arr[0:src_ht, 0:src_wd, 0:3] + b_arr[0:src_ht, 0:src_wd, 0:3]
+        maxv = 255
+        if fixed_point:
+            maxv = numpy.iinfo(pm.dtype).max
+        dstarr[dst_y:dst_y+src_ht, dst_x:dst_x+src_wd, da_idx] = maxv
+
+    dst = dstarr[dst_y:dst_y+src_ht, dst_x:dst_x+src_wd, 0:3]
+    rgb = rgb[y1:y2, x1:x2]
+    if wt_is_arr:
+        wt_arr = wt_arr[y1:y2, x1:x2]
+
+    if pm.opaque:
+        # Place our srcarr into this dstarr at dst offsets
+        dst[...] = rgb
+        return dstarr
+
+    if not fixed_point:
+        # calculate alpha blending in floating point
+        dst[...] = wt_arr * rgb + (1.0 - wt_arr) * dst
+        return dstarr
 
+    # fixed-point blending, rounding to nearest:
+    #   Co = (CaAa + Cb(max - Aa) + max/2) / max
+    maxv = numpy.iinfo(pm.dtype).max
+    tmp = dst.astype(_blend_work_types[pm.dtype])
+    tmp *= wt_arr
+    tmp += rgb
+    tmp += maxv // 2
+    tmp //= maxv
+    dst[...] = tmp
     return dstarr
 
+
+def overlay_image(dstarr, dst_x, dst_y, srcarr, dst_order='RGBA',
+                  src_order='RGBA',
+                  alpha=1.0, copy=False, fill=True, flipy=False):
+    """Composite `srcarr` into `dstarr` at (`dst_x`, `dst_y`), using the
+    alpha channel of `srcarr` if it has one, or else the scalar `alpha`.
+    `dstarr` is modified in place unless `copy` is True.
+
+    If the same overlay is composited repeatedly, use `premultiply_image`
+    once and then `overlay_premultiplied`.
+    """
+    pm = premultiply_image(srcarr, dst_order=dst_order, src_order=src_order,
+                           alpha=alpha, dtype=dstarr.dtype)
+    return overlay_premultiplied(dstarr, dst_x, dst_y, pm, copy=copy,
+                                 fill=fill, flipy=flipy)
+
+
 def reorder_image(dst_order, src_arr, src_order):
+    """Return the channels of `src_arr` (in `src_order`) in the order
+    `dst_order`.  A strided view of `src_arr` is returned where possible
+    (e.g. RGBA -> RGB, or RGB -> BGR), otherwise a copy.
+    """
     indexes = [ src_order.index(c) for c in dst_order ]
-    return numpy.dstack([ src_arr[..., idx] for idx in indexes ])
+    if len(indexes) == 1:
+        idx = indexes[0]
+        return src_arr[..., idx:idx+1]
+
+    step = indexes[1] - indexes[0]
+    if (step != 0) and all(indexes[i+1] - indexes[i] == step
+                           for i in range(len(indexes) - 1)):
+        start, stop = indexes[0], indexes[-1] + step
+        if stop < 0:
+            stop = None
+        return src_arr[..., start:stop:step]
+
+    return src_arr[..., indexes]
+
+
+def get_line_points(x1, y1, x2, y2):
+    """Return the integer coordinates of the pixels on the line from
+    (x1, y1) to (x2, y2) as a pair of arrays (xs, ys), in the same order
+    as Bresenham's line algorithm (see BaseImage.get_pixels_on_line).
+    """
+    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+    dx, dy = abs(x2 - x1), abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    n = max(dx, dy)
+    i = numpy.arange(n + 1)
+    if n == 0:
+        minor = i
+    elif dx >= dy:
+        minor = (2 * i * dy + dx - 1) // (2 * dx)
+    else:
+        minor = (2 * i * dx + dy - 1) // (2 * dy)
+
+    if dx >= dy:
+        return (x1 + sx * i, y1 + sy * minor)
+    return (x1 + sx * minor, y1 + sy * i)
+
+
+def get_polyline_points(points):
+    """Return the integer coordinates (xs, ys) of the pixels on the path
+    through `points`, a sequence of (x, y).  Each vertex appears once.
+    """
+    points = numpy.asarray(points).reshape(-1, 2)
+    xs, ys = [], []
+    for i in range(len(points) - 1):
+        (x1, y1), (x2, y2) = points[i], points[i + 1]
+        _xs, _ys = get_line_points(x1, y1, x2, y2)
+        # don't repeat last point when adding next segment
+        if i > 0:
+            _xs, _ys = _xs[1:], _ys[1:]
+        xs.append(_xs)
+        ys.append(_ys)
+    if len(xs) == 0:
+        x, y = points[0] if len(points) > 0 else (0, 0)
+        xs, ys = [numpy.array([int(x)])], [numpy.array([int(y)])]
+    return (numpy.concatenate(xs), numpy.concatenate(ys))
+
+
+def get_bezier_points(points, steps):
+    """Return the integer coordinates (xs, ys) of the pixels on the
+    Bezier curve with control points `points`, evaluated at `steps`
+    points and rounded.  Repeated pixels are left out.
+    """
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    n = len(points) - 1
+    t = numpy.linspace(0.0, 1.0, max(steps, 2))[:, None]
+    j = numpy.arange(n + 1)[None, :]
+    binom = numpy.array([math.factorial(n) /
+                         float(math.factorial(k) * math.factorial(n - k))
+                         for k in range(n + 1)])
+    bern = binom * t ** j * (1.0 - t) ** (n - j)
+    xs = numpy.round(bern.dot(points[:, 0])).astype(int)
+    ys = numpy.round(bern.dot(points[:, 1])).astype(int)
+
+    # remove duplicates, keeping the first of each
+    _, idx = numpy.unique(numpy.array((xs, ys)).T, axis=0,
+                          return_index=True)
+    idx.sort()
+    return (xs[idx], ys[idx])
+
+
+def get_parallel_points(xs, ys, ux, uy, radius):
+    """For the points (xs, ys) on a path, return the points (pxs, pys) on
+    the paths parallel to it at the offsets -radius..radius (in steps of
+    one pixel) in the direction of the unit vector (ux, uy).  The arrays
+    are of shape (2*radius+1,) + xs.shape.
+    """
+    offs = numpy.arange(-radius, radius + 1, dtype=numpy.float64)
+    offs = offs.reshape((-1,) + (1,) * numpy.ndim(xs))
+    return (xs + offs * ux, ys + offs * uy)
+
+
+def sample_image(data_np, xs, ys, method='nearest', fill=numpy.nan):
+    """Sample `data_np` at the data coordinates in arrays `xs`, `ys`
+    with nearest neighbor ('nearest') or bilinear ('bilinear')
+    interpolation.  Points outside the data are set to `fill`.  The last
+    two axes of `data_np` are Y and X; the result has the shape of
+    data_np.shape[:-2] + xs.shape, so that all the planes of a cube are
+    sampled at once.
+    """
+    xs = numpy.asarray(xs, dtype=numpy.float64)
+    ys = numpy.asarray(ys, dtype=numpy.float64)
+    ht, wd = data_np.shape[-2:]
+    dtype = numpy.result_type(data_np.dtype, numpy.float32)
+
+    if method == 'nearest':
+        # the pixel at integer coordinates x covers x-0.5 .. x+0.5
+        xi = numpy.floor(xs + 0.5).astype(numpy.intp)
+        yi = numpy.floor(ys + 0.5).astype(numpy.intp)
+        inside = (xi >= 0) & (xi < wd) & (yi >= 0) & (yi < ht)
+        res = data_np[..., yi.clip(0, ht - 1), xi.clip(0, wd - 1)]
+        return numpy.where(inside, res, fill).astype(dtype, copy=False)
+
+    elif method == 'bilinear':
+        inside = (xs >= 0) & (xs <= wd - 1) & (ys >= 0) & (ys <= ht - 1)
+        x0 = numpy.floor(xs).clip(0, max(wd - 2, 0)).astype(numpy.intp)
+        y0 = numpy.floor(ys).clip(0, max(ht - 2, 0)).astype(numpy.intp)
+        x1 = numpy.minimum(x0 + 1, wd - 1)
+        y1 = numpy.minimum(y0 + 1, ht - 1)
+        fx = (xs - x0).clip(0.0, 1.0)
+        fy = (ys - y0).clip(0.0, 1.0)
+        res = ((data_np[..., y0, x0] * (1.0 - fx) +
+                data_np[..., y0, x1] * fx) * (1.0 - fy) +
+               (data_np[..., y1, x0] * (1.0 - fx) +
+                data_np[..., y1, x1] * fx) * fy)
+        return numpy.where(inside, res, fill).astype(dtype, copy=False)
+
+    raise ValueError("Sampling method not supported: '%s'" % (method))
 
 
 #END
@@ -669,7 +669,7 @@ class CatalogServer(URLServer):
 
                 # convert ra/dec via EQUINOX change if catalog EQUINOX is
                 # not the same as our default one (2000)
-                if cmp(self.equinox, 2000.0) != 0:
+                if self.equinox != 2000.0:
                     ra_deg, dec_deg = wcs.eqToEq2000(ra_deg, dec_deg,
                                                      self.equinox)
 
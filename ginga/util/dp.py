@@ -13,7 +13,7 @@ from collections import OrderedDict
 
 from ginga import AstroImage, colors
 from ginga.RGBImage import RGBImage
-from ginga.util import wcs
+from ginga.util import wcs, stack
 
 # counter used to name anonymous images
 prefixes = dict(dp=0)
@@ -130,30 +130,35 @@ def recycle_image(image, ra_deg, dec_deg, fov_deg, px_scale, rot_deg,
     return new_image
 
 
-def make_flat(imglist, bias=None):
-
-    flats = [ image.get_data() for image in imglist ]
-    flatarr = numpy.array(flats)
-    # Take the median of the individual frames
-    flat = numpy.median(flatarr, axis=0)
+def make_flat(imglist, bias=None, method='median', **kwdargs):
+    """Make a flat field image from the images in `imglist`, combined
+    with `stack.stack_frames` (which takes the combining `method` and
+    any other keyword parameters), less the `bias` image if given and
+    normalized by the median.
+    """
+    # Combine the individual frames
+    flat = stack.stack_frames(imglist, method=method, **kwdargs)
+    if bias is not None:
+        flat -= bias.get_data()
 
     # Normalize flat
     # mean or median?
     #norm = numpy.mean(flat.flat)
     norm = numpy.median(flat.flat)
-    flat = flat / norm
+    flat /= norm
     # no zero divisors
     flat[flat == 0.0] = 1.0
 
     img_flat = make_image(flat, imglist[0], {}, pfx='flat')
     return img_flat
 
-def make_bias(imglist):
-
-    biases = [ image.get_data() for image in imglist ]
-    biasarr = numpy.array(biases)
-    # Take the median of the individual frames
-    bias = numpy.median(biasarr, axis=0)
+def make_bias(imglist, method='median', **kwdargs):
+    """Make a bias image from the images in `imglist`, combined with
+    `stack.stack_frames` (which takes the combining `method` and any
+    other keyword parameters).
+    """
+    # Combine the individual frames
+    bias = stack.stack_frames(imglist, method=method, **kwdargs)
 
     img_bias = make_image(bias, imglist[0], {}, pfx='bias')
     return img_bias
@@ -7,7 +7,33 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+"""
+Remote control of Ginga over XML-RPC (see the RC plugin), plus a binary
+transport for sending images to Ginga.
+
+Sending images through XML-RPC (RC's load_buffer and load_fits_buffer)
+needs them encoded as base64 text.  The image stream server instead
+takes messages on a plain socket: a length-prefixed JSON header
+followed by a length-prefixed binary payload (the image data, or a FITS
+file), optionally compressed with zlib (or lz4 or zstd, if those
+packages are installed).  Uncompressed image data is received straight
+into the buffer of the image array.  A client on the same host can
+instead pass the data in a block of shared memory.
+
+Example:
+
+    client = RemoteClient('localhost', 9000)
+    res = client.stream_image('frame1', 'Image', data, compress='zlib')
+    print(res['rate_mbps'])
+"""
+import time
+import json
+import struct
+import socket
 import threading
+import zlib
+
+import numpy
 
 import ginga.util.six as six
 if six.PY2:
@@ -18,20 +44,182 @@ else:
     import xmlrpc.client as xmlrpclib
     import xmlrpc.server as SimpleXMLRPCServer
     import pickle
-from ginga.util.six.moves import map
+from ginga.util.six.moves import map, socketserver
 from ginga.misc import Task, log
 
+try:
+    from multiprocessing import shared_memory
+    have_shm = True
+except ImportError:
+    have_shm = False
+
 # undefined passed value--for a data type that cannot be converted
 undefined = '#UNDEFINED'
 
+# compression methods for the image stream: name -> (compress, decompress)
+compressors = dict(zlib=(lambda buf: zlib.compress(buf, 1),
+                         zlib.decompress))
+try:
+    import lz4.frame
+    compressors['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+try:
+    import zstandard
+    compressors['zstd'] = (
+        lambda buf: zstandard.ZstdCompressor(level=1).compress(buf),
+        lambda buf: zstandard.ZstdDecompressor().decompress(buf))
+except ImportError:
+    pass
+
+# format of the length prefix of messages
+len_fmt = '!Q'
+len_size = struct.calcsize(len_fmt)
+
+
+class StreamError(Exception):
+    pass
+
+
+def get_compressor(name):
+    """Returns (name, compress, decompress) for compression method
+    `name`, where `compress` and `decompress` are functions.  lz4 and
+    zstd fall back to zlib if not installed, in which case the returned
+    name is 'zlib'; this is the name to send to the receiver.
+    """
+    if name not in compressors:
+        if name not in ('lz4', 'zstd'):
+            raise StreamError("Unknown compression method '%s'" % (name))
+        name = 'zlib'
+    compress, decompress = compressors[name]
+    return (name, compress, decompress)
+
+
+def recv_into(sock, buf):
+    """Fill the writable buffer `buf` from `sock`."""
+    view = memoryview(buf)
+    nbytes = len(view)
+    pos = 0
+    while pos < nbytes:
+        n = sock.recv_into(view[pos:], nbytes - pos)
+        if n == 0:
+            raise StreamError("Connection closed after %d of %d bytes" % (
+                pos, nbytes))
+        pos += n
+
+
+def recv_len(sock):
+    """Returns the next length prefix from `sock`, or None if the
+    connection was closed.
+    """
+    buf = bytearray(len_size)
+    view = memoryview(buf)
+    n = sock.recv_into(view, len_size)
+    if n == 0:
+        return None
+    if n < len_size:
+        recv_into(sock, view[n:])
+    return struct.unpack(len_fmt, bytes(buf))[0]
+
+
+def _to_json(obj):
+    # numpy scalars and other values in headers and metadata
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+def send_hdr(sock, hdr):
+    """Send the dict `hdr` as JSON to `sock`, prefixed with its length."""
+    hdr_buf = json.dumps(hdr, default=_to_json).encode('utf-8')
+    sock.sendall(struct.pack(len_fmt, len(hdr_buf)) + hdr_buf)
+
+
+def send_msg(sock, hdr, payload=None):
+    """Send the dict `hdr` (as JSON) and the buffer `payload` (if any) to
+    `sock`, each prefixed with its length.
+    """
+    send_hdr(sock, hdr)
+    if payload is None:
+        sock.sendall(struct.pack(len_fmt, 0))
+    else:
+        payload = memoryview(payload)
+        sock.sendall(struct.pack(len_fmt, payload.nbytes))
+        sock.sendall(payload)
+
+
+def recv_hdr(sock):
+    """Returns the next JSON header from `sock` as a dict, or None if the
+    connection was closed.
+    """
+    nbytes = recv_len(sock)
+    if nbytes is None:
+        return None
+    buf = bytearray(nbytes)
+    recv_into(sock, buf)
+    return json.loads(buf.decode('utf-8'))
+
+
+def recv_payload(sock, hdr):
+    """Receive the payload that follows header `hdr` from `sock`.
+
+    For image data ('kind' 'array') returns a numpy array of the shape
+    and type given in the header; uncompressed data is received into
+    the array's buffer without copying.  For other kinds returns the
+    payload as a bytes-like object.
+    """
+    nbytes = recv_len(sock)
+    if nbytes is None:
+        raise StreamError("Connection closed before payload")
+
+    kind = hdr.get('kind', 'array')
+    compress = hdr.get('compress', None)
+    if kind == 'array' and compress is None and nbytes > 0:
+        buf = numpy.empty(nbytes, dtype=numpy.uint8)
+    else:
+        buf = bytearray(nbytes)
+    recv_into(sock, buf)
+
+    if hdr.get('shm', None) is not None:
+        # data passed in shared memory
+        if not have_shm:
+            raise StreamError("Shared memory is not supported")
+        shm = shared_memory.SharedMemory(name=hdr['shm'])
+        try:
+            buf = numpy.array(numpy.frombuffer(shm.buf, dtype=numpy.uint8,
+                                               count=hdr['nbytes']))
+        finally:
+            shm.close()
+
+    elif compress is not None:
+        # the sender compressed with exactly this method: no fallback
+        if compress not in compressors:
+            raise StreamError("Compression method '%s' is not available" % (
+                compress))
+        buf = compressors[compress][1](buf)
+
+    if kind != 'array':
+        return buf
+
+    data = numpy.frombuffer(buf, dtype=numpy.dtype(hdr['dtype']))
+    if not data.flags.writeable:
+        data = data.copy()
+    if hdr.get('byteswap', False):
+        data.byteswap(True)
+    return data.reshape(hdr['dims'])
+
 
 class RemoteClient(object):
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, stream_port=None):
         self.host = host
         self.port = port
+        if stream_port is None:
+            stream_port = port + 1
+        self.stream_port = stream_port
 
         self._proxy = None
+        self._stream_sock = None
 
     def __connect(self):
         # Get proxy to server
@@ -53,6 +241,83 @@ class RemoteClient(object):
             return unmarshall(res)
         return call
 
+    def _stream(self, hdr, payload):
+        if self._stream_sock is None:
+            self._stream_sock = socket.create_connection((self.host,
+                                                          self.stream_port))
+        try:
+            send_msg(self._stream_sock, hdr, payload)
+            res = recv_hdr(self._stream_sock)
+            if res is None:
+                raise StreamError("Connection closed by server")
+        except Exception:
+            self.close()
+            raise
+        if res.get('status', 1) != 0:
+            raise StreamError(res.get('error', 'unknown error'))
+        return res
+
+    def stream_image(self, imname, chname, data, header=None, metadata=None,
+                     compress=None, use_shm=False):
+        """Send the image data in numpy array `data` to the image stream
+        server, to be displayed with name `imname` in channel `chname`.
+        `header` is a dict of FITS keywords and `metadata` a dict of
+        other metadata.  The data can be compressed with `compress`
+        ('zlib', 'lz4' or 'zstd'), or passed in shared memory if
+        `use_shm` is True (the server must be on the same host).
+
+        Returns a dict of the server's reply, including the number of
+        bytes ingested ('nbytes') and the ingest rate ('rate_mbps').
+        """
+        data = numpy.ascontiguousarray(data)
+        hdr = dict(kind='array', imname=imname, chname=chname,
+                   dims=list(data.shape), dtype=data.dtype.str,
+                   nbytes=data.nbytes, header=header or {},
+                   metadata=metadata or {}, compress=compress)
+        payload = data.reshape(-1).view(numpy.uint8)
+
+        if use_shm:
+            if not have_shm:
+                raise StreamError("Shared memory is not supported")
+            shm = shared_memory.SharedMemory(create=True,
+                                             size=max(data.nbytes, 1))
+            try:
+                numpy.frombuffer(shm.buf, dtype=numpy.uint8,
+                                 count=data.nbytes)[:] = payload
+                hdr.update(shm=shm.name, compress=None)
+                return self._stream(hdr, None)
+            finally:
+                shm.close()
+                shm.unlink()
+
+        if compress is not None:
+            hdr['compress'], compress_fn, _ = get_compressor(compress)
+            payload = compress_fn(payload)
+        return self._stream(hdr, payload)
+
+    def stream_fits(self, imname, chname, fits_buf, num_hdu=0,
+                    metadata=None, compress=None):
+        """Send the contents of a FITS file in `fits_buf` (a bytes-like
+        object, or the path of a file) to the image stream server, to
+        display HDU `num_hdu` with name `imname` in channel `chname`.
+        Returns a dict of the server's reply (see `stream_image`).
+        """
+        if isinstance(fits_buf, six.string_types):
+            with open(fits_buf, 'rb') as in_f:
+                fits_buf = in_f.read()
+        hdr = dict(kind='fits', imname=imname, chname=chname,
+                   num_hdu=int(num_hdu), nbytes=len(fits_buf),
+                   metadata=metadata or {}, compress=compress)
+        if compress is not None:
+            hdr['compress'], compress_fn, _ = get_compressor(compress)
+            fits_buf = compress_fn(fits_buf)
+        return self._stream(hdr, fits_buf)
+
+    def close(self):
+        if self._stream_sock is not None:
+            self._stream_sock.close()
+            self._stream_sock = None
+
 
 class RemoteServer(object):
 
@@ -115,12 +380,124 @@ class RemoteServer(object):
             res = method(*args, **kwdargs)
 
             self.logger.debug("marshalling return val")
-            return marshall(method(*args, **kwdargs))
+            return marshall(res)
 
         raise AttributeError("No such method: '%s'" % (method_name))
 
 
 
+class _StreamHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        # a connection can send any number of images
+        while True:
+            try:
+                hdr = recv_hdr(self.request)
+            except Exception as e:
+                self.server.owner.logger.error("stream error: %s" % (str(e)))
+                return
+            if hdr is None:
+                return
+            res = self.server.owner.process(self.request, hdr)
+            send_hdr(self.request, res)
+
+
+class _StreamTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ImageStreamServer(object):
+    """Receives images sent with RemoteClient.stream_image/stream_fits
+    and passes them to `ingest_fn(hdr, data)`, where `hdr` is the dict
+    of the message header and `data` is a numpy array (image data) or a
+    bytes-like object (FITS file contents).
+
+    If `stats_fn` is given, it is called as `stats_fn(hdr, stats)` after
+    each successful ingest, with the statistics dict that is returned to
+    the client.
+    """
+
+    def __init__(self, ingest_fn, host='localhost', port=9001, ev_quit=None,
+                 logger=None, stats_fn=None):
+        super(ImageStreamServer, self).__init__()
+
+        self.ingest_fn = ingest_fn
+        self.stats_fn = stats_fn
+        self.port = port
+        self.host = host
+        self.server = None
+
+        if logger is None:
+            logger = log.get_logger(null=True)
+        self.logger = logger
+
+        if ev_quit is None:
+            ev_quit = threading.Event()
+        self.ev_quit = ev_quit
+
+        # statistics of the last ingest
+        self.last_stats = None
+
+    def start(self, thread_pool=None):
+        """Start the server, in tasks of `thread_pool` if given, or else in
+        a thread of its own.
+        """
+        self.server = _StreamTCPServer((self.host, self.port), _StreamHandler)
+        self.server.owner = self
+        if thread_pool is not None:
+            t1 = Task.FuncTask2(self.monitor_shutdown)
+            thread_pool.addTask(t1)
+            t2 = Task.FuncTask2(self.server.serve_forever, poll_interval=0.1)
+            thread_pool.addTask(t2)
+        else:
+            thread = threading.Thread(target=self.server.serve_forever,
+                                      kwargs=dict(poll_interval=0.1))
+            thread.daemon = True
+            thread.start()
+
+    def get_address(self):
+        return self.server.server_address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def monitor_shutdown(self):
+        self.ev_quit.wait()
+        self.server.shutdown()
+
+    def process(self, sock, hdr):
+        """Receive the payload for message header `hdr` and ingest it.
+        Returns the reply to the client.
+        """
+        time_start = time.time()
+        try:
+            data = recv_payload(sock, hdr)
+            self.ingest_fn(hdr, data)
+
+        except Exception as e:
+            errmsg = "Error ingesting image '%s': %s" % (
+                hdr.get('imname', ''), str(e))
+            self.logger.error(errmsg)
+            return dict(status=1, error=errmsg)
+
+        time_elapsed = max(time.time() - time_start, 1.0e-6)
+        nbytes = hdr.get('nbytes', 0)
+        stats = dict(status=0, nbytes=nbytes, time_sec=time_elapsed,
+                     rate_mbps=nbytes / time_elapsed / 1.0e6)
+        self.last_stats = stats
+        self.logger.info("ingested '%s': %d bytes in %.3f sec (%.1f MB/s)" % (
+            hdr.get('imname', ''), nbytes, time_elapsed, stats['rate_mbps']))
+        if self.stats_fn is not None:
+            try:
+                self.stats_fn(hdr, stats)
+
+            except Exception as e:
+                self.logger.error("Error in stats callback: %s" % (str(e)))
+        return stats
+
+
 # List of XML-RPC acceptable return types
 ok_types = [str, int, float, bool, list, tuple, dict]
 
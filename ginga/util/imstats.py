@@ -0,0 +1,223 @@
+#
+# imstats.py -- cached statistics over the pixels of an image
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Cached, incrementally updatable statistics of a data array.
+
+The array is divided into square blocks.  For each block the min/max
+values and the counts of NaN and non-finite values are computed the
+first time they are needed, as are histograms of the block for the bin
+ranges that are requested.  Statistics for the whole array or a region
+of it are combined from the blocks, so they are only calculated once;
+if part of the array is modified, only the blocks that overlap the
+modified region need to be recomputed.
+"""
+import threading
+
+import numpy
+
+from ginga.misc import Bunch
+
+
+class ImageStats(object):
+    """
+    Block-wise cached statistics for a numpy array.
+
+    Parameters
+    ----------
+    data_np : ndarray
+        The (at least 2D) data.  Any dimensions beyond the first two
+        (e.g. color planes) are included in each block.
+
+    block_size : int
+        Width and height (in pixels) of the blocks.
+    """
+
+    def __init__(self, data_np, block_size=256):
+        self.data = data_np
+        self.block_size = int(block_size)
+        self.is_float = (data_np.dtype.kind in ('f', 'c'))
+
+        # (block_y, block_x) -> Bunch
+        self._blocks = {}
+        # maximum number of histograms cached per block
+        self.max_hists = 4
+        self._lock = threading.RLock()
+
+    def _clip_region(self, x1, y1, x2, y2):
+        ht, wd = self.data.shape[:2]
+        if x1 is None:
+            x1, y1, x2, y2 = 0, 0, wd, ht
+        return (max(0, int(x1)), max(0, int(y1)),
+                min(wd, int(x2)), min(ht, int(y2)))
+
+    def _iter_blocks(self, x1, y1, x2, y2):
+        """Yield (key, view, full) for each block overlapping the region
+        (x1, y1)-(x2, y2) (x2, y2 exclusive), where `view` is the part
+        of the block inside the region and `full` tells whether that is
+        the whole block.
+        """
+        bs = self.block_size
+        ht, wd = self.data.shape[:2]
+        for by in range(y1 // bs, -(-y2 // bs)):
+            for bx in range(x1 // bs, -(-x2 // bs)):
+                a1, b1 = bx * bs, by * bs
+                a2, b2 = min(a1 + bs, wd), min(b1 + bs, ht)
+                c1, d1 = max(a1, x1), max(b1, y1)
+                c2, d2 = min(a2, x2), min(b2, y2)
+                full = (c1 == a1 and d1 == b1 and c2 == a2 and d2 == b2)
+                yield ((by, bx), self.data[d1:d2, c1:c2], full)
+
+    def _calc_stats(self, data):
+        res = Bunch.Bunch(size=data.size, nnan=0, nfinite=data.size,
+                          minval=None, maxval=None,
+                          fminval=None, fmaxval=None, hists={})
+        if data.size == 0:
+            return res
+
+        if not self.is_float:
+            res.minval = res.fminval = data.min()
+            res.maxval = res.fmaxval = data.max()
+            return res
+
+        finite = numpy.isfinite(data)
+        res.nfinite = numpy.count_nonzero(finite)
+        if res.nfinite == data.size:
+            res.minval = res.fminval = data.min()
+            res.maxval = res.fmaxval = data.max()
+            return res
+
+        res.nnan = numpy.count_nonzero(numpy.isnan(data))
+        if res.nnan < data.size:
+            res.minval = numpy.nanmin(data)
+            res.maxval = numpy.nanmax(data)
+        if res.nfinite > 0:
+            vals = data[finite]
+            res.fminval, res.fmaxval = vals.min(), vals.max()
+        return res
+
+    def _get_block(self, key, view):
+        blk = self._blocks.get(key, None)
+        if blk is None:
+            blk = self._calc_stats(view)
+            self._blocks[key] = blk
+        return blk
+
+    def _get_region_stats(self, x1, y1, x2, y2):
+        # returns a list of (Bunch, view, full) for the region
+        res = []
+        for key, view, full in self._iter_blocks(x1, y1, x2, y2):
+            if full:
+                res.append((self._get_block(key, view), view, True))
+            else:
+                res.append((self._calc_stats(view), view, False))
+        return res
+
+    def get_summary(self, x1=None, y1=None, x2=None, y2=None):
+        """Returns a Bunch with the statistics of the whole array, or
+        of the region (x1, y1)-(x2, y2) (x2, y2 exclusive): `size`,
+        `nnan` (number of NaN values), `nfinite` (number of finite
+        values), `minval`, `maxval` (NaN ignored) and `fminval`,
+        `fmaxval` (finite values only).  The min/max values are None
+        if there are no values to calculate them from.
+        """
+        x1, y1, x2, y2 = self._clip_region(x1, y1, x2, y2)
+        with self._lock:
+            parts = [tup[0] for tup in self._get_region_stats(x1, y1,
+                                                              x2, y2)]
+
+        def _reduce(fn, name):
+            vals = [p[name] for p in parts if p[name] is not None]
+            if len(vals) == 0:
+                return None
+            return fn(vals)
+
+        return Bunch.Bunch(size=sum([p.size for p in parts]),
+                           nnan=sum([p.nnan for p in parts]),
+                           nfinite=sum([p.nfinite for p in parts]),
+                           minval=_reduce(min, 'minval'),
+                           maxval=_reduce(max, 'maxval'),
+                           fminval=_reduce(min, 'fminval'),
+                           fmaxval=_reduce(max, 'fmaxval'))
+
+    def get_minmax(self, noinf=False):
+        """Returns the (min, max) of the array, ignoring NaN values, and
+        infinite values too if `noinf` is True.
+        """
+        res = self.get_summary()
+        if res.size == 0:
+            return (0, 0)
+        if noinf:
+            minval, maxval = res.fminval, res.fmaxval
+            if minval is None:
+                minval, maxval = res.minval, res.maxval
+        else:
+            minval, maxval = res.minval, res.maxval
+        if minval is None:
+            # all NaN
+            return (numpy.nan, numpy.nan)
+        return (minval, maxval)
+
+    def get_histogram(self, numbins, x1=None, y1=None, x2=None, y2=None):
+        """Returns the histogram of the finite values of the array, or
+        of the region (x1, y1)-(x2, y2) (x2, y2 exclusive), over
+        `numbins` bins spanning the range of the values.  The result is
+        a Bunch with `dist` and `bins` (as returned by numpy.histogram)
+        and `npix`, the number of values counted.
+        """
+        x1, y1, x2, y2 = self._clip_region(x1, y1, x2, y2)
+        with self._lock:
+            parts = self._get_region_stats(x1, y1, x2, y2)
+
+            lows = [p.fminval for p, view, full in parts
+                    if p.fminval is not None]
+            highs = [p.fmaxval for p, view, full in parts
+                     if p.fmaxval is not None]
+            if len(lows) == 0:
+                lo, hi = 0.0, 0.0
+            else:
+                lo, hi = float(min(lows)), float(max(highs))
+            if lo == hi:
+                # same as numpy.histogram does
+                lo, hi = lo - 0.5, hi + 0.5
+
+            # NOTE: with a fixed range, numpy.histogram drops the
+            # non-finite values, and histograms of parts of the data
+            # add up to the histogram of the whole
+            key = (lo, hi, numbins)
+            dist = numpy.zeros(numbins, dtype=numpy.int64)
+            npix = 0
+            for p, view, full in parts:
+                npix += p.nfinite
+                if p.nfinite == 0:
+                    continue
+                hist = p.hists.get(key, None)
+                if hist is None:
+                    hist, bins = numpy.histogram(view, bins=numbins,
+                                                 range=(lo, hi))
+                    if full:
+                        if len(p.hists) >= self.max_hists:
+                            p.hists.pop(next(iter(p.hists)))
+                        p.hists[key] = hist
+                dist += hist
+
+        bins = numpy.linspace(lo, hi, numbins + 1)
+        return Bunch.Bunch(dist=dist, bins=bins, npix=npix)
+
+    def invalidate(self, x1=None, y1=None, x2=None, y2=None):
+        """Discard the cached statistics for the blocks overlapping the
+        region (x1, y1)-(x2, y2) (x2, y2 exclusive), or for all blocks.
+        Call this after modifying the data in that region.
+        """
+        with self._lock:
+            if x1 is None:
+                self._blocks = {}
+                return
+            x1, y1, x2, y2 = self._clip_region(x1, y1, x2, y2)
+            for key, view, full in self._iter_blocks(x1, y1, x2, y2):
+                self._blocks.pop(key, None)
+
+#END
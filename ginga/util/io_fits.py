@@ -124,9 +124,41 @@ class PyFitsFileHandler(BaseFitsFileHandler):
         self.fromHDU(hdu, ahdr)
         return (data, naxispath)
 
-    def load_file(self, filespec, ahdr, numhdu=None, naxispath=None,
-                  phdr=None):
+    def _is_image_hdu(self, hdu, lazy=False):
+        # rule out HDUs we can't deal with
+        if not (isinstance(hdu, pyfits.ImageHDU) or
+                isinstance(hdu, pyfits.PrimaryHDU)):
+            # Don't open tables, etc.
+            return False
+        if lazy:
+            # decide from the header alone, without touching the data
+            naxis = hdu.header.get('NAXIS', 0)
+            if naxis == 0:
+                return False
+            for i in range(1, naxis + 1):
+                if hdu.header.get('NAXIS%d' % i, 0) == 0:
+                    # non-pixel or zero-length data hdu?
+                    return False
+            return True
+
+        if not isinstance(hdu.data, numpy.ndarray):
+            # We need to open a numpy array
+            return False
+        if 0 in hdu.data.shape:
+            # non-pixel or zero-length data hdu?
+            return False
+        return True
 
+    def load_file(self, filespec, ahdr, numhdu=None, naxispath=None,
+                  phdr=None, lazy=False):
+        """Load an HDU from a FITS file.
+
+        If `lazy` is True, only the headers needed are parsed and the
+        data is returned as an array memory-mapped onto the file, so
+        that pixels are only read from disk when they are accessed.
+        (Data with BSCALE/BZERO scaling is still read in full by astropy
+        when it is scaled.)
+        """
         info = iohelper.get_fileinfo(filespec)
         if not info.ondisk:
             raise FITSError("File does not appear to be on disk: %s" % (
@@ -134,40 +166,33 @@ class PyFitsFileHandler(BaseFitsFileHandler):
         filepath = info.filepath
 
         self.logger.debug("Loading file '%s' ..." % (filepath))
-        fits_f = pyfits.open(filepath, 'readonly')
+        if lazy:
+            fits_f = pyfits.open(filepath, 'readonly', memmap=True)
+        else:
+            fits_f = pyfits.open(filepath, 'readonly')
 
-        # this seems to be necessary now for some fits files...
-        try:
-            fits_f.verify('fix')
-        except Exception as e:
-            raise FITSError("Error loading fits file '%s': %s" % (
-                filepath, str(e)))
+            # this seems to be necessary now for some fits files...
+            try:
+                fits_f.verify('fix')
+            except Exception as e:
+                raise FITSError("Error loading fits file '%s': %s" % (
+                    filepath, str(e)))
 
         if numhdu is None:
 
-            info = fits_f.info(output=False)
             extver_db = {}
 
             found_valid_hdu = False
-            for i in range(len(fits_f)):
-                hdu = fits_f[i]
-                tup = info[i]
-                name = tup[1]
+            # NOTE: iterating (rather than using len() or info()) means
+            # that headers after the first image HDU need not be read
+            for i, hdu in enumerate(fits_f):
+                name = hdu.name
                 # figure out the EXTVER for this HDU
                 extver = extver_db.setdefault(name, 0)
                 extver += 1
                 extver_db[name] = extver
 
-                # rule out HDUs we can't deal with
-                if not (isinstance(hdu, pyfits.ImageHDU) or
-                        isinstance(hdu, pyfits.PrimaryHDU)):
-                    # Don't open tables, etc.
-                    continue
-                if not isinstance(hdu.data, numpy.ndarray):
-                    # We need to open a numpy array
-                    continue
-                if 0 in hdu.data.shape:
-                    # non-pixel or zero-length data hdu?
+                if not self._is_image_hdu(hdu, lazy=lazy):
                     continue
 
                 #print "data type is %s" % hdu.data.dtype.kind
@@ -194,6 +219,16 @@ class PyFitsFileHandler(BaseFitsFileHandler):
 
         hdu = fits_f[numhdu]
 
+        if lazy:
+            # only verify the HDUs we actually use
+            try:
+                hdu.verify('fix')
+                if phdr is not None:
+                    fits_f[0].verify('fix')
+            except Exception as e:
+                raise FITSError("Error loading fits file '%s': %s" % (
+                    filepath, str(e)))
+
         data, naxispath = self.load_hdu(hdu, ahdr, fobj=fits_f,
                                         naxispath=naxispath)
 
@@ -201,6 +236,7 @@ class PyFitsFileHandler(BaseFitsFileHandler):
         if phdr is not None:
             self.fromHDU(fits_f[0], phdr)
 
+        # NOTE: a memory-mapped data array remains valid after close
         fits_f.close()
         return (data, numhdu, naxispath)
 
@@ -266,7 +302,9 @@ class FitsioFileHandler(BaseFitsFileHandler):
         return (data, naxispath)
 
     def load_file(self, filespec, ahdr, numhdu=None, naxispath=None,
-                  phdr=None):
+                  phdr=None, lazy=False):
+        # NOTE: fitsio cannot memory-map data; `lazy` is accepted for
+        # compatibility, but data is always read
 
         info = iohelper.get_fileinfo(filespec)
         if not info.ondisk:
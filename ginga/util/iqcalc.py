@@ -20,7 +20,24 @@ try:
 except ImportError:
     have_scipy = False
 
-from ginga.misc import Bunch
+try:
+    import multiprocessing
+    have_multiprocessing = True
+except ImportError:
+    have_multiprocessing = False
+
+from ginga.misc import log
+
+# fields of the object records returned by IQCalc.evaluate_peaks()
+obj_dtype = numpy.dtype([('objx', 'f8'), ('objy', 'f8'), ('pos', 'f8'),
+                         ('fwhm_x', 'f8'), ('fwhm_y', 'f8'), ('fwhm', 'f8'),
+                         ('fwhm_radius', 'i8'), ('brightness', 'f8'),
+                         ('elipse', 'f8'), ('x', 'i8'), ('y', 'i8'),
+                         ('skylevel', 'f8'), ('background', 'f8')])
+
+# minimum number of leftover fits (see IQCalc.evaluate_peaks) that are
+# worth starting worker processes for
+pool_min_fits = 100
 
 
 def get_mean(data_np):
@@ -31,6 +48,16 @@ def get_median(data_np):
     mdata = numpy.ma.masked_array(data_np, numpy.isnan(data_np))
     return numpy.median(mdata)
 
+def make_objlist(objs):
+    """Make a record array of type `obj_dtype` from a sequence of objects
+    with attributes named like its fields (e.g. the Bunch objects
+    returned by earlier versions of `IQCalc.evaluate_peaks`).
+    """
+    objlist = numpy.recarray((len(objs),), dtype=obj_dtype)
+    for name in obj_dtype.names:
+        objlist[name] = [obj[name] for obj in objs]
+    return objlist
+
 
 class IQCalcError(Exception):
     """Base exception for raising errors in this module."""
@@ -230,10 +257,154 @@ class IQCalc(object):
         return self.get_fwhm(x, y, radius, data)
 
 
+    # BATCHED FWHM CALCULATION
+
+    def cut_crosses(self, xs, ys, radius, data):
+        """Like `cut_cross`, for arrays of integer center coordinates
+        (xs, ys).  The cuts are rows of the (N, 2*radius+1) arrays (xarrs,
+        yarrs); where a cut runs off the edge of the data, the cut
+        starts at the edge and the rest of the row is marked invalid in
+        the boolean arrays (xvalid, yvalid).
+
+        Returns (x0s, y0s, xarrs, yarrs, xvalid, yvalid).
+        """
+        ht, wd = data.shape
+        offs = numpy.arange(-radius, radius + 1)
+
+        res = []
+        for ctrs, others, size, is_x in ((xs, ys, wd, True),
+                                         (ys, xs, ht, False)):
+            starts = numpy.clip(ctrs - radius, 0, None)
+            ends = numpy.clip(ctrs + radius, None, size - 1)
+            idxs = starts[:, None] + offs[None, :] + radius
+            valid = idxs <= ends[:, None]
+            idxs = numpy.clip(idxs, 0, size - 1)
+            if is_x:
+                arrs = data[others[:, None], idxs]
+            else:
+                arrs = data[idxs, others[:, None]]
+            res.append((starts, arrs, valid))
+
+        (x0s, xarrs, xvalid), (y0s, yarrs, yvalid) = res
+        return (x0s, y0s, xarrs, yarrs, xvalid, yvalid)
+
+    def fit_gaussians(self, arrs, valid, medv, max_iter=100, tol=1.0e-8):
+        """Fit the `gaussian` function to each row of the 2D array
+        `arrs` at once, as `calc_fwhm` does for a single 1D array: the
+        rows have `medv` subtracted and are clamped to 0..max.  Only the
+        elements marked in the boolean array `valid` are used.
+
+        The fits start from the moments of each row and are refined with
+        a Levenberg-Marquardt least squares fit, vectorized over the
+        rows.
+
+        Returns (fwhm, mu, sdev, maxv, ok), each an array with an element
+        per row.  Rows for which the fit did not converge are False in
+        `ok`.
+        """
+        n, m = arrs.shape
+        X = numpy.arange(m, dtype=numpy.float64)[None, :]
+        wts = (valid & numpy.isfinite(arrs)).astype(numpy.float64)
+        Y = numpy.where(wts > 0, arrs - medv, 0.0)
+        maxv = Y.max(axis=1)
+        Y = numpy.clip(Y, 0.0, numpy.clip(maxv, 0.0, None)[:, None])
+
+        # initial guess from the moments
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            total = Y.sum(axis=1)
+            mu = (X * Y).sum(axis=1) / total
+            sdev = numpy.sqrt(((X - mu[:, None])**2 * Y).sum(axis=1) / total)
+        sdev = numpy.where(sdev > 0.0, sdev, 1.0)
+        p = numpy.array([mu, sdev, maxv * sdev * numpy.sqrt(2*numpy.pi)]).T
+        p = numpy.where(numpy.isfinite(p), p, 1.0)
+
+        def residuals(p, Y, wts):
+            mu, sdev, amp = p[:, 0:1], p[:, 1:2], p[:, 2:3]
+            d = X - mu
+            g = (numpy.exp(-d**2 / (2 * sdev**2)) /
+                 (sdev * numpy.sqrt(2*numpy.pi)))
+            r = (amp * g - Y) * wts
+            return d, g, r
+
+        with numpy.errstate(all='ignore'):
+            d, g, r = residuals(p, Y, wts)
+            cost = (r**2).sum(axis=1)
+            lam = numpy.full(n, 1.0e-3)
+            ok = numpy.zeros(n, dtype=bool)
+            active = numpy.isfinite(cost)
+
+            for i in range(max_iter):
+                idx = numpy.nonzero(active)[0]
+                if len(idx) == 0:
+                    break
+                pa, da, ga, ra = p[idx], d[idx], g[idx], r[idx]
+                mu, sdev, amp = pa[:, 0:1], pa[:, 1:2], pa[:, 2:3]
+                f = amp * ga
+                wa = wts[idx]
+                jac = numpy.empty(da.shape + (3,))
+                jac[..., 0] = f * da / sdev**2 * wa
+                jac[..., 1] = f * (da**2 / sdev**3 - 1.0 / sdev) * wa
+                jac[..., 2] = ga * wa
+
+                jtj = numpy.einsum('nmi,nmj->nij', jac, jac)
+                jtr = numpy.einsum('nmi,nm->ni', jac, ra)
+                diag = numpy.einsum('nii->ni', jtj)
+                a = jtj + (lam[idx, None] * diag + 1.0e-30)[:, :, None] * \
+                    numpy.eye(3)[None, :, :]
+                try:
+                    delta = -numpy.linalg.solve(a, jtr[:, :, None])[:, :, 0]
+                except numpy.linalg.LinAlgError:
+                    delta = -numpy.einsum('nij,nj->ni',
+                                          numpy.linalg.pinv(a), jtr)
+
+                p_new = pa + delta
+                d_new, g_new, r_new = residuals(p_new, Y[idx], wa)
+                cost_new = (r_new**2).sum(axis=1)
+
+                better = cost_new <= cost[idx]
+                bi = idx[better]
+                p[bi], d[bi], g[bi], r[bi] = (p_new[better], d_new[better],
+                                              g_new[better], r_new[better])
+                lam[bi] *= 0.1
+                lam[idx[~better]] *= 10.0
+
+                small = (numpy.abs(delta) <=
+                         tol * (numpy.abs(pa) + tol)).all(axis=1)
+                done = better & (small | (cost[idx] - cost_new <=
+                                          tol * cost[idx]))
+                cost[bi] = cost_new[better]
+                ok[idx[done]] = True
+                # give up on rows that have gone bad
+                active[idx[done | ~numpy.isfinite(cost_new) |
+                           (lam[idx] > 1.0e10)]] = False
+
+        mu, sdev, amp = p.T
+        sdev = numpy.abs(sdev)
+        ok &= numpy.isfinite(p).all(axis=1) & (sdev > 0.0)
+        fwhm = 2.0 * numpy.sqrt(2.0 * numpy.log(2.0)) * sdev
+        return (fwhm, mu, sdev, amp, ok)
+
+
     # EVALUATION ON A FIELD
 
     def evaluate_peaks(self, peaks, data, bright_radius=2, fwhm_radius=15,
-                       fwhm_method=1, cb_fn=None, ev_intr=None):
+                       fwhm_method=1, cb_fn=None, ev_intr=None,
+                       num_workers=None):
+        """Measure the objects at the (x, y) positions in `peaks` (e.g.
+        from `find_bright_peaks`) in `data`.
+
+        The cuts in X and Y through all of the objects are fit at once
+        (see `fit_gaussians`).  The few fits that do not converge that
+        way are redone one by one with `calc_fwhm`, in `num_workers`
+        worker processes (by default, one per CPU) if there are many of
+        them.  Objects that cannot be fit are left out.
+
+        Returns a record array of type `obj_dtype`, with one record per
+        object.  If `cb_fn` is given, it is called with each record.
+        """
+        if fwhm_method != 1:
+            raise IQCalcError("Method (%d) not supported for fwhm calculation!" %(
+                fwhm_method))
 
         height, width = data.shape
         hh = float(height) / 2.0
@@ -249,66 +420,94 @@ class IQCalc(object):
         # Old SOSS qualsize() applied this calculation to skylevel
         skylevel = median * self.skylevel_magnification + self.skylevel_offset
 
-        # Form a list of objects and their characteristics
-        objlist = []
-        for x, y in peaks:
+        peaks = numpy.asarray(peaks, dtype=numpy.float64).reshape(-1, 2)
+        xs = peaks[:, 0].astype(numpy.int64)
+        ys = peaks[:, 1].astype(numpy.int64)
+
+        # Find the fwhm in x and y
+        x0s, y0s, xarrs, yarrs, xvalid, yvalid = self.cut_crosses(
+            xs, ys, fwhm_radius, data)
+        fits = []
+        for arrs, valid in ((xarrs, xvalid), (yarrs, yvalid)):
             if ev_intr and ev_intr.isSet():
                 raise IQCalcError("Evaluation interrupted!")
-
-            # Find the fwhm in x and y
-            try:
-                if fwhm_method == 1:
-                    (fwhm_x, fwhm_y, ctr_x, ctr_y,
-                     sdx, sdy, maxx, maxy) = self.fwhm_data(x, y, data,
-                                                            radius=fwhm_radius)
-
-                    ## # Average the X and Y gaussian fitting near the peak
-                    bx = self.gaussian(round(ctr_x), (ctr_x, sdx, maxx))
-                    by = self.gaussian(round(ctr_y), (ctr_y, sdy, maxy))
-                    ## ## bx = self.gaussian(ctr_x, (ctr_x, sdx, maxx))
-                    ## ## by = self.gaussian(ctr_y, (ctr_y, sdy, maxy))
-                    bright = float((bx + by)/2.0)
-
-                else:
-                    raise IQCalcError("Method (%d) not supported for fwhm calculation!" %(
-                        fwhm_method))
-
-            except Exception as e:
-                # Error doing FWHM, skip this object
-                self.logger.debug("Error doing FWHM on object at %.2f,%.2f: %s" % (
-                    x, y, str(e)))
-                continue
-
-            self.logger.debug("orig=%f,%f  ctr=%f,%f  fwhm=%f,%f bright=%f" % (
-                x, y, ctr_x, ctr_y, fwhm_x, fwhm_y, bright))
-            # overall measure of fwhm as a single value
-            #fwhm = math.sqrt(fwhm_x*fwhm_x + fwhm_y*fwhm_y)
-            #fwhm = (math.fabs(fwhm_x) + math.fabs(fwhm_y)) / 2.0
-            fwhm = (math.sqrt(fwhm_x*fwhm_x + fwhm_y*fwhm_y) *
-                    (1.0 / math.sqrt(2.0)) )
-
-            # calculate a measure of ellipticity
-            elipse = math.fabs(min(fwhm_x, fwhm_y) / max(fwhm_x, fwhm_y))
-
-            # calculate a measure of distance from center of image
-            dx = wh - ctr_x
-            dy = hh - ctr_y
-            dx2 = dx*dx / wd / w4
-            dy2 = dy*dy / ht / h4
-            if dx2 > dy2:
-                pos = 1.0 - dx2
+            fits.append(list(self.fit_gaussians(arrs, valid, median)))
+
+        # redo the fits that did not converge
+        jobs = []
+        for res, arrs, valid in ((fits[0], xarrs, xvalid),
+                                 (fits[1], yarrs, yvalid)):
+            for i in numpy.nonzero(~res[4])[0]:
+                jobs.append((res, i, arrs[i][valid[i]], median))
+        if len(jobs) > 0:
+            self.logger.debug("redoing %d fits" % (len(jobs)))
+            if num_workers is None:
+                num_workers = multiprocessing.cpu_count() if \
+                              have_multiprocessing else 1
+            args = [(arr1d, medv) for res, i, arr1d, medv in jobs]
+            if (num_workers > 1) and (len(jobs) >= pool_min_fits):
+                pool = multiprocessing.Pool(num_workers)
+                try:
+                    results = pool.map(_calc_fwhm_job, args)
+                finally:
+                    pool.terminate()
             else:
-                pos = 1.0 - dy2
-
-            obj = Bunch.Bunch(objx=ctr_x, objy=ctr_y, pos=pos,
-                              fwhm_x=fwhm_x, fwhm_y=fwhm_y,
-                              fwhm=fwhm, fwhm_radius=fwhm_radius,
-                              brightness=bright, elipse=elipse,
-                              x=int(x), y=int(y),
-                              skylevel=skylevel, background=median)
-            objlist.append(obj)
-
-            if cb_fn is not None:
+                results = []
+                for arg in args:
+                    if ev_intr and ev_intr.isSet():
+                        raise IQCalcError("Evaluation interrupted!")
+                    results.append(_calc_fwhm_job(arg, iqcalc=self))
+
+            for (res, i, arr1d, medv), (ok, fit) in zip(jobs, results):
+                if ok:
+                    fwhm, mu, sdev, maxv = fit
+                    res[0][i], res[1][i] = abs(fwhm), mu
+                    res[2][i], res[3][i] = abs(sdev), maxv
+                    res[4][i] = True
+
+        fwhm_x, cx, sdx, maxx, okx = fits[0]
+        fwhm_y, cy, sdy, maxy, oky = fits[1]
+        ok = okx & oky
+        if not ok.all():
+            self.logger.debug("Error doing FWHM on %d objects" % (
+                len(ok) - ok.sum()))
+
+        objlist = numpy.recarray((int(ok.sum()),), dtype=obj_dtype)
+        fwhm_x, fwhm_y = fwhm_x[ok], fwhm_y[ok]
+        sdx, sdy, maxx, maxy = sdx[ok], sdy[ok], maxx[ok], maxy[ok]
+        ctr_x = x0s[ok] + cx[ok]
+        ctr_y = y0s[ok] + cy[ok]
+
+        # Average the X and Y gaussian fitting near the peak
+        bx = self.gaussian(numpy.round(ctr_x), (ctr_x, sdx, maxx))
+        by = self.gaussian(numpy.round(ctr_y), (ctr_y, sdy, maxy))
+        objlist.brightness = (bx + by) / 2.0
+
+        objlist.objx, objlist.objy = ctr_x, ctr_y
+        objlist.fwhm_x, objlist.fwhm_y = fwhm_x, fwhm_y
+        # overall measure of fwhm as a single value
+        objlist.fwhm = (numpy.sqrt(fwhm_x*fwhm_x + fwhm_y*fwhm_y) *
+                        (1.0 / math.sqrt(2.0)))
+
+        # calculate a measure of ellipticity
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            objlist.elipse = numpy.fabs(numpy.minimum(fwhm_x, fwhm_y) /
+                                        numpy.maximum(fwhm_x, fwhm_y))
+
+        # calculate a measure of distance from center of image
+        dx = wh - ctr_x
+        dy = hh - ctr_y
+        dx2 = dx*dx / wd / w4
+        dy2 = dy*dy / ht / h4
+        objlist.pos = 1.0 - numpy.maximum(dx2, dy2)
+
+        objlist.fwhm_radius = fwhm_radius
+        objlist.x, objlist.y = xs[ok], ys[ok]
+        objlist.skylevel = skylevel
+        objlist.background = median
+
+        if cb_fn is not None:
+            for obj in objlist:
                 cb_fn(obj)
 
         return objlist
@@ -324,29 +523,34 @@ class IQCalc(object):
     #         return 0
 
     def _sortkey(self, obj):
-        val = obj.brightness * obj.pos/math.sqrt(obj.fwhm)
+        # works for a record or a record array
+        val = obj.brightness * obj.pos/numpy.sqrt(obj.fwhm)
         return val
 
     def objlist_select(self, objlist, width, height,
                         minfwhm=2.0, maxfwhm=150.0, minelipse=0.5,
                         edgew=0.01):
-
-        results = []
-        count = 0
-        for obj in objlist:
-            count += 1
-            self.logger.debug("%d obj x,y=%.2f,%.2f fwhm=%.2f bright=%.2f" % (
-                count, obj.objx, obj.objy, obj.fwhm, obj.brightness))
-            # If peak has a minfwhm < fwhm < maxfwhm and the object
-            # is inside the frame by edgew pct
-            if ((minfwhm < obj.fwhm) and (obj.fwhm < maxfwhm) and
-                (minelipse < obj.elipse) and (width*edgew < obj.x) and
-                (height*edgew < obj.y) and (width*(1.0-edgew) > obj.x) and
-                (height*(1.0-edgew) > obj.y)):
-                results.append(obj)
-
-        #results.sort(cmp=self._compare)
-        results.sort(key=self._sortkey, reverse=True)
+        """Select the objects in `objlist` (a record array from
+        `evaluate_peaks`) with a FWHM between `minfwhm` and `maxfwhm`,
+        an ellipticity above `minelipse` and inside the frame by the
+        fraction `edgew`.  Returns a record array of them, best first.
+        """
+        if not isinstance(objlist, numpy.ndarray):
+            objlist = make_objlist(objlist)
+
+        # If peak has a minfwhm < fwhm < maxfwhm and the object
+        # is inside the frame by edgew pct
+        ok = ((minfwhm < objlist.fwhm) & (objlist.fwhm < maxfwhm) &
+              (minelipse < objlist.elipse) & (width*edgew < objlist.x) &
+              (height*edgew < objlist.y) & (width*(1.0-edgew) > objlist.x) &
+              (height*(1.0-edgew) > objlist.y))
+        results = objlist[ok]
+        self.logger.debug("%d of %d objects selected" % (
+            len(results), len(objlist)))
+
+        # best first; like sort(reverse=True), keeps the order of ties
+        key = self._sortkey(results)
+        results = results[numpy.argsort(-key, kind='stable')]
         return results
 
     def pick_field(self, data, peak_radius=5, bright_radius=2, fwhm_radius=15,
@@ -406,4 +610,15 @@ class IQCalc(object):
 
         return qs
 
+
+def _calc_fwhm_job(args, iqcalc=None):
+    # for the worker processes: errors are returned rather than raised
+    arr1d, medv = args
+    if iqcalc is None:
+        iqcalc = IQCalc(logger=log.get_logger(null=True))
+    try:
+        return (True, iqcalc.calc_fwhm(arr1d, medv=medv))
+    except Exception as e:
+        return (False, str(e))
+
 #END
@@ -11,16 +11,37 @@
 """
 Usage:
    $ ./mosaic.py -o output.fits input1.fits input2.fits ... inputN.fits
+
+With an output file, the pieces are reprojected onto the WCS of the
+mosaic in parallel worker processes and accumulated into a
+memory-mapped output FITS file, so the mosaic does not need to fit in
+memory.
 """
 from __future__ import print_function
 import sys, os
 import math
+import tempfile
+import shutil
+from collections import OrderedDict
 
 import numpy
 
 from ginga import AstroImage
 from ginga.util import wcs, io_fits, dp
-from ginga.misc import log
+from ginga.misc import log, Bunch
+
+try:
+    from astropy.io import fits as pyfits
+    from astropy import wcs as pywcs
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+try:
+    import multiprocessing
+    have_multiprocessing = True
+except ImportError:
+    have_multiprocessing = False
 
 
 def mosaic(logger, itemlist, fov_deg=None):
@@ -91,23 +112,274 @@ def mosaic(logger, itemlist, fov_deg=None):
     return img_mosaic
 
 
+def _open_piece(filepath):
+    # returns the first HDU with image data in the file, opened with
+    # memory mapping so that only the pixels used are read
+    fits_f = pyfits.open(filepath, memmap=True)
+    for hdu in fits_f:
+        if hdu.header.get('NAXIS', 0) >= 2:
+            return fits_f, hdu
+    fits_f.close()
+    raise ValueError("No image data in '%s'" % (filepath))
+
+def _make_header(header):
+    hdr = pyfits.Header()
+    for kwd, val in header.items():
+        hdr[kwd] = val
+    return hdr
+
+def _make_wcs(header):
+    return pywcs.WCS(_make_header(header))
+
+def _get_footprint(piece_wcs, wd, ht, ref_wcs):
+    # bounding box, in the pixels of the mosaic, of a piece of wd x ht px:
+    # the pixels whose centers fall within the outer edges of the piece
+    x = numpy.array([-0.5, wd-0.5, wd-0.5, -0.5])
+    y = numpy.array([-0.5, -0.5, ht-0.5, ht-0.5])
+    ra, dec = piece_wcs.all_pix2world(x, y, 0)
+    x, y = ref_wcs.all_world2pix(ra, dec, 0)
+    return (int(math.ceil(x.min())), int(math.ceil(y.min())),
+            int(math.floor(x.max())) + 1, int(math.floor(y.max())) + 1)
+
+def plan_mosaic(logger, filelist, fov_deg=None):
+    """Calculate the WCS and size of a mosaic of the FITS files in
+    `filelist`, and where each of them goes in it, reading only their
+    headers.  The mosaic has the center, rotation and pixel scale of the
+    first file.  It covers all of the files, or a `fov_deg` square
+    around the center of the first file, if given.
+
+    Returns a Bunch with the `header` (a dict) of the mosaic, its
+    `width` and `height` and a list of `pieces`, each a Bunch with the
+    `path` of the file and its `bbox` (x1, y1, x2, y2) in the mosaic
+    (x2, y2 exclusive).
+    """
+    assert have_astropy, \
+           ImportError("astropy is needed to plan a mosaic")
+
+    fits_f, hdu = _open_piece(filelist[0])
+    try:
+        header0 = hdu.header
+        ra_deg, dec_deg = header0['CRVAL1'], header0['CRVAL2']
+        (rot_deg, cdelt1, cdelt2) = wcs.get_rotation_and_scale(header0)
+    finally:
+        fits_f.close()
+    px_scale = math.fabs(cdelt1)
+    cdbase = [numpy.sign(cdelt1), numpy.sign(cdelt2)]
+    logger.debug("mosaic rot=%f cdelt1=%f cdelt2=%f" % (rot_deg,
+                                                        cdelt1, cdelt2))
+
+    # WCS with the reference point at pixel 0, 0 for now
+    header = OrderedDict((('SIMPLE', True),
+                          ('BITPIX', -32),
+                          ('NAXIS', 2),
+                          ('NAXIS1', 1),
+                          ('NAXIS2', 1),
+                          ('EQUINOX', 2000.0),
+                          ('OBJECT', 'MOSAIC'),
+                          ('LONPOLE', 180.0),
+                          ))
+    header.update(wcs.simple_wcs(0, 0, ra_deg, dec_deg, px_scale,
+                                 rot_deg, cdbase=cdbase))
+    ref_wcs = _make_wcs(header)
+
+    pieces = []
+    for filepath in filelist:
+        fits_f, hdu = _open_piece(filepath)
+        try:
+            wd, ht = hdu.header['NAXIS1'], hdu.header['NAXIS2']
+            bbox = _get_footprint(pywcs.WCS(hdu.header), wd, ht, ref_wcs)
+        finally:
+            fits_f.close()
+        logger.debug("'%s' footprint %s" % (filepath, str(bbox)))
+        pieces.append(Bunch.Bunch(path=filepath, bbox=bbox))
+
+    if fov_deg is not None:
+        radius = int(round(fov_deg / px_scale / 2.0))
+        x1, y1, x2, y2 = -radius, -radius, radius, radius
+    else:
+        x1 = min([p.bbox[0] for p in pieces])
+        y1 = min([p.bbox[1] for p in pieces])
+        x2 = max([p.bbox[2] for p in pieces])
+        y2 = max([p.bbox[3] for p in pieces])
+
+    # move the origin to the corner of the mosaic
+    width, height = x2 - x1, y2 - y1
+    header['NAXIS1'], header['NAXIS2'] = width, height
+    header['CRPIX1'] -= x1
+    header['CRPIX2'] -= y1
+    res = []
+    for piece in pieces:
+        a1, b1, a2, b2 = piece.bbox
+        a1, b1 = max(a1 - x1, 0), max(b1 - y1, 0)
+        a2, b2 = min(a2 - x1, width), min(b2 - y1, height)
+        if (a2 > a1) and (b2 > b1):
+            piece.bbox = (a1, b1, a2, b2)
+            res.append(piece)
+        else:
+            logger.warning("'%s' is outside the mosaic" % (piece.path))
+
+    return Bunch.Bunch(header=header, width=width, height=height,
+                       pieces=res)
+
+def reproject_piece(filepath, header, bbox, trim_px=0, tile_rows=256):
+    """Resample the image in FITS file `filepath` onto the pixels in
+    `bbox` (x1, y1, x2, y2; x2, y2 exclusive) of the WCS in `header`,
+    by nearest neighbor.  `trim_px` pixels at the edges of the image are
+    left out.  Returns (bbox, data, mask), where `mask` is True for the
+    pixels of `data` that are covered by the image.
+    """
+    x1, y1, x2, y2 = bbox
+    out_wcs = _make_wcs(header)
+    data = numpy.zeros((y2 - y1, x2 - x1), dtype=numpy.float32)
+    mask = numpy.zeros(data.shape, dtype=bool)
+
+    fits_f, hdu = _open_piece(filepath)
+    try:
+        piece_wcs = pywcs.WCS(hdu.header, naxis=2)
+        src = hdu.data
+        while src.ndim > 2:
+            src = src[0]
+        ht, wd = src.shape
+        xi = numpy.arange(x1, x2)
+
+        # work through the bbox in bands of rows to bound the memory
+        # used for the coordinate arrays
+        for b1 in range(y1, y2, tile_rows):
+            b2 = min(b1 + tile_rows, y2)
+            xx, yy = numpy.meshgrid(xi, numpy.arange(b1, b2))
+            ra, dec = out_wcs.all_pix2world(xx, yy, 0)
+            px, py = piece_wcs.all_world2pix(ra, dec, 0)
+            px, py = numpy.rint(px), numpy.rint(py)
+            ok = ((px >= trim_px) & (px < wd - trim_px) &
+                  (py >= trim_px) & (py < ht - trim_px))
+            vals = src[py[ok].astype(int), px[ok].astype(int)]
+            # blank (NaN) pixels don't count as coverage
+            good = numpy.isfinite(vals)
+            ok[ok] = good
+            data[b1 - y1:b2 - y1][ok] = vals[good]
+            mask[b1 - y1:b2 - y1] = ok
+    finally:
+        fits_f.close()
+
+    return (bbox, data, mask)
+
+def _reproject_job(args):
+    # for the worker processes
+    return reproject_piece(*args)
+
+def _create_fits(outfile, header):
+    # create a FITS file for the mosaic without holding the data in
+    # memory: the data part is left as a sparse, zero-filled file
+    hdr = _make_header(header)
+    hdr.tofile(outfile, overwrite=True)
+    nbytes = header['NAXIS1'] * header['NAXIS2'] * 4
+    nbytes = -(-nbytes // 2880) * 2880
+    with open(outfile, 'rb+') as out_f:
+        out_f.seek(len(hdr.tostring()) + nbytes - 1)
+        out_f.write(b'\0')
+
+def mosaic_files(logger, filelist, outfile, fov_deg=None, num_workers=None,
+                 merge='average', trim_px=0, coverage_file=None,
+                 tile_rows=1024):
+    """Build a mosaic of the FITS files in `filelist` into FITS file
+    `outfile`.
+
+    The pieces are reprojected in `num_workers` worker processes (by
+    default one per CPU) and accumulated into the memory-mapped output.
+    A coverage map counts the pieces that contribute to each pixel;
+    where pieces overlap, `merge` is 'average' to average them or
+    'first' to keep the first piece placed.  The coverage map is
+    written to `coverage_file` if given.  The output is normalized in
+    bands of `tile_rows` rows.  Pixels not covered by any piece are 0.
+
+    Returns the plan from `plan_mosaic`.
+    """
+    assert merge in ('average', 'first'), \
+           ValueError("merge must be one of: average, first")
+
+    plan = plan_mosaic(logger, filelist, fov_deg=fov_deg)
+    header = plan.header
+    logger.info("Mosaic is %dx%d pixels, %d pieces" % (
+        plan.width, plan.height, len(plan.pieces)))
+    _create_fits(outfile, header)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        weight = numpy.lib.format.open_memmap(
+            os.path.join(tmpdir, 'coverage.npy'), mode='w+',
+            dtype=numpy.float32, shape=(plan.height, plan.width))
+
+        jobs = [(piece.path, header, piece.bbox, trim_px)
+                for piece in plan.pieces]
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count() if \
+                          have_multiprocessing else 1
+
+        with pyfits.open(outfile, mode='update', memmap=True) as out_f:
+            out_data = out_f[0].data
+
+            if num_workers > 1:
+                pool = multiprocessing.Pool(num_workers)
+                results = pool.imap_unordered(_reproject_job, jobs)
+            else:
+                pool = None
+                results = map(_reproject_job, jobs)
+
+            try:
+                count = 0
+                for (x1, y1, x2, y2), data, mask in results:
+                    count += 1
+                    logger.debug("placing piece %d/%d at %s" % (
+                        count, len(jobs), str((x1, y1, x2, y2))))
+                    view = numpy.s_[y1:y2, x1:x2]
+                    dst, wt = out_data[view], weight[view]
+                    if merge == 'first':
+                        mask &= (wt == 0)
+                    dst[mask] += data[mask]
+                    wt[mask] += 1
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+
+            if merge == 'average':
+                for y1 in range(0, plan.height, tile_rows):
+                    view = numpy.s_[y1:y1 + tile_rows]
+                    dst, wt = out_data[view], weight[view]
+                    covered = wt > 1
+                    dst[covered] /= wt[covered]
+
+        if coverage_file is not None:
+            logger.info("Writing coverage map to '%s'..." % (
+                coverage_file))
+            hdr = _make_header(header)
+            hdr['OBJECT'] = 'COVERAGE'
+            hdu = pyfits.PrimaryHDU(data=numpy.asarray(weight), header=hdr)
+            hdu.writeto(coverage_file, overwrite=True)
+        del weight
+
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    logger.info("Done.")
+    return plan
+
+
 def main(options, args):
 
     logger = log.get_logger(name="mosaic", options=options)
 
-    img_mosaic = mosaic(logger, args, fov_deg=options.fov)
-
     if options.outfile:
         outfile = options.outfile
-        io_fits.use('astropy')
-
         logger.info("Writing output to '%s'..." % (outfile))
-        try:
-            os.remove(outfile)
-        except OSError:
-            pass
+        mosaic_files(logger, args, outfile, fov_deg=options.fov,
+                     num_workers=options.workers, merge=options.merge,
+                     trim_px=options.trim_px,
+                     coverage_file=options.coverage)
+        return
 
-        img_mosaic.save_as_file(outfile)
+    # no output file: build the mosaic in memory
+    img_mosaic = mosaic(logger, args, fov_deg=options.fov)
 
 
 if __name__ == "__main__":
@@ -118,6 +390,8 @@ if __name__ == "__main__":
     usage = "usage: %prog [options] cmd [args]"
     optprs = OptionParser(usage=usage, version=('%%prog'))
 
+    optprs.add_option("--coverage", dest="coverage", metavar="FILE",
+                      help="Write the coverage map of the mosaic to FILE")
     optprs.add_option("--debug", dest="debug", default=False, action="store_true",
                       help="Enter the pdb debugger on main()")
     optprs.add_option("--fov", dest="fov", metavar="DEG",
@@ -128,11 +402,20 @@ if __name__ == "__main__":
     optprs.add_option("--loglevel", dest="loglevel", metavar="LEVEL",
                       type='int',
                       help="Set logging level to LEVEL")
+    optprs.add_option("--merge", dest="merge", default='average',
+                      metavar="METHOD",
+                      help="How to merge overlaps: average|first")
     optprs.add_option("-o", "--outfile", dest="outfile", metavar="FILE",
                       help="Write mosaic output to FILE")
     optprs.add_option("--stderr", dest="logstderr", default=False,
                       action="store_true",
                       help="Copy logging also to stderr")
+    optprs.add_option("--trim", dest="trim_px", default=0, type='int',
+                      metavar="NUM",
+                      help="Trim NUM pixels from the edges of each piece")
+    optprs.add_option("--workers", dest="workers", type='int',
+                      metavar="NUM",
+                      help="Use NUM worker processes (default: one per CPU)")
     optprs.add_option("--profile", dest="profile", action="store_true",
                       default=False,
                       help="Run the profiler on main()")
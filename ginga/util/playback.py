@@ -0,0 +1,259 @@
+#
+# playback.py -- pre-rendered playback of data cube slices
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Streaming playback of the slices of a data cube.
+
+A `SliceRenderer` turns one slice of a cube into an index array (the
+input to an RGB mapper).  The cutout, scale and cut levels are fixed
+when the renderer is created, so rendering a slice is just a fancy index
+of the (possibly memory-mapped) cube followed by the cut levels step.
+
+A `SlicePlayer` runs a render function on worker threads and keeps a
+bounded ring of frames rendered ahead of the play position.  Frames are
+due by the clock: if rendering or display falls behind, frames are
+dropped rather than played late.  `SlicePlayer.iter_frames` runs the
+same pipeline without the clock, e.g. to write a movie.
+"""
+import time
+import threading
+from collections import deque
+
+from ginga import trcalc, AutoCuts
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    have_futures = True
+except ImportError:
+    have_futures = False
+
+
+class SliceRenderer(object):
+    """Renders slices of the data cube `mddata`, taken along axis `axis`
+    (counted as in NAXISn - 1, so that 2 is NAXIS3).  The other
+    (non-image) axes are fixed at the indexes in `naxispath` (see
+    `AstroImage.set_naxispath`).
+
+    Each slice is cut out to `bbox` (x1, y1, x2, y2; by default the
+    whole slice), scaled by `scale` (scale_x, scale_y) with nearest
+    neighbor sampling and cut to an index array in the range 0..`vmax`
+    between `loval` and `hival`, using the `autocuts` object.
+    """
+
+    def __init__(self, mddata, naxispath, axis, autocuts, loval, hival,
+                 vmax=255, bbox=None, scale=(1.0, 1.0)):
+        self.mddata = mddata
+        self.naxispath = list(naxispath)
+        self.axis = axis
+        self.autocuts = autocuts
+        self.loval, self.hival = loval, hival
+        self.vmax = vmax
+
+        self.num_slices = mddata.shape[-(axis + 1)]
+        shp = mddata.shape[-2:]
+        if bbox is None:
+            bbox = (0, 0, shp[1] - 1, shp[0] - 1)
+        x1, y1, x2, y2 = bbox
+        scale_x, scale_y = scale
+        new_wd = int(round(scale_x * (x2 - x1 + 1)))
+        new_ht = int(round(scale_y * (y2 - y1 + 1)))
+
+        # the same view is used for every slice
+        self.view, self.scale = trcalc.get_scaled_cutout_wdht_view(
+            shp, x1, y1, x2, y2, new_wd, new_ht)
+
+        # per-thread buffers for the cut levels calculation
+        self._local = threading.local()
+
+    def get_slice(self, idx):
+        """Returns slice `idx` (a view of the cube data)."""
+        naxispath = list(self.naxispath)
+        naxispath[self.axis - 2] = idx
+        naxispath.reverse()
+        return self.mddata[tuple(naxispath)]
+
+    def get_cutout(self, idx):
+        """Returns the scaled cutout of slice `idx`."""
+        return self.get_slice(idx)[self.view]
+
+    def render(self, idx):
+        """Returns the index array for slice `idx`."""
+        data = self.get_cutout(idx)
+        scratch = AutoCuts.get_buffer(getattr(self._local, 'scratch', None),
+                                      data.shape,
+                                      AutoCuts.get_work_dtype(data))
+        self._local.scratch = scratch
+        # a new output array for each frame: frames are held in the ring
+        return self.autocuts.cut_levels_idx(data, self.loval, self.hival,
+                                            vmin=0, vmax=self.vmax,
+                                            scratch=scratch)
+
+
+class SlicePlayer(object):
+    """Plays back the frames 0..`num_frames`-1 made by `render_fn(idx)`
+    at one frame every `interval` seconds.
+
+    Up to `buffer_size` frames ahead of the play position are rendered
+    on `num_workers` threads (or on demand, if threads are not
+    available).  If `loop` is True, playback wraps around after the
+    last frame.
+    """
+
+    def __init__(self, logger, render_fn, num_frames, interval=0.1,
+                 buffer_size=16, num_workers=2, loop=True):
+        self.logger = logger
+        self.render_fn = render_fn
+        self.num_frames = num_frames
+        self.interval = interval
+        self.buffer_size = max(1, buffer_size)
+        self.loop = loop
+
+        self.executor = None
+        if have_futures and num_workers > 0:
+            self.executor = ThreadPoolExecutor(max_workers=num_workers)
+
+        self.lock = threading.RLock()
+        # position (frame number counted from the start of playback,
+        # across loops) -> future of the rendered frame
+        self._frames = {}
+        self._next_pos = 0
+        self._start_pos = 0
+        self._last_pos = -1
+        self._t0 = 0.0
+        self.running = False
+        self.num_shown = 0
+        self.num_dropped = 0
+
+    def _submit(self, idx):
+        if self.executor is None:
+            # rendered when needed
+            return None
+        return self.executor.submit(self.render_fn, idx)
+
+    def _get_result(self, future, idx):
+        if future is None:
+            return self.render_fn(idx)
+        return future.result()
+
+    def _get_idx(self, pos):
+        return pos % self.num_frames
+
+    def _fill(self, head):
+        # keep the ring of frames ahead of position `head` full
+        self._next_pos = max(self._next_pos, head)
+        while self._next_pos < head + self.buffer_size:
+            if (not self.loop) and (self._next_pos >= self.num_frames):
+                break
+            pos = self._next_pos
+            self._frames[pos] = self._submit(self._get_idx(pos))
+            self._next_pos += 1
+
+    def _discard(self, head):
+        # drop all frames before position `head`
+        for pos in [pos for pos in self._frames if pos < head]:
+            future = self._frames.pop(pos)
+            if future is not None:
+                future.cancel()
+
+    def start(self, idx=0):
+        """Start playback at frame `idx`; the first frame is due now."""
+        with self.lock:
+            self._discard(self._next_pos)
+            self._start_pos = self._next_pos = idx
+            self._last_pos = idx - 1
+            self._t0 = time.time()
+            self.num_shown = self.num_dropped = 0
+            self.running = True
+            self._fill(idx)
+
+    def set_interval(self, interval):
+        """Change the time between frames, continuing from the current
+        position.
+        """
+        with self.lock:
+            if self.running:
+                now = time.time()
+                self._start_pos = self.get_due_pos(now)
+                self._t0 = now
+            self.interval = interval
+
+    def get_due_pos(self, now):
+        """Returns the position of the frame that is due at time `now`."""
+        pos = self._start_pos + int((now - self._t0) / self.interval)
+        if not self.loop:
+            pos = min(pos, self.num_frames - 1)
+        return pos
+
+    def get_wait(self, now=None):
+        """Returns the number of seconds from `now` until the next frame
+        is due.
+        """
+        if now is None:
+            now = time.time()
+        elapsed = now - self._t0
+        return max(self.interval - elapsed % self.interval, 0.001)
+
+    def get_due_frame(self, now=None):
+        """Returns (idx, frame) for the frame due at time `now`, if it is
+        rendered and has not been returned already, otherwise None.
+        Frames that were not returned before their successor was due are
+        dropped.  If rendering the frame raised an exception, it is
+        raised here.
+        """
+        if now is None:
+            now = time.time()
+        with self.lock:
+            if not self.running:
+                return None
+            pos = self.get_due_pos(now)
+            if pos <= self._last_pos:
+                return None
+
+            self._discard(pos)
+            self._fill(pos)
+            future = self._frames[pos]
+            if (future is not None) and (not future.done()):
+                # not rendered yet; it is dropped if still not done when
+                # the next frame is due
+                return None
+
+            del self._frames[pos]
+            self.num_dropped += pos - self._last_pos - 1
+            self.num_shown += 1
+            self._last_pos = pos
+            self._fill(pos + 1)
+
+        idx = self._get_idx(pos)
+        return (idx, self._get_result(future, idx))
+
+    def iter_frames(self, start, end):
+        """Generate (idx, frame) for frames `start`..`end`-1 in order,
+        as fast as they can be rendered, with up to `buffer_size` frames
+        in progress.  The clock is not used, and no frames are dropped.
+        """
+        pending = deque()
+        idx = start
+        while (idx < end) or (len(pending) > 0):
+            while (idx < end) and (len(pending) < self.buffer_size):
+                pending.append((idx, self._submit(idx)))
+                idx += 1
+            i, future = pending.popleft()
+            yield (i, self._get_result(future, i))
+
+    def stop(self):
+        """Stop playback and discard any frames rendered ahead."""
+        with self.lock:
+            self.running = False
+            self._discard(self._next_pos)
+
+    def close(self):
+        """Stop playback and shut down the worker threads."""
+        self.stop()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+#END
@@ -0,0 +1,166 @@
+#
+# profiling.py -- per-stage timing of the rendering pipeline
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Instrumentation of the rendering pipeline of a viewer.
+
+A `RenderProfile` keeps a ring buffer of the most recent frames, each
+with the time taken and the number of bytes produced by each stage of
+rendering.  Instrumented code brackets a stage with::
+
+    t1 = profile.start()
+    ... do the work ...
+    profile.stop('cuts', t1, nbytes)
+
+When profiling is disabled, `start` returns None and `stop` returns
+immediately, so the instrumentation costs next to nothing.
+"""
+import time
+import threading
+from collections import deque
+
+import numpy
+
+from ginga.misc import Bunch, Callback
+
+# stages of rendering, in pipeline order
+stages = ('bg_dims', 'cutout', 'cuts', 'cmap', 'compose', 'transforms',
+          'icc', 'blit')
+
+
+class RenderProfile(Callback.Callbacks):
+    """Ring buffer of per-stage rendering times for one viewer.
+
+    Parameters
+    ----------
+    num_frames : int
+        Number of most recent frames to keep.
+    """
+
+    def __init__(self, num_frames=200):
+        Callback.Callbacks.__init__(self)
+
+        self.enabled = False
+        self.lock = threading.RLock()
+        self.frames = deque([], num_frames)
+        self._frame = None
+
+        # called with each completed frame
+        self.enable_callback('frame')
+
+    def enable(self, tf):
+        with self.lock:
+            self.enabled = tf
+            self._frame = None
+
+    def set_num_frames(self, num_frames):
+        with self.lock:
+            self.frames = deque(self.frames, num_frames)
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+
+    def start_frame(self, whence):
+        """Begin recording a frame, redrawn at level `whence`.  Returns
+        the start time, or None if profiling is disabled.
+        """
+        if not self.enabled:
+            return None
+        t1 = time.time()
+        self._frame = Bunch.Bunch(whence=whence, time_start=t1,
+                                  total=0.0, stages={})
+        return t1
+
+    def end_frame(self, t1):
+        """Finish the frame started at time `t1` and add it to the
+        buffer.
+        """
+        if t1 is None:
+            return
+        with self.lock:
+            frame = self._frame
+            self._frame = None
+            if frame is None:
+                return
+            frame.total = time.time() - t1
+            self.frames.append(frame)
+        self.make_callback('frame', frame)
+
+    def start(self):
+        """Returns the start time of a stage, or None if profiling is
+        disabled.
+        """
+        if not self.enabled:
+            return None
+        return time.time()
+
+    def stop(self, stage, t1, nbytes=0):
+        """Record that `stage`, started at time `t1`, is done and
+        produced `nbytes` bytes.  Does nothing if `t1` is None.
+        """
+        if t1 is None:
+            return
+        elapsed = time.time() - t1
+        frame = self._frame
+        if frame is None:
+            # stage ran outside of a redraw
+            return
+        # a stage can run more than once per frame (e.g. one cutout per
+        # image on the canvas)
+        prev = frame.stages.get(stage, (0.0, 0))
+        frame.stages[stage] = (prev[0] + elapsed, prev[1] + nbytes)
+
+    def get_frames(self):
+        with self.lock:
+            return list(self.frames)
+
+    def get_stats(self, percentiles=(50, 90, 99)):
+        """Returns a dict mapping each stage name (and 'total') to a Bunch
+        with the number of frames in which the stage ran (`count`), the
+        `mean` and `max` times, the requested `percentiles` of the times
+        (as a dict) and the mean number of bytes produced (`nbytes`).
+        Times are in seconds.
+        """
+        frames = self.get_frames()
+
+        times = {}
+        sizes = {}
+        for frame in frames:
+            for stage, (elapsed, nbytes) in frame.stages.items():
+                times.setdefault(stage, []).append(elapsed)
+                sizes.setdefault(stage, []).append(nbytes)
+            times.setdefault('total', []).append(frame.total)
+            sizes.setdefault('total', []).append(0)
+
+        res = {}
+        for stage, vals in times.items():
+            arr = numpy.array(vals)
+            pcts = numpy.percentile(arr, percentiles)
+            res[stage] = Bunch.Bunch(
+                count=len(arr), mean=arr.mean(), max=arr.max(),
+                percentiles=dict(zip(percentiles, pcts)),
+                nbytes=numpy.mean(sizes[stage]))
+        return res
+
+    def get_report(self):
+        """Returns a text table of the statistics from `get_stats`, with
+        times in msec.
+        """
+        stats = self.get_stats()
+        names = [name for name in stages + ('total',) if name in stats]
+        lines = ["%-11s %6s %8s %8s %8s %8s %10s" % (
+            'stage', 'count', 'mean', 'p50', 'p90', 'p99', 'KB')]
+        for name in names:
+            bnch = stats[name]
+            pcts = bnch.percentiles
+            lines.append("%-11s %6d %8.2f %8.2f %8.2f %8.2f %10.1f" % (
+                name, bnch.count, bnch.mean * 1000.0, pcts[50] * 1000.0,
+                pcts[90] * 1000.0, pcts[99] * 1000.0,
+                bnch.nbytes / 1024.0))
+        return '\n'.join(lines)
+
+#END
@@ -0,0 +1,181 @@
+#
+# pyramid.py -- tiled, multi-resolution representation of image data
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+A tiled, multi-resolution ("pyramid") view of a numpy data array.
+
+Level 0 is the original data; each successive level is a 2x2 block
+average of the previous one.  Levels are never computed as a whole:
+they are split into fixed-size tiles, and a tile is only built (from
+the tiles of the next finer level) the first time it is requested.
+This means that rendering a zoomed-out view of a very large image only
+touches the data necessary to produce the visible area, at the coarsest
+level that still has enough resolution for the requested scale.
+"""
+import math
+import threading
+
+import numpy
+
+from ginga.misc import Bunch
+from ginga import trcalc
+
+
+def downsample(data_np):
+    """Reduce `data_np` by a factor of two in each of the first two
+    dimensions by averaging 2x2 blocks.  Odd dimensions are handled by
+    replicating the last row/column.  Any additional dimensions (e.g.
+    color planes) are preserved.
+    """
+    ht, wd = data_np.shape[:2]
+    pad_y, pad_x = ht % 2, wd % 2
+    if pad_y or pad_x:
+        pad = [(0, pad_y), (0, pad_x)] + [(0, 0)] * (data_np.ndim - 2)
+        data_np = numpy.pad(data_np, pad, mode='edge')
+        ht, wd = data_np.shape[:2]
+
+    shp = (ht // 2, 2, wd // 2, 2) + data_np.shape[2:]
+    res = data_np.reshape(shp).mean(axis=(1, 3))
+    if res.dtype != data_np.dtype:
+        res = res.astype(data_np.dtype, copy=False)
+    return res
+
+
+class ImagePyramid(object):
+    """
+    Lazily built, tiled multi-resolution pyramid over a numpy array.
+
+    Parameters
+    ----------
+    data_np : ndarray
+        The (at least 2D) base resolution data.
+
+    tile_size : int
+        Width and height (in pixels) of the tiles at each level.
+
+    min_size : int
+        No level is built whose largest dimension is smaller than this.
+    """
+
+    def __init__(self, data_np, tile_size=512, min_size=64):
+        self.data = data_np
+        self.tile_size = int(tile_size)
+        self.min_size = int(min_size)
+
+        # calculate the shape of each level
+        ht, wd = data_np.shape[:2]
+        self.shapes = [(ht, wd)]
+        while max(ht, wd) // 2 >= self.min_size:
+            ht, wd = (ht + 1) // 2, (wd + 1) // 2
+            self.shapes.append((ht, wd))
+
+        # (level, tile_y, tile_x) -> ndarray
+        self._tiles = {}
+        self._lock = threading.RLock()
+
+    def get_num_levels(self):
+        return len(self.shapes)
+
+    def get_level_shape(self, level):
+        return self.shapes[level]
+
+    def choose_level(self, scale_x, scale_y):
+        """Return the coarsest level that still has at least as much
+        resolution as needed to render at (scale_x, scale_y).
+        """
+        scale = max(scale_x, scale_y)
+        if scale >= 1.0 or scale <= 0.0:
+            return 0
+        level = int(math.floor(math.log(1.0 / scale, 2)))
+        return max(0, min(level, len(self.shapes) - 1))
+
+    def get_tile(self, level, tile_x, tile_y):
+        """Return the tile at (tile_x, tile_y) of pyramid `level`,
+        building it first if necessary.
+        """
+        ts = self.tile_size
+        if level == 0:
+            return self.data[tile_y*ts:(tile_y+1)*ts,
+                             tile_x*ts:(tile_x+1)*ts]
+
+        key = (level, tile_y, tile_x)
+        with self._lock:
+            tile = self._tiles.get(key, None)
+            if tile is None:
+                # build from the corresponding area of the finer level
+                ht, wd = self.shapes[level]
+                x1, y1 = tile_x * ts, tile_y * ts
+                x2, y2 = min(x1 + ts, wd) - 1, min(y1 + ts, ht) - 1
+                parent = self.get_region(level - 1, x1*2, y1*2,
+                                         x2*2 + 1, y2*2 + 1)
+                tile = downsample(parent)[:y2-y1+1, :x2-x1+1]
+                self._tiles[key] = tile
+        return tile
+
+    def get_region(self, level, x1, y1, x2, y2):
+        """Assemble and return the data for the region (x1, y1)-(x2, y2),
+        inclusive, in the coordinates of pyramid `level`.  The region is
+        clipped to the bounds of that level.
+        """
+        ht, wd = self.shapes[level]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(x2, wd - 1), min(y2, ht - 1)
+        if level == 0:
+            return self.data[y1:y2+1, x1:x2+1]
+
+        ts = self.tile_size
+        tx1, tx2 = x1 // ts, x2 // ts
+        ty1, ty2 = y1 // ts, y2 // ts
+
+        shp = (y2 - y1 + 1, x2 - x1 + 1) + self.data.shape[2:]
+        res = numpy.empty(shp, dtype=self.data.dtype)
+        for ty in range(ty1, ty2 + 1):
+            for tx in range(tx1, tx2 + 1):
+                tile = self.get_tile(level, tx, ty)
+                # intersection of tile and region in level coordinates
+                a1, b1 = max(x1, tx * ts), max(y1, ty * ts)
+                a2, b2 = min(x2, tx * ts + ts - 1), min(y2, ty * ts + ts - 1)
+                res[b1-y1:b2-y1+1, a1-x1:a2-x1+1] = \
+                    tile[b1-ty*ts:b2-ty*ts+1, a1-tx*ts:a2-tx*ts+1]
+        return res
+
+    def get_scaled_cutout(self, x1, y1, x2, y2, scale_x, scale_y,
+                          method='basic'):
+        """Like `BaseImage.get_scaled_cutout`, but renders from the
+        nearest pyramid level.  Coordinates are at the base resolution;
+        the dimensions of the result are the same as those that would
+        be produced by scaling the base resolution data.
+        """
+        new_wd = int(round(scale_x * (x2 - x1 + 1)))
+        new_ht = int(round(scale_y * (y2 - y1 + 1)))
+
+        level = self.choose_level(scale_x, scale_y)
+        if level > 0:
+            data = self.get_region(level, x1 >> level, y1 >> level,
+                                   x2 >> level, y2 >> level)
+        else:
+            data = self.get_region(0, x1, y1, x2, y2)
+
+        # NOTE: like the callers of get_scaled_cutout, the trcalc
+        # functions treat x2, y2 as one past the last index
+        ht, wd = data.shape[:2]
+        if method == 'basic':
+            view, scales = trcalc.get_scaled_cutout_wdht_view(
+                data.shape, 0, 0, wd, ht, new_wd, new_ht)
+            newdata = data[view]
+        else:
+            newdata, scales = trcalc.get_scaled_cutout_wdht(
+                data, 0, 0, wd, ht, new_wd, new_ht,
+                interpolation=method)
+
+        # report scale relative to the base resolution
+        old_wd, old_ht = max(x2 - x1 + 1, 1), max(y2 - y1 + 1, 1)
+        ht, wd = newdata.shape[:2]
+        return Bunch.Bunch(data=newdata, level=level,
+                           scale_x=float(wd) / old_wd,
+                           scale_y=float(ht) / old_ht)
+
+#END
@@ -0,0 +1,413 @@
+#
+# querycache.py -- asynchronous catalog and image queries with a disk cache
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Asynchronous queries of catalog and image servers (see
+`ginga.util.catalog`), with a persistent cache of the results.
+
+A `QueryManager` runs the queries on worker threads and returns futures.
+Requests for the same query that is already in progress, or (for a
+catalog) for a cone inside a cone that is already being fetched, share
+the one request to the server.  Requests can be given a tag: a new
+request with the same tag (e.g. after a pan) cancels the older ones.
+
+A `QueryCache` keeps the results of past queries in a SQLite database.
+Catalog results are stored with the cone (center and radius) they cover
+and are indexed by declination, so that a query for any cone inside one
+fetched before is answered from the cache, by selecting the stars in
+the smaller cone.  Images are stored as files next to the database and
+looked up by their query.
+"""
+import os
+import time
+import json
+import shutil
+import pickle
+import hashlib
+import sqlite3
+import threading
+
+import numpy
+
+from ginga.misc import Bunch
+from ginga.util import wcs, catalog
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, Future
+    have_futures = True
+except ImportError:
+    have_futures = False
+
+# parameters of a catalog query that give the cone
+cone_params = ('ra', 'dec', 'r')
+
+
+class QueryCacheError(Exception):
+    pass
+
+
+def get_cone(params):
+    """Returns the cone (ra_deg, dec_deg, radius_deg) of the catalog
+    query parameters `params` ('ra' and 'dec' in degrees or sexagesimal
+    strings, 'r' in arcmin), or None if they do not give one.
+    """
+    try:
+        ra, dec = str(params['ra']), str(params['dec'])
+        if not (':' in ra):
+            ra_deg, dec_deg = float(ra), float(dec)
+        else:
+            ra_deg, dec_deg = wcs.hmsStrToDeg(ra), wcs.dmsStrToDeg(dec)
+        radius_deg = float(params['r']) / 60.0
+
+    except (KeyError, ValueError):
+        return None
+    return (ra_deg, dec_deg, radius_deg)
+
+
+def get_variant(server, params, exclude=cone_params):
+    """Returns a string identifying the query of `server` with
+    parameters `params`, apart from those in `exclude`.
+    """
+    d = dict([(key, str(val)) for key, val in params.items()
+              if key not in exclude])
+    return json.dumps([server.short_name, d], sort_keys=True)
+
+
+def calc_sep(ra1_deg, dec1_deg, ra2_deg, dec2_deg):
+    """Returns the angular separation (deg) between points (arrays or
+    scalars) on the sky, by the haversine formula.
+    """
+    ra1, dec1, ra2, dec2 = [numpy.radians(a) for a in (ra1_deg, dec1_deg,
+                                                      ra2_deg, dec2_deg)]
+    a = (numpy.sin((dec2 - dec1) / 2.0)**2 +
+         numpy.cos(dec1) * numpy.cos(dec2) *
+         numpy.sin((ra2 - ra1) / 2.0)**2)
+    return numpy.degrees(2.0 * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0, 1))))
+
+
+def cone_contains(cone1, cone2):
+    """Returns True if cone `cone1` contains cone `cone2`."""
+    ra1, dec1, r1 = cone1
+    ra2, dec2, r2 = cone2
+    return calc_sep(ra1, dec1, ra2, dec2) + r2 <= r1 + 1e-9
+
+
+def select_cone(starlist, cone):
+    """Returns the stars in `starlist` that are in `cone`."""
+    if len(starlist) == 0:
+        return []
+    ra_deg, dec_deg, radius_deg = cone
+    ras = numpy.array([star['ra_deg'] for star in starlist])
+    decs = numpy.array([star['dec_deg'] for star in starlist])
+    inside = calc_sep(ra_deg, dec_deg, ras, decs) <= radius_deg
+    return [star for star, tf in zip(starlist, inside) if tf]
+
+
+class QueryCache(object):
+    """A persistent cache of catalog and image query results in the
+    SQLite database file `dbpath`.  Image files are kept in the same
+    directory.  Results older than `max_age` seconds (if not None) are
+    not used.  The cache can be shared between threads.
+    """
+
+    def __init__(self, dbpath, logger, max_age=None):
+        self.dbpath = dbpath
+        self.logger = logger
+        self.max_age = max_age
+        self.imagedir = os.path.join(os.path.dirname(dbpath), 'images')
+        self.lock = threading.RLock()
+
+        try:
+            self.conn = sqlite3.connect(dbpath, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS cones (
+                id INTEGER PRIMARY KEY, variant TEXT, ra REAL, dec REAL,
+                radius REAL, time REAL, data BLOB)""")
+            self.conn.execute("""CREATE INDEX IF NOT EXISTS cones_dec
+                ON cones (variant, dec)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS images (
+                key TEXT PRIMARY KEY, path TEXT, time REAL)""")
+            self.conn.commit()
+
+        except sqlite3.Error as e:
+            raise QueryCacheError("Error opening query cache '%s': %s" % (
+                dbpath, str(e)))
+
+    def _get_min_time(self):
+        if self.max_age is None:
+            return 0.0
+        return time.time() - self.max_age
+
+    def find_cone(self, variant, cone):
+        """Returns (id, cone) of the smallest cached cone of query
+        `variant` that contains `cone`, or None.
+        """
+        ra_deg, dec_deg, radius_deg = cone
+        # candidates: the dec range of the cached cone covers this one
+        with self.lock:
+            rows = self.conn.execute("""SELECT id, ra, dec, radius FROM cones
+                WHERE variant = ? AND dec >= ? - radius + ?
+                AND dec <= ? + radius - ? AND radius >= ? AND time >= ?
+                ORDER BY radius""",
+                (variant, dec_deg, radius_deg, dec_deg, radius_deg,
+                 radius_deg, self._get_min_time())).fetchall()
+        for _id, ra, dec, radius in rows:
+            if cone_contains((ra, dec, radius), cone):
+                return (_id, (ra, dec, radius))
+        return None
+
+    def get_catalog(self, variant, cone):
+        """Returns (starlist, info) for the stars in `cone` from a cached
+        result of query `variant` that covers it, or None.
+        """
+        res = self.find_cone(variant, cone)
+        if res is None:
+            return None
+        _id, cached_cone = res
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM cones WHERE id = ?",
+                                    (_id,)).fetchone()
+        if row is None:
+            # replaced by a larger cone in the meantime
+            return self.get_catalog(variant, cone)
+        stars, info = pickle.loads(bytes(row[0]))
+        starlist = select_cone([catalog.Star(**d) for d in stars], cone)
+        return (starlist, Bunch.Bunch(info))
+
+    def put_catalog(self, variant, cone, starlist, info):
+        """Store the result (`starlist`, `info`) of the query `variant`
+        for `cone`.  Cached cones inside this one are removed.
+        """
+        ra_deg, dec_deg, radius_deg = cone
+        data = pickle.dumps(([star.starInfo for star in starlist],
+                             dict(info)), pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            rows = self.conn.execute("""SELECT id, ra, dec, radius FROM cones
+                WHERE variant = ? AND radius <= ? AND dec >= ? AND dec <= ?""",
+                (variant, radius_deg, dec_deg - radius_deg,
+                 dec_deg + radius_deg)).fetchall()
+            for _id, ra, dec, radius in rows:
+                if cone_contains(cone, (ra, dec, radius)):
+                    self.conn.execute("DELETE FROM cones WHERE id = ?",
+                                      (_id,))
+            self.conn.execute("""INSERT INTO cones
+                (variant, ra, dec, radius, time, data)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (variant, ra_deg, dec_deg, radius_deg, time.time(),
+                 sqlite3.Binary(data)))
+            self.conn.commit()
+
+    def get_image(self, key):
+        """Returns the path of the cached image file for query `key`, or
+        None.
+        """
+        with self.lock:
+            row = self.conn.execute("""SELECT path FROM images
+                WHERE key = ? AND time >= ?""",
+                (key, self._get_min_time())).fetchone()
+        if (row is None) or (not os.path.exists(row[0])):
+            return None
+        return row[0]
+
+    def put_image(self, key, filepath):
+        """Store a copy of the image file at `filepath` as the result of
+        query `key`.  Returns the path of the copy.
+        """
+        if not os.path.isdir(self.imagedir):
+            os.makedirs(self.imagedir)
+        ext = os.path.splitext(filepath)[1]
+        path = os.path.join(self.imagedir, key + ext)
+        shutil.copyfile(filepath, path)
+        with self.lock:
+            self.conn.execute("""INSERT OR REPLACE INTO images
+                VALUES (?, ?, ?)""", (key, path, time.time()))
+            self.conn.commit()
+        return path
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM cones")
+            self.conn.execute("DELETE FROM images")
+            self.conn.commit()
+        shutil.rmtree(self.imagedir, ignore_errors=True)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class QueryManager(object):
+    """Runs catalog and image queries on `num_workers` threads, using
+    the QueryCache `cache` (if not None).
+
+    The query methods return a `concurrent.futures.Future` for the
+    result.  Cancelling the future (or a new request with the same tag)
+    only stops the request to the server if no one else is waiting for
+    it; the result is stored in the cache in any case.
+    """
+
+    def __init__(self, logger, cache=None, num_workers=4):
+        if not have_futures:
+            raise QueryCacheError("Please install 'futures' to use the "
+                                  "query manager")
+        self.logger = logger
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=num_workers)
+
+        self.lock = threading.RLock()
+        # query key -> Bunch(future, waiters, variant, cone)
+        self._jobs = {}
+        # tag -> futures of the latest requests with that tag
+        self._tagged = {}
+        self.num_fetched = 0
+
+    def _add_waiter(self, job, fn, tag):
+        # `fn` makes the result for this waiter from the result of `job`
+        waiter = Future()
+        job.waiters.append((waiter, fn))
+        waiter.add_done_callback(lambda w: self._waiter_done(job, w))
+        if tag is not None:
+            for future in self._tagged.pop(tag, []):
+                future.cancel()
+            self._tagged[tag] = [waiter]
+        return waiter
+
+    def _waiter_done(self, job, waiter):
+        if not waiter.cancelled():
+            return
+        with self.lock:
+            # stop the job if it has not started and no one is waiting
+            if all([w.cancelled() for w, fn in job.waiters]):
+                job.future.cancel()
+
+    def _job_done(self, key, job, future):
+        with self.lock:
+            if self._jobs.get(key, None) is job:
+                del self._jobs[key]
+            waiters = list(job.waiters)
+
+        for waiter, fn in waiters:
+            if not waiter.set_running_or_notify_cancel():
+                continue
+            try:
+                if future.cancelled():
+                    raise QueryCacheError("Query was cancelled")
+                waiter.set_result(fn(future.result()))
+            except Exception as e:
+                waiter.set_exception(e)
+
+    def _submit(self, key, job_fn, tag, variant=None, cone=None):
+        # start a job to get the result for `key`; returns the future
+        # of the first waiter
+        job = Bunch.Bunch(waiters=[], variant=variant, cone=cone)
+        job.future = self.executor.submit(job_fn)
+        self._jobs[key] = job
+        waiter = self._add_waiter(job, lambda res: res, tag)
+        job.future.add_done_callback(lambda f: self._job_done(key, job, f))
+        return waiter
+
+    def search_catalog(self, server, params, tag=None):
+        """Query catalog server `server` with the parameters `params`.
+        Returns a future for (starlist, info).
+        """
+        cone = get_cone(params)
+        if cone is None:
+            # not a cone search: cached by the exact parameters
+            variant = get_variant(server, params, exclude=())
+        else:
+            variant = get_variant(server, params)
+        key = ('catalog', variant, cone)
+
+        with self.lock:
+            job = self._jobs.get(key, None)
+            if job is not None:
+                return self._add_waiter(job, lambda res: res, tag)
+
+            if cone is not None:
+                # an in-flight query of a cone that covers this one?
+                for job in list(self._jobs.values()):
+                    if (job.variant == variant) and (job.cone is not None) \
+                       and cone_contains(job.cone, cone):
+                        fn = lambda res: (select_cone(res[0], cone), res[1])
+                        return self._add_waiter(job, fn, tag)
+
+            def job_fn():
+                return self._get_catalog(server, params, variant, cone)
+
+            return self._submit(key, job_fn, tag, variant=variant,
+                                cone=cone)
+
+    def _get_catalog(self, server, params, variant, cone):
+        if (self.cache is not None) and (cone is not None):
+            res = self.cache.get_catalog(variant, cone)
+            if res is not None:
+                self.logger.debug("catalog query served from cache")
+                return res
+
+        self.logger.info("Querying catalog: %s" % (server.full_name))
+        starlist, info = server.search(**params)
+        with self.lock:
+            self.num_fetched += 1
+        if (self.cache is not None) and (cone is not None):
+            try:
+                self.cache.put_catalog(variant, cone, starlist, info)
+            except Exception as e:
+                self.logger.error("Error caching catalog result: %s" % (
+                    str(e)))
+        return (starlist, info)
+
+    def get_image(self, server, filepath, params, tag=None):
+        """Query image server `server` with the parameters `params`,
+        saving the image to `filepath`.  Returns a future for the path
+        of the image file, which is in the cache if the image came from
+        there.
+        """
+        variant = get_variant(server, params, exclude=())
+        key = ('image', variant, None)
+
+        with self.lock:
+            job = self._jobs.get(key, None)
+            if job is not None:
+                return self._add_waiter(job, lambda res: res, tag)
+
+            def job_fn():
+                return self._get_image(server, filepath, params, variant)
+
+            return self._submit(key, job_fn, tag)
+
+    def _get_image(self, server, filepath, params, variant):
+        key = hashlib.sha1(variant.encode()).hexdigest()
+        if self.cache is not None:
+            path = self.cache.get_image(key)
+            if path is not None:
+                self.logger.debug("image query served from cache")
+                return path
+
+        self.logger.info("Querying image server: %s" % (server.full_name))
+        path = server.search(filepath, **params)
+        with self.lock:
+            self.num_fetched += 1
+        if (self.cache is not None) and (path is not None) and \
+           os.path.exists(path):
+            try:
+                self.cache.put_image(key, path)
+            except Exception as e:
+                self.logger.error("Error caching image: %s" % (str(e)))
+        return path
+
+    def cancel(self, tag):
+        """Cancel the requests with tag `tag`."""
+        with self.lock:
+            futures = self._tagged.pop(tag, [])
+        for future in futures:
+            future.cancel()
+
+    def close(self):
+        """Shut down the worker threads."""
+        self.executor.shutdown(wait=False)
+
+#END
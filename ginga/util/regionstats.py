@@ -0,0 +1,101 @@
+#
+# regionstats.py -- statistics of many regions of an image at once
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Statistics of the pixels in many regions of an image, calculated
+together.
+
+The regions (`ShapeMask`s, see `ginga.util.shapemask`) are rasterised
+once into a list of (pixel, label) pairs, where the label is the index
+of the region.  This is a label image that allows regions to overlap:
+a pixel in two regions is listed twice.  All of the statistics are then
+calculated with grouped reductions over the labels (`numpy.bincount`
+and one sort for the order statistics), rather than with a loop over
+the regions.
+"""
+import numpy
+
+# fields of the records returned by calc_region_stats
+stats_dtype = numpy.dtype([('npix', int), ('sumval', float),
+                           ('meanval', float), ('medianval', float),
+                           ('stdval', float), ('minval', float),
+                           ('maxval', float), ('xcen', float),
+                           ('ycen', float)])
+
+
+class RegionStatsError(Exception):
+    pass
+
+
+def get_labels(masks):
+    """Rasterise the ShapeMasks `masks`.  Returns arrays (ys, xs, labels)
+    of the coordinates of the pixels in each mask and the index of the
+    mask they belong to.
+    """
+    ys, xs, labels = [], [], []
+    for i, mask in enumerate(masks):
+        _ys, _xs = mask.get_coords()
+        ys.append(_ys)
+        xs.append(_xs)
+        labels.append(numpy.full(len(_ys), i, dtype=numpy.intp))
+    if len(labels) == 0:
+        empty = numpy.zeros(0, dtype=numpy.intp)
+        return (empty, empty, empty)
+    return (numpy.concatenate(ys), numpy.concatenate(xs),
+            numpy.concatenate(labels))
+
+
+def calc_region_stats(data, masks):
+    """Calculate the statistics of the pixels of 2D array `data` in each
+    of the ShapeMasks `masks`.  NaN and infinite values are ignored.
+
+    Returns a record array (see `stats_dtype`) with one record per mask:
+    the number of pixels `npix`, `sumval`, `meanval`, `medianval`,
+    `stdval` (population standard deviation), `minval`, `maxval` and the
+    flux-weighted centroid (`xcen`, `ycen`).  The statistics of a region
+    with no (finite) pixels are NaN.
+    """
+    if len(data.shape) != 2:
+        raise RegionStatsError("Region statistics need 2D data: %s" % (
+            str(data.shape)))
+
+    num = len(masks)
+    ys, xs, labels = get_labels(masks)
+    vals = data[ys, xs].astype(numpy.float64)
+    finite = numpy.isfinite(vals)
+    if not finite.all():
+        ys, xs, labels, vals = (ys[finite], xs[finite], labels[finite],
+                                vals[finite])
+
+    res = numpy.recarray(num, dtype=stats_dtype)
+    npix = numpy.bincount(labels, minlength=num)
+    res.npix = npix
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        sumval = numpy.bincount(labels, weights=vals, minlength=num)
+        meanval = sumval / npix
+        dev = vals - meanval[labels]
+        res.sumval = numpy.where(npix > 0, sumval, numpy.nan)
+        res.meanval = meanval
+        res.stdval = numpy.sqrt(numpy.bincount(labels, weights=dev * dev,
+                                               minlength=num) / npix)
+        res.xcen = numpy.bincount(labels, weights=vals * xs,
+                                  minlength=num) / sumval
+        res.ycen = numpy.bincount(labels, weights=vals * ys,
+                                  minlength=num) / sumval
+
+    # order statistics: sort by label, then by value within each region
+    svals = vals[numpy.lexsort((vals, labels))]
+    ok = npix > 0
+    starts = numpy.cumsum(npix) - npix
+    n, i = npix[ok], starts[ok]
+    for name in ('minval', 'maxval', 'medianval'):
+        res[name] = numpy.nan
+    res.minval[ok] = svals[i]
+    res.maxval[ok] = svals[i + n - 1]
+    res.medianval[ok] = 0.5 * (svals[i + (n - 1) // 2] + svals[i + n // 2])
+    return res
+
+#END
@@ -0,0 +1,248 @@
+#
+# shapemask.py -- run-length encoded masks of canvas shapes
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Masks of the pixels enclosed by canvas shapes (e.g. for statistics of
+a region).
+
+A `ShapeMask` holds the pixels enclosed by a shape as horizontal runs
+(row, start, stop) within the shape's bounding box.  It is made by
+`make_shape_mask`, which only tests the pixels within the bounding box
+(clipped to the image), a strip of rows at a time.  Pulling the values
+of the enclosed pixels out of an image with `ShapeMask.get_values` takes
+time in proportion to the area of the shape, not the size of the image.
+
+`get_shape_key` returns a key for the geometry of a shape, which is used
+to cache masks in a `MaskCache`: moving or resizing a shape gives a new
+key, but changing its color does not.  Shapes that are not in data
+coordinates are not cached.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from ginga.canvas.coordmap import DataMapper
+
+# attributes of canvas objects that do not change the pixels enclosed
+visual_attrs = ('linewidth', 'alpha', 'fillalpha', 'fontsize', 'cap_radius')
+
+# rows of the bounding box tested at a time in make_shape_mask
+strip_rows = 256
+
+
+class ShapeMask(object):
+    """The pixels enclosed by a shape, as runs of pixels [start, stop)
+    along the rows `rows`.  (x1, y1, x2, y2) is the bounding box of the
+    mask in the image.
+    """
+
+    def __init__(self, x1, y1, x2, y2, rows, starts, stops):
+        self.bbox = (x1, y1, x2, y2)
+        self.rows = rows
+        self.starts = starts
+        self.stops = stops
+
+    @classmethod
+    def from_dense(cls, mask, x1=0, y1=0):
+        """Make a ShapeMask from boolean array `mask`, which covers the
+        image pixels from (x1, y1).
+        """
+        ht, wd = mask.shape
+        rows, starts, stops = _encode(mask)
+        return cls(x1, y1, x1 + wd - 1, y1 + ht - 1,
+                   rows + y1, starts + x1, stops + x1)
+
+    def get_count(self):
+        """Returns the number of pixels in the mask."""
+        return int((self.stops - self.starts).sum())
+
+    def get_view(self):
+        """Returns a view of the bounding box of the mask in the image."""
+        x1, y1, x2, y2 = self.bbox
+        return numpy.s_[y1:y2+1, x1:x2+1]
+
+    def get_coords(self):
+        """Returns arrays (ys, xs) of the coordinates of the pixels in
+        the mask, in row order.
+        """
+        lengths = self.stops - self.starts
+        # offset of each pixel from the start of its run
+        offsets = numpy.arange(lengths.sum()) - numpy.repeat(
+            numpy.cumsum(lengths) - lengths, lengths)
+        xs = numpy.repeat(self.starts, lengths) + offsets
+        ys = numpy.repeat(self.rows, lengths)
+        return (ys, xs)
+
+    def get_values(self, data):
+        """Returns the values of the pixels of image array `data` in the
+        mask (in row order), without copying the rest of the bounding
+        box.
+        """
+        ys, xs = self.get_coords()
+        return data[ys, xs]
+
+    def to_dense(self):
+        """Returns the mask as a boolean array covering the bounding box.
+        """
+        x1, y1, x2, y2 = self.bbox
+        mask = numpy.zeros((max(0, y2 - y1 + 1), max(0, x2 - x1 + 1)),
+                           dtype=bool)
+        ys, xs = self.get_coords()
+        mask[ys - y1, xs - x1] = True
+        return mask
+
+    def fill(self, mask, value=True):
+        """Set the pixels in the mask to `value` in image-sized array
+        `mask`.
+        """
+        ys, xs = self.get_coords()
+        mask[ys, xs] = value
+
+
+def _encode(mask):
+    # (rows, starts, stops) of the runs of True values in 2D array `mask`
+    ht, wd = mask.shape
+    edges = numpy.zeros((ht, wd + 2), dtype=numpy.int8)
+    edges[:, 1:-1] = mask
+    edges = numpy.diff(edges, axis=1)
+    # runs are found in row order, so starts and stops pair up
+    rows, starts = numpy.nonzero(edges == 1)
+    stops = numpy.nonzero(edges == -1)[1]
+    return rows, starts, stops
+
+
+def get_bbox(shape_obj, wd, ht):
+    """Returns the bounding box (x1, y1, x2, y2) of the pixels that may
+    be enclosed by `shape_obj`, clipped to an image of size (`wd`, `ht`).
+    The box is empty (x2 < x1 or y2 < y1) if the shape is off the image.
+    """
+    x1, y1, x2, y2 = shape_obj.get_llur()
+    x1, x2 = max(0, int(math.floor(x1))), min(int(math.floor(x2)), wd - 1)
+    y1, y2 = max(0, int(math.floor(y1))), min(int(math.floor(y2)), ht - 1)
+    return (x1, y1, x2, y2)
+
+
+def make_shape_mask(shape_obj, wd, ht):
+    """Make the ShapeMask of the pixels enclosed by `shape_obj` in an
+    image of size (`wd`, `ht`).  Only the pixels in the bounding box of
+    the shape are tested.
+    """
+    x1, y1, x2, y2 = get_bbox(shape_obj, wd, ht)
+    empty = numpy.zeros(0, dtype=int)
+    if (x2 < x1) or (y2 < y1):
+        return ShapeMask(x1, y1, x2, y2, empty, empty, empty)
+
+    xi = numpy.arange(x1, x2 + 1).reshape(1, -1)
+    res = []
+    for ys in range(y1, y2 + 1, strip_rows):
+        ye = min(ys + strip_rows, y2 + 1)
+        yi = numpy.arange(ys, ye).reshape(-1, 1)
+        contains = numpy.broadcast_to(shape_obj.contains_arr(xi, yi),
+                                      (ye - ys, x2 - x1 + 1))
+        rows, starts, stops = _encode(contains)
+        res.append((rows + ys, starts + x1, stops + x1))
+
+    rows, starts, stops = [numpy.concatenate(arrs) for arrs in zip(*res)]
+    return ShapeMask(x1, y1, x2, y2, rows, starts, stops)
+
+
+def _freeze(val):
+    # hashable version of a numeric attribute or list of points
+    if isinstance(val, (bool, numpy.bool_)):
+        raise TypeError("not a geometry value")
+    if isinstance(val, (int, float, numpy.number)):
+        return float(val)
+    if isinstance(val, (list, tuple, numpy.ndarray)):
+        return tuple([_freeze(elt) for elt in val])
+    raise TypeError("not a geometry value")
+
+
+def get_shape_key(shape_obj):
+    """Returns a hashable key for the geometry of canvas object
+    `shape_obj`: its kind, coordinates, sizes and points (and those of
+    the objects of a compound object), or None if the shape cannot be
+    keyed.  Only shapes in data coordinates can be keyed: the pixels
+    enclosed by shapes in other coordinates (window, cartesian, wcs, ...)
+    change with the viewer's pan, scale or image.
+    """
+    kind = getattr(shape_obj, 'kind', None)
+    if kind is None or getattr(shape_obj, 'ref_obj', None) is not None:
+        return None
+    if ((getattr(shape_obj, 'coord', None) != 'data') or
+        type(getattr(shape_obj, 'crdmap', None)) not in (DataMapper,
+                                                         type(None))):
+        return None
+
+    items = [('kind', kind), ('coord', getattr(shape_obj, 'coord', None)),
+             ('crdmap', type(getattr(shape_obj, 'crdmap', None)).__name__)]
+    for name, val in sorted(shape_obj.__dict__.items()):
+        if name in visual_attrs:
+            continue
+        try:
+            items.append((name, _freeze(val)))
+        except (TypeError, ValueError):
+            continue
+
+    if shape_obj.is_compound():
+        keys = tuple([get_shape_key(obj) for obj in shape_obj.objects])
+        if None in keys:
+            return None
+        items.append(('objects', keys))
+    return tuple(items)
+
+
+class LRUCache(object):
+    """A cache of up to `max_size` items, dropping the least recently
+    used.  The cache can be shared between threads.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._items[key] = item
+            return item
+
+    def put(self, key, item):
+        with self.lock:
+            self._items.pop(key, None)
+            self._items[key] = item
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MaskCache(LRUCache):
+    """A cache of ShapeMasks, keyed on the geometry of the shapes."""
+
+    def get_mask(self, shape_obj, wd, ht):
+        """Returns the ShapeMask of `shape_obj` in an image of size
+        (`wd`, `ht`), from the cache if the shape has been seen before.
+        """
+        key = get_shape_key(shape_obj)
+        if key is None:
+            return make_shape_mask(shape_obj, wd, ht)
+        key = (key, wd, ht)
+        mask = self.get(key)
+        if mask is None:
+            mask = make_shape_mask(shape_obj, wd, ht)
+            self.put(key, mask)
+        return mask
+
+#END
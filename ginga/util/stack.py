@@ -0,0 +1,342 @@
+#! /usr/bin/env python
+#
+# stack.py -- Combine stacks of images in bands of rows
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Usage:
+   $ ./stack.py -o bias.fits --method=median bias1.fits ... biasN.fits
+
+Combines a stack of frames of the same size (e.g. biases or flats) into
+one image, pixel by pixel.  The frames are processed in bands of rows,
+so that only one band of every frame needs to be in memory at a time:
+frames in FITS files are read through memory mapping, and the memory
+used is bounded by the band size rather than by the size of the stack.
+Bands can be combined in parallel worker processes.
+
+Combining methods are:
+
+    median   the median of the frames
+    mean     the mean of the frames
+    sigclip  the mean after iteratively rejecting values more than
+             `sigma_lo`/`sigma_hi` standard deviations below/above the
+             median
+    minmax   the mean after rejecting the `nlow` lowest and `nhigh`
+             highest values
+"""
+from __future__ import print_function
+import sys
+import warnings
+
+import numpy
+
+from ginga.misc import log
+from ginga.util import six
+
+try:
+    from astropy.io import fits as pyfits
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+try:
+    import multiprocessing
+    have_multiprocessing = True
+except ImportError:
+    have_multiprocessing = False
+
+methods = ('median', 'mean', 'sigclip', 'minmax')
+
+
+class StackError(Exception):
+    pass
+
+
+class FitsFrame(object):
+    """A frame in a FITS file, read in bands of rows through memory
+    mapping.  The file is opened for each band read, so a FitsFrame can
+    be passed to worker processes.
+    """
+
+    def __init__(self, filepath, ext=None):
+        self.filepath = filepath
+        self.ext = ext
+        self.shape = None
+
+        with pyfits.open(filepath, memmap=True) as fits_f:
+            hdu = self._get_hdu(fits_f)
+            self.shape = (hdu.header['NAXIS2'], hdu.header['NAXIS1'])
+            self.header = hdu.header.copy()
+
+    def _get_hdu(self, fits_f):
+        if self.ext is not None:
+            return fits_f[self.ext]
+        # first HDU with image data
+        for i, hdu in enumerate(fits_f):
+            if hdu.header.get('NAXIS', 0) >= 2:
+                self.ext = i
+                return hdu
+        raise StackError("No image data in '%s'" % (self.filepath))
+
+    def get_rows(self, y1, y2):
+        with pyfits.open(self.filepath, memmap=True) as fits_f:
+            data = self._get_hdu(fits_f).data
+            while data.ndim > 2:
+                data = data[0]
+            # copy, so that the file can be closed
+            return numpy.array(data[y1:y2])
+
+
+def get_frame(item):
+    """Returns a frame for `item`: a 2D array, an image object (anything
+    with get_data()) or the path of a FITS file.
+    """
+    if isinstance(item, six.string_types):
+        if not have_astropy:
+            raise StackError("Reading frames from files requires astropy")
+        return FitsFrame(item)
+    if hasattr(item, 'get_data'):
+        item = item.get_data()
+    data = numpy.asarray(item)
+    if data.ndim != 2:
+        raise StackError("Frames must be 2D: %s" % (str(data.shape)))
+    return data
+
+
+def combine(band, method='median', sigma_lo=3.0, sigma_hi=3.0, iters=3,
+            nlow=1, nhigh=1):
+    """Combine the 3D array `band` (frames, rows, columns) along the
+    first axis, with the combining `method` (see the module docstring).
+    Returns a 2D float array.
+    """
+    if method == 'median':
+        return numpy.median(band, axis=0)
+
+    elif method == 'mean':
+        return numpy.mean(band, axis=0, dtype=numpy.float64)
+
+    elif method == 'sigclip':
+        data = band.astype(numpy.float64)
+        with warnings.catch_warnings():
+            # pixels where all the values are NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for i in range(iters):
+                center = numpy.nanmedian(data, axis=0)
+                std = numpy.nanstd(data, axis=0)
+                with numpy.errstate(invalid='ignore'):
+                    reject = ((data < center - sigma_lo * std) |
+                              (data > center + sigma_hi * std))
+                if not reject.any():
+                    break
+                data[reject] = numpy.nan
+            return numpy.nanmean(data, axis=0)
+
+    elif method == 'minmax':
+        num = band.shape[0]
+        if nlow + nhigh >= num:
+            raise StackError("Cannot reject %d low and %d high values "
+                             "from %d frames" % (nlow, nhigh, num))
+        data = numpy.sort(band, axis=0)
+        return numpy.mean(data[nlow:num - nhigh], axis=0,
+                          dtype=numpy.float64)
+
+    raise StackError("Unknown combining method '%s': must be one of %s" % (
+        method, ', '.join(methods)))
+
+
+def _make_job(frames, y1, y2, kwdargs):
+    # frames in memory are sliced here, so that only the band is passed
+    # to a worker process; frames in files are read by the worker
+    parts = [frame[y1:y2] if isinstance(frame, numpy.ndarray) else frame
+             for frame in frames]
+    return (parts, y1, y2, kwdargs)
+
+
+def _combine_job(args):
+    # for the worker processes
+    parts, y1, y2, kwdargs = args
+    band = numpy.array([part if isinstance(part, numpy.ndarray)
+                        else part.get_rows(y1, y2)
+                        for part in parts])
+    return y1, y2, combine(band, **kwdargs)
+
+
+def stack_frames(itemlist, method='median', band_rows=None,
+                 max_band_mb=256, num_workers=1, logger=None,
+                 progress_cb=None, **kwdargs):
+    """Combine the frames in `itemlist` (2D arrays, image objects or
+    paths of FITS files, all of the same size) pixel by pixel with
+    `method` (see `combine` for the method parameters).  FITS files are
+    read through memory mapping, one band at a time.
+
+    The frames are combined in bands of `band_rows` rows, by default as
+    many as fit a band of all of the frames in `max_band_mb` MB.  With
+    `num_workers` > 1 (None for one per CPU) the bands are combined in
+    that many worker processes, with at most two bands per worker
+    outstanding.  If given, `progress_cb` is called with the fraction
+    of rows done after each band.
+
+    Returns the combined 2D float array.
+    """
+    if len(itemlist) == 0:
+        raise StackError("No frames to stack")
+    if method not in methods:
+        raise StackError("Unknown combining method '%s': must be one of "
+                         "%s" % (method, ', '.join(methods)))
+    kwdargs['method'] = method
+
+    frames = [get_frame(item) for item in itemlist]
+    shape = frames[0].shape
+    for frame in frames[1:]:
+        if frame.shape != shape:
+            raise StackError("Frames differ in size: %s vs. %s" % (
+                str(frame.shape), str(shape)))
+    ht, wd = shape
+
+    if band_rows is None:
+        row_bytes = len(frames) * wd * 8
+        band_rows = max(1, int(max_band_mb * 1024 * 1024) // row_bytes)
+    band_rows = min(band_rows, ht)
+    jobs = (_make_job(frames, y1, min(y1 + band_rows, ht), kwdargs)
+            for y1 in range(0, ht, band_rows))
+    if logger is not None:
+        logger.debug("stacking %d frames of %dx%d in bands of %d rows" % (
+            len(frames), wd, ht, band_rows))
+
+    result = numpy.empty((ht, wd), dtype=numpy.float64)
+
+    def _done(y1, y2, res):
+        result[y1:y2] = res
+        if progress_cb is not None:
+            progress_cb(float(y2) / ht)
+
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count() if \
+                      have_multiprocessing else 1
+
+    if num_workers <= 1 or not have_multiprocessing:
+        for job in jobs:
+            _done(*_combine_job(job))
+        return result
+
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        # keep a limited number of bands outstanding, to bound the memory
+        # used for the bands of frames held in memory
+        pending = []
+        for job in jobs:
+            pending.append(pool.apply_async(_combine_job, (job,)))
+            if len(pending) >= num_workers * 2:
+                _done(*pending.pop(0).get())
+        for res in pending:
+            _done(*res.get())
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return result
+
+
+def stack_files(logger, filelist, outfile, method='median', **kwdargs):
+    """Combine the frames in the FITS files in `filelist` with
+    `stack_frames` and write the result to FITS file `outfile`, with
+    the header of the first file.
+    """
+    frame0 = FitsFrame(filelist[0])
+    logger.info("Stacking %d frames with method '%s'..." % (
+        len(filelist), method))
+    data = stack_frames(filelist, method=method, logger=logger, **kwdargs)
+
+    header = frame0.header
+    header['HISTORY'] = "Stack of %d frames (%s)" % (len(filelist), method)
+    logger.info("Writing output to '%s'..." % (outfile))
+    hdu = pyfits.PrimaryHDU(data=data.astype(numpy.float32), header=header)
+    hdu.writeto(outfile, overwrite=True)
+
+
+def main(options, args):
+
+    logger = log.get_logger(name="stack", options=options)
+
+    if not options.outfile:
+        raise StackError("Please specify an output file with -o")
+
+    kwdargs = dict(sigma_lo=options.sigma_lo, sigma_hi=options.sigma_hi,
+                   nlow=options.nlow, nhigh=options.nhigh,
+                   band_rows=options.band_rows,
+                   max_band_mb=options.max_band_mb,
+                   num_workers=options.workers)
+    stack_files(logger, args, options.outfile, method=options.method,
+                **kwdargs)
+    logger.info("Done.")
+
+
+if __name__ == "__main__":
+
+    # Parse command line options with nifty optparse module
+    from optparse import OptionParser
+
+    usage = "usage: %prog [options] -o outfile file1 file2 ..."
+    optprs = OptionParser(usage=usage, version=('%%prog'))
+
+    optprs.add_option("--debug", dest="debug", default=False, action="store_true",
+                      help="Enter the pdb debugger on main()")
+    optprs.add_option("--log", dest="logfile", metavar="FILE",
+                      help="Write logging output to FILE")
+    optprs.add_option("--loglevel", dest="loglevel", metavar="LEVEL",
+                      type='int',
+                      help="Set logging level to LEVEL")
+    optprs.add_option("--method", dest="method", default='median',
+                      metavar="METHOD",
+                      help="Combining method: %s" % ('|'.join(methods)))
+    optprs.add_option("--band-rows", dest="band_rows", type='int',
+                      metavar="NUM",
+                      help="Combine bands of NUM rows")
+    optprs.add_option("--max-band-mb", dest="max_band_mb", type='float',
+                      default=256, metavar="MB",
+                      help="Limit bands to MB megabytes (default: 256)")
+    optprs.add_option("--nlow", dest="nlow", type='int', default=1,
+                      metavar="NUM",
+                      help="Reject NUM lowest values (minmax method)")
+    optprs.add_option("--nhigh", dest="nhigh", type='int', default=1,
+                      metavar="NUM",
+                      help="Reject NUM highest values (minmax method)")
+    optprs.add_option("-o", "--outfile", dest="outfile", metavar="FILE",
+                      help="Write the stacked output to FILE")
+    optprs.add_option("--sigma-lo", dest="sigma_lo", type='float',
+                      default=3.0, metavar="SIGMA",
+                      help="Lower rejection limit (sigclip method)")
+    optprs.add_option("--sigma-hi", dest="sigma_hi", type='float',
+                      default=3.0, metavar="SIGMA",
+                      help="Upper rejection limit (sigclip method)")
+    optprs.add_option("--stderr", dest="logstderr", default=False,
+                      action="store_true",
+                      help="Copy logging also to stderr")
+    optprs.add_option("--workers", dest="workers", type='int', default=1,
+                      metavar="NUM",
+                      help="Use NUM worker processes")
+    optprs.add_option("--profile", dest="profile", action="store_true",
+                      default=False,
+                      help="Run the profiler on main()")
+
+    (options, args) = optprs.parse_args(sys.argv[1:])
+
+    # Are we debugging this?
+    if options.debug:
+        import pdb
+
+        pdb.run('main(options, args)')
+
+    # Are we profiling this?
+    elif options.profile:
+        import profile
+
+        print("%s profile:" % sys.argv[0])
+        profile.run('main(options, args)')
+
+    else:
+        main(options, args)
+
+# END
@@ -0,0 +1,273 @@
+#
+# thumbdb.py -- persistent index of thumbnail images
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+A persistent store for thumbnails.
+
+All of the thumbnails in a `ThumbIndex` live in a single SQLite database
+file, keyed by a hash of the path, modification time, size and HDU of
+the image file and the settings used to render the thumbnail (see
+`get_thumb_key`).  A changed file or different render settings simply
+produce a different key.  Lookups can be done in batches with
+`ThumbIndex.get_many`, so that a directory full of files can be checked
+with a handful of queries.
+
+`make_thumb` renders a thumbnail from a decimated, memory-mapped read
+of a FITS file.  It does not need a viewer and is meant to be run in
+worker processes.
+"""
+import os
+import math
+import json
+import zlib
+import hashlib
+import sqlite3
+import threading
+
+import numpy
+
+from ginga import AstroImage, AutoCuts, RGBMap, cmap, imap
+from ginga.misc import log
+
+try:
+    from astropy.io import fits as pyfits
+    have_astropy = True
+except ImportError:
+    have_astropy = False
+
+# settings used to render a thumbnail, if not specified
+default_render = dict(thumb_length=150, autocut_method='zscale',
+                      cmap='gray', imap='ramp')
+
+# maximum number of keys per query in a batch lookup
+batch_size = 500
+
+
+class ThumbDBError(Exception):
+    pass
+
+
+def get_render_settings(**kwdargs):
+    """Returns the thumbnail render settings: `default_render` updated
+    with the keyword arguments.
+    """
+    render = dict(default_render)
+    render.update(kwdargs)
+    return render
+
+
+def get_thumb_key(path, idx=None, render=None):
+    """Returns the index key for the thumbnail of HDU `idx` of the file
+    at `path`, rendered with the settings in dict `render`.  The key
+    changes if the file is modified.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    if render is None:
+        render = default_render
+    s = repr((path, st.st_mtime, st.st_size, idx, sorted(render.items())))
+    return hashlib.sha1(s.encode()).hexdigest()
+
+
+class ThumbIndex(object):
+    """An index of thumbnails in the SQLite database file `dbpath`.
+
+    Each thumbnail is stored as a compressed RGB array, together with a
+    dict of metadata (e.g. header keywords for a tooltip).  The index
+    can be shared between threads.
+    """
+
+    def __init__(self, dbpath, logger):
+        self.dbpath = dbpath
+        self.logger = logger
+        self.lock = threading.RLock()
+
+        try:
+            self.conn = sqlite3.connect(dbpath, check_same_thread=False)
+            # this is a cache: trade durability for speed
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS thumbs (
+                key TEXT PRIMARY KEY, path TEXT, mtime REAL, size INTEGER,
+                width INTEGER, height INTEGER, metadata TEXT, data BLOB)""")
+            self.conn.execute("""CREATE INDEX IF NOT EXISTS thumbs_path
+                ON thumbs (path)""")
+            self.conn.commit()
+
+        except sqlite3.Error as e:
+            raise ThumbDBError("Error opening thumb index '%s': %s" % (
+                dbpath, str(e)))
+
+    def get(self, key):
+        """Returns (rgb, metadata) for `key`, or None if not in the
+        index.
+        """
+        return self.get_many([key]).get(key, None)
+
+    def get_many(self, keys):
+        """Returns a dict mapping each of `keys` found in the index to
+        (rgb, metadata).
+        """
+        keys = list(keys)
+        res = {}
+        with self.lock:
+            for i in range(0, len(keys), batch_size):
+                chunk = keys[i:i+batch_size]
+                query = """SELECT key, width, height, metadata, data
+                    FROM thumbs WHERE key IN (%s)""" % (
+                        ','.join(['?'] * len(chunk)))
+                rows = self.conn.execute(query, chunk).fetchall()
+                for key, wd, ht, metadata, data in rows:
+                    rgb = numpy.frombuffer(zlib.decompress(data),
+                                           dtype=numpy.uint8)
+                    res[key] = (rgb.reshape((ht, wd, 3)),
+                                json.loads(metadata))
+        return res
+
+    def put(self, key, path, rgb, metadata):
+        """Store thumbnail `rgb` (an (ht, wd, 3) uint8 array) and the
+        dict `metadata` under `key`.  Thumbnails of older versions of the
+        file at `path` are removed.
+        """
+        rgb = numpy.ascontiguousarray(rgb[..., :3], dtype=numpy.uint8)
+        ht, wd = rgb.shape[:2]
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        metadata = json.dumps(metadata, default=str)
+        data = zlib.compress(rgb.tobytes(), 1)
+
+        with self.lock:
+            self.conn.execute("""DELETE FROM thumbs WHERE path = ? AND
+                (mtime != ? OR size != ?)""", (path, st.st_mtime, st.st_size))
+            self.conn.execute("""INSERT OR REPLACE INTO thumbs VALUES
+                (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, path, st.st_mtime, st.st_size, wd, ht, metadata,
+                 sqlite3.Binary(data)))
+            self.conn.commit()
+
+    def remove(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM thumbs WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def get_count(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM thumbs").fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM thumbs")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def decimate(data, thumb_length=150):
+    """Returns a view of `data` keeping every n-th pixel in each
+    direction, so that the long side is at most about `thumb_length`
+    pixels.
+    """
+    ht, wd = data.shape[:2]
+    step = max(1, int(math.ceil(max(wd, ht) / float(thumb_length))))
+    return data[::step, ::step]
+
+
+def read_decimated(filepath, idx=None, thumb_length=150):
+    """Read HDU `idx` (by default, the first one with image data) of
+    the FITS file at `filepath`, keeping every n-th pixel so that the
+    long side is at most about `thumb_length` pixels.  The file is
+    memory-mapped, so only the pixels needed are read.  For data with
+    more than two dimensions, the first slice is used.
+
+    Returns (data, header).
+    """
+    if not have_astropy:
+        raise ThumbDBError("Please install 'astropy' to read FITS files")
+
+    with pyfits.open(filepath, memmap=True) as fits_f:
+        if idx is None:
+            for i, hdu in enumerate(fits_f):
+                if (hdu.header.get('NAXIS', 0) >= 2) and \
+                   (hdu.header.get('XTENSION', 'IMAGE') in ('IMAGE',
+                                                            'COMPRESSED_IMAGE')):
+                    idx = i
+                    break
+            else:
+                raise ThumbDBError("No image data in '%s'" % (filepath))
+
+        hdu = fits_f[idx]
+        header = hdu.header.copy()
+        data = hdu.data
+        while len(data.shape) > 2:
+            data = data[0]
+
+        # copy, so that the result does not hold on to the file
+        data = numpy.array(decimate(data, thumb_length))
+
+    return data, header
+
+
+def render_thumb(data, render=None, cuts=None, logger=None):
+    """Render `data` to an (ht, wd, 3) uint8 RGB array with the cut
+    method, color map and intensity map named in dict `render`.  If
+    `cuts` is given as (loval, hival), these cut levels are used instead
+    of the ones calculated with the cut method.  Color data (e.g. from a
+    JPEG file) is used as is.
+    """
+    if len(data.shape) == 3:
+        return data[..., :3].clip(0, 255).astype(numpy.uint8)
+
+    if logger is None:
+        logger = log.get_logger(null=True)
+    render = get_render_settings(**(render or {}))
+
+    image = AstroImage.AstroImage(data, logger=logger)
+    autocuts = AutoCuts.get_autocuts(render['autocut_method'])(logger)
+    if cuts is None:
+        loval, hival = autocuts.calc_cut_levels(image)
+    else:
+        loval, hival = cuts
+
+    rgbmap = RGBMap.RGBMapper(logger)
+    rgbmap.set_cmap(cmap.get_cmap(render['cmap']), callback=False)
+    rgbmap.set_imap(imap.get_imap(render['imap']), callback=False)
+    vmax = rgbmap.get_hash_size() - 1
+    idx = autocuts.cut_levels_idx(data, loval, hival, vmin=0, vmax=vmax)
+
+    rgbobj = rgbmap.get_rgbarray(idx, order='RGB')
+    return rgbobj.get_array('RGB')
+
+
+def make_thumb(filepath, idx=None, render=None, keywords=None):
+    """Make a thumbnail of HDU `idx` of the FITS file at `filepath` (see
+    `read_decimated` and `render_thumb`).  Intended to run in a worker
+    process.
+
+    Returns (rgb, metadata), where metadata is a dict of the values of
+    header `keywords` ('N/A' for missing ones).
+    """
+    render = get_render_settings(**(render or {}))
+    data, header = read_decimated(filepath, idx=idx,
+                                  thumb_length=render['thumb_length'])
+    rgb = render_thumb(data, render=render)
+
+    metadata = {}
+    for kwd in (keywords or []):
+        metadata[kwd] = header.get(kwd, 'N/A')
+    return rgb, metadata
+
+
+def _make_thumb_job(args):
+    # for the worker processes: errors are returned rather than raised
+    try:
+        return (True, make_thumb(*args))
+    except Exception as e:
+        return (False, str(e))
+
+#END
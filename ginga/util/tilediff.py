@@ -0,0 +1,197 @@
+#
+# tilediff.py -- incremental (tile difference) encoding of RGB frames
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Incremental encoding of rendered frames for remote displays.
+
+The frame is divided into square tiles.  Each new frame is compared
+with the previous one and only the tiles that have changed are
+compressed; runs of changed tiles in the same tile row are merged into
+a single rectangle.  The receiver keeps a copy of the last frame and
+composites the rectangles onto it, in sequence.  If most of the frame
+has changed (or its size changed) the whole frame is sent instead, as a
+"key" frame.
+
+`TileDiffEncoder` can optionally adapt the compression quality to keep
+the data rate under a given limit.
+"""
+import time
+from io import BytesIO
+
+import numpy
+
+from ginga.misc import Bunch
+
+try:
+    import PIL.Image as PILimage
+    have_pil = True
+except ImportError:
+    have_pil = False
+
+
+def encode_pil(data_np, format='jpeg', quality=90):
+    """Compress an RGB numpy array into a buffer in (format)."""
+    if not have_pil:
+        raise Exception("Install PIL to use this method")
+    image = PILimage.fromarray(data_np)
+    buf = BytesIO()
+    image.save(buf, format=format, quality=quality)
+    return buf.getvalue()
+
+
+def get_dirty_tiles(prev_np, data_np, tile_size):
+    """Returns a 2D boolean array, with one element per tile, which is
+    True for the tiles that differ between `prev_np` and `data_np`
+    (which must have the same shape).
+    """
+    ht, wd = data_np.shape[:2]
+    nty, ntx = -(-ht // tile_size), -(-wd // tile_size)
+
+    diff = (prev_np != data_np)
+    if diff.ndim > 2:
+        diff = diff.any(axis=2)
+
+    # pad to a whole number of tiles and reduce over each tile
+    pad_y, pad_x = nty * tile_size - ht, ntx * tile_size - wd
+    if pad_y or pad_x:
+        diff = numpy.pad(diff, ((0, pad_y), (0, pad_x)), mode='constant')
+    diff = diff.reshape(nty, tile_size, ntx, tile_size)
+    return diff.any(axis=(1, 3))
+
+
+def get_dirty_rects(dirty, tile_size, wd, ht):
+    """Convert a boolean tile array (as returned by `get_dirty_tiles`)
+    into a list of (x, y, width, height) rectangles, merging horizontal
+    runs of dirty tiles.
+    """
+    rects = []
+    for ty, row in enumerate(dirty):
+        idx = numpy.flatnonzero(row)
+        if len(idx) == 0:
+            continue
+        # split the indexes of dirty tiles into consecutive runs
+        breaks = numpy.flatnonzero(numpy.diff(idx) != 1) + 1
+        for run in numpy.split(idx, breaks):
+            x, y = run[0] * tile_size, ty * tile_size
+            x2 = min((run[-1] + 1) * tile_size, wd)
+            y2 = min(y + tile_size, ht)
+            rects.append((int(x), int(y), int(x2 - x), int(y2 - y)))
+    return rects
+
+
+class TileDiffEncoder(object):
+    """
+    Encodes a sequence of frames as key frames and tile differences.
+
+    Parameters
+    ----------
+    tile_size : int
+        Width and height of a tile in pixels.  A multiple of 8 avoids
+        JPEG artifacts at the tile boundaries.
+
+    key_threshold : float
+        If more than this fraction of the tiles changed, a key frame
+        is sent instead.
+
+    encode_fn : callable or None
+        Function `encode_fn(data_np, format, quality)` returning the
+        compressed buffer for an RGB array; the default uses PIL.
+    """
+
+    def __init__(self, tile_size=64, key_threshold=0.6, encode_fn=None):
+        self.tile_size = tile_size
+        self.key_threshold = key_threshold
+        if encode_fn is None:
+            encode_fn = encode_pil
+        self.encode_fn = encode_fn
+
+        # quality adaptation
+        self.quality = 90
+        self.min_quality = 40
+        self.max_quality = 90
+        self.max_rate = 0
+        self.rate_interval = 2.0
+        self._sent = []
+
+        self.reset()
+
+    def reset(self):
+        """Forget the previous frame; the next one will be a key frame."""
+        self.prev_np = None
+        self.seq = 0
+
+    def set_bandwidth_limit(self, bytes_per_sec):
+        """Set the data rate (bytes/sec) to aim for by adjusting the
+        quality (0 means no limit).
+        """
+        self.max_rate = bytes_per_sec
+        if not bytes_per_sec:
+            self.quality = self.max_quality
+
+    def get_rate(self):
+        """Returns the recent data rate in bytes/sec."""
+        if len(self._sent) == 0:
+            return 0.0
+        now = time.time()
+        total = sum([nbytes for t, nbytes in self._sent])
+        return total / max(now - self._sent[0][0], self.rate_interval)
+
+    def _record(self, nbytes):
+        now = time.time()
+        self._sent.append((now, nbytes))
+        while (len(self._sent) > 0 and
+               now - self._sent[0][0] > self.rate_interval):
+            self._sent.pop(0)
+
+        if not self.max_rate:
+            return
+        rate = self.get_rate()
+        if rate > self.max_rate:
+            self.quality = max(self.min_quality, self.quality - 10)
+        elif rate < 0.5 * self.max_rate:
+            self.quality = min(self.max_quality, self.quality + 5)
+
+    def encode(self, data_np, format='jpeg', force_key=False):
+        """Encode a new frame.  `data_np` is an RGB array of shape
+        (ht, wd, 3).  Returns a Bunch with attributes `seq` (the frame
+        sequence number), `key` (True if this is a key frame) and
+        `tiles`, a list of Bunch(x, y, width, height, buf) with the
+        compressed rectangles to composite over the previous frame
+        (empty if the frame has not changed).
+        """
+        ht, wd = data_np.shape[:2]
+        key = force_key or (self.prev_np is None) or \
+              (self.prev_np.shape != data_np.shape)
+
+        if not key:
+            dirty = get_dirty_tiles(self.prev_np, data_np, self.tile_size)
+            if dirty.mean() > self.key_threshold:
+                key = True
+
+        if key:
+            rects = [(0, 0, wd, ht)]
+        else:
+            rects = get_dirty_rects(dirty, self.tile_size, wd, ht)
+
+        tiles = []
+        nbytes = 0
+        for x, y, width, height in rects:
+            buf = self.encode_fn(
+                numpy.ascontiguousarray(data_np[y:y+height, x:x+width]),
+                format, self.quality)
+            nbytes += len(buf)
+            tiles.append(Bunch.Bunch(x=x, y=y, width=width, height=height,
+                                     buf=buf))
+
+        self.prev_np = data_np.copy()
+        if len(tiles) > 0:
+            # NOTE: only frames that are sent are numbered, the receiver
+            # relies on the sequence having no gaps
+            self.seq += 1
+            self._record(nbytes)
+        return Bunch.Bunch(seq=self.seq, key=key, tiles=tiles)
+
+#END
@@ -16,7 +16,7 @@ class VideoSink(object):
 
     def write(self, image):
         assert image.shape == self.size
-        self.p.stdin.write(image.tostring())
+        self.p.stdin.write(image.tobytes())
 
     def close(self):
         self.p.stdin.close()
@@ -329,6 +329,69 @@ class BaseWCS(object):
         """
         pass
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        """
+        Map an array of pixel indexes into sky coordinates in the WCS
+        system defined by the header.
+
+        Parameters
+        ----------
+        idxs : array-like
+            A (N, naxis) array of data coordinates, one per row
+
+        coords : 'data' or None, optional, default to 'data'
+            Expresses whether the data coordinates are indexed from zero
+
+        This is the vectorized form of `pixtoradec`.  Subclasses should
+        override it to transform all of the coordinates with one call
+        into the wrapped WCS; the default implementation calls
+        `pixtoradec` once per row.
+
+        Returns
+        -------
+        Returns a (N, 2) array of the WCS converted values in the
+        first two axes of the coordinate system defined by the WCS
+        (e.g. ra_deg, dec_deg in each row).
+        """
+        idxs = numpy.asarray(idxs, dtype=numpy.float64)
+        res = [self.pixtoradec(tuple(row), coords=coords) for row in idxs]
+        return numpy.array(res, dtype=numpy.float64).reshape((-1, 2))
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        """
+        Map arrays of sky coordinates in the WCS system defined by the
+        header into pixel indexes.
+
+        Parameters
+        ----------
+        ra_deg : array-like
+            First coordinates
+
+        dec_deg : array-like
+            Second coordinates
+
+        coords : 'data' or None, optional, defaults to 'data'
+            Expresses whether to return coordinates indexed from zero
+
+        naxispath : list-like or None, optional, defaults to None
+            A sequence defining the pixel indexes > 2D, if any
+
+        This is the vectorized form of `radectopix`.  Subclasses should
+        override it to transform all of the coordinates with one call
+        into the wrapped WCS; the default implementation calls
+        `radectopix` once per coordinate.
+
+        Returns
+        -------
+        Returns a (N, 2) array of the data (pixel) values in the first
+        two axes of the data coordinate system defined by the WCS
+        (e.g. x, y in each row).
+        """
+        ra_deg, dec_deg = _as_coord_arrays(ra_deg, dec_deg)
+        res = [self.radectopix(ra, dec, coords=coords, naxispath=naxispath)
+               for ra, dec in zip(ra_deg, dec_deg)]
+        return numpy.array(res, dtype=numpy.float64).reshape((-1, 2))
+
     def pixtosystem(self, idxs, system=None, coords='data'):
         """
         Map pixel values into a sky coordinate in a named system.
@@ -492,7 +555,7 @@ class AstropyWCS2(BaseWCS):
             origin = 0
         else:
             origin = 1
-        pixcrd = numpy.array([idxs], numpy.float_)
+        pixcrd = numpy.array([idxs], numpy.float64)
         try:
             sky = self.wcs.all_pix2world(pixcrd, origin)
             return float(sky[0, 2])
@@ -516,7 +579,7 @@ class AstropyWCS2(BaseWCS):
             origin = 0
         else:
             origin = 1
-        pixcrd = numpy.array([idxs], numpy.float_)
+        pixcrd = numpy.array([idxs], numpy.float64)
 
         try:
             sky = self.wcs.all_pix2world(pixcrd, origin)[0] * u.deg
@@ -564,6 +627,37 @@ class AstropyWCS2(BaseWCS):
 
         return pixels
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        if coords == 'data':
+            origin = 0
+        else:
+            origin = 1
+        pixcrd = numpy.asarray(idxs, dtype=numpy.float64)
+
+        try:
+            sky = self.wcs.all_pix2world(pixcrd, origin)
+        except Exception as e:
+            self.logger.error("Error calculating pixtoradec: %s" % (str(e)))
+            raise WCSError(e)
+
+        # the native frame components are the first two world axes
+        return sky[:, :2]
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        if coords == 'data':
+            origin = 0
+        else:
+            origin = 1
+        skycrd = _make_skycrd(ra_deg, dec_deg, naxispath)
+
+        try:
+            pix = self.wcs.wcs_world2pix(skycrd, origin)
+        except Exception as e:
+            self.logger.error("Error calculating radectopix: %s" % (str(e)))
+            raise WCSError(e)
+
+        return pix[:, :2]
+
 
     def pixtocoords(self, idxs, system=None, coords='data'):
 
@@ -666,7 +760,7 @@ class AstropyWCS(BaseWCS):
             origin = 0
         else:
             origin = 1
-        pixcrd = numpy.array([idxs], numpy.float_)
+        pixcrd = numpy.array([idxs], numpy.float64)
         try:
             sky = self.wcs.all_pix2world(pixcrd, origin)
             return float(sky[0, 2])
@@ -681,7 +775,7 @@ class AstropyWCS(BaseWCS):
             origin = 0
         else:
             origin = 1
-        pixcrd = numpy.array([idxs], numpy.float_)
+        pixcrd = numpy.array([idxs], numpy.float64)
         try:
             #sky = self.wcs.wcs_pix2sky(pixcrd, origin)
             #sky = self.wcs.all_pix2sky(pixcrd, origin)
@@ -707,7 +801,7 @@ class AstropyWCS(BaseWCS):
         args = [ra_deg, dec_deg]
         if naxispath:
             args += [0] * len(naxispath)
-        skycrd = numpy.array([args], numpy.float_)
+        skycrd = numpy.array([args], numpy.float64)
 
         try:
             #pix = self.wcs.wcs_sky2pix(skycrd, origin)
@@ -724,6 +818,36 @@ class AstropyWCS(BaseWCS):
         y = float(pix[0, 1])
         return (x, y)
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        if coords == 'data':
+            origin = 0
+        else:
+            origin = 1
+        pixcrd = numpy.asarray(idxs, dtype=numpy.float64)
+
+        try:
+            sky = self.wcs.all_pix2world(pixcrd, origin)
+        except Exception as e:
+            self.logger.error("Error calculating pixtoradec: %s" % (str(e)))
+            raise WCSError(e)
+
+        return sky[:, :2]
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        if coords == 'data':
+            origin = 0
+        else:
+            origin = 1
+        skycrd = _make_skycrd(ra_deg, dec_deg, naxispath)
+
+        try:
+            pix = self.wcs.wcs_world2pix(skycrd, origin)
+        except Exception as e:
+            self.logger.error("Error calculating radectopix: %s" % (str(e)))
+            raise WCSError(e)
+
+        return pix[:, :2]
+
     def pixtocoords(self, idxs, system=None, coords='data'):
 
         if self.coordsys == 'raw':
@@ -871,6 +995,37 @@ class AstLibWCS(BaseWCS):
 
         return (x, y)
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        idxs = numpy.asarray(idxs, dtype=numpy.float64)
+        if coords == 'fits':
+            # Via astWCS.NUMPY_MODE, we've forced pixels referenced from 0
+            idxs = idxs - 1
+
+        try:
+            # astWCS transforms lists of coordinates in one call
+            res = self.wcs.pix2wcs(list(idxs[:, 0]), list(idxs[:, 1]))
+
+        except Exception as e:
+            self.logger.error("Error calculating pixtoradec: %s" % (str(e)))
+            raise WCSError(e)
+
+        return numpy.array(res, dtype=numpy.float64).reshape((-1, 2))
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        ra_deg, dec_deg = _as_coord_arrays(ra_deg, dec_deg)
+        try:
+            res = self.wcs.wcs2pix(list(ra_deg), list(dec_deg))
+
+        except Exception as e:
+            self.logger.error("Error calculating radectopix: %s" % (str(e)))
+            raise WCSError(e)
+
+        pix = numpy.array(res, dtype=numpy.float64).reshape((-1, 2))
+        if coords == 'fits':
+            # Via astWCS.NUMPY_MODE, we've forced pixels referenced from 0
+            pix += 1
+        return pix
+
     def pixtosystem(self, idxs, system=None, coords='data'):
 
         if self.coordsys == 'raw':
@@ -1003,6 +1158,42 @@ class KapteynWCS(BaseWCS):
         x, y = pix[0], pix[1]
         return (x, y)
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        idxs = numpy.asarray(idxs, dtype=numpy.float64)
+        # Kapteyn's WCS needs pixels referenced from 1
+        if coords == 'data':
+            idxs = idxs + 1
+
+        try:
+            # a tuple of arrays is transformed in one call
+            res = self.wcs.toworld(tuple(idxs.T))
+            if (self.wcs.lonaxnum is not None) and (self.wcs.lataxnum is not None):
+                ra_deg, dec_deg = res[self.wcs.lonaxnum-1], res[self.wcs.lataxnum-1]
+            else:
+                ra_deg, dec_deg = res[0], res[1]
+
+        except Exception as e:
+            self.logger.error("Error calculating pixtoradec: %s" % (str(e)))
+            raise WCSError(e)
+
+        return numpy.array((ra_deg, dec_deg), dtype=numpy.float64).T
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        skycrd = _make_skycrd(ra_deg, dec_deg, naxispath)
+
+        try:
+            pix = self.wcs.topixel(tuple(skycrd.T))
+
+        except Exception as e:
+            self.logger.error("Error calculating radectopix: %s" % (str(e)))
+            raise WCSError(e)
+
+        pix = numpy.array((pix[0], pix[1]), dtype=numpy.float64).T
+        if coords == 'data':
+            # Kapteyn's WCS returns pixels referenced from 1
+            pix -= 1
+        return pix
+
     def pixtosystem(self, idxs, system=None, coords='data'):
 
         if self.coordsys == 'raw':
@@ -1145,6 +1336,50 @@ class StarlinkWCS(BaseWCS):
 
         return (x, y)
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        idxs = numpy.asarray(idxs, dtype=numpy.float64)
+        # Starlink's WCS needs pixels referenced from 1
+        if coords == 'data':
+            idxs = idxs + 1
+
+        try:
+            # pixel to sky coords (in the WCS specified transform);
+            # Ast transforms a (naxis, N) array in one call
+            res = self.wcs.tran(idxs.T, 1)
+
+            if self.coordsys not in ('pixel', 'raw'):
+                # whatever sky coords to icrs coords
+                res = self.icrs_trans.tran(res, 1)
+            # TODO: what if axes are inverted?
+            sky = numpy.degrees(numpy.array((res[0], res[1]),
+                                            dtype=numpy.float64))
+
+        except Exception as e:
+            self.logger.error("Error calculating pixtoradec: %s" % (str(e)))
+            raise WCSError(e)
+
+        return sky.T
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        skycrd = _make_skycrd(ra_deg, dec_deg, naxispath)
+        # TODO: what if spatial axes are inverted?
+        skycrd[:, :2] = numpy.radians(skycrd[:, :2])
+
+        try:
+            # sky coords to pixel (in the WCS specified transform)
+            # 0 as second arg -> inverse transform
+            res = self.wcs.tran(skycrd.T, 0)
+            pix = numpy.array((res[0], res[1]), dtype=numpy.float64).T
+
+        except Exception as e:
+            self.logger.error("Error calculating radectopix: %s" % (str(e)))
+            raise WCSError(e)
+
+        if coords == 'data':
+            # Starlink's WCS returns pixels referenced from 1
+            pix -= 1
+        return pix
+
     def pixtosystem(self, idxs, system=None, coords='data'):
 
         if self.coordsys == 'raw':
@@ -1277,7 +1512,7 @@ class BareBonesWCS(BaseWCS):
         # reverse matrix
         rmatrix = (cd11 * cd22) - (cd12 * cd21)
 
-        if not cmp(rmatrix, 0.0):
+        if rmatrix == 0.0:
             raise WCSError("WCS Matrix Error: check values")
 
         # Adjust RA as necessary
@@ -1302,6 +1537,53 @@ class BareBonesWCS(BaseWCS):
             x, y = x - 1, y - 1
         return (x, y)
 
+    def pixtoradec_arr(self, idxs, coords='data'):
+        idxs = numpy.asarray(idxs, dtype=numpy.float64)
+        x, y = idxs[:, 0], idxs[:, 1]
+
+        # account for DATA->FITS coordinate space
+        if coords == 'data':
+            x, y = x + 1, y + 1
+
+        crpix1, crpix2 = self.get_reference_pixel()
+        crval1, crval2 = self.get_physical_reference_pixel()
+        cd11, cd12, cd21, cd22 = self.get_pixel_coordinates()
+
+        res = numpy.empty((len(x), 2), dtype=numpy.float64)
+        res[:, 0] = (cd11 * (x - crpix1) + cd12 *
+                     (y - crpix2)) / math.cos(math.radians(crval2)) + crval1
+        res[:, 1] = cd21 * (x - crpix1) + cd22 * (y - crpix2) + crval2
+        return res
+
+    def radectopix_arr(self, ra_deg, dec_deg, coords='data', naxispath=None):
+        ra_deg, dec_deg = _as_coord_arrays(ra_deg, dec_deg)
+
+        crpix1, crpix2 = self.get_reference_pixel()
+        crval1, crval2 = self.get_physical_reference_pixel()
+        cd11, cd12, cd21, cd22 = self.get_pixel_coordinates()
+
+        # reverse matrix
+        rmatrix = (cd11 * cd22) - (cd12 * cd21)
+
+        if rmatrix == 0.0:
+            raise WCSError("WCS Matrix Error: check values")
+
+        # Adjust RA as necessary
+        d_ra = ra_deg - crval1
+        d_ra = numpy.where(d_ra > 180.0, d_ra - 360.0,
+                           numpy.where(d_ra < -180.0, d_ra + 360.0, d_ra))
+        d_dec = dec_deg - crval2
+        cos_crval2 = math.cos(crval2 * math.pi/180.0)
+
+        res = numpy.empty((len(ra_deg), 2), dtype=numpy.float64)
+        res[:, 0] = (cd22 * cos_crval2 * d_ra - cd12 * d_dec)/rmatrix + crpix1
+        res[:, 1] = (cd11 * d_dec - cd21 * cos_crval2 * d_ra)/rmatrix + crpix2
+
+        # account for FITS->DATA space
+        if coords == 'data':
+            res -= 1
+        return res
+
     def pixtosystem(self, idxs, system=None, coords='data'):
         return self.pixtoradec(idxs, coords=coords)
 
@@ -1313,6 +1595,29 @@ class WcslibWCS(AstropyWCS):
 
 ################## Help functions ##################
 
+def _as_coord_arrays(ra_deg, dec_deg):
+    """Return `ra_deg` and `dec_deg` as flat float arrays of equal length."""
+    ra_deg = numpy.asarray(ra_deg, dtype=numpy.float64).ravel()
+    dec_deg = numpy.asarray(dec_deg, dtype=numpy.float64).ravel()
+    if len(ra_deg) != len(dec_deg):
+        raise WCSError("Coordinate arrays differ in length (%d != %d)" % (
+            len(ra_deg), len(dec_deg)))
+    return ra_deg, dec_deg
+
+
+def _make_skycrd(ra_deg, dec_deg, naxispath):
+    """Build a (N, naxis) array of world coordinates from arrays of
+    `ra_deg` and `dec_deg`, padding the extra axes with zeros as the
+    scalar `radectopix` methods do.
+    """
+    ra_deg, dec_deg = _as_coord_arrays(ra_deg, dec_deg)
+    num_extra = len(naxispath) if naxispath else 0
+    skycrd = numpy.zeros((len(ra_deg), 2 + num_extra), dtype=numpy.float64)
+    skycrd[:, 0] = ra_deg
+    skycrd[:, 1] = dec_deg
+    return skycrd
+
+
 def choose_coord_units(header):
     """Return the appropriate key code for the units value for the axes by
     examining the FITS header.
@@ -16,6 +16,7 @@ from ginga import Mixins, Bindings
 from ginga.misc import log, Bunch
 from ginga.canvas.mixins import DrawingMixin, CanvasMixin, CompoundMixin
 from ginga.util.toolbox import ModeIndicator
+from ginga.util import tilediff
 from ginga.web.pgw import PgHelp
 
 
@@ -59,6 +60,18 @@ class ImageViewPg(ImageView):
         # some artifacts, especially noticeable with small text
         self.t_.setDefaults(html5_canvas_format='jpeg')
 
+        # send only the parts of the window that changed since the last
+        # update, optionally adapting the quality to keep the data rate
+        # under html5_max_bandwidth (kB/sec, 0 for no limit)
+        self.t_.setDefaults(html5_tile_diff=True, html5_tile_size=64,
+                            html5_max_bandwidth=0)
+        self._tile_encoder = tilediff.TileDiffEncoder(
+            tile_size=self.t_['html5_tile_size'])
+        self._tile_encoder.set_bandwidth_limit(
+            self.t_['html5_max_bandwidth'] * 1024)
+        self.t_.getSetting('html5_max_bandwidth').add_callback(
+            'set', self._max_bandwidth_cb)
+
         #self.defer_redraw = False
 
 
@@ -78,6 +91,10 @@ class ImageViewPg(ImageView):
         if self.pgcanvas is None:
             return
 
+        if self.t_.get('html5_tile_diff', False):
+            self._update_image_tiles()
+            return
+
         try:
             self.logger.debug("getting image as buffer...")
             format = self.t_.get('html5_canvas_format', 'jpeg')
@@ -90,6 +107,30 @@ class ImageViewPg(ImageView):
         except Exception as e:
             self.logger.error("Couldn't update canvas: %s" % (str(e)))
 
+    def _update_image_tiles(self):
+        try:
+            format = self.t_.get('html5_canvas_format', 'jpeg')
+            # NOTE: alpha is dropped; the window is opaque
+            arr = self.get_image_as_array()
+            idx = self.get_rgb_order().index
+            arr = arr[..., [idx('R'), idx('G'), idx('B')]]
+
+            frame = self._tile_encoder.encode(arr, format=format)
+            if len(frame.tiles) == 0:
+                self.logger.debug("no change in window contents")
+                return
+            self.logger.debug("sending frame %d: %d tile(s), %d bytes" % (
+                frame.seq, len(frame.tiles),
+                sum([len(tile.buf) for tile in frame.tiles])))
+
+            self.pgcanvas.do_update_tiles(frame, format=format)
+
+        except Exception as e:
+            self.logger.error("Couldn't update canvas: %s" % (str(e)))
+
+    def _max_bandwidth_cb(self, setting, value):
+        self._tile_encoder.set_bandwidth_limit(value * 1024)
+
     def reschedule_redraw(self, time_sec):
         if self.pgcanvas is not None:
             self.pgcanvas.reset_timer('redraw', time_sec)
@@ -132,6 +173,8 @@ class ImageViewPg(ImageView):
     def map_event(self, event):
         self.logger.info("window mapped to %dx%d" % (
             event.width, event.height))
+        # (re)connected browser has no previous frame to update
+        self._tile_encoder.reset()
         self.configure_window(event.width, event.height)
         self.redraw(whence=0)
 
@@ -92,6 +92,11 @@ class GingaViewerWidget(Widgets.Canvas):
         self.draw_image(buf, 0, 0, self.width, self.height)
         self.logger.debug("drew image")
 
+    def do_update_tiles(self, frame, format='jpeg'):
+        self.logger.debug("drawing %d tile(s)" % (len(frame.tiles)))
+        self.draw_tiles(frame.tiles, frame.seq, key=frame.key,
+                        imgtype=format)
+
     def _cb_redirect(self, event):
         method = self._dispatch_event_table[event.type]
         try:
@@ -788,6 +788,19 @@ support HTML5 canvas.</canvas>
 
         self._draw("image", x=x, y=y, src=img_src, width=width, height=height)
 
+    def draw_tiles(self, tiles, seq, key=False, imgtype='png'):
+        """Composite a numbered frame update (as produced by
+        `ginga.util.tilediff`) on the canvas.  Updates are applied in
+        `seq` order; `key` marks an update covering the whole canvas.
+        """
+        tiles = [dict(x=tile.x, y=tile.y, width=tile.width,
+                      height=tile.height,
+                      src=PgHelp.get_image_src_from_buffer(tile.buf,
+                                                           imgtype=imgtype))
+                 for tile in tiles]
+
+        self._draw("tiles", seq=seq, key=key, tiles=tiles)
+
     def add_timer(self, name, cb_fn):
         app = self.get_app()
         timer = app.add_timer(cb_fn)
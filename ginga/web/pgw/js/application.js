@@ -398,6 +398,60 @@ ginga_initialize_canvas = function (canvas, id, app) {
             })
     }
     
+    // incremental frame updates (see ginga/util/tilediff.py) that are
+    // waiting to be composited, by sequence number
+    pg_canvas.pendingFrames = {};
+    pg_canvas.nextFrame = 1;
+
+    pg_canvas.drawTiles = function(ctx, frame) {
+        if (frame.key) {
+            // a key frame replaces everything: forget older updates
+            pg_canvas.pendingFrames = {};
+            pg_canvas.nextFrame = frame.seq;
+        }
+        pg_canvas.pendingFrames[frame.seq] = frame;
+
+        var numDone = 0;
+        var tileDone = function () {
+            numDone += 1;
+            if (numDone == frame.tiles.length) {
+                frame.loaded = true;
+                pg_canvas.flushTiles(ctx);
+            }
+        }
+        frame.loaded = false;
+        frame.images = frame.tiles.map(function (tile) {
+            var img = new Image();
+            img.addEventListener("load", tileDone);
+            img.addEventListener("error", function () {
+                // count a broken tile as done, so that it does not hold
+                // up this and all later updates
+                console.log("error loading tile of frame " + frame.seq);
+                img.broken = true;
+                tileDone();
+            })
+            img.src = tile.src;
+            return img;
+        });
+    }
+
+    pg_canvas.flushTiles = function(ctx) {
+        // images load asynchronously, but each update is relative to
+        // the previous one, so they must be drawn strictly in order
+        var frame = pg_canvas.pendingFrames[pg_canvas.nextFrame];
+        while ((frame !== undefined) && frame.loaded) {
+            for (var i = 0; i < frame.tiles.length; i++) {
+                if (!frame.images[i].broken) {
+                    ctx.drawImage(frame.images[i], frame.tiles[i].x,
+                                  frame.tiles[i].y);
+                }
+            }
+            delete pg_canvas.pendingFrames[pg_canvas.nextFrame];
+            pg_canvas.nextFrame += 1;
+            frame = pg_canvas.pendingFrames[pg_canvas.nextFrame];
+        }
+    }
+
     pg_canvas.drawCompound = function(ctx, compound) {
         compound.shapes.forEach(function (shp) {
             pg_canvas.shapeToFunc[shp["type"]](ctx, shp);
@@ -410,6 +464,7 @@ ginga_initialize_canvas = function (canvas, id, app) {
         oval: pg_canvas.drawOval,
         circle: pg_canvas.drawCircle,
         image: pg_canvas.drawImage,
+        tiles: pg_canvas.drawTiles,
         line: pg_canvas.drawLine,
         polygon: pg_canvas.drawPolygon,
         compound: pg_canvas.drawCompound